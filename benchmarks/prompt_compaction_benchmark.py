@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Prompt压缩基准测试 - 对比压缩前后的prompt大小以及（可选）Claude端到端延迟
+
+录制的屏幕数据为JSONL文件（或包含.json文件的目录），每条记录格式:
+    {"text_command": "...", "ui_elements": [...], "os_info": {...}, "screenshot_path": "可选", "screenshot_base64": "可选"}
+ui_elements 与服务端 omniparser_result 消息中的 data.ui_elements 格式一致。
+
+用法:
+    python benchmarks/prompt_compaction_benchmark.py recorded_screens.jsonl
+    python benchmarks/prompt_compaction_benchmark.py recorded/ --live --output results.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+
+from shared.schemas.data_models import UIElement, OSInfo
+from server.claude.claude_service import ClaudeService
+from server.claude.prompt_compactor import estimate_tokens
+
+
+def load_recorded_screens(path: str) -> list:
+    """加载录制的屏幕数据"""
+    records = []
+    if os.path.isdir(path):
+        for filename in sorted(os.listdir(path)):
+            if filename.endswith('.json'):
+                with open(os.path.join(path, filename), 'r', encoding='utf-8') as f:
+                    records.append(json.load(f))
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    records.append(json.loads(line))
+    return records
+
+
+def run_live(service: ClaudeService, prompt: str, screenshot_path: str) -> float:
+    """执行一次真实的Claude调用，返回耗时（秒）"""
+    start = time.time()
+    service._execute_claude_command_with_retry(prompt, screenshot_path)
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt压缩基准测试")
+    parser.add_argument("recorded", help="录制的屏幕数据（JSONL文件或目录）")
+    parser.add_argument("--token-budget", type=int, default=1500, help="压缩后元素表的token预算")
+    parser.add_argument("--live", action="store_true", help="调用Claude CLI测量端到端延迟（需要screenshot_path或screenshot_base64）")
+    parser.add_argument("--output", help="结果输出JSON文件路径")
+    args = parser.parse_args()
+
+    records = load_recorded_screens(args.recorded)
+    if not records:
+        print("❌ 没有找到录制数据")
+        return
+
+    baseline = ClaudeService({'prompt_compaction_enabled': False})
+    compacted = ClaudeService({'prompt_compaction': {'token_budget': args.token_budget}})
+
+    results = []
+    for i, record in enumerate(records):
+        command = record['text_command']
+        ui_elements = [UIElement(**elem) for elem in record.get('ui_elements', [])]
+        os_info = OSInfo(**record['os_info']) if record.get('os_info') else None
+
+        t0 = time.perf_counter()
+        prompt_before = baseline._build_analysis_prompt(command, ui_elements, os_info)
+        t1 = time.perf_counter()
+        prompt_after = compacted._build_analysis_prompt(command, ui_elements, os_info)
+        t2 = time.perf_counter()
+
+        result = {
+            'index': i,
+            'text_command': command,
+            'elements': len(ui_elements),
+            'chars_before': len(prompt_before),
+            'chars_after': len(prompt_after),
+            'tokens_before': estimate_tokens(prompt_before),
+            'tokens_after': estimate_tokens(prompt_after),
+            'build_ms_before': (t1 - t0) * 1000,
+            'build_ms_after': (t2 - t1) * 1000,
+        }
+
+        screenshot_path = record.get('screenshot_path')
+        if args.live and screenshot_path and os.path.exists(screenshot_path):
+            result['latency_before'] = run_live(baseline, prompt_before, screenshot_path)
+            result['latency_after'] = run_live(compacted, prompt_after, screenshot_path)
+        elif args.live and record.get('screenshot_base64'):
+            with baseline.image_store.acquire(record['screenshot_base64']) as image_path:
+                result['latency_before'] = run_live(baseline, prompt_before, image_path)
+                result['latency_after'] = run_live(compacted, prompt_after, image_path)
+
+        results.append(result)
+        print(f"[{i}] {len(ui_elements)}个元素: {result['tokens_before']} -> {result['tokens_after']} tokens "
+              f"({result['chars_before']} -> {result['chars_after']} 字符)")
+
+    summary = {
+        'records': len(results),
+        'median_tokens_before': statistics.median(r['tokens_before'] for r in results),
+        'median_tokens_after': statistics.median(r['tokens_after'] for r in results),
+        'median_chars_before': statistics.median(r['chars_before'] for r in results),
+        'median_chars_after': statistics.median(r['chars_after'] for r in results),
+    }
+    live = [r for r in results if 'latency_before' in r]
+    if live:
+        summary['median_latency_before'] = statistics.median(r['latency_before'] for r in live)
+        summary['median_latency_after'] = statistics.median(r['latency_after'] for r in live)
+
+    print("\n📊 汇总:")
+    for key, value in summary.items():
+        print(f"  {key}: {value:.2f}" if isinstance(value, float) else f"  {key}: {value}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'summary': summary, 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+截图编码基准测试 - 对比固定1280x720 JPEG q85 与编码策略在不同链路吞吐量下的
+编码耗时、传输大小以及（可选）OmniParser解析精度
+
+输入为原始分辨率的截图文件（PNG等无损格式）或包含截图的目录；不提供时截取当前屏幕。
+
+用法:
+    python benchmarks/screenshot_encoding_benchmark.py screenshots/
+    python benchmarks/screenshot_encoding_benchmark.py shot.png --throughputs 256,2048,16384 --parse --output results.json
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+from PIL import Image, ImageGrab
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+
+from client.screenshot.encoding_policy import EncodingPolicy
+
+
+def load_screenshots(paths: list) -> list:
+    """加载截图，返回 (名称, RGB图像) 列表"""
+    screenshots = []
+    for path in paths:
+        if os.path.isdir(path):
+            for filename in sorted(os.listdir(path)):
+                if filename.lower().endswith(('.png', '.bmp', '.tif', '.tiff')):
+                    screenshots.append((filename, Image.open(os.path.join(path, filename)).convert('RGB')))
+        else:
+            screenshots.append((os.path.basename(path), Image.open(path).convert('RGB')))
+    if not screenshots:
+        screenshots.append(('screen', ImageGrab.grab().convert('RGB')))
+    return screenshots
+
+
+def encode_legacy(image: Image.Image) -> str:
+    """原实现：固定缩放到1280x720，LANCZOS，JPEG q85"""
+    compressed = image.resize((1280, 720), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    compressed.save(buffer, format='JPEG', quality=85, optimize=True)
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def encode_with_policy(policy: EncodingPolicy, image: Image.Image):
+    """使用编码策略编码，返回 (base64, 决策)"""
+    decision = policy.decide(image.size)
+    return policy.encode(policy.resize(image, decision), decision), decision
+
+
+def element_centers(elements: list) -> list:
+    return [((e['coordinates'][0] + e['coordinates'][2]) / 2, (e['coordinates'][1] + e['coordinates'][3]) / 2,
+             e.get('type'), (e.get('text') or '').strip().lower())
+            for e in elements if len(e.get('coordinates') or []) >= 4]
+
+
+def parse_accuracy(reference: list, candidate: list, tolerance: float) -> dict:
+    """以原始分辨率无损截图的解析结果为基准，计算元素召回率和文本召回率"""
+    ref, cand = element_centers(reference), element_centers(candidate)
+    matched = 0
+    for rx, ry, rtype, _ in ref:
+        if any(ctype == rtype and abs(cx - rx) <= tolerance and abs(cy - ry) <= tolerance for cx, cy, ctype, _ in cand):
+            matched += 1
+    ref_texts = {t for *_, t in ref if t}
+    cand_texts = {t for *_, t in cand if t}
+    return {
+        'element_recall': matched / len(ref) if ref else 1.0,
+        'text_recall': len(ref_texts & cand_texts) / len(ref_texts) if ref_texts else 1.0,
+        'elements': len(cand),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="截图编码基准测试")
+    parser.add_argument("screenshots", nargs='*', help="截图文件或目录（默认截取当前屏幕）")
+    parser.add_argument("--throughputs", default="256,2048,16384", help="模拟的上传吞吐量（KB/s，逗号分隔）")
+    parser.add_argument("--device-scale", type=float, default=1.0, help="屏幕像素密度")
+    parser.add_argument("--repeat", type=int, default=3, help="每种编码重复次数（取中位数耗时）")
+    parser.add_argument("--parse", action="store_true", help="使用OmniParser比较解析精度（需要服务端模型）")
+    parser.add_argument("--tolerance", type=float, default=12.0, help="元素中心匹配容差（屏幕像素）")
+    parser.add_argument("--output", help="结果输出JSON文件路径")
+    args = parser.parse_args()
+
+    screenshots = load_screenshots(args.screenshots)
+    throughputs = [int(t) * 1024 for t in args.throughputs.split(',') if t.strip()]
+
+    omniparser = None
+    if args.parse:
+        from server.omniparser import OmniParserService
+        omniparser = OmniParserService()
+        if not omniparser.is_available():
+            print("❌ OmniParser不可用，跳过解析精度比较")
+            omniparser = None
+
+    results = []
+    for name, image in screenshots:
+        reference_elements = None
+        if omniparser:
+            buffer = io.BytesIO()
+            image.save(buffer, format='PNG')
+            _, reference_elements = omniparser.parse_screen(base64.b64encode(buffer.getvalue()).decode(), image.size)
+
+        # (策略名, 模拟吞吐量, 编码函数)
+        strategies = [('legacy_1280x720_jpeg85', None, lambda img: (encode_legacy(img), None))]
+        for throughput in throughputs:
+            policy = EncodingPolicy({'device_scale': args.device_scale})
+            policy.record_upload(throughput, 1.0)
+            strategies.append((f'policy@{throughput // 1024}KB/s', throughput,
+                               lambda img, p=policy: encode_with_policy(p, img)))
+
+        for strategy, throughput, encode in strategies:
+            timings = []
+            for _ in range(max(1, args.repeat)):
+                start = time.perf_counter()
+                payload, decision = encode(image)
+                timings.append(time.perf_counter() - start)
+
+            decoded_size = Image.open(io.BytesIO(base64.b64decode(payload))).size
+            result = {
+                'screenshot': name,
+                'source_size': list(image.size),
+                'strategy': strategy,
+                'wire_size': list(decoded_size),
+                'codec': f"{decision.codec}@{decision.quality}" if decision else "JPEG@85",
+                'resample': decision.resample if decision else "lanczos",
+                'encode_ms': statistics.median(timings) * 1000,
+                'payload_kb': len(payload) / 1024,
+            }
+            if throughput:
+                result['upload_ms'] = len(payload) / throughput * 1000
+
+            if omniparser:
+                _, elements = omniparser.parse_screen(payload, image.size)
+                result.update(parse_accuracy(reference_elements, elements, args.tolerance))
+
+            results.append(result)
+            line = (f"[{name}] {strategy:<24} {result['wire_size'][0]}x{result['wire_size'][1]} {result['codec']:<8} "
+                    f"{result['encode_ms']:7.1f}ms {result['payload_kb']:8.1f}KB")
+            if 'element_recall' in result:
+                line += f"  元素召回 {result['element_recall']:.2%} 文本召回 {result['text_recall']:.2%}"
+            print(line)
+
+    print("\n📊 汇总（中位数）:")
+    summary = {}
+    for strategy in dict.fromkeys(r['strategy'] for r in results):
+        rows = [r for r in results if r['strategy'] == strategy]
+        summary[strategy] = {
+            'encode_ms': statistics.median(r['encode_ms'] for r in rows),
+            'payload_kb': statistics.median(r['payload_kb'] for r in rows),
+        }
+        if all('element_recall' in r for r in rows):
+            summary[strategy]['element_recall'] = statistics.median(r['element_recall'] for r in rows)
+            summary[strategy]['text_recall'] = statistics.median(r['text_recall'] for r in rows)
+        print(f"  {strategy}: " + ", ".join(f"{k}={v:.2f}" for k, v in summary[strategy].items()))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'summary': summary, 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+消息序列化基准测试 - 对比原实现（逐元素pydantic校验 + 标准库json）与 shared/schemas/serialization.py
+快速路径在每条 analysis_result 消息上的CPU耗时，以及二进制帧使用表格形式前后的大小
+
+元素列表默认随机生成；也可以使用录制的屏幕数据（JSONL文件，每行含 ui_elements，
+格式与 prompt_compaction_benchmark.py 相同）。
+
+用法:
+    python benchmarks/serialization_benchmark.py
+    python benchmarks/serialization_benchmark.py --elements 300 --screenshot-kb 1200 --iterations 100
+    python benchmarks/serialization_benchmark.py --recorded recorded_screens.jsonl --output results.json
+"""
+
+import argparse
+import base64
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+
+from shared.schemas.data_models import TaskAnalysisResponse, ActionPlan, UIElement
+from shared.schemas import serialization
+from shared.schemas.serialization import parse_ui_elements, dumps_text, loads
+from shared.utils.wire_codec import WireCodec, available_codecs
+
+
+def synthetic_elements(count: int, seed: int = 0) -> list:
+    """生成OmniParser输出格式的元素列表（约三分之一带模板）"""
+    rng = random.Random(seed)
+    types = ['text', 'icon', 'button', 'input']
+    elements = []
+    for i in range(count):
+        x, y = rng.uniform(0, 1800), rng.uniform(0, 1000)
+        elements.append({
+            'id': i,
+            'type': rng.choice(types),
+            'description': f"元素 {i} " + ''.join(rng.choice('abcdefghij ') for _ in range(rng.randint(5, 40))),
+            'coordinates': [round(x, 1), round(y, 1), round(x + rng.uniform(10, 200), 1), round(y + rng.uniform(10, 60), 1)],
+            'text': ''.join(rng.choice('abcdefghij') for _ in range(rng.randint(0, 20))),
+            'confidence': round(rng.random(), 3),
+            'template_base64': base64.b64encode(rng.randbytes(600)).decode() if i % 3 == 0 else None,
+        })
+    return elements
+
+
+def load_recorded_elements(path: str) -> list:
+    """加载录制数据中的元素列表"""
+    element_sets = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                element_sets.append(json.loads(line).get('ui_elements', []))
+    return element_sets
+
+
+def build_message(elements: list, screenshot_base64: str, fast: bool) -> dict:
+    """服务端构造 analysis_result 消息"""
+    if fast:
+        ui_elements = parse_ui_elements(elements)
+    else:
+        ui_elements = [UIElement(**elem) for elem in elements]
+    actions = [ActionPlan(type='click', description=f"点击元素 {i}", element_id=str(i)) for i in range(3)]
+    response = TaskAnalysisResponse(
+        task_id='benchmark', success=True, reasoning='基准测试', actions=actions,
+        expected_outcome='完成', confidence=0.9, ui_elements=ui_elements,
+        annotated_screenshot_base64=screenshot_base64
+    )
+    return {'type': 'analysis_result', 'task_id': 'benchmark', 'timestamp': time.time(), 'data': response.model_dump()}
+
+
+def time_ms(fn, iterations: int) -> float:
+    """多次执行取中位数（毫秒）"""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def benchmark_elements(elements: list, screenshot_base64: str, iterations: int, codec: str) -> dict:
+    """对一组元素测量各阶段耗时"""
+    legacy_text = json.dumps(build_message(elements, screenshot_base64, fast=False))
+    message = build_message(elements, screenshot_base64, fast=True)
+    fast_text = dumps_text(message)
+
+    flat_codec = WireCodec(codec, pack_min_rows=0)
+    packed_codec = WireCodec(codec)
+    flat_frame = flat_codec.encode(message)
+    packed_frame = packed_codec.encode(message)
+
+    timings = {
+        'build_legacy_ms': time_ms(lambda: build_message(elements, screenshot_base64, fast=False), iterations),
+        'build_fast_ms': time_ms(lambda: build_message(elements, screenshot_base64, fast=True), iterations),
+        'encode_legacy_ms': time_ms(lambda: json.dumps(message), iterations),
+        'encode_fast_ms': time_ms(lambda: dumps_text(message), iterations),
+        'decode_legacy_ms': time_ms(lambda: [UIElement(**elem) for elem in json.loads(legacy_text)['data']['ui_elements']],
+                                    iterations),
+        'decode_fast_ms': time_ms(lambda: parse_ui_elements(loads(fast_text)['data']['ui_elements']), iterations),
+        'frame_encode_flat_ms': time_ms(lambda: flat_codec.encode(message), iterations),
+        'frame_encode_packed_ms': time_ms(lambda: packed_codec.encode(message), iterations),
+        'frame_decode_flat_ms': time_ms(lambda: flat_codec.decode(flat_frame), iterations),
+        'frame_decode_packed_ms': time_ms(lambda: packed_codec.decode(packed_frame), iterations),
+    }
+    legacy_total = timings['build_legacy_ms'] + timings['encode_legacy_ms'] + timings['decode_legacy_ms']
+    fast_total = timings['build_fast_ms'] + timings['encode_fast_ms'] + timings['decode_fast_ms']
+    return {
+        'elements': len(elements),
+        **timings,
+        'legacy_total_ms': legacy_total,
+        'fast_total_ms': fast_total,
+        'text_bytes_legacy': len(legacy_text.encode('utf-8')),
+        'text_bytes_fast': len(fast_text.encode('utf-8')),
+        'frame_bytes_flat': len(flat_frame),
+        'frame_bytes_packed': len(packed_frame),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="消息序列化基准测试")
+    parser.add_argument("--recorded", help="录制的屏幕数据（JSONL文件），不提供时随机生成元素")
+    parser.add_argument("--elements", type=int, default=200, help="随机生成的元素数量")
+    parser.add_argument("--screenshot-kb", type=int, default=800, help="标注截图base64大小（KB）")
+    parser.add_argument("--iterations", type=int, default=50, help="每项测量的重复次数")
+    parser.add_argument("--codec", default=available_codecs()[0], choices=available_codecs(), help="二进制帧压缩编码")
+    parser.add_argument("--output", help="结果输出JSON文件路径")
+    args = parser.parse_args()
+
+    element_sets = load_recorded_elements(args.recorded) if args.recorded else [synthetic_elements(args.elements)]
+    if not element_sets:
+        print("❌ 没有找到录制数据")
+        return
+    screenshot_base64 = base64.b64encode(random.Random(1).randbytes(args.screenshot_kb * 768)).decode()
+
+    print(f"JSON后端: {serialization.BACKEND}，二进制帧压缩: {args.codec}")
+    results = []
+    for i, elements in enumerate(element_sets):
+        result = benchmark_elements(elements, screenshot_base64, args.iterations, args.codec)
+        results.append(result)
+        print(f"\n#{i} {result['elements']} 个元素")
+        print(f"  构造消息:  {result['build_legacy_ms']:7.2f} ms -> {result['build_fast_ms']:7.2f} ms")
+        print(f"  JSON编码:  {result['encode_legacy_ms']:7.2f} ms -> {result['encode_fast_ms']:7.2f} ms")
+        print(f"  解码+元素: {result['decode_legacy_ms']:7.2f} ms -> {result['decode_fast_ms']:7.2f} ms")
+        print(f"  合计:      {result['legacy_total_ms']:7.2f} ms -> {result['fast_total_ms']:7.2f} ms")
+        print(f"  二进制帧编码/解码: {result['frame_encode_flat_ms']:.2f}/{result['frame_decode_flat_ms']:.2f} ms -> "
+              f"{result['frame_encode_packed_ms']:.2f}/{result['frame_decode_packed_ms']:.2f} ms（表格形式）")
+        print(f"  二进制帧大小: {result['frame_bytes_flat']} -> {result['frame_bytes_packed']} 字节（表格形式）")
+
+    legacy = statistics.mean(r['legacy_total_ms'] for r in results)
+    fast = statistics.mean(r['fast_total_ms'] for r in results)
+    print(f"\n平均每条消息: {legacy:.2f} ms -> {fast:.2f} ms（节省 {(1 - fast / legacy) * 100:.1f}%）")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'backend': serialization.BACKEND, 'codec': args.codec, 'results': results},
+                      f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,596 @@
+#!/usr/bin/env python3
+"""
+服务端压测 - 模拟多个客户端连接 /ws，按设定的到达率回放录制的截图和指令，
+统计各阶段延迟分位数、吞吐量，并按时间采样服务端排队深度和内存
+
+默认为每个并发级别启动一个独立的服务端子进程（server/api/main.py），
+其中OmniParser替换为固定延迟的桩，Claude替换为按对数正态分布随机延迟的假后端，可完全离线运行；
+也可以用 --url 压测已运行的服务端（此时服务端指标为累计值）。
+
+录制数据为JSONL文件（格式同 prompt_compaction_benchmark.py，使用 text_command 和
+screenshot_path / screenshot_base64 字段），或包含截图的目录（可附带每行一条指令的 commands.txt）。
+
+用法:
+    python benchmarks/server_load_benchmark.py --clients 10,50,200 --rate 20 --duration 30
+    python benchmarks/server_load_benchmark.py recorded/ --rate 0 --think-time 1 --output load.json
+    python benchmarks/server_load_benchmark.py --clients 50 --output new.json --baseline load.json
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import itertools
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageDraw
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+
+from shared.schemas.data_models import ActionPlan, CompletionVerificationResponse
+from server.utils.server_metrics import summarize_latencies
+
+CLIENT_STAGES = ['omniparser_result', 'first_action', 'claude_result', 'analysis', 'verification', 'task']
+
+DEFAULT_COMMANDS = [
+    "打开浏览器并搜索天气",
+    "在记事本中输入会议纪要",
+    "打开设置并切换到深色模式",
+    "关闭当前窗口",
+    "新建一个文件夹并命名为报告",
+]
+
+
+# ---------------------------------------------------------------- 替身服务（在服务端子进程中使用）
+
+def _lognormal(median: float, sigma: float) -> float:
+    """中位数为 median 的对数正态分布随机延迟（秒）"""
+    return median * math.exp(random.gauss(0.0, sigma)) if sigma > 0 else median
+
+
+class StubOmniParser:
+    """固定延迟的OmniParser桩，按截图尺寸生成网格排列的UI元素"""
+
+    def __init__(self, latency: float, sigma: float, elements: int):
+        self.latency = latency
+        self.sigma = sigma
+        self.elements = elements
+
+    def is_available(self) -> bool:
+        return True
+
+    def get_status(self) -> Dict:
+        return {'available': True, 'stub': True}
+
+    def extract_text(self, image_base64: str) -> List[str]:
+        return []
+
+    def parse_screen(self, image_base64: str, screen_resolution=None):
+        # 解码图像头部取得尺寸，与真实服务一样需要处理整段base64
+        image = Image.open(io.BytesIO(base64.b64decode(image_base64)))
+        width, height = screen_resolution or image.size
+        time.sleep(_lognormal(self.latency, self.sigma))
+
+        columns = max(1, int(math.sqrt(self.elements)))
+        cell_w, cell_h = width // columns, height // max(1, math.ceil(self.elements / columns))
+        elements = []
+        for i in range(self.elements):
+            x, y = (i % columns) * cell_w, (i // columns) * cell_h
+            elements.append({
+                'id': i, 'type': 'button' if i % 3 else 'text', 'description': f"元素 {i}",
+                'coordinates': [x + 4, y + 4, x + cell_w - 4, y + cell_h - 4],
+                'text': f"item {i}", 'confidence': 0.9,
+            })
+        return None, elements
+
+
+class _StubMemory:
+    def __init__(self):
+        self._contexts: Dict[str, Dict] = {}
+
+    def get_task_context(self, task_id):
+        return self._contexts.get(task_id)
+
+    def save(self, task_id: str, context: Dict):
+        if len(self._contexts) > 4096:
+            self._contexts.pop(next(iter(self._contexts)))
+        self._contexts[task_id] = context
+
+
+class _StubHedging:
+    def get_metrics(self) -> Dict:
+        return {'stub': True}
+
+
+class FakeLatencyClaude:
+    """按设定延迟流式产出操作的Claude假后端"""
+
+    def __init__(self, latency: float, first_action: float, verify_latency: float, sigma: float, actions: int):
+        self.latency = latency
+        self.first_action = first_action
+        self.verify_latency = verify_latency
+        self.sigma = sigma
+        self.actions = actions
+        self.memory = _StubMemory()
+        self.hedging_policy = _StubHedging()
+
+    def analyze_task_with_claude(self, text_command, screenshot_base64, ui_elements, annotated_screenshot_base64=None,
+                                 os_info=None, task_id=None, on_action=None):
+        total = _lognormal(self.latency, self.sigma)
+        first = min(total, _lognormal(self.first_action, self.sigma))
+        step = (total - first) / max(1, self.actions - 1)
+
+        actions = []
+        time.sleep(first)
+        for index in range(self.actions):
+            if index:
+                time.sleep(step)
+            element = ui_elements[index % len(ui_elements)] if ui_elements else None
+            action = ActionPlan(type='click', description=f"点击{index}",
+                                element_id=str(element.id) if element else None,
+                                coordinates=None if element else [100 + index, 100])
+            actions.append(action)
+            if on_action:
+                on_action(index, action)
+        if task_id:
+            self.memory.save(task_id, {'expected_outcome': f"完成: {text_command}"})
+        return actions, f"模拟分析: {text_command}", 0.9
+
+    def verify_task_completion_with_base64(self, original_command, previous_claude_output, screenshot_base64,
+                                           verification_prompt=None):
+        time.sleep(_lognormal(self.verify_latency, self.sigma))
+        return 'completed', '模拟验证', 0.9, None, None
+
+    def verify_completion_simple(self, task_id, screenshot_base64):
+        time.sleep(_lognormal(self.verify_latency, self.sigma))
+        return CompletionVerificationResponse(task_id=task_id, status='completed', reasoning='模拟验证',
+                                              confidence=0.9, verification_time=self.verify_latency)
+
+
+def serve(args):
+    """服务端子进程：注入替身服务后运行 server/api/main.py 的应用"""
+    os.environ['SKIP_SERVICE_INITIALIZATION'] = '1'
+    import uvicorn
+    import server.api.main as server_app
+
+    random.seed(args.seed)
+    server_app.omniparser_service = StubOmniParser(args.omniparser_ms / 1000, args.latency_sigma, args.elements)
+    server_app.claude_service = FakeLatencyClaude(args.claude_ms / 1000, args.first_action_ms / 1000,
+                                                  args.verify_ms / 1000, args.latency_sigma, args.actions)
+    if not args.server_logs:
+        # 服务端逐条打印请求日志，高并发时本身就是开销
+        server_app.print = lambda *a, **k: None
+    uvicorn.run(server_app.app, host='127.0.0.1', port=args.port, log_level='warning', ws_max_size=64 * 1024 * 1024)
+
+
+# ---------------------------------------------------------------- 录制数据
+
+def _encode_png(image: Image.Image) -> str:
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def synthetic_screens(count: int = 3, size=(1920, 1080)) -> List[str]:
+    """没有录制数据时生成类似界面的截图（窗口、按钮色块）"""
+    rng = random.Random(0)
+    screens = []
+    for _ in range(count):
+        image = Image.new('RGB', size, (236, 236, 240))
+        draw = ImageDraw.Draw(image)
+        for _ in range(60):
+            x, y = rng.randrange(size[0] - 200), rng.randrange(size[1] - 80)
+            color = tuple(rng.randrange(40, 230) for _ in range(3))
+            draw.rectangle([x, y, x + rng.randrange(40, 200), y + rng.randrange(20, 80)], fill=color)
+            draw.text((x + 6, y + 4), f"Button {rng.randrange(100)}", fill=(0, 0, 0))
+        screens.append(_encode_png(image))
+    return screens
+
+
+def load_corpus(path: Optional[str]) -> List[Dict]:
+    """
+    加载录制的截图和指令
+
+    Returns:
+        List[Dict]: [{'text_command': str, 'screenshot_base64': str}]
+    """
+    if not path:
+        screens = synthetic_screens()
+        return [{'text_command': command, 'screenshot_base64': screens[i % len(screens)]}
+                for i, command in enumerate(DEFAULT_COMMANDS)]
+
+    records = []
+    if os.path.isdir(path):
+        commands_file = os.path.join(path, 'commands.txt')
+        commands = DEFAULT_COMMANDS
+        if os.path.exists(commands_file):
+            with open(commands_file, 'r', encoding='utf-8') as f:
+                commands = [line.strip() for line in f if line.strip()] or DEFAULT_COMMANDS
+        images = [name for name in sorted(os.listdir(path)) if name.lower().endswith(('.png', '.jpg', '.jpeg'))]
+        for i, name in enumerate(images):
+            with open(os.path.join(path, name), 'rb') as f:
+                records.append({'text_command': commands[i % len(commands)],
+                                'screenshot_base64': base64.b64encode(f.read()).decode('ascii')})
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                screenshot = record.get('screenshot_base64')
+                if not screenshot and record.get('screenshot_path') and os.path.exists(record['screenshot_path']):
+                    with open(record['screenshot_path'], 'rb') as image_file:
+                        screenshot = base64.b64encode(image_file.read()).decode('ascii')
+                if screenshot:
+                    records.append({'text_command': record['text_command'], 'screenshot_base64': screenshot})
+    return records
+
+
+# ---------------------------------------------------------------- 模拟客户端
+
+class SimulatedClient:
+    """一条WebSocket连接，多个请求按request_id复用同一连接"""
+
+    def __init__(self, url: str, index: int):
+        self.url = url
+        self.index = index
+        self.session_id = f"bench-{index}-{uuid.uuid4().hex[:8]}"
+        self.websocket = None
+        self._routes: Dict[str, asyncio.Queue] = {}
+        self._reader: Optional[asyncio.Task] = None
+
+    async def connect(self):
+        import websockets
+        self.websocket = await websockets.connect(self.url, max_size=None, ping_interval=None)
+        self._reader = asyncio.create_task(self._read())
+
+    async def _read(self):
+        try:
+            async for raw in self.websocket:
+                message = json.loads(raw)
+                queue = self._routes.get(message.get('request_id'))
+                if queue is not None:
+                    queue.put_nowait(message)
+        except Exception:
+            pass
+        finally:
+            for queue in self._routes.values():
+                queue.put_nowait(None)
+
+    async def request(self, message_type: str, data: Dict, timeout: float):
+        """发送请求，逐条产出 (收到时间, 消息)，最终响应（或错误）后结束"""
+        request_id = uuid.uuid4().hex
+        queue = self._routes[request_id] = asyncio.Queue()
+        try:
+            await self.websocket.send(json.dumps({
+                'type': message_type, 'task_id': request_id, 'request_id': request_id,
+                'timestamp': time.time(), 'data': data
+            }))
+            while True:
+                message = await asyncio.wait_for(queue.get(), timeout)
+                if message is None:
+                    raise ConnectionError("连接已断开")
+                yield time.perf_counter(), message
+                if message.get('type') not in ('omniparser_result', 'action_partial', 'claude_result'):
+                    return
+        finally:
+            self._routes.pop(request_id, None)
+
+    async def close(self):
+        if self.websocket is not None:
+            await self.websocket.close()
+        if self._reader is not None:
+            await asyncio.gather(self._reader, return_exceptions=True)
+
+
+class LoadRun:
+    """一个并发级别的压测"""
+
+    def __init__(self, url: str, stats_url: Optional[str], corpus: List[Dict], args, clients: int):
+        self.url = url
+        self.stats_url = stats_url
+        self.corpus = corpus
+        self.args = args
+        self.client_count = clients
+
+        self.samples: Dict[str, List[float]] = {stage: [] for stage in CLIENT_STAGES}
+        self.timeline: List[Dict] = []
+        self.completed = 0
+        self.errors = 0
+        self.outstanding = 0
+        self.error_messages: Dict[str, int] = {}
+        self._records = itertools.cycle(corpus)
+
+    async def run_task(self, client: SimulatedClient):
+        record = next(self._records)
+        self.outstanding += 1
+        start = time.perf_counter()
+        stages: Dict[str, float] = {}
+        try:
+            analysis = None
+            async for received, message in client.request('analyze_task', {
+                'text_command': record['text_command'],
+                'screenshot_base64': record['screenshot_base64'],
+                'session_id': client.session_id,
+                'os_info': {'system': 'Linux', 'version': 'bench', 'release': 'bench', 'machine': 'x86_64',
+                            'processor': 'bench', 'platform': 'bench', 'screen_width': 1920, 'screen_height': 1080},
+            }, self.args.timeout):
+                message_type = message.get('type')
+                if message_type == 'omniparser_result':
+                    stages['omniparser_result'] = received - start
+                elif message_type == 'action_partial':
+                    stages.setdefault('first_action', received - start)
+                elif message_type == 'claude_result':
+                    stages['claude_result'] = received - start
+                elif message_type == 'analysis_result' and message['data'].get('success'):
+                    stages['analysis'] = received - start
+                    analysis = message['data']
+                else:
+                    raise RuntimeError(message.get('message') or message_type)
+
+            if not self.args.no_verify:
+                verify_start = time.perf_counter()
+                async for received, message in client.request('verify_task_completion', {
+                    'original_command': record['text_command'],
+                    'previous_claude_output': analysis.get('reasoning') or '',
+                    'screenshot_base64': record['screenshot_base64'],
+                }, self.args.timeout):
+                    if message.get('type') != 'task_completion_result':
+                        raise RuntimeError(message.get('message') or message.get('type'))
+                    stages['verification'] = received - verify_start
+
+            stages['task'] = time.perf_counter() - start
+            for stage, seconds in stages.items():
+                self.samples[stage].append(seconds * 1000)
+            self.completed += 1
+        except Exception as e:
+            self.errors += 1
+            key = f"{type(e).__name__}: {e}"[:120]
+            self.error_messages[key] = self.error_messages.get(key, 0) + 1
+        finally:
+            self.outstanding -= 1
+
+    async def _closed_loop(self, client: SimulatedClient, deadline: float):
+        """每个客户端完成一条任务后（思考时间后）再发送下一条"""
+        while time.perf_counter() < deadline:
+            await self.run_task(client)
+            if self.args.think_time:
+                await asyncio.sleep(random.expovariate(1.0 / self.args.think_time))
+
+    async def _open_loop(self, clients: List[SimulatedClient], deadline: float) -> List[asyncio.Task]:
+        """泊松到达：与任务完成情况无关地按到达率发送，轮流分配给各客户端"""
+        tasks = []
+        for client in itertools.cycle(clients):
+            await asyncio.sleep(random.expovariate(self.args.rate))
+            if time.perf_counter() >= deadline:
+                break
+            tasks.append(asyncio.create_task(self.run_task(client)))
+        return tasks
+
+    def _fetch_server_stats(self) -> Optional[Dict]:
+        if not self.stats_url:
+            return None
+        try:
+            with urllib.request.urlopen(self.stats_url, timeout=5) as response:
+                return json.loads(response.read())
+        except Exception:
+            return None
+
+    async def _sample(self, started: float):
+        loop = asyncio.get_running_loop()
+        while True:
+            stats = await loop.run_in_executor(None, self._fetch_server_stats) or {}
+            memory = stats.get('memory') or {}
+            self.timeline.append({
+                't': round(time.perf_counter() - started, 2),
+                'completed': self.completed,
+                'errors': self.errors,
+                'outstanding': self.outstanding,
+                'server_connections': stats.get('connections'),
+                'server_waiting': stats.get('waiting'),
+                'server_in_flight': stats.get('in_flight'),
+                'server_rss_mb': memory.get('rss_mb'),
+            })
+            await asyncio.sleep(self.args.sample_interval)
+
+    async def execute(self) -> Dict:
+        clients = [SimulatedClient(self.url, i) for i in range(self.client_count)]
+        await asyncio.gather(*(client.connect() for client in clients))
+
+        started = time.perf_counter()
+        deadline = started + self.args.duration
+        sampler = asyncio.create_task(self._sample(started))
+        try:
+            if self.args.rate > 0:
+                tasks = await self._open_loop(clients, deadline)
+            else:
+                tasks = [asyncio.create_task(self._closed_loop(client, deadline)) for client in clients]
+            # 到达结束后等待进行中的任务完成
+            if tasks:
+                await asyncio.wait(tasks, timeout=self.args.timeout * 2)
+            elapsed = time.perf_counter() - started
+        finally:
+            sampler.cancel()
+            await asyncio.gather(sampler, return_exceptions=True)
+
+        server_stats = self._fetch_server_stats()
+        await asyncio.gather(*(client.close() for client in clients), return_exceptions=True)
+
+        peak_rss = [point['server_rss_mb'] for point in self.timeline if point['server_rss_mb'] is not None]
+        return {
+            'clients': self.client_count,
+            'rate': self.args.rate,
+            'elapsed': elapsed,
+            'completed': self.completed,
+            'errors': self.errors,
+            'error_messages': self.error_messages,
+            'throughput_per_sec': self.completed / elapsed if elapsed > 0 else 0.0,
+            'stages_ms': {stage: summarize_latencies(values) for stage, values in self.samples.items()},
+            'peak_server_waiting': max((p['server_waiting'] or 0 for p in self.timeline), default=0),
+            'peak_server_rss_mb': max(peak_rss) if peak_rss else None,
+            'server': server_stats,
+            'timeline': self.timeline,
+        }
+
+
+# ---------------------------------------------------------------- 主流程
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server_process(args) -> Tuple[subprocess.Popen, int]:
+    """启动注入替身服务的服务端子进程，返回 (进程, 端口)"""
+    port = _free_port()
+    command = [sys.executable, os.path.abspath(__file__), '--serve', '--port', str(port),
+               '--omniparser-ms', str(args.omniparser_ms), '--claude-ms', str(args.claude_ms),
+               '--first-action-ms', str(args.first_action_ms), '--verify-ms', str(args.verify_ms),
+               '--latency-sigma', str(args.latency_sigma), '--actions', str(args.actions),
+               '--elements', str(args.elements), '--seed', str(args.seed)]
+    if args.server_logs:
+        command.append('--server-logs')
+    env = {**os.environ, 'MAX_CONCURRENT_REQUESTS_PER_CONNECTION': str(args.per_connection_limit)}
+    process = subprocess.Popen(command, cwd=project_root, env=env)
+
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"服务端子进程退出，退出码 {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1):
+                return process, port
+        except Exception:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("服务端子进程启动超时")
+
+
+def stop_server_process(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def print_level(result: Dict):
+    print(f"\n📊 {result['clients']} 个客户端: 完成 {result['completed']}，失败 {result['errors']}，"
+          f"吞吐量 {result['throughput_per_sec']:.2f} 任务/秒，服务端峰值排队 {result['peak_server_waiting']}，"
+          f"峰值内存 {result['peak_server_rss_mb'] or 0:.0f}MB")
+    print(f"  {'阶段':<20}{'p50':>10}{'p95':>10}{'p99':>10}{'样本':>8}")
+    for stage, summary in result['stages_ms'].items():
+        if summary['count']:
+            print(f"  {stage:<20}{summary['p50']:>10.0f}{summary['p95']:>10.0f}{summary['p99']:>10.0f}"
+                  f"{summary['count']:>8}")
+    for message, count in result['error_messages'].items():
+        print(f"  ❌ {count} x {message}")
+
+
+def compare_with_baseline(results: List[Dict], baseline_path: str):
+    """与基线结果比较同一并发级别的吞吐量和p95延迟"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {level['clients']: level for level in json.load(f).get('levels', [])}
+    print(f"\n📈 与基线比较: {baseline_path}")
+    for result in results:
+        base = baseline.get(result['clients'])
+        if base is None:
+            continue
+        print(f"  {result['clients']} 个客户端: 吞吐量 {base['throughput_per_sec']:.2f} -> "
+              f"{result['throughput_per_sec']:.2f} 任务/秒")
+        for stage, summary in result['stages_ms'].items():
+            before = base['stages_ms'].get(stage, {})
+            if summary['count'] and before.get('count'):
+                change = (summary['p95'] - before['p95']) / before['p95'] * 100 if before['p95'] else 0.0
+                print(f"    {stage:<20} p95 {before['p95']:>8.0f} -> {summary['p95']:>8.0f} ms ({change:+.1f}%)")
+
+
+async def run_levels(args, corpus: List[Dict]) -> List[Dict]:
+    results = []
+    for clients in (int(value) for value in args.clients.split(',')):
+        process = None
+        if args.url:
+            url = args.url
+            stats_url = args.url.replace('ws://', 'http://').replace('wss://', 'https://').rsplit('/ws', 1)[0] + '/stats'
+        else:
+            process, port = await asyncio.get_running_loop().run_in_executor(None, start_server_process, args)
+            url, stats_url = f"ws://127.0.0.1:{port}/ws", f"http://127.0.0.1:{port}/stats"
+        try:
+            print(f"🚀 {clients} 个客户端，{'到达率 %.1f/秒' % args.rate if args.rate > 0 else '闭环'}，"
+                  f"持续 {args.duration:.0f} 秒...")
+            result = await LoadRun(url, stats_url, corpus, args, clients).execute()
+        finally:
+            if process is not None:
+                stop_server_process(process)
+        print_level(result)
+        results.append(result)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="服务端压测")
+    parser.add_argument("corpus", nargs='?', help="录制的截图和指令（JSONL文件或目录），默认生成合成数据")
+    parser.add_argument("--clients", default="10,50,200", help="并发客户端数，逗号分隔的多个级别依次运行")
+    parser.add_argument("--rate", type=float, default=10.0, help="总到达率（任务/秒，泊松到达）；0表示闭环")
+    parser.add_argument("--think-time", type=float, default=0.0, help="闭环模式下任务间的平均思考时间（秒）")
+    parser.add_argument("--duration", type=float, default=30.0, help="每个级别发送任务的时长（秒）")
+    parser.add_argument("--timeout", type=float, default=60.0, help="单条消息的最长等待时间（秒）")
+    parser.add_argument("--no-verify", action="store_true", help="任务不包含完成度验证请求")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="服务端指标采样间隔（秒）")
+    parser.add_argument("--url", help="压测已运行的服务端（如 ws://localhost:8000/ws），不启动替身服务端")
+    parser.add_argument("--per-connection-limit", type=int, default=8, help="服务端单连接并发请求上限")
+    parser.add_argument("--omniparser-ms", type=float, default=400.0, help="OmniParser桩的延迟中位数")
+    parser.add_argument("--claude-ms", type=float, default=3000.0, help="Claude假后端完整分析的延迟中位数")
+    parser.add_argument("--first-action-ms", type=float, default=1200.0, help="Claude假后端首个操作的延迟中位数")
+    parser.add_argument("--verify-ms", type=float, default=1500.0, help="完成度验证的延迟中位数")
+    parser.add_argument("--latency-sigma", type=float, default=0.3, help="延迟对数正态分布的sigma")
+    parser.add_argument("--actions", type=int, default=4, help="每次分析生成的操作数")
+    parser.add_argument("--elements", type=int, default=40, help="每帧检测到的UI元素数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--server-logs", action="store_true", help="保留服务端的请求日志输出")
+    parser.add_argument("--output", help="结果输出JSON文件路径")
+    parser.add_argument("--baseline", help="与之前输出的结果文件比较")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=8000, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    if args.serve:
+        serve(args)
+        return
+
+    random.seed(args.seed)
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        print("❌ 没有找到录制数据")
+        return
+
+    results = asyncio.run(run_levels(args, corpus))
+
+    if args.output:
+        config = {key: value for key, value in vars(args).items() if key not in ('serve', 'port', 'output', 'baseline')}
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'config': config, 'corpus_size': len(corpus), 'levels': results}, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入: {args.output}")
+
+    if args.baseline:
+        compare_with_baseline(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,12 +8,23 @@ Client Automation Package - PyAutoGUI自动化执行模块
 - ExecutionManager: 执行管理器，处理用户交互和安全控制
 - ExecutionConfig: 执行配置
 - ExecutionResult: 执行结果数据结构
+- SettleDetector: 操作后的界面稳定检测
+- ActionTraceStore / TraceReplayer: 操作轨迹的录制和本地回放
+- TemplateMatcher: 在目标附近截图中匹配元素模板
 """
 
 from .automation_engine import AutomationEngine, ExecutionStatus, ExecutionResult, TaskExecutionResult
-from .execution_manager import ExecutionManager, ExecutionConfig, ExecutionMode
+try:
+    from .execution_manager import ExecutionManager, ExecutionConfig, ExecutionMode
+except ImportError:
+    # 无界面运行时（client.headless）不安装PyQt6，执行管理器不可用
+    ExecutionManager = ExecutionConfig = ExecutionMode = None
 from .result_validator import ResultValidator, ValidationResult, ValidationReport
 from .safety_controller import SafetyController, SafetyRule, SafetyAssessment, RiskLevel
+from .settle_detector import SettleDetector, SettleResult
+from .region_diff import RegionSnapshot, RegionDiff, capture_region, compare_regions
+from .template_matcher import TemplateMatcher, TemplateMatch
+from .action_trace import ActionTrace, ActionTraceStore, TraceRecorder, TraceReplayer, ReplayResult
 
 __all__ = [
     'AutomationEngine',
@@ -29,5 +40,18 @@ __all__ = [
     'SafetyController',
     'SafetyRule',
     'SafetyAssessment',
-    'RiskLevel'
+    'RiskLevel',
+    'SettleDetector',
+    'SettleResult',
+    'RegionSnapshot',
+    'RegionDiff',
+    'capture_region',
+    'compare_regions',
+    'TemplateMatcher',
+    'TemplateMatch',
+    'ActionTrace',
+    'ActionTraceStore',
+    'TraceRecorder',
+    'TraceReplayer',
+    'ReplayResult'
 ]
\ No newline at end of file
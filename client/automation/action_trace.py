@@ -0,0 +1,393 @@
+"""
+操作轨迹 - 记录执行成功的操作序列（操作、元素锚点和稳定耗时），
+再次执行同一指令时在本地回放：每一步用锚点模板在当前屏幕上重新定位目标，
+锚点无法匹配时才回退到服务端完整分析
+
+轨迹以明文JSON保存，向密码、支付卡号等敏感输入框输入的文本不会写入轨迹，含有这类输入的轨迹不保存
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 添加项目根目录到Python路径
+import sys
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(project_root)
+
+from shared.schemas.data_models import ActionPlan, UIElement
+from .template_matcher import TemplateMatcher, crop_template, decode_template, encode_template, grab_logical, to_gray
+
+logger = logging.getLogger(__name__)
+
+# 需要屏幕目标的操作类型，回放前要重新定位
+POSITIONAL_ACTIONS = ("click", "double_click", "right_click", "scroll", "move")
+
+# 敏感输入（与安全控制器的密码输入、信用卡信息规则一致，另含验证码、密钥等），
+# 匹配输入文本、操作描述或输入框（上一个点击目标）的文字和描述
+SENSITIVE_INPUT_RE = re.compile(
+    r"(密码|口令|password|passwd|pwd|passcode|验证码|otp|token|secret|api[\s_-]*key|密钥|"
+    r"信用卡|credit.*card|card\s*number|卡号|cvv|cvc|身份证|\d{4}[\s-]*\d{4}[\s-]*\d{4}[\s-]*\d{4})",
+    re.IGNORECASE
+)
+
+
+@dataclass
+class TraceAnchor:
+    """操作目标的锚点"""
+    box: List[int]                         # 录制时的目标区域 [x1, y1, x2, y2]
+    text: str = ""                         # 元素文字（用于日志和人工排查）
+    description: str = ""                  # 元素描述
+    template_base64: Optional[str] = None  # 目标中心的灰度模板（PNG），区域过于平坦时为空
+
+    @property
+    def center(self) -> Tuple[int, int]:
+        x1, y1, x2, y2 = self.box
+        return ((x1 + x2) // 2, (y1 + y2) // 2)
+
+
+@dataclass
+class TraceStep:
+    """轨迹中的一步"""
+    action: Dict[str, Any]                 # ActionPlan字段
+    anchor: Optional[TraceAnchor] = None
+    settle_time: Optional[float] = None    # 录制时等待界面稳定的耗时
+
+
+@dataclass
+class ActionTrace:
+    """一条指令的完整操作轨迹"""
+    command: str
+    screen_size: Optional[Tuple[int, int]]
+    steps: List[TraceStep] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+    replay_count: int = 0
+    last_replayed_at: Optional[float] = None
+    sensitive: bool = False                # 含有敏感输入，不保存
+
+    @property
+    def key(self) -> str:
+        return trace_key(self.command, self.screen_size)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ActionTrace":
+        steps = []
+        for step in data.get('steps', []):
+            anchor = step.get('anchor')
+            steps.append(TraceStep(
+                action=step['action'],
+                anchor=TraceAnchor(**anchor) if anchor else None,
+                settle_time=step.get('settle_time')
+            ))
+        screen_size = data.get('screen_size')
+        return cls(
+            command=data['command'],
+            screen_size=tuple(screen_size) if screen_size else None,
+            steps=steps,
+            created_at=data.get('created_at', time.time()),
+            replay_count=data.get('replay_count', 0),
+            last_replayed_at=data.get('last_replayed_at'),
+            sensitive=data.get('sensitive', False)
+        )
+
+
+def normalize_command(command: str) -> str:
+    """指令归一化：忽略大小写和多余空白"""
+    return " ".join(command.lower().split())
+
+
+def trace_key(command: str, screen_size: Optional[Tuple[int, int]]) -> str:
+    """轨迹键：同一指令在不同分辨率下的轨迹分别保存"""
+    size = f"{screen_size[0]}x{screen_size[1]}" if screen_size else "unknown"
+    return hashlib.sha1(f"{normalize_command(command)}|{size}".encode('utf-8')).hexdigest()[:20]
+
+
+class TraceRecorder:
+    """在执行过程中记录成功的操作"""
+
+    def __init__(self, command: str, screen_size: Optional[Tuple[int, int]], template_size: int = 64,
+                 grab: Optional[Callable] = None):
+        """
+        初始化轨迹记录器
+
+        Args:
+            command: 用户指令
+            screen_size: 屏幕尺寸
+            template_size: 锚点模板最大边长
+            grab: 区域截图函数，默认使用 PIL.ImageGrab
+        """
+        # 指令本身包含敏感信息（如“用密码xxx登录”）时同样不保存
+        self.trace = ActionTrace(command=command, screen_size=screen_size,
+                                 sensitive=bool(SENSITIVE_INPUT_RE.search(command)))
+        self.template_size = template_size
+        self._grab = grab
+        self._focus_anchor: Optional[TraceAnchor] = None  # 最近一次点击的目标，即输入文本的输入框
+
+    def capture_anchor(self, action: ActionPlan, position: Optional[Tuple[int, int]],
+                       element: Optional[UIElement] = None) -> Optional[TraceAnchor]:
+        """
+        在操作执行前截取目标锚点
+
+        Args:
+            action: 即将执行的操作
+            position: 操作目标位置
+            element: 目标UI元素（有则使用其区域，否则使用目标位置周围的小块）
+
+        Returns:
+            Optional[TraceAnchor]: 锚点，操作没有屏幕目标时为None
+        """
+        if action.type.lower() not in POSITIONAL_ACTIONS or position is None:
+            return None
+
+        half = self.template_size // 4
+        if element is not None and element.coordinates and len(element.coordinates) >= 4:
+            box = [int(v) for v in element.coordinates[:4]]
+        else:
+            box = [position[0] - half, position[1] - half, position[0] + half, position[1] + half]
+        # 元素框可能偏离实际点击点，锚点始终以点击位置为中心
+        width = min(box[2] - box[0], self.template_size)
+        height = min(box[3] - box[1], self.template_size)
+        box = [position[0] - width // 2, position[1] - height // 2,
+               position[0] + width - width // 2, position[1] + height - height // 2]
+
+        template_base64 = None
+        try:
+            from PIL import ImageGrab
+            region = tuple(box)
+            image = grab_logical(self._grab or (lambda bbox: ImageGrab.grab(bbox=bbox)), region)
+            gray = to_gray(image)
+            template = crop_template(gray, [0, 0, gray.shape[1], gray.shape[0]], self.template_size)
+            if template is not None:
+                template_base64 = encode_template(template)
+        except Exception as e:
+            logger.debug(f"Anchor capture failed for {box}: {e}")
+
+        return TraceAnchor(
+            box=box,
+            text=element.text if element else "",
+            description=element.description if element else action.description,
+            template_base64=template_base64
+        )
+
+    def add_step(self, action: ActionPlan, anchor: Optional[TraceAnchor], settle_time: Optional[float]):
+        """记录一个成功的操作，敏感输入的文本不记录，并将轨迹标记为不保存"""
+        data = action.model_dump(exclude_none=True)
+        data['type'] = action.type.value if hasattr(action.type, 'value') else action.type
+        if anchor is not None:
+            self._focus_anchor = anchor
+        if data['type'].lower() == "type" and self._is_sensitive_input(action):
+            data.pop('text', None)
+            self.trace.sensitive = True
+            logger.info("轨迹中包含敏感输入，不保存该轨迹")
+        self.trace.steps.append(TraceStep(action=data, anchor=anchor, settle_time=settle_time))
+
+    def _is_sensitive_input(self, action: ActionPlan) -> bool:
+        """输入文本、操作描述或输入框的文字和描述是否匹配敏感输入规则"""
+        fields = [action.text, action.description]
+        if self._focus_anchor is not None:
+            fields += [self._focus_anchor.text, self._focus_anchor.description]
+        return any(SENSITIVE_INPUT_RE.search(value) for value in fields if value)
+
+
+class ActionTraceStore:
+    """操作轨迹的本地存储（每条轨迹一个JSON文件）"""
+
+    def __init__(self, config: Optional[Dict] = None):
+        """
+        初始化轨迹存储
+
+        Args:
+            config: 配置字典
+        """
+        self.config = config or {}
+
+        self.directory = self.config.get(
+            'directory', os.path.join(os.path.expanduser('~'), '.computer_use_agent', 'traces'))
+        self.max_traces = self.config.get('max_traces', 200)
+
+        self._cache: Dict[str, ActionTrace] = {}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def find(self, command: str, screen_size: Optional[Tuple[int, int]]) -> Optional[ActionTrace]:
+        """
+        查找指令的轨迹
+
+        Returns:
+            Optional[ActionTrace]: 轨迹，不存在或损坏时为None
+        """
+        key = trace_key(command, screen_size)
+        if key in self._cache:
+            return self._cache[key]
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                trace = ActionTrace.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"轨迹文件损坏，已忽略: {key}: {e}")
+            return None
+        self._cache[key] = trace
+        return trace
+
+    def save(self, trace: ActionTrace) -> bool:
+        """
+        保存轨迹（同一指令的旧轨迹被覆盖）
+
+        Returns:
+            bool: 是否已保存，没有步骤或含有敏感输入时不保存
+        """
+        if not trace.steps:
+            return False
+        if trace.sensitive:
+            logger.info(f"轨迹含有敏感输入，不保存: '{trace.command}'")
+            return False
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(trace.key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(trace.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._cache[trace.key] = trace
+        self._prune()
+        logger.info(f"已保存操作轨迹: '{trace.command}' ({len(trace.steps)} 步)")
+        return True
+
+    def remove(self, command: str, screen_size: Optional[Tuple[int, int]]):
+        """删除指令的轨迹（回放失败后由新的成功执行重新录制）"""
+        key = trace_key(command, screen_size)
+        self._cache.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _prune(self):
+        """超过上限时删除最久未使用的轨迹"""
+        try:
+            files = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                     if name.endswith('.json')]
+        except OSError:
+            return
+        if len(files) <= self.max_traces:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - self.max_traces]:
+            self._cache.pop(os.path.basename(path)[:-5], None)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+@dataclass
+class ReplayResult:
+    """一次轨迹回放的结果"""
+    success: bool
+    completed_steps: int
+    total_steps: int
+    elapsed: float
+    failed_step: Optional[int] = None
+    reason: Optional[str] = None
+
+
+class TraceReplayer:
+    """在本地回放操作轨迹，每一步先用锚点重新定位目标"""
+
+    def __init__(self, engine, matcher: Optional[TemplateMatcher] = None, config: Optional[Dict] = None):
+        """
+        初始化回放器
+
+        Args:
+            engine: AutomationEngine
+            matcher: 模板匹配器
+            config: 配置字典
+        """
+        self.config = config or {}
+        self.engine = engine
+        self.matcher = matcher or TemplateMatcher({
+            'search_radius': self.config.get('search_radius', 160),
+            'min_score': self.config.get('min_score', 0.85),
+            'screen_size': self.config.get('screen_size')
+        }, grab=engine.grab_region)
+        self.min_settle_timeout = self.config.get('min_settle_timeout', 0.5)
+
+    def relocate(self, step: TraceStep) -> Tuple[Optional[ActionPlan], Optional[str]]:
+        """
+        根据锚点在当前屏幕上重新定位操作
+
+        Returns:
+            Tuple[Optional[ActionPlan], Optional[str]]: (定位后的操作, 失败原因)
+        """
+        action = ActionPlan(**step.action)
+        action.element_id = None  # 元素编号只在录制时的解析结果中有效
+        anchor = step.anchor
+        if anchor is None:
+            return action, None
+        if not anchor.template_base64:
+            # 目标区域没有可匹配的纹理，只能沿用录制时的位置
+            action.coordinates = list(anchor.center)
+            return action, None
+
+        template = decode_template(anchor.template_base64)
+        if template is None:
+            return None, "锚点模板损坏"
+        match = self.matcher.locate(template, anchor.center)
+        if match is None:
+            return None, f"未能在屏幕上找到目标: {anchor.text or anchor.description}"
+        if match.offset != (0, 0):
+            logger.info(f"目标 '{anchor.text or anchor.description}' 偏移 {match.offset}，得分 {match.score:.3f}")
+        action.coordinates = list(match.position)
+        return action, None
+
+    def replay(self, trace: ActionTrace, should_stop: Optional[Callable[[], bool]] = None,
+               on_step: Optional[Callable[[int, Any], None]] = None) -> ReplayResult:
+        """
+        回放轨迹，任一步骤无法定位或执行失败时立即停止
+
+        Args:
+            trace: 操作轨迹
+            should_stop: 返回True时停止回放
+            on_step: 每步执行后的回调 (step_index, ExecutionResult)
+
+        Returns:
+            ReplayResult: 回放结果
+        """
+        start_time = time.time()
+        self.engine.set_ui_elements([])
+
+        for index, step in enumerate(trace.steps):
+            if should_stop and should_stop():
+                return ReplayResult(False, index, len(trace.steps), time.time() - start_time, index, "已停止")
+
+            action, reason = self.relocate(step)
+            if action is None:
+                logger.info(f"轨迹回放在第 {index + 1} 步失败: {reason}")
+                return ReplayResult(False, index, len(trace.steps), time.time() - start_time, index, reason)
+
+            # 录制时的稳定耗时决定等待上限：正常情况下界面响应时间相近，超出较多说明界面状态不同
+            settle_timeout = None
+            if step.settle_time is not None:
+                settle_timeout = max(self.min_settle_timeout, step.settle_time * 3)
+
+            result = self.engine._execute_single_action(action, index, settle_timeout=settle_timeout)
+            if on_step:
+                on_step(index, result)
+            if result.status.value != "success":
+                return ReplayResult(False, index, len(trace.steps), time.time() - start_time, index,
+                                    result.error_message or "操作执行失败")
+
+        elapsed = time.time() - start_time
+        trace.replay_count += 1
+        trace.last_replayed_at = time.time()
+        logger.info(f"轨迹回放完成: '{trace.command}' {len(trace.steps)} 步，耗时 {elapsed:.2f}s")
+        return ReplayResult(True, len(trace.steps), len(trace.steps), elapsed)
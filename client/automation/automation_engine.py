@@ -2,7 +2,6 @@
 PyAutoGUI自动化执行引擎 - 将AI生成的操作计划转换为实际的计算机操作
 """
 
-import pyautogui
 import time
 import logging
 import platform
@@ -17,10 +16,20 @@ project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(_
 sys.path.append(project_root)
 
 from shared.schemas.data_models import ActionPlan, UIElement
+from shared.utils.coordinate_converter import element_centers
+from shared.utils.tracing import get_tracer
+from client.display.display_context import DisplayContext, PrimaryDisplay
 from .result_validator import ResultValidator, ValidationResult
+from .settle_detector import SettleDetector, SettleResult
+from .region_diff import RegionSnapshot, capture_region
+from .action_trace import ActionTrace, TraceRecorder, TraceStep, POSITIONAL_ACTIONS
+from .template_matcher import TemplateMatcher, decode_template, element_template, encode_template, to_gray
 
 logger = logging.getLogger(__name__)
 
+# 回车、开始菜单等按键的效果通常出现在采样区域之外（提交、新窗口、对话框）
+REMOTE_EFFECT_KEYS = ("enter", "return", "win", "cmd", "command")
+
 class ExecutionStatus(Enum):
     """执行状态枚举"""
     PENDING = "pending"
@@ -39,8 +48,9 @@ class ExecutionResult:
     status: ExecutionStatus
     execution_time: float
     error_message: Optional[str] = None
-    screenshot_before: Optional[str] = None
-    screenshot_after: Optional[str] = None
+    screenshot_before: Optional[RegionSnapshot] = None  # 操作前目标区域截图
+    screenshot_after: Optional[RegionSnapshot] = None   # 操作后目标区域截图
+    settle_time: Optional[float] = None  # 操作后等待界面稳定的耗时
 
 @dataclass
 class TaskExecutionResult:
@@ -66,9 +76,15 @@ class AutomationEngine:
         """
         self.config = config or {}
         
+        # 显示器上下文：截图和输入注入都通过它进行，默认操作主显示器
+        self.display: DisplayContext = self.config.get('display') or PrimaryDisplay()
+        
         # 安全设置
-        pyautogui.FAILSAFE = self.config.get('failsafe', True)  # 启用安全模式
-        pyautogui.PAUSE = self.config.get('pause_between_actions', 0.5)  # 操作间隔
+        # 操作后由稳定检测等待界面更新，pyautogui自身只保留很短的间隔
+        self.display.configure(
+            failsafe=self.config.get('failsafe', True),  # 启用安全模式
+            pause=self.config.get('pause_between_actions', 0.05)  # 操作间隔
+        )
         
         # 执行控制
         self.is_running = False
@@ -82,8 +98,27 @@ class AutomationEngine:
         self.os_name = platform.system()
         self._setup_os_specific()
         
-        # UI元素映射
+        # UI元素映射和元素中心点（设置元素时一次算出）
         self.ui_elements_map = {}
+        self._element_centers = {}
+        
+        # 界面稳定检测（替代操作后的固定等待）
+        self.settle_enabled = self.config.get('settle_detection', True)
+        self.settle_fallback_delay = self.config.get('settle_fallback_delay', 0.5)  # 无法检测时的固定等待
+        try:
+            screen_size = tuple(self.display.size())
+        except Exception:
+            screen_size = None
+        self.screen_size = screen_size
+        self.settle_detector = SettleDetector({
+            'poll_interval': self.config.get('settle_poll_interval', 0.03),
+            'stable_window': self.config.get('settle_stable_window', 0.15),
+            'timeout': self.config.get('settle_timeout', 3.0),
+            'response_timeout': self.config.get('settle_response_timeout', 0.4),
+            'max_response_timeout': self.config.get('settle_max_response_timeout', 1.0),
+            'region_radius': self.config.get('settle_region_radius', 160),
+            'screen_size': screen_size
+        }, grab=self.grab_region)
         
         # 初始化结果验证器
         validator_config = {
@@ -92,9 +127,31 @@ class AutomationEngine:
             'pixel_tolerance': self.config.get('pixel_tolerance', 10),
             'confidence_threshold': self.config.get('confidence_threshold', 0.7)
         }
-        self.validator = ResultValidator(validator_config)
-        
-        logger.info(f"AutomationEngine initialized for {self.os_name}")
+        self.validator = ResultValidator(validator_config, position=self.display.position)
+        
+        # 点击前用分析帧中的元素模板校正目标位置（LLM分析期间窗口可能移动）
+        self.retarget_enabled = self.config.get('retarget_clicks', True)
+        self.template_matcher = TemplateMatcher({
+            'search_radius': self.config.get('retarget_search_radius', 96),
+            'min_score': self.config.get('retarget_min_score', 0.8),
+            'screen_size': screen_size
+        }, grab=self.grab_region)
+        self._analysis_frame = None       # 生成当前UI元素的截图
+        self._analysis_gray = None        # 首次需要模板时再转换为灰度
+        self._element_templates = {}      # 元素ID -> 模板（None表示无法匹配）
+        self._action_positions = {}       # 当前操作已确定的目标位置，避免同一操作重复匹配
+        self._focus_position = None       # 最近一次点击的位置，输入和按键的效果出现在这里附近
+        self._retarget_stats = {'corrected': 0, 'unchanged': 0, 'not_found': 0}
+        
+        # 操作轨迹录制（成功执行的操作可在本地回放）
+        self.trace_recorder: Optional[TraceRecorder] = None
+        self.trace_template_size = self.config.get('trace_template_size', 64)
+        
+        logger.info(f"AutomationEngine initialized for {self.os_name} ({self.display.name})")
+    
+    def grab_region(self, region):
+        """截取当前显示器的区域"""
+        return self.display.grab(bbox=region)
     
     def _setup_os_specific(self):
         """设置操作系统特定的配置"""
@@ -123,16 +180,45 @@ class AutomationEngine:
                 'win': 'super'
             }
     
-    def set_ui_elements(self, ui_elements: List[UIElement]):
+    def set_ui_elements(self, ui_elements: List[UIElement], analysis_frame=None):
         """
         设置UI元素映射
         
         Args:
             ui_elements: UI元素列表
+            analysis_frame: 生成这些元素的截图（PIL图像），用于点击前的模板校正
         """
         self.ui_elements_map = {str(elem.id): elem for elem in ui_elements}
+        self._element_centers = element_centers(ui_elements)
+        self._analysis_frame = analysis_frame
+        self._analysis_gray = None
+        self._element_templates = {}
         logger.info(f"Updated UI elements map with {len(ui_elements)} elements")
     
+    def start_trace_recording(self, command: str, steps: Optional[List[TraceStep]] = None):
+        """
+        开始录制操作轨迹，之后执行成功的操作都会记录锚点和稳定耗时
+        
+        Args:
+            command: 用户指令
+            steps: 已完成的步骤（回放中途失败、由服务端接手时保留已回放的部分）
+        """
+        self.trace_recorder = TraceRecorder(command, self.screen_size, self.trace_template_size,
+                                            grab=self.grab_region)
+        if steps:
+            self.trace_recorder.trace.steps.extend(steps)
+        logger.debug(f"开始录制操作轨迹: {command}")
+    
+    def stop_trace_recording(self) -> Optional[ActionTrace]:
+        """
+        结束录制
+        
+        Returns:
+            Optional[ActionTrace]: 录制的轨迹，未在录制时为None
+        """
+        recorder, self.trace_recorder = self.trace_recorder, None
+        return recorder.trace if recorder else None
+    
     def execute_action_plan(self, action_plan: List[ActionPlan], task_id: str = "unknown") -> TaskExecutionResult:
         """
         执行完整的操作计划
@@ -210,35 +296,65 @@ class AutomationEngine:
         logger.info(f"任务 {task_id} 执行完成: {completed}/{len(action_plan)} 成功, 耗时 {total_time:.2f}s")
         return result
     
-    def _execute_single_action(self, action: ActionPlan, action_index: int) -> ExecutionResult:
+    def _execute_single_action(self, action: ActionPlan, action_index: int,
+                               settle_timeout: Optional[float] = None) -> ExecutionResult:
         """
         执行单个操作
         
         Args:
             action: 操作计划
             action_index: 操作索引
+            settle_timeout: 等待界面稳定的最长时间，默认使用配置
             
         Returns:
             ExecutionResult: 执行结果
         """
+        with get_tracer().span("action", index=action_index, type=action.type) as span:
+            result = self._run_single_action(action, action_index, settle_timeout)
+            span.set(status=result.status.value)
+            return result
+    
+    def _run_single_action(self, action: ActionPlan, action_index: int,
+                           settle_timeout: Optional[float]) -> ExecutionResult:
         start_time = time.time()
         screenshot_before = None
         screenshot_after = None
+        settle_time = None
+        self._action_positions = {}
         
         logger.info(f"执行操作 {action_index}: {action.type} - {action.description}")
         
         try:
-            # 执行前截图
+            # 只截取操作目标附近的区域，同一次截图同时作为验证的操作前图像和稳定检测的基准
+            region = self._action_region(action)
             if self.capture_screenshots:
-                screenshot_before = self._capture_screenshot()
+                screenshot_before = self._capture_region(region)
+            if not self.settle_enabled:
+                settle_baseline = None
+            elif screenshot_before is not None:
+                settle_baseline = self.settle_detector.fingerprint(screenshot_before.image)
+            else:
+                settle_baseline = self.settle_detector.sample(region)
+            
+            # 录制轨迹时在操作前截取目标锚点
+            anchor = None
+            if self.trace_recorder is not None and action.type.lower() in POSITIONAL_ACTIONS:
+                anchor = self.trace_recorder.capture_anchor(
+                    action, self._get_click_position(action), self.ui_elements_map.get(str(action.element_id))
+                )
             
             # 根据操作类型执行相应操作
             success = self._dispatch_action(action)
+            if success and action.type.lower() in ("click", "double_click", "right_click"):
+                self._focus_position = self._get_click_position(action)
+            
+            # 等待界面稳定（等待操作本身已经是延时，无需再检测）
+            if action.type.lower() != "wait":
+                settle_time = self.wait_for_settle(action, region, settle_baseline, settle_timeout).elapsed
             
             # 执行后截图
             if self.capture_screenshots:
-                time.sleep(0.5)  # 等待界面更新
-                screenshot_after = self._capture_screenshot()
+                screenshot_after = self._capture_region(region)
             
             execution_time = time.time() - start_time
             
@@ -247,7 +363,8 @@ class AutomationEngine:
                 try:
                     validation_report = self.validator.validate_action_result(
                         action, action_index, list(self.ui_elements_map.values()),
-                        screenshot_before, screenshot_after
+                        screenshot_before, screenshot_after,
+                        click_position=self._action_positions.get(id(action))
                     )
                     
                     # 根据验证结果调整执行状态
@@ -285,6 +402,9 @@ class AutomationEngine:
             status = ExecutionStatus.FAILED
             error_message = str(e)
         
+        if status == ExecutionStatus.SUCCESS and self.trace_recorder is not None:
+            self.trace_recorder.add_step(action, anchor, settle_time)
+        
         return ExecutionResult(
             action_index=action_index,
             action_type=action.type,
@@ -293,9 +413,71 @@ class AutomationEngine:
             execution_time=execution_time,
             error_message=error_message,
             screenshot_before=screenshot_before,
-            screenshot_after=screenshot_after
+            screenshot_after=screenshot_after,
+            settle_time=settle_time
         )
     
+    def _action_region(self, action: ActionPlan):
+        """操作目标附近的屏幕区域，输入和按键使用最近一次点击的位置附近，都没有时使用鼠标所在位置附近"""
+        position = None
+        if action.type.lower() in ("click", "double_click", "right_click", "scroll", "move"):
+            position = self._get_click_position(action)
+        elif action.type.lower() in ("type", "key", "hotkey"):
+            position = self._focus_position
+        elif action.type.lower() == "drag" and action.coordinates and len(action.coordinates) >= 4:
+            position = (action.coordinates[2], action.coordinates[3])
+        if position is None:
+            try:
+                position = tuple(self.display.position())
+            except Exception:
+                return None
+        return self.settle_detector.region_around(position)
+    
+    def wait_for_settle(self, action: ActionPlan, region=None, baseline: Optional[int] = None,
+                        timeout: Optional[float] = None) -> SettleResult:
+        """
+        等待操作目标附近的界面稳定
+        
+        Args:
+            action: 刚执行的操作
+            region: 采样区域，默认根据操作计算
+            baseline: 操作前的区域指纹
+            timeout: 最长等待时间，默认使用配置
+            
+        Returns:
+            SettleResult: 检测结果
+        """
+        if region is None:
+            region = self._action_region(action)
+        if not self.settle_enabled:
+            region = None
+        # 效果可能出现在区域之外的操作不使用学习到的响应时间，区域没有变化时等满 max_response_timeout
+        response_timeout = self.settle_detector.max_response_timeout if self._has_remote_effect(action) else None
+        with get_tracer().span("settle") as span:
+            result = self.settle_detector.wait(region, baseline, timeout, should_stop=lambda: self.should_stop,
+                                               kind=action.type.lower(), response_timeout=response_timeout)
+            if result.samples == 0:
+                # 区域截图不可用（禁用或截图失败），退回固定等待
+                time.sleep(self.settle_fallback_delay)
+                result.elapsed = self.settle_fallback_delay
+            elif not result.settled and not self.should_stop:
+                logger.warning(f"界面在 {result.elapsed:.2f}s 内未稳定，继续执行")
+            else:
+                logger.debug(f"界面稳定耗时 {result.elapsed * 1000:.0f}ms ({result.samples} 次采样)")
+            span.set(settled=result.settled, samples=result.samples)
+        return result
+    
+    @staticmethod
+    def _has_remote_effect(action: ActionPlan) -> bool:
+        """操作效果是否通常出现在采样区域之外：启动程序（双击）、热键、回车等"""
+        action_type = action.type.lower()
+        if action_type in ("double_click", "hotkey"):
+            return True
+        if action_type == "key" and action.text:
+            keys = [key.strip() for key in action.text.lower().split('+')]
+            return len(keys) > 1 or any(key in REMOTE_EFFECT_KEYS for key in keys)
+        return False
+    
     def _dispatch_action(self, action: ActionPlan) -> bool:
         """
         分发操作到具体的执行方法
@@ -340,7 +522,7 @@ class AutomationEngine:
         """执行点击操作"""
         position = self._get_click_position(action)
         if position:
-            pyautogui.click(position[0], position[1])
+            self.display.click(position[0], position[1])
             return True
         return False
     
@@ -348,7 +530,7 @@ class AutomationEngine:
         """执行双击操作"""
         position = self._get_click_position(action)
         if position:
-            pyautogui.doubleClick(position[0], position[1])
+            self.display.double_click(position[0], position[1])
             return True
         return False
     
@@ -356,7 +538,7 @@ class AutomationEngine:
         """执行右键点击操作"""
         position = self._get_click_position(action)
         if position:
-            pyautogui.rightClick(position[0], position[1])
+            self.display.right_click(position[0], position[1])
             return True
         return False
     
@@ -364,7 +546,7 @@ class AutomationEngine:
         """执行文本输入操作"""
         if action.text:
             interval = action.interval or 0.05
-            pyautogui.typewrite(action.text, interval=interval)
+            self.display.typewrite(action.text, interval=interval)
             return True
         return False
     
@@ -376,7 +558,7 @@ class AutomationEngine:
             keys = [self.key_mappings.get(key.strip(), key.strip()) for key in keys]
             
             if len(keys) == 1:
-                pyautogui.press(keys[0])
+                self.display.press(keys[0])
             else:
                 # 优化组合键处理：按住第一个键，然后按其他键
                 self._execute_sequential_hotkey(keys)
@@ -394,17 +576,17 @@ class AutomationEngine:
             return
         
         # 按住第一个键
-        pyautogui.keyDown(keys[0])
+        self.display.key_down(keys[0])
         
         try:
             # 依次按下并释放其他键
             for key in keys[1:]:
-                pyautogui.keyDown(key)
-                pyautogui.keyUp(key)
+                self.display.key_down(key)
+                self.display.key_up(key)
                 time.sleep(0.05)  # 小延迟确保按键注册
         finally:
             # 确保释放第一个键
-            pyautogui.keyUp(keys[0])
+            self.display.key_up(keys[0])
     
     def _execute_hotkey(self, action: ActionPlan) -> bool:
         """执行热键操作"""
@@ -414,7 +596,7 @@ class AutomationEngine:
             if len(mapped_keys) > 1:
                 self._execute_sequential_hotkey(mapped_keys)
             else:
-                pyautogui.press(mapped_keys[0])
+                self.display.press(mapped_keys[0])
             return True
         return False
     
@@ -424,9 +606,9 @@ class AutomationEngine:
         clicks = action.clicks or 3
         
         if position:
-            pyautogui.scroll(clicks, x=position[0], y=position[1])
+            self.display.scroll(clicks, x=position[0], y=position[1])
         else:
-            pyautogui.scroll(clicks)
+            self.display.scroll(clicks)
         return True
     
     def _execute_drag(self, action: ActionPlan) -> bool:
@@ -434,7 +616,7 @@ class AutomationEngine:
         if action.coordinates and len(action.coordinates) >= 4:
             x1, y1, x2, y2 = action.coordinates[:4]
             duration = action.duration or 1.0
-            pyautogui.drag(x2 - x1, y2 - y1, x1, y1, duration=duration)
+            self.display.drag(x1, y1, x2, y2, duration=duration)
             return True
         return False
     
@@ -449,7 +631,7 @@ class AutomationEngine:
         position = self._get_click_position(action)
         if position:
             duration = action.duration or 1.0
-            pyautogui.moveTo(position[0], position[1], duration=duration)
+            self.display.move_to(position[0], position[1], duration=duration)
             return True
         return False
     
@@ -465,14 +647,15 @@ class AutomationEngine:
         """
         # 优先使用element_id
         if action.element_id and action.element_id in self.ui_elements_map:
+            if id(action) in self._action_positions:
+                return self._action_positions[id(action)]
             element = self.ui_elements_map[action.element_id]
-            if element.coordinates and len(element.coordinates) >= 4:
-                x1, y1, x2, y2 = element.coordinates
-                # 计算中心点
-                center_x = int((x1 + x2) / 2)
-                center_y = int((y1 + y2) / 2)
-                logger.debug(f"使用元素 {action.element_id} 的中心点: ({center_x}, {center_y})")
-                return (center_x, center_y)
+            center = self._element_centers.get(action.element_id)
+            if center is not None:
+                logger.debug(f"使用元素 {action.element_id} 的中心点: {center}")
+                position = self._retarget(element, center)
+                self._action_positions[id(action)] = position
+                return position
         
         # 备用：使用直接坐标
         if action.coordinates:
@@ -487,21 +670,69 @@ class AutomationEngine:
         logger.warning(f"无法确定操作位置: element_id={action.element_id}, coordinates={action.coordinates}")
         return None
     
-    def _capture_screenshot(self) -> Optional[str]:
+    def _element_template(self, element: UIElement):
+        """元素模板：优先使用元素自带的模板，否则从分析帧中裁剪并写回元素"""
+        key = str(element.id)
+        if key in self._element_templates:
+            return self._element_templates[key]
+        
+        template = None
+        if element.template_base64:
+            template = decode_template(element.template_base64)
+        elif self._analysis_frame is not None and self.screen_size:
+            if self._analysis_gray is None:
+                self._analysis_gray = to_gray(self._analysis_frame)
+            frame_height, frame_width = self._analysis_gray.shape
+            scale = (frame_width / self.screen_size[0], frame_height / self.screen_size[1])
+            template = element_template(self._analysis_gray, element.coordinates[:4], scale)
+            if template is not None:
+                element.template_base64 = encode_template(template)
+        self._element_templates[key] = template
+        return template
+    
+    def _retarget(self, element: UIElement, position: Tuple[int, int]) -> Tuple[int, int]:
         """
-        捕获屏幕截图并返回base64编码
+        点击前在目标附近的小区域中匹配元素模板，校正界面移动造成的偏差
+        
+        匹配失败（元素外观变化、被遮挡）时沿用分析帧中的坐标，由结果验证发现问题
         
+        Args:
+            element: 目标元素
+            position: 分析帧中的元素中心
+            
         Returns:
-            Optional[str]: base64编码的截图，失败时返回None
+            Tuple[int, int]: 校正后的点击坐标
         """
-        try:
-            screenshot = pyautogui.screenshot()
-            # 这里可以集成ScreenshotManager来处理base64转换
-            # 暂时返回占位符
-            return "screenshot_placeholder"
-        except Exception as e:
-            logger.error(f"截图失败: {e}")
-            return None
+        if not self.retarget_enabled:
+            return position
+        template = self._element_template(element)
+        if template is None:
+            return position
+        
+        match = self.template_matcher.locate(template, position)
+        if match is None:
+            self._retarget_stats['not_found'] += 1
+            logger.debug(f"元素 {element.id} 模板未匹配，使用原坐标 {position}")
+            return position
+        if max(abs(match.offset[0]), abs(match.offset[1])) <= 1:  # 裁剪取整误差
+            self._retarget_stats['unchanged'] += 1
+            return position
+        self._retarget_stats['corrected'] += 1
+        logger.info(f"元素 {element.id} 位置偏移 {match.offset}，校正为 {match.position} "
+                    f"(得分 {match.score:.3f}, {match.elapsed * 1000:.0f}ms)")
+        return match.position
+    
+    def _capture_region(self, region) -> Optional[RegionSnapshot]:
+        """
+        截取操作目标附近的区域，供结果验证比较操作前后的差异
+        
+        Returns:
+            Optional[RegionSnapshot]: 区域截图，失败时返回None
+        """
+        snapshot = capture_region(region, grab=self.grab_region)
+        if snapshot is None and region is not None:
+            logger.warning(f"区域截图失败: {region}")
+        return snapshot
     
     def pause_execution(self):
         """暂停执行"""
@@ -535,7 +766,11 @@ class AutomationEngine:
             "is_paused": self.is_paused,
             "should_stop": self.should_stop,
             "os_name": self.os_name,
-            "failsafe_enabled": pyautogui.FAILSAFE,
-            "pause_duration": pyautogui.PAUSE,
-            "ui_elements_count": len(self.ui_elements_map)
+            "display": self.display.name,
+            "failsafe_enabled": self.display.failsafe,
+            "pause_duration": self.display.pause,
+            "ui_elements_count": len(self.ui_elements_map),
+            "trace_recording": self.trace_recorder is not None,
+            "retarget": {**self._retarget_stats, **self.template_matcher.get_stats()},
+            "settle": self.settle_detector.get_stats()
         }
\ No newline at end of file
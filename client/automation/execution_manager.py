@@ -3,6 +3,7 @@
 """
 
 import asyncio
+import threading
 import time
 import logging
 from typing import List, Dict, Optional, Callable, Any
@@ -19,6 +20,7 @@ sys.path.append(project_root)
 from shared.schemas.data_models import ActionPlan, UIElement
 from client.automation.automation_engine import AutomationEngine, TaskExecutionResult, ExecutionResult, ExecutionStatus
 from client.automation.safety_controller import SafetyController, SafetyAssessment, RiskLevel
+from client.automation.action_trace import ActionTrace, ActionTraceStore, ReplayResult, TraceReplayer
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +41,17 @@ class ExecutionConfig:
     strict_mode: bool = False  # 严格模式：任何失败都停止
     auto_retry: bool = True    # 自动重试失败的操作
     max_retries: int = 2       # 最大重试次数
+    settle_detection: bool = True  # 操作后检测界面稳定，替代固定等待
+    settle_timeout: float = 3.0    # 等待界面稳定的最长时间（秒）
+    record_traces: bool = True     # 录制执行成功的操作轨迹
+    replay_traces: bool = True     # 同一指令再次执行时优先在本地回放轨迹
+
+def _action_key(action: ActionPlan) -> tuple:
+    """比较两份计划中的操作是否相同所用的字段"""
+    action_type = action.type.value if hasattr(action.type, 'value') else str(action.type)
+    coordinates = tuple(action.coordinates) if action.coordinates else None
+    return (action_type.lower(), action.element_id, coordinates, action.text, tuple(action.keys or ()))
+
 
 class ExecutionWorker(QThread):
     """执行工作线程"""
@@ -55,14 +68,20 @@ class ExecutionWorker(QThread):
     error_occurred = pyqtSignal(str)  # error_message
     
     def __init__(self, engine: AutomationEngine, action_plan: List[ActionPlan], 
-                 task_id: str, config: ExecutionConfig, safety_controller: SafetyController):
+                 task_id: str, config: ExecutionConfig, safety_controller: SafetyController,
+                 plan_complete: bool = True):
         super().__init__()
         self.engine = engine
-        self.action_plan = action_plan
+        self.action_plan = list(action_plan)
         self.task_id = task_id
         self.config = config
         self.safety_controller = safety_controller
         
+        # 流式计划：操作陆续追加，plan_complete为False时执行完已有操作会等待后续操作
+        self.plan_complete = plan_complete
+        self._plan_lock = threading.Lock()
+        self.plan_mismatch: Optional[str] = None  # 已流式到达的操作与最终计划不一致时的说明
+        
         self.should_stop = False
         self.is_paused = False
         self.waiting_for_confirmation = False
@@ -70,6 +89,9 @@ class ExecutionWorker(QThread):
         
         # 重试机制
         self.retry_counts = {}
+        
+        # 按操作序号缓存的安全评估，已到达的操作批量评估
+        self._assessments: Dict[int, SafetyAssessment] = {}
     
     def run(self):
         """执行线程主循环"""
@@ -79,8 +101,10 @@ class ExecutionWorker(QThread):
             action_results = []
             start_time = time.time()
             
-            for i, action in enumerate(self.action_plan):
-                if self.should_stop:
+            i = 0
+            while True:
+                action = self._next_action(i)
+                if action is None or self.should_stop:
                     break
                 
                 # 处理暂停
@@ -108,6 +132,8 @@ class ExecutionWorker(QThread):
                     self.config.strict_mode):
                     logger.error(f"严格模式下操作失败，停止执行: {result.error_message}")
                     break
+                
+                i += 1
             
             # 计算最终结果
             total_time = time.time() - start_time
@@ -115,7 +141,9 @@ class ExecutionWorker(QThread):
             success_rate = completed / len(self.action_plan) if self.action_plan else 0
             
             # 确定整体状态
-            if self.should_stop:
+            if self.plan_mismatch:
+                overall_status = ExecutionStatus.FAILED
+            elif self.should_stop:
                 overall_status = ExecutionStatus.CANCELLED
             elif completed == len(self.action_plan):
                 overall_status = ExecutionStatus.SUCCESS
@@ -131,7 +159,8 @@ class ExecutionWorker(QThread):
                 success_rate=success_rate,
                 total_execution_time=total_time,
                 status=overall_status,
-                action_results=action_results
+                action_results=action_results,
+                final_error=self.plan_mismatch
             )
             
             self.execution_completed.emit(final_result)
@@ -140,6 +169,70 @@ class ExecutionWorker(QThread):
             logger.error(f"执行线程发生异常: {e}")
             self.error_occurred.emit(str(e))
     
+    def _next_action(self, index: int) -> Optional[ActionPlan]:
+        """
+        获取指定序号的操作，流式计划尚未生成到该操作时等待
+        
+        Returns:
+            Optional[ActionPlan]: 操作，计划已结束或停止时返回None
+        """
+        wait_start = time.time()
+        while not self.should_stop:
+            with self._plan_lock:
+                if index < len(self.action_plan):
+                    return self.action_plan[index]
+                if self.plan_complete:
+                    return None
+            if time.time() - wait_start > self.config.max_execution_time:
+                logger.warning(f"等待流式操作 {index} 超时，结束执行")
+                return None
+            self.msleep(50)
+        return None
+    
+    def append_action(self, action: ActionPlan):
+        """追加流式生成的操作"""
+        with self._plan_lock:
+            self.action_plan.append(action)
+    
+    def complete_plan(self, final_plan: Optional[List[ActionPlan]] = None):
+        """
+        结束流式计划
+        
+        Args:
+            final_plan: 完整解析的操作计划（可选），其中尚未流式到达的操作会补充到计划末尾
+        
+        服务端重试或对冲请求胜出时，最终计划可能与已流式到达（可能已经执行）的操作不是同一份计划，
+        此时不再拼接另一份计划的剩余操作，停止执行并以失败结束，交由用户或重新分析处理
+        """
+        with self._plan_lock:
+            if final_plan:
+                mismatch = next((i for i, (streamed, final) in enumerate(zip(self.action_plan, final_plan))
+                                 if _action_key(streamed) != _action_key(final)), None)
+                if mismatch is None and len(final_plan) < len(self.action_plan):
+                    mismatch = len(final_plan)
+                if mismatch is not None:
+                    self.plan_mismatch = f"流式操作 #{mismatch + 1} 与最终操作计划不一致，已停止执行"
+                    logger.warning(self.plan_mismatch)
+                    self.should_stop = True
+                elif len(final_plan) > len(self.action_plan):
+                    self.action_plan.extend(final_plan[len(self.action_plan):])
+            self.plan_complete = True
+    
+    def _safety_assessment(self, action: ActionPlan, action_index: int) -> SafetyAssessment:
+        """
+        获取操作的安全评估
+        
+        首次需要时一次性评估计划中所有已到达的操作，流式追加的操作在到达后的下一次查询时批量评估
+        """
+        if action_index not in self._assessments:
+            with self._plan_lock:
+                pending = self.action_plan[action_index:]
+            ui_elements = list(self.engine.ui_elements_map.values())
+            assessments = self.safety_controller.assess_plan_safety(pending or [action], ui_elements, action_index)
+            for offset, assessment in enumerate(assessments):
+                self._assessments[action_index + offset] = assessment
+        return self._assessments.pop(action_index)
+    
     def _should_confirm_action(self, action: ActionPlan, action_index: int) -> tuple[bool, str]:
         """
         判断是否需要用户确认
@@ -148,8 +241,7 @@ class ExecutionWorker(QThread):
             tuple[bool, str]: (是否需要确认, 确认消息)
         """
         # 首先进行安全评估
-        ui_elements = list(self.engine.ui_elements_map.values())
-        safety_assessment = self.safety_controller.assess_action_safety(action, action_index, ui_elements)
+        safety_assessment = self._safety_assessment(action, action_index)
         
         # 如果安全评估要求阻止执行，直接返回
         if safety_assessment.block_execution:
@@ -233,7 +325,8 @@ class ExecutionWorker(QThread):
             retry_count += 1
             if retry_count <= max_retries:
                 logger.info(f"操作 {action_index} 失败，进行第 {retry_count} 次重试")
-                self.msleep(1000)  # 等待1秒后重试
+                # 等待失败操作引起的界面变化结束后再重试
+                self.engine.wait_for_settle(action)
         
         # 记录重试次数
         if retry_count > 0:
@@ -263,6 +356,41 @@ class ExecutionWorker(QThread):
         self.confirmation_result = confirmed
         self.waiting_for_confirmation = False
 
+class ReplayWorker(QThread):
+    """轨迹回放线程"""
+    
+    execution_started = pyqtSignal(str)  # task_id
+    action_started = pyqtSignal(int, str)  # action_index, description
+    action_completed = pyqtSignal(int, object)  # action_index, ExecutionResult
+    replay_finished = pyqtSignal(object)  # ReplayResult
+    error_occurred = pyqtSignal(str)
+    
+    def __init__(self, replayer: TraceReplayer, trace: ActionTrace, task_id: str):
+        super().__init__()
+        self.replayer = replayer
+        self.trace = trace
+        self.task_id = task_id
+        self.should_stop = False
+    
+    def run(self):
+        """回放主循环"""
+        try:
+            self.execution_started.emit(self.task_id)
+            result = self.replayer.replay(
+                self.trace,
+                should_stop=lambda: self.should_stop,
+                on_step=self.action_completed.emit
+            )
+            self.replay_finished.emit(result)
+        except Exception as e:
+            logger.error(f"轨迹回放发生异常: {e}")
+            self.error_occurred.emit(str(e))
+            self.replay_finished.emit(ReplayResult(False, 0, len(self.trace.steps), 0.0, 0, str(e)))
+    
+    def stop(self):
+        """停止回放"""
+        self.should_stop = True
+
 class ExecutionManager(QObject):
     """自动化执行管理器"""
     
@@ -278,6 +406,7 @@ class ExecutionManager(QObject):
     error_occurred = pyqtSignal(str)
     status_changed = pyqtSignal(dict)
     task_completion_check_requested = pyqtSignal(str, str, str)  # task_id, original_command, previous_claude_output
+    replay_finished = pyqtSignal(object, object)  # ActionTrace, ReplayResult
     
     def __init__(self, config: Optional[ExecutionConfig] = None):
         super().__init__()
@@ -285,8 +414,10 @@ class ExecutionManager(QObject):
         self.config = config or ExecutionConfig()
         self.engine = AutomationEngine({
             'failsafe': True,
-            'pause_between_actions': 0.5,
+            'pause_between_actions': 0.05,
             'capture_screenshots': self.config.screenshot_enabled,
+            'settle_detection': self.config.settle_detection,
+            'settle_timeout': self.config.settle_timeout,
             'strict_mode': self.config.strict_mode
         })
         
@@ -297,7 +428,12 @@ class ExecutionManager(QObject):
             'block_high_risk': False,  # 默认不阻止高风险操作，而是要求确认
             'block_critical_risk': True  # 阻止极高风险操作
         }
-        self.safety_controller = SafetyController(safety_config)
+        self.safety_controller = SafetyController(safety_config, screen_size=self.engine.display.size)
+        
+        # 操作轨迹：成功执行的指令在本地录制，再次执行时回放
+        self.trace_store = ActionTraceStore()
+        self.trace_replayer = TraceReplayer(self.engine, config={'screen_size': self.engine.screen_size})
+        self.replay_worker = None
         
         self.current_worker = None
         self.current_task_id = None
@@ -313,7 +449,7 @@ class ExecutionManager(QObject):
     
     def execute_action_plan(self, action_plan: List[ActionPlan], ui_elements: List[UIElement], 
                            task_id: str = None, original_command: str = None, 
-                           claude_output: str = None) -> bool:
+                           claude_output: str = None, analysis_frame=None) -> bool:
         """
         执行操作计划
         
@@ -323,6 +459,7 @@ class ExecutionManager(QObject):
             task_id: 任务ID
             original_command: 原始用户指令
             claude_output: 上一轮Claude输出
+            analysis_frame: 生成UI元素的截图（PIL图像），点击前据此校正目标位置
             
         Returns:
             bool: 是否成功启动执行
@@ -340,7 +477,8 @@ class ExecutionManager(QObject):
         self.previous_claude_output = claude_output
         
         # 更新UI元素映射
-        self.engine.set_ui_elements(ui_elements)
+        self.engine.set_ui_elements(ui_elements, analysis_frame)
+        self._begin_trace(original_command)
         
         # 创建执行线程
         self.current_worker = ExecutionWorker(
@@ -356,6 +494,166 @@ class ExecutionManager(QObject):
         logger.info(f"开始执行任务 {self.current_task_id}，共 {len(action_plan)} 个操作")
         return True
     
+    def start_streaming_plan(self, ui_elements: List[UIElement], task_id: str = None,
+                             original_command: str = None, analysis_frame=None) -> bool:
+        """
+        启动流式执行：操作计划随Claude输出陆续追加，已到达的操作立即执行
+        
+        Args:
+            ui_elements: UI元素列表
+            task_id: 任务ID
+            original_command: 原始用户指令
+            analysis_frame: 生成UI元素的截图（PIL图像），点击前据此校正目标位置
+            
+        Returns:
+            bool: 是否成功启动执行
+        """
+        if self.is_executing():
+            logger.warning("已有任务在执行中，无法启动流式执行")
+            return False
+        
+        self.current_task_id = task_id or f"task_{int(time.time())}"
+        self.original_user_command = original_command
+        self.previous_claude_output = None
+        
+        self.engine.set_ui_elements(ui_elements, analysis_frame)
+        self._begin_trace(original_command)
+        
+        self.current_worker = ExecutionWorker(
+            self.engine, [], self.current_task_id, self.config, self.safety_controller,
+            plan_complete=False
+        )
+        self._connect_worker_signals()
+        self.current_worker.start()
+        
+        logger.info(f"开始流式执行任务 {self.current_task_id}")
+        return True
+    
+    def _begin_trace(self, command: Optional[str]):
+        """
+        开始录制指令的轨迹；同一任务的后续轮次（验证后继续执行）追加到正在录制的轨迹
+
+        新任务开始时由界面调用 discard_recorded_trace()，停止或出错时在此处丢弃，
+        上一任务未保存的步骤不会混入新轨迹
+        """
+        if not self.config.record_traces or not command:
+            return
+        if self.engine.trace_recorder is None:
+            self.engine.start_trace_recording(command)
+    
+    def save_recorded_trace(self) -> Optional[ActionTrace]:
+        """
+        保存当前录制的轨迹（任务验证完成后调用）
+        
+        Returns:
+            Optional[ActionTrace]: 保存的轨迹
+        """
+        trace = self.engine.stop_trace_recording()
+        if trace is None or not trace.steps:
+            return None
+        try:
+            if not self.trace_store.save(trace):
+                return None
+        except OSError as e:
+            logger.warning(f"保存操作轨迹失败: {e}")
+            return None
+        return trace
+    
+    def discard_recorded_trace(self):
+        """放弃当前录制的轨迹（任务失败、停止或开始新任务时调用）"""
+        self.engine.stop_trace_recording()
+    
+    def find_trace(self, command: str) -> Optional[ActionTrace]:
+        """
+        查找可回放的轨迹
+        
+        轨迹中任一步骤按当前安全策略需要确认或会被阻止时不回放，交由服务端流程处理
+        
+        Returns:
+            Optional[ActionTrace]: 可回放的轨迹，没有时为None
+        """
+        if not self.config.replay_traces or not command:
+            return None
+        trace = self.trace_store.find(command, self.engine.screen_size)
+        if trace is None:
+            return None
+        
+        actions = [ActionPlan(**step.action) for step in trace.steps]
+        for assessment in self.safety_controller.assess_plan_safety(actions):
+            if assessment.block_execution or (
+                    assessment.requires_confirmation and self.config.mode != ExecutionMode.FULL_AUTO):
+                logger.info(f"轨迹 '{command}' 包含需要确认的操作，不在本地回放")
+                return None
+        return trace
+    
+    def replay_trace(self, trace: ActionTrace, task_id: str = None) -> bool:
+        """
+        在本地回放轨迹，结束后发出 replay_finished 信号
+        
+        Returns:
+            bool: 是否成功启动回放
+        """
+        if self.is_executing():
+            logger.warning("已有任务在执行中，无法回放轨迹")
+            return False
+        
+        self.current_task_id = task_id or f"replay_{int(time.time())}"
+        self.engine.stop_trace_recording()
+        
+        self.replay_worker = ReplayWorker(self.trace_replayer, trace, self.current_task_id)
+        self.replay_worker.execution_started.connect(self.execution_started.emit)
+        self.replay_worker.action_completed.connect(self.action_completed.emit)
+        self.replay_worker.error_occurred.connect(self.error_occurred.emit)
+        self.replay_worker.replay_finished.connect(self._on_replay_finished)
+        self.replay_worker.start()
+        
+        logger.info(f"开始回放轨迹 '{trace.command}'，共 {len(trace.steps)} 步")
+        return True
+    
+    def _on_replay_finished(self, result: ReplayResult):
+        """轨迹回放结束处理"""
+        trace = self.replay_worker.trace
+        self.current_task_id = None
+        if result.success:
+            try:
+                self.trace_store.save(trace)  # 更新回放次数
+            except OSError as e:
+                logger.warning(f"更新操作轨迹失败: {e}")
+        elif self.config.record_traces:
+            # 服务端接手剩余步骤，新轨迹保留已回放成功的部分
+            self.engine.start_trace_recording(trace.command, trace.steps[:result.completed_steps])
+        self.replay_finished.emit(trace, result)
+    
+    def append_streamed_action(self, action: ActionPlan) -> bool:
+        """
+        向流式执行中的计划追加操作
+        
+        Returns:
+            bool: 是否追加成功
+        """
+        if not self.is_streaming_plan():
+            return False
+        self.current_worker.append_action(action)
+        return True
+    
+    def finalize_streamed_plan(self, action_plan: Optional[List[ActionPlan]], claude_output: str = None):
+        """
+        结束流式计划
+        
+        Args:
+            action_plan: 完整解析的操作计划，为None表示分析失败，只执行已到达的操作
+            claude_output: 上一轮Claude输出，用于任务完成度验证
+        """
+        if claude_output is not None:
+            self.previous_claude_output = claude_output
+        if self.current_worker:
+            self.current_worker.complete_plan(action_plan)
+    
+    def is_streaming_plan(self) -> bool:
+        """检查是否有尚未结束的流式计划"""
+        return (self.current_worker is not None and self.current_worker.isRunning()
+                and not self.current_worker.plan_complete)
+    
     def _connect_worker_signals(self):
         """连接工作线程信号"""
         if not self.current_worker:
@@ -369,10 +667,19 @@ class ExecutionManager(QObject):
         self.current_worker.action_started.connect(self.action_started.emit)
         self.current_worker.action_completed.connect(self.action_completed.emit)
         self.current_worker.confirmation_requested.connect(self._on_confirmation_requested)
-        self.current_worker.error_occurred.connect(self.error_occurred.emit)
+        self.current_worker.error_occurred.connect(self._on_execution_error)
+    
+    def _on_execution_error(self, error_message: str):
+        """执行线程异常处理"""
+        self.discard_recorded_trace()
+        self.error_occurred.emit(error_message)
     
     def _on_execution_completed(self, result: TaskExecutionResult):
         """执行完成处理"""
+        if result.status != ExecutionStatus.SUCCESS:
+            # 有操作失败或被取消，不会进入完成度验证，轨迹不完整
+            self.discard_recorded_trace()
+        
         # 触发任务完成度检查
         if (self.original_user_command and 
             result.status == ExecutionStatus.SUCCESS):
@@ -407,6 +714,10 @@ class ExecutionManager(QObject):
     
     def stop_execution(self):
         """停止执行"""
+        self.discard_recorded_trace()
+        if self.replay_worker:
+            self.replay_worker.stop()
+            self.replay_worker.wait(5000)
         if self.current_worker:
             self.current_worker.stop()
             self.current_worker.wait(5000)  # 等待最多5秒
@@ -417,6 +728,8 @@ class ExecutionManager(QObject):
     
     def is_executing(self) -> bool:
         """检查是否正在执行"""
+        if self.replay_worker is not None and self.replay_worker.isRunning():
+            return True
         return self.current_worker is not None and self.current_worker.isRunning()
     
     def get_execution_status(self) -> Dict[str, Any]:
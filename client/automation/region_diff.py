@@ -0,0 +1,147 @@
+"""
+操作区域差异 - 截取操作目标附近的小区域并保存为NumPy数组，
+用向量化的变化像素比例和简化SSIM判断操作前后界面是否发生了变化
+"""
+
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageGrab
+
+logger = logging.getLogger(__name__)
+
+Region = Tuple[int, int, int, int]  # (x1, y1, x2, y2)，屏幕坐标
+
+# SSIM常数（像素值范围255）
+_SSIM_C1 = (0.01 * 255) ** 2
+_SSIM_C2 = (0.03 * 255) ** 2
+
+
+@dataclass
+class RegionSnapshot:
+    """操作目标区域的一次截图"""
+    region: Region
+    pixels: np.ndarray  # (H, W, 3) uint8 RGB
+    captured_at: float = field(default_factory=time.time)
+
+    @property
+    def image(self) -> Image.Image:
+        return Image.fromarray(self.pixels, 'RGB')
+
+
+@dataclass
+class RegionDiff:
+    """两次区域截图的差异指标"""
+    changed_ratio: float  # 任一通道差异超过阈值的像素比例
+    ssim: float           # 分块SSIM均值，1表示完全相同
+    mean_abs_diff: float  # 灰度平均绝对差
+    elapsed: float        # 计算耗时（秒）
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            'changed_ratio': round(self.changed_ratio, 5),
+            'ssim': round(self.ssim, 5),
+            'mean_abs_diff': round(self.mean_abs_diff, 3),
+            'elapsed_ms': round(self.elapsed * 1000, 3),
+        }
+
+
+def capture_region(region: Optional[Region],
+                   grab: Optional[Callable[[Region], Image.Image]] = None) -> Optional[RegionSnapshot]:
+    """
+    截取屏幕区域
+
+    Args:
+        region: 截取区域
+        grab: 区域截图函数，默认使用 PIL.ImageGrab
+
+    Returns:
+        Optional[RegionSnapshot]: 区域截图，区域为空或截图失败时为None
+    """
+    if region is None:
+        return None
+    try:
+        image = grab(region) if grab else ImageGrab.grab(bbox=region)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        return RegionSnapshot(region=region, pixels=np.asarray(image))
+    except Exception as e:
+        logger.debug(f"Region capture failed for {region}: {e}")
+        return None
+
+
+def _to_gray(pixels: np.ndarray) -> np.ndarray:
+    """RGB转灰度（ITU-R 601-2 定点近似），返回float32"""
+    rgb = pixels.astype(np.int32)
+    return ((rgb[..., 0] * 77 + rgb[..., 1] * 150 + rgb[..., 2] * 29) >> 8).astype(np.float32)
+
+
+def ssim_lite(gray_a: np.ndarray, gray_b: np.ndarray, block: int = 8) -> float:
+    """
+    简化SSIM：按 block x block 不重叠分块计算均值、方差和协方差，返回各块SSIM的均值
+
+    相比高斯窗口的完整SSIM只需几次reshape和求均值，小区域上耗时在毫秒级
+
+    Args:
+        gray_a: 灰度图A (H, W)
+        gray_b: 灰度图B (H, W)
+        block: 分块大小
+
+    Returns:
+        float: SSIM均值
+    """
+    height = gray_a.shape[0] // block * block
+    width = gray_a.shape[1] // block * block
+    if height == 0 or width == 0:
+        return 1.0 if np.array_equal(gray_a, gray_b) else 0.0
+
+    def block_mean(values: np.ndarray) -> np.ndarray:
+        return values[:height, :width].reshape(height // block, block, width // block, block).mean(axis=(1, 3))
+
+    mean_a, mean_b = block_mean(gray_a), block_mean(gray_b)
+    var_a = block_mean(gray_a * gray_a) - mean_a * mean_a
+    var_b = block_mean(gray_b * gray_b) - mean_b * mean_b
+    cov = block_mean(gray_a * gray_b) - mean_a * mean_b
+
+    ssim_map = ((2 * mean_a * mean_b + _SSIM_C1) * (2 * cov + _SSIM_C2)) / \
+               ((mean_a ** 2 + mean_b ** 2 + _SSIM_C1) * (var_a + var_b + _SSIM_C2))
+    return float(ssim_map.mean())
+
+
+def compare_regions(before: RegionSnapshot, after: RegionSnapshot, pixel_threshold: int = 16,
+                    ssim_step: int = 2) -> Optional[RegionDiff]:
+    """
+    计算两次区域截图的差异
+
+    Args:
+        before: 操作前截图
+        after: 操作后截图
+        pixel_threshold: 通道差异超过该值的像素视为变化
+        ssim_step: SSIM和灰度差在隔 ssim_step 像素抽样的图像上计算，控制耗时
+
+    Returns:
+        Optional[RegionDiff]: 差异指标，区域不一致时为None
+    """
+    if before.region != after.region or before.pixels.shape != after.pixels.shape:
+        return None
+
+    start_time = time.time()
+    if np.array_equal(before.pixels, after.pixels):
+        return RegionDiff(changed_ratio=0.0, ssim=1.0, mean_abs_diff=0.0, elapsed=time.time() - start_time)
+
+    # uint8上的 max-min 即绝对差，避免整幅转换为更宽的类型
+    a, b = before.pixels, after.pixels
+    diff = np.maximum(a, b) - np.minimum(a, b)
+    changed = (diff[..., 0] > pixel_threshold) | (diff[..., 1] > pixel_threshold) | (diff[..., 2] > pixel_threshold)
+    changed_ratio = float(np.count_nonzero(changed) / changed.size)
+
+    gray_a, gray_b = _to_gray(a[::ssim_step, ::ssim_step]), _to_gray(b[::ssim_step, ::ssim_step])
+    return RegionDiff(
+        changed_ratio=changed_ratio,
+        ssim=ssim_lite(gray_a, gray_b),
+        mean_abs_diff=float(np.abs(gray_a - gray_b).mean()),
+        elapsed=time.time() - start_time
+    )
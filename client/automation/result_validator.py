@@ -4,8 +4,7 @@
 
 import time
 import logging
-import pyautogui
-from typing import List, Dict, Optional, Tuple, Any
+from typing import Callable, List, Dict, Optional, Tuple, Any, Union
 from dataclasses import dataclass
 from enum import Enum
 
@@ -16,6 +15,7 @@ project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(_
 sys.path.append(project_root)
 
 from shared.schemas.data_models import ActionPlan, UIElement
+from .region_diff import RegionSnapshot, RegionDiff, compare_regions
 
 logger = logging.getLogger(__name__)
 
@@ -43,14 +43,16 @@ class ValidationReport:
 class ResultValidator:
     """执行结果验证器"""
     
-    def __init__(self, config: Optional[Dict] = None):
+    def __init__(self, config: Optional[Dict] = None, position: Optional[Callable[[], Any]] = None):
         """
         初始化验证器
         
         Args:
             config: 配置字典
+            position: 获取鼠标位置的函数，默认使用 pyautogui.position
         """
         self.config = config or {}
+        self._position = position
         
         # 验证配置
         self.validation_timeout = self.config.get('validation_timeout', 5.0)
@@ -58,6 +60,11 @@ class ResultValidator:
         self.pixel_tolerance = self.config.get('pixel_tolerance', 10)  # 像素容差
         self.confidence_threshold = self.config.get('confidence_threshold', 0.7)
         
+        # 区域截图差异判定
+        self.diff_pixel_threshold = self.config.get('diff_pixel_threshold', 16)  # 通道差异超过该值视为变化像素
+        self.min_changed_ratio = self.config.get('min_changed_ratio', 0.002)     # 变化像素比例下限
+        self.max_unchanged_ssim = self.config.get('max_unchanged_ssim', 0.99)    # SSIM低于该值视为有变化
+        
         logger.info("ResultValidator initialized")
     
     def validate_action_result(
@@ -65,8 +72,9 @@ class ResultValidator:
         action: ActionPlan, 
         action_index: int,
         ui_elements: List[UIElement],
-        screenshot_before: Optional[str] = None,
-        screenshot_after: Optional[str] = None
+        screenshot_before: Optional[Union[RegionSnapshot, str]] = None,
+        screenshot_after: Optional[Union[RegionSnapshot, str]] = None,
+        click_position: Optional[Tuple[int, int]] = None
     ) -> ValidationReport:
         """
         验证单个操作的执行结果
@@ -75,8 +83,9 @@ class ResultValidator:
             action: 执行的操作
             action_index: 操作索引
             ui_elements: UI元素列表
-            screenshot_before: 执行前截图base64
-            screenshot_after: 执行后截图base64
+            screenshot_before: 执行前操作目标区域截图（旧调用方为base64截图）
+            screenshot_after: 执行后操作目标区域截图
+            click_position: 实际点击的坐标（模板匹配校正后），提供时代替分析帧中的元素中心
             
         Returns:
             ValidationReport: 验证报告
@@ -84,30 +93,44 @@ class ResultValidator:
         start_time = time.time()
         screenshots = {}
         
-        if screenshot_before:
+        if isinstance(screenshot_before, str):
             screenshots['before'] = screenshot_before
-        if screenshot_after:
+        if isinstance(screenshot_after, str):
             screenshots['after'] = screenshot_after
         
         try:
+            # 操作前后的区域差异只计算一次，各类操作按各自的预期判定
+            diff = None
+            if isinstance(screenshot_before, RegionSnapshot) and isinstance(screenshot_after, RegionSnapshot):
+                diff = compare_regions(screenshot_before, screenshot_after, self.diff_pixel_threshold)
+            
             # 根据操作类型进行不同的验证
             action_type = action.type.lower()
             
-            if action_type == "click":
-                result = self._validate_click_action(action, ui_elements, screenshots)
+            if action_type in ["click", "double_click", "right_click"]:
+                result = self._validate_click_action(action, ui_elements, screenshots, diff, click_position)
             elif action_type == "type":
-                result = self._validate_type_action(action, screenshots)
-            elif action_type == "key":
-                result = self._validate_key_action(action, screenshots)
+                result = self._validate_type_action(action, screenshots, diff)
+            elif action_type in ["key", "hotkey"]:
+                result = self._validate_key_action(action, screenshots, diff)
             elif action_type == "wait":
                 result = self._validate_wait_action(action)
             elif action_type in ["scroll", "drag", "move"]:
-                result = self._validate_movement_action(action, screenshots)
+                result = self._validate_movement_action(action, screenshots, diff)
             else:
                 result = ValidationResult.SUCCESS  # 未知操作类型默认成功
             
+            error_message = None
+            if result != ValidationResult.SUCCESS and self._region_changed(diff) is False:
+                error_message = "操作后目标区域没有可见变化"
+            
             validation_time = time.time() - start_time
-            confidence = self._calculate_confidence(result, action_type)
+            confidence = self._calculate_confidence(result, action_type, diff)
+            
+            details = self._get_validation_details(action, result)
+            if diff is not None:
+                details['region'] = list(screenshot_after.region)
+                details['diff'] = diff.to_dict()
             
             return ValidationReport(
                 action_index=action_index,
@@ -116,8 +139,9 @@ class ResultValidator:
                 result=result,
                 confidence=confidence,
                 validation_time=validation_time,
+                error_message=error_message,
                 screenshots=screenshots,
-                details=self._get_validation_details(action, result)
+                details=details
             )
             
         except Exception as e:
@@ -135,19 +159,35 @@ class ResultValidator:
                 screenshots=screenshots
             )
     
+    def _mouse_position(self):
+        """当前鼠标位置（带 x、y 属性）"""
+        if self._position is None:
+            import pyautogui
+            self._position = pyautogui.position
+        return self._position()
+
     def _validate_click_action(
         self, 
         action: ActionPlan, 
         ui_elements: List[UIElement],
-        screenshots: Dict[str, str]
+        screenshots: Dict[str, str],
+        diff: Optional[RegionDiff] = None,
+        click_position: Optional[Tuple[int, int]] = None
     ) -> ValidationResult:
-        """验证点击操作"""
+        """验证点击操作：鼠标落在目标上，且目标附近界面有变化"""
         try:
             # 基本验证：检查鼠标位置
-            current_pos = pyautogui.position()
+            current_pos = self._mouse_position()
+            
+            # 执行时校正过点击坐标：元素已经移动，分析帧中的中心不再是目标
+            if click_position is not None:
+                distance = ((current_pos.x - click_position[0]) ** 2 + (current_pos.y - click_position[1]) ** 2) ** 0.5
+                if distance > self.pixel_tolerance:
+                    logger.warning(f"鼠标位置 {current_pos} 距离点击坐标 {click_position} 过远: {distance}px")
+                    return ValidationResult.PARTIAL
             
             # 如果有element_id，验证是否点击了正确的元素
-            if action.element_id:
+            elif action.element_id:
                 target_element = None
                 for elem in ui_elements:
                     if str(elem.id) == str(action.element_id):
@@ -163,9 +203,7 @@ class ResultValidator:
                         
                         # 检查鼠标是否在元素附近
                         distance = ((current_pos.x - center_x) ** 2 + (current_pos.y - center_y) ** 2) ** 0.5
-                        if distance <= self.pixel_tolerance:
-                            return ValidationResult.SUCCESS
-                        else:
+                        if distance > self.pixel_tolerance:
                             logger.warning(f"鼠标位置 {current_pos} 距离目标元素中心 ({center_x}, {center_y}) 过远: {distance}px")
                             return ValidationResult.PARTIAL
             
@@ -174,12 +212,12 @@ class ResultValidator:
                 target_pos = action.click_position
                 if target_pos:
                     distance = ((current_pos.x - target_pos[0]) ** 2 + (current_pos.y - target_pos[1]) ** 2) ** 0.5
-                    if distance <= self.pixel_tolerance:
-                        return ValidationResult.SUCCESS
-                    else:
+                    if distance > self.pixel_tolerance:
                         return ValidationResult.PARTIAL
             
-            # 如果有截图，可以进行更高级的验证（比较前后截图差异）
+            # 比较操作前后目标区域：点击通常会引起高亮、焦点、菜单或窗口变化
+            if diff is not None:
+                return self._visual_verdict(diff)
             if screenshots.get('before') and screenshots.get('after'):
                 return self._compare_screenshots_for_click(screenshots)
             
@@ -190,16 +228,13 @@ class ResultValidator:
             logger.error(f"验证点击操作失败: {e}")
             return ValidationResult.ERROR
     
-    def _validate_type_action(self, action: ActionPlan, screenshots: Dict[str, str]) -> ValidationResult:
-        """验证文本输入操作"""
+    def _validate_type_action(self, action: ActionPlan, screenshots: Dict[str, str],
+                              diff: Optional[RegionDiff] = None) -> ValidationResult:
+        """验证文本输入操作：输入的文字应出现在焦点位置附近"""
         try:
-            # 基本验证：检查剪贴板内容（如果可能）
-            if action.text:
-                # 这里可以尝试获取当前焦点窗口的文本内容
-                # 但pyautogui没有直接的方法，所以进行基础验证
-                
-                # 检查键盘状态等基本信息
-                return ValidationResult.SUCCESS
+            if action.text and diff is not None:
+                # 没有变化通常意味着输入框没有获得焦点
+                return self._visual_verdict(diff)
             
             return ValidationResult.SUCCESS
             
@@ -207,7 +242,8 @@ class ResultValidator:
             logger.error(f"验证文本输入操作失败: {e}")
             return ValidationResult.ERROR
     
-    def _validate_key_action(self, action: ActionPlan, screenshots: Dict[str, str]) -> ValidationResult:
+    def _validate_key_action(self, action: ActionPlan, screenshots: Dict[str, str],
+                             diff: Optional[RegionDiff] = None) -> ValidationResult:
         """验证按键操作"""
         try:
             # 按键操作很难验证具体效果，进行基础检查
@@ -221,8 +257,10 @@ class ResultValidator:
                     if key not in valid_keys and not key.isalnum():
                         logger.warning(f"可能无效的按键: {key}")
                         return ValidationResult.PARTIAL
-                
-                return ValidationResult.SUCCESS
+            
+            # 复制等快捷键可能没有可见效果，没有变化只判定为部分成功
+            if diff is not None:
+                return self._visual_verdict(diff)
             
             return ValidationResult.SUCCESS
             
@@ -240,12 +278,13 @@ class ResultValidator:
             logger.error(f"验证等待操作失败: {e}")
             return ValidationResult.ERROR
     
-    def _validate_movement_action(self, action: ActionPlan, screenshots: Dict[str, str]) -> ValidationResult:
+    def _validate_movement_action(self, action: ActionPlan, screenshots: Dict[str, str],
+                                  diff: Optional[RegionDiff] = None) -> ValidationResult:
         """验证移动/滚动/拖拽操作"""
         try:
             # 检查鼠标位置是否发生了变化
             if action.type.lower() == "move" and action.coordinates:
-                current_pos = pyautogui.position()
+                current_pos = self._mouse_position()
                 target_pos = action.click_position
                 
                 if target_pos:
@@ -255,6 +294,10 @@ class ResultValidator:
                     else:
                         return ValidationResult.PARTIAL
             
+            # 滚动和拖拽应改变目标区域的内容（已滚动到底或拖拽无效时没有变化）
+            if action.type.lower() in ["scroll", "drag"] and diff is not None:
+                return self._visual_verdict(diff)
+            
             # 其他移动操作基础验证
             return ValidationResult.SUCCESS
             
@@ -262,6 +305,19 @@ class ResultValidator:
             logger.error(f"验证移动操作失败: {e}")
             return ValidationResult.ERROR
     
+    def _region_changed(self, diff: Optional[RegionDiff]) -> Optional[bool]:
+        """目标区域是否发生了变化，没有区域截图时为None"""
+        if diff is None:
+            return None
+        return diff.changed_ratio >= self.min_changed_ratio or diff.ssim < self.max_unchanged_ssim
+    
+    def _visual_verdict(self, diff: RegionDiff) -> ValidationResult:
+        """预期有可见变化的操作：有变化为成功，没有变化为部分成功"""
+        if self._region_changed(diff):
+            return ValidationResult.SUCCESS
+        logger.info(f"目标区域无变化: 变化像素 {diff.changed_ratio:.4f}, SSIM {diff.ssim:.4f}")
+        return ValidationResult.PARTIAL
+    
     def _compare_screenshots_for_click(self, screenshots: Dict[str, str]) -> ValidationResult:
         """通过比较截图来验证点击效果"""
         try:
@@ -283,7 +339,8 @@ class ResultValidator:
             logger.error(f"截图比较失败: {e}")
             return ValidationResult.ERROR
     
-    def _calculate_confidence(self, result: ValidationResult, action_type: str) -> float:
+    def _calculate_confidence(self, result: ValidationResult, action_type: str,
+                              diff: Optional[RegionDiff] = None) -> float:
         """计算验证置信度"""
         base_confidence = {
             ValidationResult.SUCCESS: 0.9,
@@ -307,6 +364,8 @@ class ResultValidator:
         }
         
         multiplier = type_multiplier.get(action_type.lower(), 0.7)
+        if self._region_changed(diff):
+            multiplier = max(multiplier, 0.95)  # 有像素差异作为证据时判定更可靠
         return min(1.0, confidence * multiplier)
     
     def _get_validation_details(self, action: ActionPlan, result: ValidationResult) -> Dict[str, Any]:
@@ -331,12 +390,15 @@ class ResultValidator:
     def _get_validation_method(self, action_type: str) -> str:
         """获取验证方法描述"""
         methods = {
-            'click': '鼠标位置验证 + 截图比较',
-            'type': '基础验证',
-            'key': '按键有效性验证',
+            'click': '鼠标位置验证 + 区域差异',
+            'double_click': '鼠标位置验证 + 区域差异',
+            'right_click': '鼠标位置验证 + 区域差异',
+            'type': '区域差异',
+            'key': '按键有效性验证 + 区域差异',
+            'hotkey': '区域差异',
             'wait': '执行成功验证',
-            'scroll': '基础验证',
-            'drag': '位置变化验证',
+            'scroll': '区域差异',
+            'drag': '区域差异',
             'move': '鼠标位置验证'
         }
         
@@ -5,7 +5,7 @@
 import time
 import logging
 import re
-from typing import List, Dict, Optional, Set, Tuple, Any
+from typing import List, Dict, Optional, Set, Tuple, Any, Pattern
 from dataclasses import dataclass
 from enum import Enum
 
@@ -16,6 +16,8 @@ project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(_
 sys.path.append(project_root)
 
 from shared.schemas.data_models import ActionPlan, UIElement
+from shared.utils.tracing import get_tracer
+from client.utils.environment_info import ScreenSizeProvider, primary_screen_size
 
 logger = logging.getLogger(__name__)
 
@@ -48,15 +50,57 @@ class SafetyAssessment:
     warning_message: str
     assessment_time: float
 
+class _CompiledRuleSet:
+    """
+    按操作类型预编译的规则匹配器
+    
+    所有规则合并为一个交替正则作为预过滤：绝大多数文本一次扫描即可确认未触发任何规则；
+    命中时再逐条检查该操作类型的规则，保持原有的规则顺序和全部触发结果
+    """
+    
+    def __init__(self, rules: List[SafetyRule]):
+        self._by_type: Dict[str, Tuple[Optional[Pattern], List[Tuple[SafetyRule, Pattern]]]] = {}
+        compiled_rules = [(rule, self._compile(rule.pattern)) for rule in rules if rule.enabled]
+        
+        action_types = {action_type for rule, _ in compiled_rules for action_type in rule.applies_to}
+        for action_type in action_types:
+            candidates = [(rule, regex) for rule, regex in compiled_rules if action_type in rule.applies_to]
+            try:
+                combined = re.compile("|".join(f"(?:{regex.pattern})" for _, regex in candidates), re.IGNORECASE)
+            except re.error:
+                # 规则中有无法合并的写法（如重复的命名分组），不使用预过滤
+                combined = None
+            self._by_type[action_type] = (combined, candidates)
+    
+    @staticmethod
+    def _compile(pattern: str) -> Pattern:
+        try:
+            return re.compile(pattern, re.IGNORECASE)
+        except re.error:
+            # 不是有效的正则表达式，按关键词匹配
+            return re.compile(re.escape(pattern), re.IGNORECASE)
+    
+    def match(self, text: str, action_type: str) -> List[SafetyRule]:
+        """返回文本触发的全部规则"""
+        entry = self._by_type.get(action_type)
+        if entry is None:
+            return []
+        combined, candidates = entry
+        if combined is not None and not combined.search(text):
+            return []
+        return [rule for rule, regex in candidates if regex.search(text)]
+
+
 class SafetyController:
     """安全控制器"""
     
-    def __init__(self, config: Optional[Dict] = None):
+    def __init__(self, config: Optional[Dict] = None, screen_size: Optional[ScreenSizeProvider] = None):
         """
         初始化安全控制器
         
         Args:
             config: 配置字典
+            screen_size: 屏幕分辨率查询函数（如执行引擎的 display.size），默认查询主显示器
         """
         self.config = config or {}
         
@@ -72,6 +116,15 @@ class SafetyController:
         # 用户自定义规则
         self.custom_rules = []
         
+        # 预编译的规则匹配器，规则增删或启停时重建
+        self._compiled_rules: Optional[_CompiledRuleSet] = None
+        
+        # 屏幕尺寸缓存（边缘点击检查使用）
+        self._screen_size_provider = screen_size or primary_screen_size
+        self.screen_size: Optional[Tuple[int, int]] = self.config.get('screen_size')
+        self.screen_size_ttl = self.config.get('screen_size_ttl', 30.0)
+        self._screen_size_checked_at = time.time() if self.screen_size else 0.0
+        
         # 执行统计
         self.execution_stats = {
             'total_actions': 0,
@@ -220,6 +273,32 @@ class SafetyController:
         Returns:
             SafetyAssessment: 安全评估结果
         """
+        with get_tracer().span("safety_check", actions=1):
+            return self._assess(action, action_index, self._element_map(ui_elements))
+    
+    def assess_plan_safety(self, actions: List[ActionPlan], ui_elements: List[UIElement] = None,
+                           start_index: int = 0) -> List[SafetyAssessment]:
+        """
+        批量评估整个操作计划的安全性（规则匹配器、元素索引和屏幕尺寸只准备一次）
+        
+        Args:
+            actions: 操作列表
+            ui_elements: UI元素列表
+            start_index: 第一个操作的索引
+            
+        Returns:
+            List[SafetyAssessment]: 与操作一一对应的安全评估结果
+        """
+        with get_tracer().span("safety_check", actions=len(actions)):
+            element_map = self._element_map(ui_elements)
+            return [self._assess(action, start_index + i, element_map) for i, action in enumerate(actions)]
+    
+    @staticmethod
+    def _element_map(ui_elements: Optional[List[UIElement]]) -> Dict[str, UIElement]:
+        return {str(elem.id): elem for elem in ui_elements} if ui_elements else {}
+    
+    def _assess(self, action: ActionPlan, action_index: int, element_map: Dict[str, UIElement]) -> SafetyAssessment:
+        """评估单个操作的安全性"""
         start_time = time.time()
         triggered_rules = []
         max_risk_level = RiskLevel.LOW
@@ -236,12 +315,12 @@ class SafetyController:
             
             # 检查坐标安全性
             if action.coordinates:
-                coord_rules = self._check_coordinate_safety(action, ui_elements)
+                coord_rules = self._check_coordinate_safety(action)
                 triggered_rules.extend(coord_rules)
             
             # 检查UI元素安全性
-            if action.element_id and ui_elements:
-                element_rules = self._check_element_safety(action, ui_elements)
+            if action.element_id and element_map:
+                element_rules = self._check_element_safety(action, element_map)
                 triggered_rules.extend(element_rules)
             
             # 检查操作类型安全性
@@ -300,21 +379,30 @@ class SafetyController:
     
     def _check_text_safety(self, text: str, action_type: str) -> List[SafetyRule]:
         """检查文本内容安全性"""
-        triggered_rules = []
-        text_lower = text.lower()
+        if self._compiled_rules is None:
+            self._compiled_rules = _CompiledRuleSet(self.safety_rules + self.custom_rules)
         
-        for rule in self.safety_rules + self.custom_rules:
-            if not rule.enabled or action_type not in rule.applies_to:
-                continue
-            
-            # 检查是否匹配规则
-            if self._matches_pattern(text_lower, rule.pattern):
-                triggered_rules.append(rule)
-                logger.debug(f"文本 '{text}' 触发安全规则: {rule.name}")
+        triggered_rules = self._compiled_rules.match(text, action_type)
+        for rule in triggered_rules:
+            logger.debug(f"文本 '{text}' 触发安全规则: {rule.name}")
         
         return triggered_rules
     
-    def _check_coordinate_safety(self, action: ActionPlan, ui_elements: List[UIElement]) -> List[SafetyRule]:
+    def invalidate_rules(self):
+        """规则变化后重建匹配器（直接修改SafetyRule对象后需要调用）"""
+        self._compiled_rules = None
+    
+    def get_screen_size(self) -> Optional[Tuple[int, int]]:
+        """获取屏幕尺寸（缓存，过期后重新查询以适应分辨率变化）"""
+        if self.screen_size is None or time.time() - self._screen_size_checked_at > self.screen_size_ttl:
+            try:
+                self.screen_size = tuple(self._screen_size_provider())
+            except Exception as e:
+                logger.warning(f"屏幕尺寸检查失败: {e}")
+            self._screen_size_checked_at = time.time()
+        return self.screen_size
+    
+    def _check_coordinate_safety(self, action: ActionPlan) -> List[SafetyRule]:
         """检查坐标安全性"""
         triggered_rules = []
         
@@ -324,35 +412,29 @@ class SafetyController:
         # 检查是否在屏幕边缘（可能是意外点击）
         x, y = action.click_position or (0, 0)
         
-        try:
-            import pyautogui
-            screen_width, screen_height = pyautogui.size()
-            
-            edge_threshold = 20  # 边缘阈值
-            
-            if (x <= edge_threshold or x >= screen_width - edge_threshold or
-                y <= edge_threshold or y >= screen_height - edge_threshold):
-                
-                for rule in self.safety_rules:
-                    if rule.pattern == "screen_edge_click" and action.type in rule.applies_to:
-                        triggered_rules.append(rule)
-                        break
+        screen_size = self.get_screen_size()
+        if screen_size is None:
+            return triggered_rules
+        screen_width, screen_height = screen_size
         
-        except Exception as e:
-            logger.warning(f"屏幕尺寸检查失败: {e}")
+        edge_threshold = 20  # 边缘阈值
+        
+        if (x <= edge_threshold or x >= screen_width - edge_threshold or
+            y <= edge_threshold or y >= screen_height - edge_threshold):
+            
+            for rule in self.safety_rules:
+                if rule.pattern == "screen_edge_click" and action.type in rule.applies_to:
+                    triggered_rules.append(rule)
+                    break
         
         return triggered_rules
     
-    def _check_element_safety(self, action: ActionPlan, ui_elements: List[UIElement]) -> List[SafetyRule]:
+    def _check_element_safety(self, action: ActionPlan, element_map: Dict[str, UIElement]) -> List[SafetyRule]:
         """检查UI元素安全性"""
         triggered_rules = []
         
         # 查找目标元素
-        target_element = None
-        for elem in ui_elements:
-            if str(elem.id) == str(action.element_id):
-                target_element = elem
-                break
+        target_element = element_map.get(str(action.element_id))
         
         if not target_element:
             return triggered_rules
@@ -446,6 +528,7 @@ class SafetyController:
     def add_custom_rule(self, rule: SafetyRule):
         """添加自定义安全规则"""
         self.custom_rules.append(rule)
+        self.invalidate_rules()
         logger.info(f"添加自定义安全规则: {rule.name}")
     
     def remove_custom_rule(self, rule_name: str) -> bool:
@@ -453,6 +536,7 @@ class SafetyController:
         for i, rule in enumerate(self.custom_rules):
             if rule.name == rule_name:
                 del self.custom_rules[i]
+                self.invalidate_rules()
                 logger.info(f"移除自定义安全规则: {rule_name}")
                 return True
         return False
@@ -462,6 +546,7 @@ class SafetyController:
         for rule in self.safety_rules + self.custom_rules:
             if rule.name == rule_name:
                 rule.enabled = True
+                self.invalidate_rules()
                 logger.info(f"启用安全规则: {rule_name}")
                 return True
         return False
@@ -471,6 +556,7 @@ class SafetyController:
         for rule in self.safety_rules + self.custom_rules:
             if rule.name == rule_name:
                 rule.enabled = False
+                self.invalidate_rules()
                 logger.info(f"禁用安全规则: {rule_name}")
                 return True
         return False
@@ -512,5 +598,8 @@ class SafetyController:
         self.require_confirmation_for_medium = self.config.get('require_confirmation_for_medium', self.require_confirmation_for_medium)
         self.block_high_risk = self.config.get('block_high_risk', self.block_high_risk)
         self.block_critical_risk = self.config.get('block_critical_risk', self.block_critical_risk)
+        if 'screen_size' in config:
+            self.screen_size = config['screen_size']
+            self._screen_size_checked_at = time.time()
         
         logger.info("安全配置已更新")
\ No newline at end of file
@@ -0,0 +1,207 @@
+"""
+界面稳定检测 - 操作后高频截取目标附近的小区域，像素在稳定窗口内不再变化即认为界面已更新完毕，
+替代固定等待时间：快速界面不再白等，慢速界面也不会过早检查
+"""
+
+import logging
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+from PIL import Image, ImageGrab
+
+logger = logging.getLogger(__name__)
+
+Region = Tuple[int, int, int, int]  # (x1, y1, x2, y2)，屏幕坐标
+
+
+@dataclass
+class SettleResult:
+    """一次稳定检测的结果"""
+    settled: bool         # 是否在超时前稳定
+    changed: bool         # 区域相对操作前是否发生过变化
+    elapsed: float        # 等待耗时（秒）
+    samples: int          # 截取次数
+    region: Optional[Region] = None
+
+
+class SettleDetector:
+    """基于区域截图的界面稳定检测器"""
+
+    def __init__(self, config: Optional[Dict] = None, grab: Optional[Callable[[Region], Image.Image]] = None):
+        """
+        初始化稳定检测器
+
+        Args:
+            config: 配置字典
+            grab: 区域截图函数，默认使用 PIL.ImageGrab
+        """
+        self.config = config or {}
+
+        self.poll_interval = self.config.get('poll_interval', 0.03)      # 采样间隔
+        self.stable_window = self.config.get('stable_window', 0.15)      # 像素保持不变的时长，短于光标闪烁周期
+        self.timeout = self.config.get('timeout', 3.0)                   # 最长等待时间
+        self.response_timeout = self.config.get('response_timeout', 0.4)  # 学习后等待界面开始响应的最短时间
+        self.max_response_timeout = self.config.get('max_response_timeout', 1.0)  # 未学习时的等待时间（原固定等待）
+        self.response_margin = self.config.get('response_margin', 2.0)   # 学习值为近期最慢响应的倍数
+        self.response_history = self.config.get('response_history', 20)  # 每类操作保留的响应耗时数量
+        self.min_response_samples = self.config.get('min_response_samples', 5)  # 开始使用学习值所需的样本数
+        self.region_radius = self.config.get('region_radius', 160)       # 目标周围的采样半径（像素）
+        self.screen_size = self.config.get('screen_size')                # (width, height)，用于裁剪采样区域
+
+        self._grab = grab or (lambda region: ImageGrab.grab(bbox=region))
+        self._stats = {'waits': 0, 'timeouts': 0, 'total_wait': 0.0, 'samples': 0, 'no_response': 0}
+        self._response_times: Dict[str, deque] = {}
+
+    def region_around(self, position: Optional[Tuple[int, int]]) -> Optional[Region]:
+        """
+        计算目标位置周围的采样区域
+
+        Args:
+            position: 目标坐标 (x, y)
+
+        Returns:
+            Optional[Region]: 采样区域，位置未知时为None
+        """
+        if position is None:
+            return None
+        x, y = int(position[0]), int(position[1])
+        r = self.region_radius
+        x1, y1, x2, y2 = x - r, y - r, x + r, y + r
+        if self.screen_size:
+            width, height = self.screen_size
+            x1, y1 = max(0, x1), max(0, y1)
+            x2, y2 = min(width, x2), min(height, y2)
+            if x2 <= x1 or y2 <= y1:
+                return None
+        return (x1, y1, x2, y2)
+
+    def sample(self, region: Optional[Region]) -> Optional[int]:
+        """
+        截取区域并返回像素指纹
+
+        Args:
+            region: 采样区域
+
+        Returns:
+            Optional[int]: crc32指纹，区域为空或截图失败时为None
+        """
+        if region is None:
+            return None
+        try:
+            return self.fingerprint(self._grab(region))
+        except Exception as e:
+            logger.debug(f"Region capture failed for {region}: {e}")
+            return None
+
+    @staticmethod
+    def fingerprint(image: Image.Image) -> int:
+        """图像的像素指纹（统一转为RGB，与其他途径截取的同一区域可比较）"""
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        return zlib.crc32(image.tobytes())
+
+    def response_window(self, kind: Optional[str] = None) -> float:
+        """
+        等待界面开始响应的时间
+
+        按操作类型从近期实际响应耗时中学习：样本足够时取最慢响应的 response_margin 倍，
+        限制在 [response_timeout, max_response_timeout] 之间；样本不足或未指定类型时使用 max_response_timeout
+
+        Args:
+            kind: 操作类型
+        """
+        history = self._response_times.get(kind) if kind else None
+        if not history or len(history) < self.min_response_samples:
+            return self.max_response_timeout
+        learned = max(history) * self.response_margin
+        return min(self.max_response_timeout, max(self.response_timeout, learned))
+
+    def wait(self, region: Optional[Region], baseline: Optional[int] = None, timeout: Optional[float] = None,
+             should_stop: Optional[Callable[[], bool]] = None, kind: Optional[str] = None,
+             response_timeout: Optional[float] = None) -> SettleResult:
+        """
+        等待区域稳定
+
+        提供操作前的基准指纹时，先等待区域开始变化（最多 response_window(kind) 秒，一直不变视为操作没有可见效果），
+        再等待变化后的像素保持 stable_window 秒不变。观察到的响应耗时记入该类操作的历史
+
+        Args:
+            region: 采样区域，为空时直接返回
+            baseline: 操作前的区域指纹
+            timeout: 最长等待时间，默认使用配置
+            should_stop: 返回True时立即结束等待
+            kind: 操作类型，用于学习响应等待时间
+            response_timeout: 指定响应等待时间（不学习），默认按 kind 计算
+
+        Returns:
+            SettleResult: 检测结果
+        """
+        start_time = time.time()
+        timeout = self.timeout if timeout is None else timeout
+        learn = response_timeout is None and kind is not None
+        if response_timeout is None:
+            response_timeout = self.response_window(kind)
+        last = self.sample(region)
+        if last is None:
+            return SettleResult(settled=False, changed=False, elapsed=0.0, samples=0, region=region)
+
+        samples = 1
+        changed = baseline is not None and last != baseline
+        if changed and learn:
+            self._record_response(kind, time.time() - start_time)
+        awaiting_response = baseline is not None and not changed
+        stable_since = start_time
+        settled = False
+
+        while True:
+            now = time.time()
+            if awaiting_response and now - start_time >= response_timeout:
+                settled = True  # 操作没有引起可见变化
+                self._stats['no_response'] += 1
+                break
+            if not awaiting_response and now - stable_since >= self.stable_window:
+                settled = True
+                break
+            if now - start_time >= timeout or (should_stop and should_stop()):
+                break
+
+            time.sleep(self.poll_interval)
+            current = self.sample(region)
+            samples += 1
+            if current is None:
+                break
+            if current != last:
+                if awaiting_response and learn:
+                    self._record_response(kind, time.time() - start_time)
+                changed = True
+                awaiting_response = False
+                stable_since = time.time()
+                last = current
+
+        elapsed = time.time() - start_time
+        self._stats['waits'] += 1
+        self._stats['samples'] += samples
+        self._stats['total_wait'] += elapsed
+        if not settled:
+            self._stats['timeouts'] += 1
+            logger.debug(f"Region {region} did not settle within {timeout:.2f}s")
+        return SettleResult(settled=settled, changed=changed, elapsed=elapsed, samples=samples, region=region)
+
+    def _record_response(self, kind: str, latency: float):
+        """记录一次操作到界面开始变化的耗时"""
+        history = self._response_times.get(kind)
+        if history is None:
+            history = self._response_times[kind] = deque(maxlen=self.response_history)
+        history.append(latency)
+
+    def get_stats(self) -> Dict:
+        """获取检测统计信息"""
+        waits = self._stats['waits']
+        return {
+            **self._stats,
+            'average_wait': self._stats['total_wait'] / waits if waits else 0.0,
+            'response_windows': {kind: self.response_window(kind) for kind in self._response_times},
+        }
@@ -4,7 +4,7 @@
 
 import time
 import logging
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 from dataclasses import dataclass
 from enum import Enum
 
@@ -15,7 +15,9 @@ project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(_
 sys.path.append(project_root)
 
 from client.screenshot.screenshot_manager import ScreenshotManager
+from client.screenshot.frame_delta import DeltaFrameEncoder
 from shared.schemas.data_models import CompletionVerificationRequest, CompletionVerificationResponse, CompletionStatus
+from shared.utils.tracing import get_tracer
 
 logger = logging.getLogger(__name__)
 
@@ -39,15 +41,37 @@ class CompletionCheckResult:
     screenshot_base64: Optional[str] = None  # 截图的base64数据
     verification_prompt: Optional[str] = None  # 验证提示词
     check_time: float = 0.0
+    frame_changed: bool = True  # 验证截图相对上一次验证截图是否有变化
+    dirty_rects: Optional[List[Tuple[int, int, int, int]]] = None  # 变化区域（原始分辨率）
+    frame_payload: Optional[Dict[str, Any]] = None  # 上传的截图字段（关键帧或增量帧）
 
 class TaskCompletionChecker:
     """任务完成度验证器"""
     
-    def __init__(self):
-        """初始化任务完成度验证器"""
-        self.screenshot_manager = ScreenshotManager()
+    def __init__(self, screenshot_manager: Optional[ScreenshotManager] = None):
+        """
+        初始化任务完成度验证器
+        
+        Args:
+            screenshot_manager: 截图管理器，默认截取主显示器
+        """
+        self.screenshot_manager = screenshot_manager or ScreenshotManager()
+        # 验证截图相对上一次已确认的截图只上传变化图块
+        self.delta_encoder = DeltaFrameEncoder()
+        self._task_id: Optional[str] = None
         logger.info("TaskCompletionChecker initialized")
     
+    def begin_task(self, task_id: str):
+        """
+        切换到新任务时清除变化检测的参考帧
+
+        检查器在多个任务之间复用，新任务的第一张验证截图不能与上一任务的最后一张比较，
+        否则屏幕看起来相同（例如任务本来就已完成）时会被误判为没有变化而跳过验证
+        """
+        if task_id != self._task_id:
+            self._task_id = task_id
+            self.screenshot_manager.change_detector.reset()
+    
     def generate_completion_check_prompt(self, original_command: str, 
                                        previous_claude_output: str,
                                        screenshot_base64: str) -> str:
@@ -110,14 +134,40 @@ class TaskCompletionChecker:
         Returns:
             CompletionCheckResult: 检查结果
         """
+        with get_tracer().span("verify") as span:
+            result = self._check_task_completion(task_id, original_command, previous_claude_output)
+            span.set(status=result.status.value, frame_changed=result.frame_changed)
+            return result
+    
+    def _check_task_completion(self, task_id: str, original_command: str,
+                               previous_claude_output: str) -> CompletionCheckResult:
         start_time = time.time()
+        self.begin_task(task_id)
         
         try:
             # 1. 捕获当前屏幕截图
             logger.info("正在捕获完成验证截图...")
-            screenshot_base64 = self.screenshot_manager.capture_screen_to_base64()
+            frame = self.screenshot_manager.capture_frame()
+            
+            if frame is not None and not frame.changed:
+                # 屏幕自上次验证以来没有变化，不需要编码和上传
+                logger.info("验证截图与上一次相同，跳过上传")
+                return CompletionCheckResult(
+                    task_id=task_id,
+                    status=TaskStatus.UNCLEAR,
+                    confidence=0.0,
+                    reasoning="屏幕自上次验证以来没有变化",
+                    next_steps=None,
+                    next_actions=None,
+                    check_time=time.time() - start_time,
+                    frame_changed=False,
+                    dirty_rects=[]
+                )
             
-            if not screenshot_base64:
+            frame_payload = self.delta_encoder.encode(frame) if frame else None
+            screenshot_base64 = frame_payload.get('screenshot_base64') if frame_payload else None
+            
+            if not frame_payload:
                 logger.error("截图失败，无法进行任务完成度验证")
                 return CompletionCheckResult(
                     task_id=task_id,
@@ -145,9 +195,11 @@ class TaskCompletionChecker:
                 next_steps=None,
                 next_actions=None,
                 screenshot_path=None,  # 不需要保存文件
-                screenshot_base64=screenshot_base64,  # 直接包含截图数据
+                screenshot_base64=screenshot_base64,  # 关键帧时包含完整截图数据
                 verification_prompt=prompt,  # 包含验证提示词
-                check_time=time.time() - start_time
+                check_time=time.time() - start_time,
+                dirty_rects=frame.change.dirty_rects if frame.change else None,
+                frame_payload=frame_payload
             )
             
         except Exception as e:
@@ -241,14 +293,39 @@ class TaskCompletionChecker:
         Returns:
             CompletionCheckResult: 检查结果
         """
+        with get_tracer().span("verify", simple=True) as span:
+            result = self._check_task_completion_simple(task_id)
+            span.set(status=result.status.value, frame_changed=result.frame_changed)
+            return result
+    
+    def _check_task_completion_simple(self, task_id: str) -> CompletionCheckResult:
         start_time = time.time()
+        self.begin_task(task_id)
         
         try:
             # 1. 捕获当前屏幕截图
             logger.info("正在捕获完成验证截图...")
-            screenshot_base64 = self.screenshot_manager.capture_screen_to_base64()
+            frame = self.screenshot_manager.capture_frame()
+            
+            if frame is not None and not frame.changed:
+                # 屏幕自上次验证以来没有变化，不需要编码和上传
+                logger.info("验证截图与上一次相同，跳过上传")
+                return CompletionCheckResult(
+                    task_id=task_id,
+                    status=TaskStatus.UNCLEAR,
+                    confidence=0.0,
+                    reasoning="屏幕自上次验证以来没有变化",
+                    next_steps=None,
+                    next_actions=None,
+                    check_time=time.time() - start_time,
+                    frame_changed=False,
+                    dirty_rects=[]
+                )
+            
+            frame_payload = self.delta_encoder.encode(frame) if frame else None
+            screenshot_base64 = frame_payload.get('screenshot_base64') if frame_payload else None
             
-            if not screenshot_base64:
+            if not frame_payload:
                 logger.error("截图失败，无法进行任务完成度验证")
                 return CompletionCheckResult(
                     task_id=task_id,
@@ -263,7 +340,7 @@ class TaskCompletionChecker:
             # 2. 创建简化的验证请求
             verification_request = CompletionVerificationRequest(
                 task_id=task_id,
-                screenshot_base64=screenshot_base64
+                **frame_payload
             )
             
             # 3. 返回包含截图数据的结果，等待服务端处理
@@ -277,7 +354,9 @@ class TaskCompletionChecker:
                 screenshot_path=None,
                 screenshot_base64=screenshot_base64,
                 verification_prompt=None,  # 简化接口不需要提示词
-                check_time=time.time() - start_time
+                check_time=time.time() - start_time,
+                dirty_rects=frame.change.dirty_rects if frame.change else None,
+                frame_payload=frame_payload
             )
             
         except Exception as e:
@@ -0,0 +1,246 @@
+"""
+模板匹配 - 在目标附近的小区域截图中用归一化互相关(NCC)查找元素模板，
+用于在界面移动后重新定位操作目标（回放操作轨迹、点击前校正坐标）
+"""
+
+import base64
+import io
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageGrab
+
+try:
+    import cv2
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+Region = Tuple[int, int, int, int]  # (x1, y1, x2, y2)，屏幕坐标
+
+
+@dataclass
+class TemplateMatch:
+    """一次模板匹配的结果"""
+    position: Tuple[int, int]  # 匹配位置的模板中心（屏幕坐标）
+    offset: Tuple[int, int]    # 相对期望位置的偏移
+    score: float               # NCC得分，1表示完全一致
+    elapsed: float             # 截图加匹配耗时（秒）
+
+
+def to_gray(image: Image.Image) -> np.ndarray:
+    """PIL图像转灰度uint8数组"""
+    return np.asarray(image.convert('L'))
+
+
+def grab_logical(grab: Callable[[Region], Image.Image], region: Region) -> Image.Image:
+    """
+    截取区域并统一为逻辑像素尺寸
+
+    高分屏（Retina等）上截图区域按逻辑坐标给出，返回的图像却是物理像素（2倍等），
+    缩放回区域大小后，图像中的像素偏移才能直接加到屏幕坐标上
+    """
+    image = grab(region)
+    size = (region[2] - region[0], region[3] - region[1])
+    if image.size != size:
+        image = image.resize(size, Image.Resampling.BOX)
+    return image
+
+
+def crop_template(gray: np.ndarray, box, max_size: int = 64) -> Optional[np.ndarray]:
+    """
+    从灰度截图中裁剪元素模板
+
+    元素较大时只保留中心 max_size x max_size 的部分：匹配耗时与模板面积成正比，
+    而中心区域（图标、文字）已足够区分
+
+    Args:
+        gray: 灰度截图 (H, W)
+        box: 元素区域 [x1, y1, x2, y2]，截图坐标
+        max_size: 模板最大边长
+
+    Returns:
+        Optional[np.ndarray]: 模板，区域无效或过于平坦（无法可靠匹配）时为None
+    """
+    x1, y1, x2, y2 = (int(round(v)) for v in box[:4])
+    x1, y1 = max(0, x1), max(0, y1)
+    x2, y2 = min(gray.shape[1], x2), min(gray.shape[0], y2)
+    if x2 - x1 < 4 or y2 - y1 < 4:
+        return None
+
+    cx, cy = (x1 + x2) // 2, (y1 + y2) // 2
+    half_w, half_h = min(x2 - x1, max_size) // 2, min(y2 - y1, max_size) // 2
+    template = gray[cy - half_h:cy + half_h, cx - half_w:cx + half_w]
+    if template.size == 0 or float(template.std()) < 4.0:
+        return None
+    return np.ascontiguousarray(template)
+
+
+def element_template(gray: np.ndarray, box, scale: Tuple[float, float] = (1.0, 1.0),
+                     max_size: int = 64) -> Optional[np.ndarray]:
+    """
+    从分析帧中裁剪元素模板并换算到屏幕像素尺寸
+
+    Args:
+        gray: 分析帧灰度图
+        box: 元素区域 [x1, y1, x2, y2]，屏幕坐标
+        scale: 分析帧像素 / 屏幕坐标 的比例 (sx, sy)
+        max_size: 模板最大边长（屏幕像素）
+
+    Returns:
+        Optional[np.ndarray]: 屏幕像素尺寸的模板，无法可靠匹配时为None
+    """
+    sx, sy = scale
+    frame_box = [box[0] * sx, box[1] * sy, box[2] * sx, box[3] * sy]
+    template = crop_template(gray, frame_box, int(round(max_size * max(sx, sy))))
+    if template is None or (abs(sx - 1.0) < 0.01 and abs(sy - 1.0) < 0.01):
+        return template
+    size = (max(4, int(round(template.shape[1] / sx))), max(4, int(round(template.shape[0] / sy))))
+    return np.asarray(Image.fromarray(template, 'L').resize(size, Image.Resampling.BILINEAR))
+
+
+def encode_template(template: np.ndarray) -> str:
+    """模板编码为base64 PNG（灰度小图，通常不足1KB）"""
+    buffer = io.BytesIO()
+    Image.fromarray(template, 'L').save(buffer, format='PNG', compress_level=1)
+    return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def decode_template(data: str) -> Optional[np.ndarray]:
+    """解码base64 PNG模板"""
+    try:
+        return to_gray(Image.open(io.BytesIO(base64.b64decode(data))))
+    except Exception as e:
+        logger.debug(f"Template decode failed: {e}")
+        return None
+
+
+def _window_sums(values: np.ndarray, height: int, width: int) -> np.ndarray:
+    """积分图计算所有 height x width 窗口的和"""
+    integral = np.zeros((values.shape[0] + 1, values.shape[1] + 1), dtype=np.float64)
+    integral[1:, 1:] = values.cumsum(axis=0).cumsum(axis=1)
+    return (integral[height:, width:] - integral[:-height, width:]
+            - integral[height:, :-width] + integral[:-height, :-width])
+
+
+def ncc_map(search: np.ndarray, template: np.ndarray) -> np.ndarray:
+    """
+    计算模板在搜索图像每个位置的归一化互相关（等价于 cv2.TM_CCOEFF_NORMED）
+
+    有OpenCV时直接使用，否则用FFT计算互相关、积分图计算窗口方差
+
+    Args:
+        search: 搜索图像 (H, W)
+        template: 模板 (h, w)，不大于搜索图像
+
+    Returns:
+        np.ndarray: (H-h+1, W-w+1) 的得分图
+    """
+    if CV2_AVAILABLE:
+        return cv2.matchTemplate(search.astype(np.float32), template.astype(np.float32), cv2.TM_CCOEFF_NORMED)
+
+    search = search.astype(np.float64)
+    template = template.astype(np.float64)
+    h, w = template.shape
+    t = template - template.mean()
+    t_norm = np.sqrt((t * t).sum())
+
+    shape = (search.shape[0] + h - 1, search.shape[1] + w - 1)
+    correlation = np.fft.irfft2(np.fft.rfft2(search, shape) * np.fft.rfft2(t[::-1, ::-1], shape), shape)
+    numerator = correlation[h - 1:search.shape[0], w - 1:search.shape[1]]
+
+    sums = _window_sums(search, h, w)
+    sq_sums = _window_sums(search * search, h, w)
+    variance = np.maximum(sq_sums - sums * sums / (h * w), 0.0)
+    denominator = np.sqrt(variance) * t_norm
+    return np.where(denominator > 1e-6, numerator / np.maximum(denominator, 1e-6), 0.0)
+
+
+class TemplateMatcher:
+    """在期望位置附近截取小区域并匹配元素模板"""
+
+    def __init__(self, config: Optional[Dict] = None, grab: Optional[Callable[[Region], Image.Image]] = None):
+        """
+        初始化模板匹配器
+
+        Args:
+            config: 配置字典
+            grab: 区域截图函数，默认使用 PIL.ImageGrab
+        """
+        self.config = config or {}
+
+        self.search_radius = self.config.get('search_radius', 96)   # 期望位置周围的搜索半径（像素）
+        self.min_score = self.config.get('min_score', 0.8)          # 低于该得分视为未找到
+        self.screen_size = self.config.get('screen_size')           # (width, height)，用于裁剪搜索区域
+
+        self._grab = grab or (lambda region: ImageGrab.grab(bbox=region))
+        self._stats = {'matches': 0, 'misses': 0, 'total_time': 0.0}
+
+    def search_region(self, center: Tuple[int, int], template: np.ndarray,
+                      search_radius: Optional[int] = None) -> Optional[Region]:
+        """模板中心位于 center 附近 search_radius 内时能完整覆盖模板的截图区域"""
+        radius = self.search_radius if search_radius is None else search_radius
+        h, w = template.shape
+        x1, y1 = int(center[0]) - w // 2 - radius, int(center[1]) - h // 2 - radius
+        x2, y2 = x1 + w + 2 * radius, y1 + h + 2 * radius
+        if self.screen_size:
+            width, height = self.screen_size
+            x1, y1 = max(0, x1), max(0, y1)
+            x2, y2 = min(width, x2), min(height, y2)
+        if x2 - x1 < w or y2 - y1 < h:
+            return None
+        return (x1, y1, x2, y2)
+
+    def locate(self, template: np.ndarray, expected: Tuple[int, int],
+               search_radius: Optional[int] = None) -> Optional[TemplateMatch]:
+        """
+        在期望位置附近查找模板
+
+        Args:
+            template: 灰度模板
+            expected: 模板中心的期望屏幕坐标
+            search_radius: 搜索半径，默认使用配置
+
+        Returns:
+            Optional[TemplateMatch]: 匹配结果，未找到或截图失败时为None
+        """
+        start_time = time.time()
+        region = self.search_region(expected, template, search_radius)
+        if region is None:
+            return None
+        try:
+            search = to_gray(grab_logical(self._grab, region))
+        except Exception as e:
+            logger.debug(f"Region capture failed for {region}: {e}")
+            return None
+
+        scores = ncc_map(search, template)
+        y, x = np.unravel_index(int(np.argmax(scores)), scores.shape)
+        score = float(scores[y, x])
+        elapsed = time.time() - start_time
+        self._stats['total_time'] += elapsed
+
+        if score < self.min_score:
+            self._stats['misses'] += 1
+            logger.debug(f"Template not found near {expected} (best score {score:.3f})")
+            return None
+
+        self._stats['matches'] += 1
+        h, w = template.shape
+        position = (region[0] + int(x) + w // 2, region[1] + int(y) + h // 2)
+        return TemplateMatch(
+            position=position,
+            offset=(position[0] - int(expected[0]), position[1] - int(expected[1])),
+            score=score,
+            elapsed=elapsed
+        )
+
+    def get_stats(self) -> Dict:
+        """获取匹配统计信息"""
+        attempts = self._stats['matches'] + self._stats['misses']
+        return {**self._stats, 'average_time': self._stats['total_time'] / attempts if attempts else 0.0}
@@ -3,40 +3,105 @@ import websockets
 import json
 import time
 import threading
+import uuid
 import weakref
-from typing import Optional
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from shared.schemas.data_models import (
-    TaskAnalysisRequest, TaskAnalysisResponse, 
+    TaskAnalysisRequest, TaskAnalysisResponse,
     OmniParserResult, ClaudeAnalysisResult
 )
+from shared.utils.tracing import TRACE_FIELD, SpanContext, get_tracer, new_span_id
+from shared.utils.wire_codec import (
+    WireCodec, WireFormatError, WireStats, available_codecs, codec_from_subprotocol, subprotocols
+)
+
+# 同一请求在最终响应之前可能收到的中间消息类型，其余消息类型都视为请求的最终响应
+INTERMEDIATE_MESSAGE_TYPES = {"omniparser_result", "action_partial", "claude_result"}
+
+MessageCallback = Callable[[dict], None]
+
+
+class ServerClientError(Exception):
+    """请求未能得到服务端响应（未连接、超时、连接中断或客户端关闭）"""
+    pass
+
+
+@dataclass
+class _PendingRequest:
+    """等待响应的请求"""
+    request_id: str
+    task_id: str
+    future: asyncio.Future
+    on_message: Optional[MessageCallback] = None
+    sent: bool = False
+    last_activity: float = field(default_factory=time.monotonic)
+    trace: Optional[SpanContext] = None  # 以本次请求span为父的上下文
+
 
 class ServerClient:
+    """
+    与服务端的长连接客户端，运行在共享事件循环上
+
+    - 多个请求通过 request_id 在同一连接上并发，响应按 request_id（旧服务端按 task_id）路由到对应请求
+    - 中间消息（OmniParser结果、流式操作等）通过回调转发，可在回调中发射Qt信号
+    - 有界发送队列和在途请求上限提供背压
+    - WebSocket ping 心跳，连接断开后按指数退避自动重连
+    """
     _shared_loop = None  # 共享事件循环
     _loop_thread = None  # 事件循环线程
     _clients = []  # 活跃客户端列表
-    
-    def __init__(self, server_url: str = "ws://localhost:8000/ws"):
+
+    def __init__(self, server_url: str = "ws://localhost:8000/ws", config: Optional[Dict] = None):
         self.server_url = server_url
-        self.websocket: Optional[websockets.WebSocketServerProtocol] = None
+        self.config = config or {}
+        self.websocket: Optional[websockets.WebSocketClientProtocol] = None
         self.connected = False
         self._connection_lock = threading.Lock()
-        
+
+        self.connect_timeout = self.config.get('connect_timeout', 10.0)
+        self.heartbeat_interval = self.config.get('heartbeat_interval', 20.0)
+        self.heartbeat_timeout = self.config.get('heartbeat_timeout', 10.0)
+        self.reconnect_initial_delay = self.config.get('reconnect_initial_delay', 0.5)
+        self.reconnect_max_delay = self.config.get('reconnect_max_delay', 10.0)
+        self.request_timeout = self.config.get('request_timeout', 420.0)  # 两条消息之间的最长等待，适应Claude处理时间
+        self.max_in_flight = self.config.get('max_in_flight', 8)
+        self.send_queue_size = self.config.get('send_queue_size', 16)
+        self.max_message_size = self.config.get('max_message_size', 10 * 1024 * 1024)
+        # 消息压缩：握手时提供的编码（空列表表示只收发JSON文本），图像字段不压缩
+        self.wire_codecs = self.config.get('wire_codecs', available_codecs())
+        self.wire_compression_level = self.config.get('wire_compression_level')
+        self.wire_stats = WireStats()
+        self._codec = WireCodec(stats=self.wire_stats)
+
+        # 上传耗时回调 (字节数, 秒)，用于估计链路吞吐量
+        self.upload_recorder: Optional[Callable[[int, float], None]] = None
+
+        # 以下对象只在共享事件循环中访问
+        self._pending: Dict[str, _PendingRequest] = {}
+        self._send_queue: Optional[asyncio.Queue] = None
+        self._in_flight: Optional[asyncio.Semaphore] = None
+        self._connected_event: Optional[asyncio.Event] = None
+        self._connection_task: Optional[asyncio.Task] = None
+        self._closing = False
+
         # 注册到共享客户端列表
         ServerClient._clients.append(weakref.ref(self))
-        
+
         # 确保共享事件循环存在
         self._ensure_shared_loop()
-    
+
     @classmethod
     def _ensure_shared_loop(cls):
         """确保共享事件循环存在"""
         if cls._shared_loop is None or cls._shared_loop.is_closed():
             cls._shared_loop = asyncio.new_event_loop()
-            
+
             # 启动事件循环线程
             if cls._loop_thread is None or not cls._loop_thread.is_alive():
                 cls._loop_thread = threading.Thread(
@@ -45,7 +110,7 @@ class ServerClient:
                     name="ServerClient-EventLoop"
                 )
                 cls._loop_thread.start()
-    
+
     @classmethod
     def _run_shared_loop(cls):
         """运行共享事件循环"""
@@ -56,147 +121,378 @@ class ServerClient:
             print(f"共享事件循环错误: {e}")
         finally:
             cls._shared_loop.close()
-    
-    def _run_in_loop(self, coro):
+
+    def _run_in_loop(self, coro, timeout: Optional[float] = 30):
         """在共享事件循环中运行协程"""
         if self._shared_loop and not self._shared_loop.is_closed():
             future = asyncio.run_coroutine_threadsafe(coro, self._shared_loop)
-            return future.result(timeout=30)  # 30秒超时
+            return future.result(timeout=timeout)
         else:
             raise RuntimeError("共享事件循环不可用")
-    
+
+    async def _on_shared_loop(self, coro):
+        """保证协程在共享事件循环中执行（调用方可能在其他事件循环中）"""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._shared_loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._shared_loop))
+
+    # ---------------------------------------------------------------- 连接管理
+
+    def start(self):
+        """启动后台连接（立即返回，连接和断线重连在共享事件循环中进行）"""
+        self._shared_loop.call_soon_threadsafe(self._start_connection_loop)
+
+    def _start_connection_loop(self):
+        if self._connection_task is None or self._connection_task.done():
+            self._closing = False
+            if self._send_queue is None:
+                self._send_queue = asyncio.Queue(maxsize=self.send_queue_size)
+                self._in_flight = asyncio.Semaphore(self.max_in_flight)
+                self._connected_event = asyncio.Event()
+            self._connection_task = self._shared_loop.create_task(self._connection_loop())
+
     async def connect(self) -> bool:
-        """连接到服务端"""
-        with self._connection_lock:
-            if self.connected:
-                return True
-            
+        """连接到服务端，连接成功后保持连接并在断开时自动重连"""
+        return await self._on_shared_loop(self._connect())
+
+    async def _connect(self) -> bool:
+        self._start_connection_loop()
+        try:
+            await asyncio.wait_for(self._connected_event.wait(), timeout=self.connect_timeout)
+            return True
+        except asyncio.TimeoutError:
+            print(f"连接超时: {self.server_url}")
+            return False
+
+    def connect_sync(self) -> bool:
+        """同步连接方法"""
+        try:
+            return self._run_in_loop(self._connect(), timeout=self.connect_timeout + 5)
+        except Exception as e:
+            print(f"同步连接失败: {e}")
+            return False
+
+    async def _connection_loop(self):
+        """保持连接：连接、收发、心跳，断开后指数退避重连"""
+        delay = self.reconnect_initial_delay
+        while not self._closing:
             try:
-                # 添加连接超时和重试机制
                 self.websocket = await asyncio.wait_for(
                     websockets.connect(
                         self.server_url,
-                        ping_interval=20,  # 20秒心跳
-                        ping_timeout=10,   # 10秒心跳超时
-                        close_timeout=10   # 10秒关闭超时
+                        max_size=self.max_message_size,
+                        ping_interval=None,  # 由心跳任务负责
+                        close_timeout=10,
+                        compression=None,  # 不使用permessage-deflate，由消息编码选择性压缩
+                        subprotocols=subprotocols(self.wire_codecs) or None
                     ),
-                    timeout=10.0  # 10秒连接超时
+                    timeout=self.connect_timeout
                 )
-                self.connected = True
-                print(f"已连接到服务端: {self.server_url}")
-                return True
-            except asyncio.TimeoutError:
-                print(f"连接超时: {self.server_url}")
-                self.connected = False
-                return False
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                print(f"连接失败: {e}")
-                self.connected = False
-                return False
-    
-    def connect_sync(self) -> bool:
-        """同步连接方法"""
-        try:
-            return self._run_in_loop(self.connect())
-        except Exception as e:
-            print(f"同步连接失败: {e}")
-            return False
-    
-    async def disconnect(self):
-        """断开连接"""
-        with self._connection_lock:
-            if self.websocket:
+                print(f"连接失败: {e}，{delay:.1f}秒后重试")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.reconnect_max_delay)
+                continue
+
+            delay = self.reconnect_initial_delay
+            # 旧版本服务端不选择子协议，此时继续使用JSON文本
+            self._codec = WireCodec(codec_from_subprotocol(self.websocket.subprotocol),
+                                    self.wire_compression_level, stats=self.wire_stats)
+            with self._connection_lock:
+                self.connected = True
+            self._connected_event.set()
+            print(f"已连接到服务端: {self.server_url}")
+
+            tasks = [
+                asyncio.create_task(self._reader(self.websocket)),
+                asyncio.create_task(self._writer(self.websocket)),
+                asyncio.create_task(self._heartbeat(self.websocket)),
+            ]
+            try:
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                with self._connection_lock:
+                    self.connected = False
+                self._connected_event.clear()
                 try:
                     await asyncio.wait_for(self.websocket.close(), timeout=5.0)
-                except asyncio.TimeoutError:
-                    print("断开连接超时")
+                except Exception:
+                    pass
+                self.websocket = None
+                # 已发出的请求无法确认服务端是否处理，直接失败；尚未发出的请求留在队列中，重连后发送
+                self._fail_pending(ServerClientError("连接已断开"), sent_only=True)
+                if not self._closing:
+                    print("与服务端的连接已断开，准备重连")
+
+    async def _reader(self, websocket):
+        """接收消息并路由到对应请求"""
+        async for raw in websocket:
+            try:
+                message = self._codec.decode(raw)
+            except (json.JSONDecodeError, WireFormatError) as e:
+                print(f"消息格式错误: {e}")
+                continue
+            self._route(message)
+
+    async def _writer(self, websocket):
+        """从发送队列取出消息依次发送"""
+        while True:
+            request_id, message = await self._send_queue.get()
+            pending = self._pending.get(request_id)
+            if pending is None or pending.future.done():
+                continue  # 请求已超时或取消
+            pending.sent = True
+            # 按当前连接协商的编码发送（重连后可能变化，因此在发送时编码）
+            data = self._codec.encode(message)
+            start_time = time.time()
+            await websocket.send(data)
+            if pending.trace:
+                get_tracer().record("send", start_time, context=pending.trace, bytes=len(data))
+            if self.upload_recorder:
+                try:
+                    self.upload_recorder(len(data), time.time() - start_time)
                 except Exception as e:
-                    print(f"断开连接错误: {e}")
-                finally:
-                    self.websocket = None
-                    self.connected = False
-                    print("已断开连接")
-    
+                    print(f"记录上传耗时失败: {e}")
+
+    async def _heartbeat(self, websocket):
+        """定期ping，超时视为连接失效"""
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                pong_waiter = await websocket.ping()
+                await asyncio.wait_for(pong_waiter, timeout=self.heartbeat_timeout)
+            except Exception as e:
+                print(f"心跳失败: {e}")
+                return
+
+    def _route(self, message: dict):
+        """将消息路由到等待中的请求"""
+        pending = self._pending.get(message.get("request_id"))
+        if pending is None:
+            # 旧版本服务端不回传request_id，按task_id匹配
+            task_id = message.get("task_id")
+            matches = [p for p in self._pending.values() if p.sent and (task_id is None or p.task_id == task_id)]
+            if len(matches) == 1 or (matches and task_id is not None):
+                pending = matches[0]
+        if pending is None or pending.future.done():
+            print(f"收到无法匹配请求的消息: {message.get('type')}")
+            return
+
+        pending.last_activity = time.monotonic()
+        if message.get("type") in INTERMEDIATE_MESSAGE_TYPES:
+            if pending.on_message:
+                try:
+                    pending.on_message(message)
+                except Exception as e:
+                    print(f"处理中间消息失败: {e}")
+        else:
+            trace = message.get(TRACE_FIELD)
+            if pending.trace and isinstance(trace, dict) and trace.get("spans"):
+                # 服务端处理阶段的span并入客户端的同一trace
+                get_tracer().ingest(trace["spans"])
+            pending.future.set_result(message)
+
+    def _fail_pending(self, error: Exception, sent_only: bool = False):
+        for pending in list(self._pending.values()):
+            if (pending.sent or not sent_only) and not pending.future.done():
+                pending.future.set_exception(error)
+
+    async def disconnect(self):
+        """断开连接并停止自动重连"""
+        await self._on_shared_loop(self._disconnect())
+
+    async def _disconnect(self):
+        self._closing = True
+        if self._connection_task and not self._connection_task.done():
+            self._connection_task.cancel()
+            try:
+                await self._connection_task
+            except (asyncio.CancelledError, Exception):
+                pass
+        if self.websocket:
+            try:
+                await asyncio.wait_for(self.websocket.close(), timeout=5.0)
+            except asyncio.TimeoutError:
+                print("断开连接超时")
+            except Exception as e:
+                print(f"断开连接错误: {e}")
+        self.websocket = None
+        with self._connection_lock:
+            self.connected = False
+        self._fail_pending(ServerClientError("客户端已断开连接"))
+        print("已断开连接")
+
     def disconnect_sync(self):
         """同步断开连接方法"""
         try:
-            self._run_in_loop(self.disconnect())
+            self._run_in_loop(self._disconnect())
         except Exception as e:
             print(f"同步断开连接失败: {e}")
-    
+
+    def disconnect_nowait(self):
+        """在共享事件循环中安排断开连接，立即返回（供GUI线程调用，不等待连接关闭）"""
+        if self._shared_loop and not self._shared_loop.is_closed():
+            asyncio.run_coroutine_threadsafe(self._disconnect(), self._shared_loop)
+
+    # ---------------------------------------------------------------- 请求
+
+    async def request(self, message_type: str, data: dict, task_id: Optional[str] = None,
+                      on_message: Optional[MessageCallback] = None, timeout: Optional[float] = None) -> dict:
+        """
+        发送请求并等待最终响应（中间消息通过 on_message 回调转发）
+
+        Args:
+            message_type: 消息类型
+            data: 消息数据
+            task_id: 任务ID，默认自动生成
+            on_message: 中间消息回调（在共享事件循环线程中调用）
+            timeout: 两条消息之间的最长等待时间
+
+        Returns:
+            dict: 最终响应消息
+
+        Raises:
+            ServerClientError: 超时、连接中断或客户端关闭
+        """
+        return await self._on_shared_loop(
+            self._request(message_type, data, task_id, on_message, timeout, get_tracer().current())
+        )
+
+    async def _request(self, message_type: str, data: dict, task_id: Optional[str],
+                       on_message: Optional[MessageCallback], timeout: Optional[float],
+                       trace: Optional[SpanContext] = None) -> dict:
+        if self._closing:
+            raise ServerClientError("客户端已断开连接")
+        self._start_connection_loop()
+        timeout = timeout or self.request_timeout
+        request_id = uuid.uuid4().hex
+        task_id = task_id or str(uuid.uuid4())
+        message = {
+            "type": message_type,
+            "task_id": task_id,
+            "request_id": request_id,
+            "timestamp": time.time(),
+            "data": data
+        }
+        # trace上下文由调用方线程捕获（共享事件循环线程看不到调用方的上下文变量）
+        request_span_id = new_span_id() if trace else None
+        request_trace = SpanContext(trace.trace_id, request_span_id) if trace else None
+        if request_trace:
+            get_tracer().inject(message, request_trace)
+        start_time = time.time()
+
+        # 在途请求上限：超出时等待已有请求完成
+        await self._in_flight.acquire()
+        pending = _PendingRequest(request_id, task_id, self._shared_loop.create_future(), on_message,
+                                  trace=request_trace)
+        self._pending[request_id] = pending
+        try:
+            # 发送队列满时等待（背压）
+            await self._send_queue.put((request_id, message))
+            pending.last_activity = time.monotonic()
+            while True:
+                remaining = timeout - (time.monotonic() - pending.last_activity)
+                if remaining <= 0:
+                    raise ServerClientError(f"等待服务端响应超时 ({timeout}秒)")
+                try:
+                    return await asyncio.wait_for(asyncio.shield(pending.future), timeout=remaining)
+                except asyncio.TimeoutError:
+                    continue  # 期间收到中间消息时继续等待
+        finally:
+            self._pending.pop(request_id, None)
+            if not pending.future.done():
+                pending.future.cancel()
+            self._in_flight.release()
+            if trace:
+                get_tracer().record("request", start_time, context=trace, span_id=request_span_id,
+                                    type=message_type, request_id=request_id)
+
+    def submit(self, message_type: str, data: dict, task_id: Optional[str] = None,
+               on_message: Optional[MessageCallback] = None, timeout: Optional[float] = None) -> Future:
+        """
+        从任意线程提交请求（线程安全）
+
+        Returns:
+            concurrent.futures.Future: 最终响应消息
+        """
+        return asyncio.run_coroutine_threadsafe(
+            self._request(message_type, data, task_id, on_message, timeout, get_tracer().current()),
+            self._shared_loop
+        )
+
+    def request_sync(self, message_type: str, data: dict, task_id: Optional[str] = None,
+                     on_message: Optional[MessageCallback] = None, timeout: Optional[float] = None) -> dict:
+        """同步请求方法（阻塞调用线程直到收到最终响应）"""
+        return self.submit(message_type, data, task_id, on_message, timeout).result()
+
     async def send_task_for_analysis(self, text_command: str, screenshot_base64: str) -> Optional[TaskAnalysisResponse]:
         """发送任务给服务端分析"""
-        if not self.connected:
-            print("未连接到服务端")
-            return None
-        
         try:
             # 创建任务请求
             task_request = TaskAnalysisRequest(
                 text_command=text_command,
                 screenshot_base64=screenshot_base64
             )
-            
-            # 创建消息
-            message = {
-                "type": "analyze_task",
-                "task_id": f"task_{int(time.time() * 1000)}",
-                "timestamp": time.time(),
-                "data": task_request.model_dump()
-            }
-            
-            # 发送消息（添加超时）
-            await asyncio.wait_for(
-                self.websocket.send(json.dumps(message)),
-                timeout=10.0
-            )
-            print("任务已发送，等待服务端响应...")
-            
-            # 等待响应（添加超时）
-            response_str = await asyncio.wait_for(
-                self.websocket.recv(),
-                timeout=60.0  # 60秒超时等待分析结果
-            )
-            response_data = json.loads(response_str)
-            
+
+            print("任务已提交，等待服务端响应...")
+            response_data = await self.request("analyze_task", task_request.model_dump())
+
             # 解析响应
             if response_data.get("type") == "analysis_result":
                 return TaskAnalysisResponse(**response_data["data"])
             else:
                 print(f"收到未知响应类型: {response_data.get('type')}")
                 return None
-                
-        except asyncio.TimeoutError:
-            print("任务发送或接收响应超时")
-            return None
-        except websockets.exceptions.ConnectionClosed:
-            print("连接已断开")
-            self.connected = False
+
+        except ServerClientError as e:
+            print(f"任务请求失败: {e}")
             return None
         except Exception as e:
             print(f"发送任务失败: {e}")
             return None
-    
+
     def send_task_sync(self, text_command: str, screenshot_base64: str) -> Optional[TaskAnalysisResponse]:
         """同步发送任务方法"""
         try:
-            return self._run_in_loop(self.send_task_for_analysis(text_command, screenshot_base64))
+            return self._run_in_loop(self.send_task_for_analysis(text_command, screenshot_base64), timeout=None)
         except Exception as e:
             print(f"同步发送任务失败: {e}")
             return None
-    
+
     async def test_connection(self) -> bool:
         """测试连接"""
+        return await self._on_shared_loop(self._test_connection())
+
+    async def _test_connection(self) -> bool:
         try:
             if self.websocket and self.connected:
-                await asyncio.wait_for(self.websocket.ping(), timeout=5.0)
+                pong_waiter = await self.websocket.ping()
+                await asyncio.wait_for(pong_waiter, timeout=5.0)
                 return True
             else:
                 return False
         except Exception:
-            self.connected = False
             return False
-    
+
+    def get_stats(self) -> Dict:
+        """获取连接状态"""
+        return {
+            'server_url': self.server_url,
+            'connected': self.connected,
+            'in_flight': len(self._pending),
+            'queued': self._send_queue.qsize() if self._send_queue else 0,
+            'wire': self._codec.get_stats(),
+        }
+
     @classmethod
     def shutdown_all(cls):
         """关闭所有客户端和共享事件循环"""
@@ -209,24 +505,24 @@ class ServerClient:
                         client.disconnect_sync()
                     except:
                         pass
-            
+
             cls._clients.clear()
-            
+
             # 停止共享事件循环
             if cls._shared_loop and not cls._shared_loop.is_closed():
                 cls._shared_loop.call_soon_threadsafe(cls._shared_loop.stop)
-                
+
                 # 等待线程结束
                 if cls._loop_thread and cls._loop_thread.is_alive():
                     cls._loop_thread.join(timeout=5.0)
-            
+
             cls._shared_loop = None
             cls._loop_thread = None
             print("ServerClient已全部关闭")
-            
+
         except Exception as e:
             print(f"关闭ServerClient时出错: {e}")
-    
+
     def __del__(self):
         """析构函数 - 清理资源"""
         try:
@@ -235,23 +531,82 @@ class ServerClient:
         except:
             pass
 
+
+class ServerClientPool:
+    """
+    服务端连接池：多条长连接，每个请求交给当前在途请求最少的连接
+
+    接口与 ServerClient 的异步请求部分一致（request / start / disconnect / get_stats），
+    一条连接的发送队列或服务端单连接处理能力成为瓶颈时（如多显示器Agent农场）使用
+    """
+
+    def __init__(self, server_url: str = "ws://localhost:8000/ws", size: int = 2,
+                 config: Optional[Dict] = None):
+        """
+        初始化连接池
+
+        Args:
+            server_url: 服务端地址
+            size: 连接数
+            config: 每条连接的配置（见 ServerClient）
+        """
+        self.server_url = server_url
+        self.clients = [ServerClient(server_url, config) for _ in range(max(1, size))]
+
+    @property
+    def connected(self) -> bool:
+        return any(client.connected for client in self.clients)
+
+    def _pick(self) -> ServerClient:
+        return min(self.clients, key=lambda client: (not client.connected, len(client._pending)))
+
+    def start(self):
+        """启动所有连接"""
+        for client in self.clients:
+            client.start()
+
+    async def request(self, message_type: str, data: dict, task_id: Optional[str] = None,
+                      on_message: Optional[MessageCallback] = None, timeout: Optional[float] = None) -> dict:
+        """发送请求（参数见 ServerClient.request）"""
+        return await self._pick().request(message_type, data, task_id, on_message, timeout)
+
+    def submit(self, message_type: str, data: dict, task_id: Optional[str] = None,
+               on_message: Optional[MessageCallback] = None, timeout: Optional[float] = None) -> Future:
+        """从任意线程提交请求（参数见 ServerClient.submit）"""
+        return self._pick().submit(message_type, data, task_id, on_message, timeout)
+
+    async def disconnect(self):
+        """断开所有连接"""
+        await asyncio.gather(*(client.disconnect() for client in self.clients), return_exceptions=True)
+
+    def get_stats(self) -> Dict:
+        """获取连接池状态"""
+        connections = [client.get_stats() for client in self.clients]
+        return {
+            'server_url': self.server_url,
+            'connected': sum(1 for stats in connections if stats['connected']),
+            'in_flight': sum(stats['in_flight'] for stats in connections),
+            'queued': sum(stats['queued'] for stats in connections),
+            'connections': connections,
+        }
+
 # 测试函数
 async def test_client():
     client = ServerClient()
-    
+
     if await client.connect():
         # 测试发送消息
         response = await client.send_task_for_analysis(
             text_command="测试指令",
             screenshot_base64="test_base64_data"
         )
-        
+
         if response:
             print(f"收到响应: {response}")
-        
+
         await client.disconnect()
     else:
         print("连接失败")
 
 if __name__ == "__main__":
-    asyncio.run(test_client())
\ No newline at end of file
+    asyncio.run(test_client())
@@ -0,0 +1,23 @@
+"""
+Client Display Package - 显示器上下文
+
+截图和输入注入绑定到具体显示器，多个Agent可在不同的X显示器上并行操作。
+
+主要组件:
+- DisplayContext: 显示器上下文接口
+- PrimaryDisplay: 当前主显示器（pyautogui + PIL.ImageGrab）
+- XDisplay: 指定的X11显示器（python-xlib XTEST 或 xdotool）
+"""
+
+from .display_context import (
+    DisplayContext, PrimaryDisplay, XDisplay, Point, create_display_context, x_key_name
+)
+
+__all__ = [
+    'DisplayContext',
+    'PrimaryDisplay',
+    'XDisplay',
+    'Point',
+    'create_display_context',
+    'x_key_name'
+]
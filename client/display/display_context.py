@@ -0,0 +1,388 @@
+"""
+显示器上下文 - 把截图和输入注入绑定到一个显示器上
+
+默认的 PrimaryDisplay 使用 pyautogui 和 PIL.ImageGrab 操作当前主显示器；
+XDisplay 绑定到指定的 X11 DISPLAY（例如 Xvfb 虚拟显示器），
+多个Agent各自持有一个上下文即可在不同显示器上并行执行，互不抢占鼠标和键盘
+"""
+
+import abc
+import logging
+import os
+import shutil
+import subprocess
+import time
+from collections import namedtuple
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageGrab
+
+try:
+    from Xlib import X, XK
+    from Xlib import display as xlib_display
+    from Xlib.ext import xtest
+    XLIB_AVAILABLE = True
+except ImportError:
+    XLIB_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+Point = namedtuple('Point', ['x', 'y'])
+Region = Tuple[int, int, int, int]  # (x1, y1, x2, y2)，屏幕坐标
+
+# pyautogui 键名 -> X keysym 名称
+_X_KEY_NAMES: Dict[str, str] = {
+    'enter': 'Return', 'return': 'Return', 'esc': 'Escape', 'escape': 'Escape',
+    'tab': 'Tab', 'space': 'space', 'backspace': 'BackSpace', 'delete': 'Delete', 'del': 'Delete',
+    'insert': 'Insert', 'home': 'Home', 'end': 'End', 'pageup': 'Prior', 'pgup': 'Prior',
+    'pagedown': 'Next', 'pgdn': 'Next', 'up': 'Up', 'down': 'Down', 'left': 'Left', 'right': 'Right',
+    'ctrl': 'Control_L', 'ctrlleft': 'Control_L', 'ctrlright': 'Control_R',
+    'shift': 'Shift_L', 'shiftleft': 'Shift_L', 'shiftright': 'Shift_R',
+    'alt': 'Alt_L', 'altleft': 'Alt_L', 'altright': 'Alt_R', 'option': 'Alt_L',
+    'win': 'Super_L', 'super': 'Super_L', 'command': 'Super_L', 'cmd': 'Super_L',
+    'capslock': 'Caps_Lock', 'printscreen': 'Print', 'menu': 'Menu',
+}
+
+# 非字母数字字符 -> X keysym 名称（逐字符输入时使用）
+_X_CHAR_NAMES: Dict[str, str] = {
+    ' ': 'space', '\n': 'Return', '\t': 'Tab', '!': 'exclam', '"': 'quotedbl', '#': 'numbersign',
+    '$': 'dollar', '%': 'percent', '&': 'ampersand', "'": 'apostrophe', '(': 'parenleft',
+    ')': 'parenright', '*': 'asterisk', '+': 'plus', ',': 'comma', '-': 'minus', '.': 'period',
+    '/': 'slash', ':': 'colon', ';': 'semicolon', '<': 'less', '=': 'equal', '>': 'greater',
+    '?': 'question', '@': 'at', '[': 'bracketleft', '\\': 'backslash', ']': 'bracketright',
+    '^': 'asciicircum', '_': 'underscore', '`': 'grave', '{': 'braceleft', '|': 'bar',
+    '}': 'braceright', '~': 'asciitilde',
+}
+
+_BUTTONS = {'left': 1, 'middle': 2, 'right': 3}
+
+
+def x_key_name(key: str) -> str:
+    """pyautogui 键名转换为 X keysym 名称"""
+    key = key.strip()
+    lowered = key.lower()
+    if lowered in _X_KEY_NAMES:
+        return _X_KEY_NAMES[lowered]
+    if len(lowered) in (2, 3) and lowered.startswith('f') and lowered[1:].isdigit():
+        return lowered.upper()
+    return _X_CHAR_NAMES.get(key, key)
+
+
+class DisplayContext(abc.ABC):
+    """显示器上下文：截图和鼠标键盘操作的统一接口（方法名对应 pyautogui 的常用操作）"""
+
+    name = "primary"
+
+    @property
+    def failsafe(self) -> bool:
+        return False
+
+    @property
+    def pause(self) -> float:
+        return 0.0
+
+    def configure(self, failsafe: bool = True, pause: float = 0.05):
+        """设置安全模式和操作间隔，只有主显示器（pyautogui）使用"""
+
+    @abc.abstractmethod
+    def grab(self, bbox: Optional[Region] = None) -> Image.Image:
+        """截取整个显示器或指定区域"""
+
+    def size(self) -> Tuple[int, int]:
+        """显示器分辨率 (width, height)"""
+        return self.grab().size
+
+    @abc.abstractmethod
+    def position(self) -> Point:
+        """当前鼠标位置"""
+
+    @abc.abstractmethod
+    def move_to(self, x: int, y: int, duration: float = 0.0):
+        """移动鼠标到指定位置"""
+
+    @abc.abstractmethod
+    def click(self, x: int, y: int, clicks: int = 1, button: str = 'left'):
+        """在指定位置点击"""
+
+    def double_click(self, x: int, y: int):
+        self.click(x, y, clicks=2)
+
+    def right_click(self, x: int, y: int):
+        self.click(x, y, button='right')
+
+    @abc.abstractmethod
+    def scroll(self, clicks: int, x: Optional[int] = None, y: Optional[int] = None):
+        """滚动滚轮，正数向上"""
+
+    @abc.abstractmethod
+    def drag(self, x1: int, y1: int, x2: int, y2: int, duration: float = 1.0):
+        """按住左键从起点拖到终点"""
+
+    @abc.abstractmethod
+    def key_down(self, key: str):
+        """按下按键（pyautogui 键名）"""
+
+    @abc.abstractmethod
+    def key_up(self, key: str):
+        """释放按键（pyautogui 键名）"""
+
+    def press(self, key: str):
+        self.key_down(key)
+        self.key_up(key)
+
+    @abc.abstractmethod
+    def typewrite(self, text: str, interval: float = 0.0):
+        """逐字符输入文本"""
+
+    def close(self):
+        """释放显示器连接"""
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.name!r})"
+
+
+class PrimaryDisplay(DisplayContext):
+    """当前主显示器，使用 pyautogui 和 PIL.ImageGrab"""
+
+    name = "primary"
+
+    def __init__(self):
+        # 延迟导入：Linux下导入pyautogui需要可用的DISPLAY，只操作虚拟显示器时不应依赖它
+        import pyautogui
+        self._pyautogui = pyautogui
+
+    @property
+    def failsafe(self) -> bool:
+        return self._pyautogui.FAILSAFE
+
+    @property
+    def pause(self) -> float:
+        return self._pyautogui.PAUSE
+
+    def configure(self, failsafe: bool = True, pause: float = 0.05):
+        self._pyautogui.FAILSAFE = failsafe
+        self._pyautogui.PAUSE = pause
+
+    def grab(self, bbox: Optional[Region] = None) -> Image.Image:
+        return ImageGrab.grab(bbox=bbox)
+
+    def size(self) -> Tuple[int, int]:
+        return tuple(self._pyautogui.size())
+
+    def position(self) -> Point:
+        x, y = self._pyautogui.position()
+        return Point(x, y)
+
+    def move_to(self, x: int, y: int, duration: float = 0.0):
+        self._pyautogui.moveTo(x, y, duration=duration)
+
+    def click(self, x: int, y: int, clicks: int = 1, button: str = 'left'):
+        self._pyautogui.click(x, y, clicks=clicks, button=button)
+
+    def double_click(self, x: int, y: int):
+        self._pyautogui.doubleClick(x, y)
+
+    def right_click(self, x: int, y: int):
+        self._pyautogui.rightClick(x, y)
+
+    def scroll(self, clicks: int, x: Optional[int] = None, y: Optional[int] = None):
+        if x is not None and y is not None:
+            self._pyautogui.scroll(clicks, x=x, y=y)
+        else:
+            self._pyautogui.scroll(clicks)
+
+    def drag(self, x1: int, y1: int, x2: int, y2: int, duration: float = 1.0):
+        self._pyautogui.drag(x2 - x1, y2 - y1, x1, y1, duration=duration)
+
+    def key_down(self, key: str):
+        self._pyautogui.keyDown(key)
+
+    def key_up(self, key: str):
+        self._pyautogui.keyUp(key)
+
+    def press(self, key: str):
+        self._pyautogui.press(key)
+
+    def typewrite(self, text: str, interval: float = 0.0):
+        self._pyautogui.typewrite(text, interval=interval)
+
+
+class XDisplay(DisplayContext):
+    """
+    指定的 X11 显示器（如 Xvfb 的 ":99"）
+
+    截图使用 PIL.ImageGrab 的 xdisplay 参数；输入注入优先使用 python-xlib 的 XTEST 扩展，
+    未安装时调用 xdotool（通过 DISPLAY 环境变量指定显示器）
+    """
+
+    def __init__(self, display: str):
+        """
+        初始化X显示器上下文
+
+        Args:
+            display: X显示器名称，如 ":99"
+        """
+        self.name = display
+        self._env = {**os.environ, 'DISPLAY': display}
+        self._size: Optional[Tuple[int, int]] = None
+        self._xlib = None
+
+        if XLIB_AVAILABLE:
+            self._xlib = xlib_display.Display(display)
+            if not self._xlib.has_extension('XTEST'):
+                self._xlib.close()
+                self._xlib = None
+                logger.warning(f"显示器 {display} 不支持XTEST扩展，改用xdotool")
+        if self._xlib is None and shutil.which('xdotool') is None:
+            raise RuntimeError(f"无法向显示器 {display} 注入输入: 需要 python-xlib 或 xdotool")
+
+    # ---- 截图 ----
+
+    def grab(self, bbox: Optional[Region] = None) -> Image.Image:
+        return ImageGrab.grab(bbox=bbox, xdisplay=self.name)
+
+    def size(self) -> Tuple[int, int]:
+        if self._size is None:
+            if self._xlib is not None:
+                screen = self._xlib.screen()
+                self._size = (screen.width_in_pixels, screen.height_in_pixels)
+            else:
+                width, height = self._xdotool('getdisplaygeometry').split()
+                self._size = (int(width), int(height))
+        return self._size
+
+    # ---- 鼠标 ----
+
+    def position(self) -> Point:
+        if self._xlib is not None:
+            pointer = self._xlib.screen().root.query_pointer()
+            return Point(pointer.root_x, pointer.root_y)
+        values = dict(line.split('=', 1) for line in self._xdotool('getmouselocation', '--shell').splitlines()
+                      if '=' in line)
+        return Point(int(values['X']), int(values['Y']))
+
+    def move_to(self, x: int, y: int, duration: float = 0.0):
+        x, y = int(x), int(y)
+        if duration > 0:
+            # 分段移动，拖拽和悬停类界面需要中间的移动事件
+            start = self.position()
+            steps = max(2, int(duration / 0.02))
+            for i in range(1, steps):
+                self._motion(start.x + (x - start.x) * i // steps, start.y + (y - start.y) * i // steps)
+                time.sleep(duration / steps)
+        self._motion(x, y)
+
+    def click(self, x: int, y: int, clicks: int = 1, button: str = 'left'):
+        self._motion(int(x), int(y))
+        for i in range(clicks):
+            if i:
+                time.sleep(0.05)
+            self._button(_BUTTONS[button])
+
+    def scroll(self, clicks: int, x: Optional[int] = None, y: Optional[int] = None):
+        if x is not None and y is not None:
+            self._motion(int(x), int(y))
+        button = 4 if clicks > 0 else 5  # X11滚轮：4向上，5向下
+        for _ in range(abs(int(clicks))):
+            self._button(button)
+
+    def drag(self, x1: int, y1: int, x2: int, y2: int, duration: float = 1.0):
+        self._motion(int(x1), int(y1))
+        self._button(1, release=False)
+        try:
+            self.move_to(x2, y2, duration=duration)
+        finally:
+            self._button(1, press=False)
+
+    # ---- 键盘 ----
+
+    def key_down(self, key: str):
+        self._key(x_key_name(key), release=False)
+
+    def key_up(self, key: str):
+        self._key(x_key_name(key), press=False)
+
+    def press(self, key: str):
+        self._key(x_key_name(key))
+
+    def typewrite(self, text: str, interval: float = 0.0):
+        if self._xlib is None:
+            self._xdotool('type', '--delay', str(int(interval * 1000)), '--', text)
+            return
+        for char in text:
+            self._key(_X_CHAR_NAMES.get(char, char))
+            if interval:
+                time.sleep(interval)
+
+    def close(self):
+        if self._xlib is not None:
+            self._xlib.close()
+            self._xlib = None
+
+    # ---- 底层实现 ----
+
+    def _xdotool(self, *args: str) -> str:
+        result = subprocess.run(['xdotool', *args], env=self._env, capture_output=True,
+                                text=True, timeout=10, check=True)
+        return result.stdout
+
+    def _motion(self, x: int, y: int):
+        if self._xlib is None:
+            self._xdotool('mousemove', str(x), str(y))
+            return
+        xtest.fake_input(self._xlib, X.MotionNotify, x=x, y=y)
+        self._xlib.sync()
+
+    def _button(self, button: int, press: bool = True, release: bool = True):
+        if self._xlib is None:
+            if press and release:
+                self._xdotool('click', str(button))
+            else:
+                self._xdotool('mousedown' if press else 'mouseup', str(button))
+            return
+        if press:
+            xtest.fake_input(self._xlib, X.ButtonPress, button)
+        if release:
+            xtest.fake_input(self._xlib, X.ButtonRelease, button)
+        self._xlib.sync()
+
+    def _key(self, keysym_name: str, press: bool = True, release: bool = True):
+        if self._xlib is None:
+            command = 'key' if press and release else ('keydown' if press else 'keyup')
+            self._xdotool(command, keysym_name)
+            return
+
+        keysym = XK.string_to_keysym(keysym_name)
+        if keysym == 0:
+            raise ValueError(f"未知按键: {keysym_name}")
+        keycodes = list(self._xlib.keysym_to_keycodes(keysym))
+        if not keycodes:
+            raise ValueError(f"显示器 {self.name} 的键盘映射中没有按键: {keysym_name}")
+        keycode, index = keycodes[0]
+        # 键盘映射第二列（index 1）的字符需要按住Shift，如大写字母和符号
+        shift = self._xlib.keysym_to_keycode(XK.string_to_keysym('Shift_L')) if index == 1 else None
+
+        if press:
+            if shift:
+                xtest.fake_input(self._xlib, X.KeyPress, shift)
+            xtest.fake_input(self._xlib, X.KeyPress, keycode)
+        if release:
+            xtest.fake_input(self._xlib, X.KeyRelease, keycode)
+            if shift:
+                xtest.fake_input(self._xlib, X.KeyRelease, shift)
+        self._xlib.sync()
+
+
+def create_display_context(display: Optional[str] = None) -> DisplayContext:
+    """
+    创建显示器上下文
+
+    Args:
+        display: X显示器名称（如 ":99"），为空时使用主显示器
+
+    Returns:
+        DisplayContext: 显示器上下文
+    """
+    if display:
+        return XDisplay(display)
+    return PrimaryDisplay()
@@ -0,0 +1,23 @@
+"""
+Client Headless Package - 无界面Agent运行时
+
+不依赖PyQt，在一个asyncio事件循环中运行多个Agent，可通过命令行或以守护进程方式批量执行指令。
+
+主要组件:
+- HeadlessAgent: 截图、分析、执行、完成度验证循环
+- HeadlessRuntime: 任务队列和多Agent调度
+- AgentRunResult: 单条指令的执行结果
+- AgentFarm: 启动多个Xvfb虚拟显示器，每个显示器运行一个Agent
+"""
+
+from .agent import HeadlessAgent, AgentRunResult
+from .runtime import HeadlessRuntime
+from .farm import AgentFarm, XvfbServer
+
+__all__ = [
+    'HeadlessAgent',
+    'AgentRunResult',
+    'HeadlessRuntime',
+    'AgentFarm',
+    'XvfbServer'
+]
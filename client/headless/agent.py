@@ -0,0 +1,396 @@
+"""
+无界面Agent - 在asyncio事件循环中完成 截图 → 服务端分析 → 执行 → 完成度验证 的循环，
+不依赖PyQt；截图和操作执行是阻塞调用，在线程池中运行，服务端请求期间不占用线程
+"""
+
+import asyncio
+import contextlib
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+# 添加项目根目录到Python路径
+import sys
+import os
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(project_root)
+
+from shared.schemas.data_models import ActionPlan, UIElement
+from client.automation.automation_engine import AutomationEngine, ExecutionResult, ExecutionStatus
+from client.automation.safety_controller import SafetyController
+from client.automation.task_completion_checker import TaskCompletionChecker
+from client.automation.action_trace import ActionTraceStore, TraceReplayer
+from client.communication.server_client import ServerClient, ServerClientError
+from client.screenshot.screenshot_manager import ScreenshotManager
+from client.display.display_context import DisplayContext
+from client.utils.environment_info import EnvironmentInfo
+from shared.schemas.serialization import parse_ui_elements
+from shared.utils.tracing import get_tracer
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AgentRunResult:
+    """一条指令的执行结果"""
+    task_id: str
+    command: str
+    status: str                      # completed / incomplete / failed / blocked / error / replayed
+    rounds: int = 0                  # 分析-执行-验证的轮数
+    actions_executed: int = 0
+    reasoning: Optional[str] = None
+    error: Optional[str] = None
+    timings: Dict[str, float] = field(default_factory=dict)  # 各阶段累计耗时（秒）
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.time()) - self.started_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'task_id': self.task_id,
+            'command': self.command,
+            'status': self.status,
+            'rounds': self.rounds,
+            'actions_executed': self.actions_executed,
+            'reasoning': self.reasoning,
+            'error': self.error,
+            'elapsed': round(self.elapsed, 3),
+            'timings': {stage: round(seconds, 3) for stage, seconds in self.timings.items()},
+        }
+
+
+class HeadlessAgent:
+    """单个显示器上的无界面Agent"""
+
+    def __init__(self, server_client: ServerClient, config: Optional[Dict] = None,
+                 screenshot_manager: Optional[ScreenshotManager] = None,
+                 engine: Optional[AutomationEngine] = None,
+                 safety_controller: Optional[SafetyController] = None,
+                 completion_checker: Optional[TaskCompletionChecker] = None,
+                 display_lock: Optional[asyncio.Lock] = None,
+                 display: Optional[DisplayContext] = None):
+        """
+        初始化Agent
+
+        Args:
+            server_client: 共享的服务端长连接
+            config: 配置字典
+            screenshot_manager: 截图管理器
+            engine: 自动化执行引擎
+            safety_controller: 安全控制器
+            completion_checker: 任务完成度验证器
+            display_lock: 同一显示器上多个Agent共用的锁，提供时整个任务（截图→分析→执行→验证）期间持有，
+                          否则其他Agent可能在分析期间改变焦点和窗口，使操作落到别的窗口中
+            display: 显示器上下文，默认操作主显示器；各Agent使用不同显示器时可完全并行
+        """
+        self.config = config or {}
+        self.name = self.config.get('name', 'agent')
+        self.server_client = server_client
+
+        self.max_rounds = self.config.get('max_rounds', 5)                      # 验证后继续执行的最多轮数
+        self.verify_completion = self.config.get('verify_completion', True)
+        self.allow_confirmation = self.config.get('allow_confirmation', False)  # 无人确认，默认不执行需要确认的操作
+        self.replay_traces = self.config.get('replay_traces', True)
+
+        self.display = display
+        self.screenshot_manager = screenshot_manager or ScreenshotManager(grab=display.grab if display else None)
+        self.engine = engine or AutomationEngine({
+            'display': display,
+            'failsafe': self.config.get('failsafe', True),
+            'pause_between_actions': 0.05,
+            'capture_screenshots': self.config.get('capture_screenshots', True),
+            'settle_timeout': self.config.get('settle_timeout', 3.0),
+            'strict_mode': self.config.get('strict_mode', False)
+        })
+        self.safety_controller = safety_controller or SafetyController({
+            'strict_mode': self.config.get('strict_mode', False),
+            'require_confirmation_for_medium': False,
+            'block_high_risk': False,
+            'block_critical_risk': True,
+            'screen_size': self.engine.screen_size
+        }, screen_size=self.engine.display.size)
+        # 验证截图单独做帧变化检测，不与分析截图共用截图管理器
+        self.completion_checker = completion_checker or TaskCompletionChecker(
+            ScreenshotManager(grab=display.grab) if display else None
+        )
+        self.trace_store = ActionTraceStore(self.config.get('trace_store'))
+        self.trace_replayer = TraceReplayer(self.engine, config={'screen_size': self.engine.screen_size})
+
+        self.display_lock = display_lock or asyncio.Lock()
+        self.shared_display = display_lock is not None
+        self._holding_display = False  # 当前任务已持有共享显示器锁
+        # 阻塞操作（截图、pyautogui）在Agent自己的线程中串行执行
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{self.name}-io")
+        self.environment = EnvironmentInfo(screen_size=self.engine.display.size)
+        self._analysis_frame = None  # 最近一次分析使用的截图帧，执行时用于校正点击位置
+
+        self.busy = False
+        self.stats = {'tasks': 0, 'completed': 0, 'failed': 0, 'replayed': 0, 'actions': 0,
+                      'task_time': 0.0, 'analysis_time': 0.0, 'execution_time': 0.0, 'verification_time': 0.0}
+
+    async def _in_thread(self, func, *args):
+        # 线程池不继承上下文变量，绑定当前trace上下文使线程中的span归入同一任务
+        return await asyncio.get_running_loop().run_in_executor(self._executor, get_tracer().bind(func), *args)
+
+    async def run_task(self, command: str, task_id: Optional[str] = None) -> AgentRunResult:
+        """
+        执行一条指令直到验证完成、失败或达到最大轮数
+
+        Args:
+            command: 用户指令
+            task_id: 任务ID，默认自动生成
+
+        Returns:
+            AgentRunResult: 执行结果
+        """
+        result = AgentRunResult(task_id=task_id or str(uuid.uuid4()), command=command, status='incomplete')
+        tracer = get_tracer()
+        with tracer.trace(result.task_id):
+            with tracer.span("task", agent=self.name) as span:
+                if self.shared_display:
+                    async with self.display_lock:
+                        self._holding_display = True
+                        try:
+                            await self._run(command, result)
+                        finally:
+                            self._holding_display = False
+                else:
+                    await self._run(command, result)
+                span.set(status=result.status, rounds=result.rounds)
+        tracer.finish(result.task_id)
+        return result
+
+    async def _run(self, command: str, result: AgentRunResult):
+        self.busy = True
+        self.stats['tasks'] += 1
+        try:
+            replayed_steps = await self._try_replay(command, result) if self.replay_traces else []
+            if result.status == 'replayed':
+                return
+
+            actions, elements, claude_output = await self._analyze(command, result)
+            if self.config.get('record_traces', True):
+                # 回放中途失败时，新轨迹保留已回放成功的步骤
+                self.engine.start_trace_recording(command, replayed_steps)
+
+            while actions is not None and result.rounds < self.max_rounds:
+                result.rounds += 1
+                if not await self._execute(actions, elements, result):
+                    break
+                if not self.verify_completion:
+                    result.status = 'completed'
+                    break
+                actions, elements, claude_output = await self._verify(command, claude_output, result)
+
+            if result.status == 'completed':
+                trace = self.engine.stop_trace_recording()
+                if trace is not None and trace.steps:
+                    self.trace_store.save(trace)
+        except ServerClientError as e:
+            result.status, result.error = 'error', f"服务端请求失败: {e}"
+        except Exception as e:
+            logger.exception(f"[{self.name}] 任务执行异常")
+            result.status, result.error = 'error', str(e)
+        finally:
+            self.engine.stop_trace_recording()
+            self.busy = False
+            result.finished_at = time.time()
+            self.stats['task_time'] += result.elapsed
+            self.stats['completed' if result.status in ('completed', 'replayed') else 'failed'] += 1
+            logger.info(f"[{self.name}] 任务 '{command}' 结束: {result.status}，耗时 {result.elapsed:.2f}s")
+
+    async def _try_replay(self, command: str, result: AgentRunResult) -> list:
+        """
+        同一指令有成功轨迹时在本地回放，全部完成时将结果状态设为 replayed
+
+        Returns:
+            list: 已回放成功的轨迹步骤
+        """
+        trace = self.trace_store.find(command, self.engine.screen_size)
+        if trace is None:
+            return []
+        actions = [ActionPlan(**step.action) for step in trace.steps]
+        if any(a.block_execution or a.requires_confirmation
+               for a in self.safety_controller.assess_plan_safety(actions)):
+            return []
+
+        start_time = time.time()
+        async with self._display_access():
+            replay = await self._in_thread(self.trace_replayer.replay, trace)
+        self._add_timing(result, 'replay', time.time() - start_time)
+        result.actions_executed += replay.completed_steps
+        if not replay.success:
+            logger.info(f"[{self.name}] 轨迹回放失败（{replay.reason}），改由服务端分析")
+            return trace.steps[:replay.completed_steps]
+        self.trace_store.save(trace)
+        self.stats['replayed'] += 1
+        result.status = 'replayed'
+        return trace.steps
+
+    def _display_access(self):
+        """截图和执行阶段的显示器锁；任务已持有共享锁时不再重复获取"""
+        return contextlib.nullcontext() if self._holding_display else self.display_lock
+
+    async def _capture_frame(self):
+        async with self._display_access():
+            return await self._in_thread(self.screenshot_manager.capture_frame)
+
+    async def _analyze(self, command: str, result: AgentRunResult):
+        """截图并请求服务端分析，返回 (操作列表, UI元素, Claude输出摘要)"""
+        frame = await self._capture_frame()
+        if frame is None:
+            result.status, result.error = 'error', "截图失败"
+            return None, [], None
+
+        screenshot_base64 = await self._in_thread(frame.to_base64)
+        start_time = time.time()
+        response = await self.server_client.request("analyze_task", {
+            "text_command": command,
+            "screenshot_base64": screenshot_base64,
+            "user_id": self.name,
+            "os_info": self.environment.os_info()
+        }, task_id=result.task_id)
+        elapsed = time.time() - start_time
+        self._add_timing(result, 'analysis', elapsed)
+        self.stats['analysis_time'] += elapsed
+
+        if response.get("type") != "analysis_result":
+            result.status = 'error'
+            result.error = response.get("message") or f"未知响应类型: {response.get('type')}"
+            return None, [], None
+        data = response.get("data", {})
+        if not data.get("success", False):
+            result.status, result.error = 'failed', data.get("error_message") or "服务端分析失败"
+            return None, [], None
+
+        actions = [ActionPlan(**action) for action in data.get("actions") or []]
+        elements = parse_ui_elements(data.get("ui_elements"))
+        result.reasoning = data.get("reasoning")
+        claude_output = f"推理过程: {result.reasoning}\n操作计划: {len(actions)}个步骤"
+        self._analysis_frame = frame
+        if not actions:
+            result.status = 'failed'
+            result.error = "服务端未生成操作计划"
+            return None, [], None
+        return actions, elements, claude_output
+
+    async def _execute(self, actions: List[ActionPlan], elements: List[UIElement], result: AgentRunResult) -> bool:
+        """安全评估后执行操作，返回是否全部执行成功"""
+        for assessment in self.safety_controller.assess_plan_safety(actions, elements):
+            if assessment.block_execution or (assessment.requires_confirmation and not self.allow_confirmation):
+                result.status = 'blocked'
+                result.error = assessment.warning_message or "操作需要确认，无界面模式下未执行"
+                return False
+
+        frame = self._analysis_frame if elements else None
+        self.engine.set_ui_elements(elements, frame.image if frame is not None else None)
+        start_time = time.time()
+        async with self._display_access():
+            results = await self._in_thread(self._execute_plan, actions)
+        elapsed = time.time() - start_time
+        self._add_timing(result, 'execution', elapsed)
+        self.stats['execution_time'] += elapsed
+
+        result.actions_executed += len(results)
+        self.stats['actions'] += len(results)
+        failed = [r for r in results if r.status != ExecutionStatus.SUCCESS]
+        if failed:
+            result.status = 'failed'
+            result.error = failed[0].error_message or f"操作 {failed[0].action_index} 执行失败"
+            return False
+        return True
+
+    def _execute_plan(self, actions: List[ActionPlan]) -> List[ExecutionResult]:
+        """在Agent线程中依次执行操作，失败时重试一次"""
+        results = []
+        for index, action in enumerate(actions):
+            execution = self.engine._execute_single_action(action, index)
+            if execution.status != ExecutionStatus.SUCCESS:
+                self.engine.wait_for_settle(action)
+                execution = self.engine._execute_single_action(action, index)
+            results.append(execution)
+            if execution.status != ExecutionStatus.SUCCESS:
+                break
+        return results
+
+    async def _verify(self, command: str, claude_output: str, result: AgentRunResult):
+        """
+        请求服务端验证任务完成度
+
+        Returns:
+            任务未完成且有后续操作时返回 (操作列表, UI元素, Claude输出摘要)，否则操作列表为None
+        """
+        start_time = time.time()
+        async with self._display_access():
+            check = await self._in_thread(
+                self.completion_checker.check_task_completion, result.task_id, command, claude_output
+            )
+        if not check.frame_changed:
+            result.status, result.error = 'incomplete', "屏幕自上次验证以来没有变化"
+            return None, [], claude_output
+        if not check.frame_payload or not check.verification_prompt:
+            result.status, result.error = 'error', "无法获取验证截图"
+            return None, [], claude_output
+
+        frame_payload = check.frame_payload
+        encoder = self.completion_checker.delta_encoder
+        for attempt in range(2):
+            response = await self.server_client.request("verify_task_completion", {
+                "original_command": command,
+                "previous_claude_output": claude_output,
+                "verification_prompt": check.verification_prompt,
+                **frame_payload
+            }, task_id=result.task_id)
+            if response.get("type") != "frame_resync" or attempt == 1:
+                break
+            frame_payload = encoder.resync()  # 服务端缺少参考帧，改发关键帧
+            if not frame_payload:
+                break
+        elapsed = time.time() - start_time
+        self._add_timing(result, 'verification', elapsed)
+        self.stats['verification_time'] += elapsed
+
+        if response.get("type") != "task_completion_result":
+            result.status = 'error'
+            result.error = response.get("message") or f"验证失败: {response.get('type')}"
+            return None, [], claude_output
+        encoder.acknowledge(frame_payload)
+
+        data = response.get("data", {})
+        status = data.get("status", "unclear")
+        result.reasoning = data.get("reasoning") or result.reasoning
+        if status == "completed":
+            result.status = 'completed'
+            return None, [], claude_output
+        if status != "incomplete":
+            result.status = 'failed' if status == "failed" else 'incomplete'
+            return None, [], claude_output
+
+        next_actions = data.get("next_actions")
+        if next_actions:
+            return [ActionPlan(**action) for action in next_actions], [], "继续执行验证后的操作指令"
+        if data.get("next_steps"):
+            # 只有文字建议时按新指令重新分析
+            return await self._analyze(data["next_steps"], result)
+        result.status = 'incomplete'
+        return None, [], claude_output
+
+    @staticmethod
+    def _add_timing(result: AgentRunResult, stage: str, seconds: float):
+        result.timings[stage] = result.timings.get(stage, 0.0) + seconds
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取Agent统计信息"""
+        finished = self.stats['completed'] + self.stats['failed']
+        return {'name': self.name, 'display': self.engine.display.name, 'busy': self.busy, **self.stats,
+                'average_task_time': self.stats['task_time'] / finished if finished else 0.0}
+
+    def close(self):
+        """释放Agent线程"""
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,187 @@
+"""
+多显示器Agent农场 - 启动N个Xvfb虚拟显示器，每个显示器运行一个Agent，
+所有Agent共用服务端连接池，任务由运行时队列分配给空闲Agent
+"""
+
+import asyncio
+import logging
+import os
+import shlex
+import subprocess
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# 添加项目根目录到Python路径
+import sys
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(project_root)
+
+from client.display.display_context import XDisplay
+from client.headless.agent import AgentRunResult, HeadlessAgent
+from client.headless.runtime import HeadlessRuntime
+
+logger = logging.getLogger(__name__)
+
+
+class XvfbServer:
+    """一个Xvfb虚拟显示器进程（可附带在该显示器上运行的会话程序，如窗口管理器或浏览器）"""
+
+    def __init__(self, number: int, screen_size: Tuple[int, int] = (1920, 1080), depth: int = 24,
+                 session_command: Optional[str] = None, startup_timeout: float = 10.0):
+        """
+        Args:
+            number: 显示器编号，对应 DISPLAY=":number"
+            screen_size: 分辨率 (width, height)
+            depth: 颜色深度
+            session_command: 显示器启动后在其上运行的命令
+            startup_timeout: 等待Xvfb就绪的最长时间（秒）
+        """
+        self.number = number
+        self.display = f":{number}"
+        self.screen_size = tuple(screen_size)
+        self.depth = depth
+        self.session_command = session_command
+        self.startup_timeout = startup_timeout
+
+        self.process: Optional[subprocess.Popen] = None
+        self.session: Optional[subprocess.Popen] = None
+
+    @property
+    def socket_path(self) -> str:
+        return f"/tmp/.X11-unix/X{self.number}"
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        """启动Xvfb并等待显示器可连接"""
+        if self.running:
+            return
+        if os.path.exists(f"/tmp/.X{self.number}-lock"):
+            raise RuntimeError(f"显示器 {self.display} 已被占用")
+
+        width, height = self.screen_size
+        self.process = subprocess.Popen(
+            ['Xvfb', self.display, '-screen', '0', f"{width}x{height}x{self.depth}", '-nolisten', 'tcp'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        deadline = time.time() + self.startup_timeout
+        while not os.path.exists(self.socket_path):
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Xvfb {self.display} 启动失败，退出码 {self.process.returncode}")
+            if time.time() > deadline:
+                self.stop()
+                raise RuntimeError(f"Xvfb {self.display} 启动超时")
+            time.sleep(0.05)
+
+        if self.session_command:
+            self.session = subprocess.Popen(
+                shlex.split(self.session_command), env={**os.environ, 'DISPLAY': self.display},
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+        logger.info(f"Xvfb {self.display} 已启动 ({width}x{height}, pid {self.process.pid})")
+
+    def stop(self):
+        """停止会话程序和Xvfb"""
+        for process in (self.session, self.process):
+            if process is None or process.poll() is not None:
+                continue
+            process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.session = None
+        self.process = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'display': self.display,
+            'running': self.running,
+            'pid': self.process.pid if self.process else None,
+            'session_running': self.session is not None and self.session.poll() is None,
+        }
+
+
+class AgentFarm:
+    """Xvfb多显示器Agent农场"""
+
+    def __init__(self, config: Optional[Dict] = None):
+        """
+        初始化农场
+
+        Args:
+            config: 配置字典，除以下字段外其余传给 HeadlessRuntime（server_url、queue_size、agent等）
+                displays: 显示器（Agent）数量
+                base_display: 第一个显示器的编号
+                screen_size: 虚拟显示器分辨率
+                session_command: 每个显示器启动后运行的命令
+                connections: 服务端连接数，默认每4个Agent一条
+        """
+        self.config = config or {}
+
+        self.display_count = self.config.get('displays', 2)
+        self.base_display = self.config.get('base_display', 99)
+        screen_size = tuple(self.config.get('screen_size', (1920, 1080)))
+
+        self.servers = [
+            XvfbServer(self.base_display + i, screen_size, self.config.get('depth', 24),
+                       self.config.get('session_command'), self.config.get('startup_timeout', 10.0))
+            for i in range(self.display_count)
+        ]
+        self.contexts: List[XDisplay] = []
+
+        # 每个显示器一个Agent，显示器之间不需要共享锁，截图和执行完全并行
+        self.runtime = HeadlessRuntime({
+            **self.config,
+            'agents': self.display_count,
+            'connections': self.config.get('connections', max(1, (self.display_count + 3) // 4)),
+        }, agent_factory=self._create_agent)
+
+    def _create_agent(self, index: int, server_client) -> HeadlessAgent:
+        agent_config = {**self.config.get('agent', {}), 'name': f"agent-{self.servers[index].display}"}
+        return HeadlessAgent(server_client, agent_config, display=self.contexts[index])
+
+    async def start(self):
+        """启动所有显示器，然后启动运行时"""
+        if self.contexts:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.gather(*(loop.run_in_executor(None, server.start) for server in self.servers))
+            self.contexts = [XDisplay(server.display) for server in self.servers]
+        except Exception:
+            self._stop_displays()
+            raise
+        await self.runtime.start()
+        logger.info(f"Agent农场已启动: {len(self.servers)} 个显示器 "
+                    f"({', '.join(server.display for server in self.servers)})")
+
+    async def submit(self, command: str, task_id: Optional[str] = None) -> asyncio.Future:
+        """提交指令到任务队列，由第一个空闲的Agent执行"""
+        if not self.contexts:
+            await self.start()
+        return await self.runtime.submit(command, task_id)
+
+    async def run(self, commands: List[str]) -> List[AgentRunResult]:
+        """执行一批指令并按提交顺序返回结果"""
+        futures = [await self.submit(command) for command in commands]
+        return list(await asyncio.gather(*futures))
+
+    async def stop(self):
+        """停止运行时和所有显示器"""
+        await self.runtime.stop()
+        self._stop_displays()
+        logger.info("Agent农场已停止")
+
+    def _stop_displays(self):
+        for context in self.contexts:
+            context.close()
+        self.contexts = []
+        for server in self.servers:
+            server.stop()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取农场统计信息（运行时统计加各显示器状态）"""
+        return {**self.runtime.get_stats(), 'displays': [server.get_stats() for server in self.servers]}
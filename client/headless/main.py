@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Computer Use Agent - 无界面客户端入口
+
+示例:
+    python client/headless/main.py -c "打开浏览器" -c "新建标签页"
+    python client/headless/main.py --commands-file tasks.txt --agents 2 --json
+    python client/headless/main.py --daemon < tasks.txt    # 从标准输入逐行读取指令
+    python client/headless/main.py --displays 4 --session-command firefox --daemon < tasks.txt  # Xvfb农场
+    python client/headless/main.py -c "打开浏览器" --trace-dir traces/  # 每个任务导出Chrome trace JSON
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import os
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(project_root)
+
+from client.headless.runtime import HeadlessRuntime
+from client.headless.farm import AgentFarm
+from shared.utils.tracing import configure_tracer
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Computer Use Agent 无界面客户端")
+    parser.add_argument("-c", "--command", action="append", default=[], help="要执行的指令，可重复")
+    parser.add_argument("--commands-file", help="指令文件，每行一条")
+    parser.add_argument("--daemon", action="store_true", help="守护模式：从标准输入持续读取指令")
+    parser.add_argument("--server", default="ws://localhost:8000/ws", help="服务端WebSocket地址")
+    parser.add_argument("--agents", type=int, default=1, help="Agent数量（共用主显示器，任务依次执行；并行执行请使用 --displays）")
+    parser.add_argument("--displays", type=int, default=0, help="启动的Xvfb虚拟显示器数量，每个显示器一个Agent")
+    parser.add_argument("--base-display", type=int, default=99, help="第一个虚拟显示器的编号")
+    parser.add_argument("--screen-size", default="1920x1080", help="虚拟显示器分辨率")
+    parser.add_argument("--session-command", help="每个虚拟显示器启动后运行的命令")
+    parser.add_argument("--connections", type=int, help="服务端连接数")
+    parser.add_argument("--metrics-interval", type=float, default=0, help="每隔多少秒向标准错误输出一次统计（JSON）")
+    parser.add_argument("--max-rounds", type=int, default=5, help="验证后继续执行的最多轮数")
+    parser.add_argument("--no-verify", action="store_true", help="执行后不请求完成度验证")
+    parser.add_argument("--no-replay", action="store_true", help="不回放已录制的操作轨迹")
+    parser.add_argument("--allow-confirmation", action="store_true", help="执行需要确认的操作（无人值守时慎用）")
+    parser.add_argument("--json", action="store_true", help="以JSON行输出每条指令的结果")
+    parser.add_argument("--trace-dir", help="按任务导出Chrome trace JSON的目录（默认读取环境变量 TRACE_DIR）")
+    parser.add_argument("--trace-collector", help="trace收集服务地址（默认读取环境变量 TRACE_COLLECTOR_URL）")
+    parser.add_argument("--log-level", default="INFO")
+    return parser.parse_args(argv)
+
+
+def build_config(args) -> dict:
+    config = {
+        'server_url': args.server,
+        'agents': args.agents,
+        'agent': {
+            'max_rounds': args.max_rounds,
+            'verify_completion': not args.no_verify,
+            'replay_traces': not args.no_replay,
+            'allow_confirmation': args.allow_confirmation,
+        }
+    }
+    if args.connections:
+        config['connections'] = args.connections
+    if args.displays:
+        width, height = (int(v) for v in args.screen_size.lower().split('x'))
+        config.update({
+            'displays': args.displays,
+            'base_display': args.base_display,
+            'screen_size': (width, height),
+            'session_command': args.session_command,
+        })
+    return config
+
+
+def print_result(result, as_json: bool):
+    if as_json:
+        print(json.dumps(result.to_dict(), ensure_ascii=False), flush=True)
+        return
+    icon = "✅" if result.status in ('completed', 'replayed') else "❌"
+    line = f"{icon} [{result.status}] {result.command} - {result.actions_executed} 个操作, 耗时 {result.elapsed:.2f}s"
+    if result.error:
+        line += f" ({result.error})"
+    print(line, flush=True)
+
+
+async def run_batch(runtime: HeadlessRuntime, commands, as_json: bool) -> int:
+    futures = [await runtime.submit(command) for command in commands]
+    failures = 0
+    for future in asyncio.as_completed(futures):
+        result = await future
+        print_result(result, as_json)
+        failures += result.status not in ('completed', 'replayed')
+    return failures
+
+
+async def run_daemon(runtime: HeadlessRuntime, as_json: bool) -> int:
+    """逐行读取标准输入，每条指令提交后立即读取下一条，结果完成时输出"""
+    loop = asyncio.get_running_loop()
+    pending = set()
+    while True:
+        line = await loop.run_in_executor(None, sys.stdin.readline)
+        if not line:
+            break
+        command = line.strip()
+        if not command:
+            continue
+        future = await runtime.submit(command)
+        future.add_done_callback(
+            lambda f: print_result(f.result(), as_json) if not f.cancelled() and f.exception() is None else None
+        )
+        pending.add(future)
+        pending = {f for f in pending if not f.done()}
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    return 0
+
+
+async def report_metrics(runtime, interval: float):
+    """定期输出运行时统计（各Agent指标、队列长度、连接状态）"""
+    while True:
+        await asyncio.sleep(interval)
+        print(json.dumps(runtime.get_stats(), ensure_ascii=False, default=str), file=sys.stderr, flush=True)
+
+
+async def async_main(args) -> int:
+    commands = list(args.command)
+    if args.commands_file:
+        with open(args.commands_file, 'r', encoding='utf-8') as f:
+            commands.extend(line.strip() for line in f if line.strip())
+    if not commands and not args.daemon:
+        print("❌ 没有要执行的指令（使用 -c、--commands-file 或 --daemon）")
+        return 2
+
+    config = build_config(args)
+    runtime = AgentFarm(config) if args.displays else HeadlessRuntime(config)
+    await runtime.start()
+    reporter = asyncio.create_task(report_metrics(runtime, args.metrics_interval)) if args.metrics_interval > 0 else None
+    try:
+        if args.daemon:
+            return await run_daemon(runtime, args.json)
+        return 1 if await run_batch(runtime, commands, args.json) else 0
+    finally:
+        if reporter:
+            reporter.cancel()
+        stats = runtime.get_stats()
+        if not args.json:
+            print(f"📊 完成 {stats['finished']} 条指令，成功 {stats['succeeded']} 条，"
+                  f"吞吐量 {stats['throughput_per_min']:.1f} 条/分钟")
+        await runtime.stop()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.INFO),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    configure_tracer("client", directory=args.trace_dir, collector_url=args.trace_collector)
+    try:
+        sys.exit(asyncio.run(async_main(args)))
+    except KeyboardInterrupt:
+        print("\n👋 无界面客户端已停止")
+
+
+if __name__ == "__main__":
+    main()
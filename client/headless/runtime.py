@@ -0,0 +1,145 @@
+"""
+无界面运行时 - 在一个asyncio事件循环中调度多个Agent，任务从队列中分配给空闲Agent，
+所有Agent共用服务端长连接（按request_id多路复用，可配置为多条连接的连接池）
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+# 添加项目根目录到Python路径
+import sys
+import os
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(project_root)
+
+from client.communication.server_client import ServerClient, ServerClientPool
+from client.headless.agent import AgentRunResult, HeadlessAgent
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QueuedTask:
+    """队列中等待执行的指令"""
+    command: str
+    future: asyncio.Future
+    task_id: Optional[str] = None
+    queued_at: float = field(default_factory=time.time)
+
+
+class HeadlessRuntime:
+    """多Agent无界面运行时"""
+
+    def __init__(self, config: Optional[Dict] = None,
+                 agent_factory: Optional[Callable[[int, ServerClient], HeadlessAgent]] = None):
+        """
+        初始化运行时
+
+        Args:
+            config: 配置字典
+            agent_factory: 创建第 i 个Agent的函数，默认所有Agent操作同一个显示器
+        """
+        self.config = config or {}
+
+        self.server_url = self.config.get('server_url', 'ws://localhost:8000/ws')
+        self.agent_count = self.config.get('agents', 1)
+        self.queue_size = self.config.get('queue_size', 0)  # 0表示不限制
+        self.connections = self.config.get('connections', 1)
+
+        client_config = self.config.get('client', {
+            'max_in_flight': max(8, self.agent_count * 2 // self.connections)
+        })
+        if self.connections > 1:
+            self.server_client = ServerClientPool(self.server_url, self.connections, client_config)
+        else:
+            self.server_client = ServerClient(self.server_url, client_config)
+        self._agent_factory = agent_factory or self._default_agent
+        self._shared_display_lock: Optional[asyncio.Lock] = None
+
+        self.agents: List[HeadlessAgent] = []
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._started_at: Optional[float] = None
+        self._finished = 0
+        self._succeeded = 0
+
+    def _default_agent(self, index: int, server_client: ServerClient) -> HeadlessAgent:
+        # 同一显示器上的Agent共用一把锁，每个任务整轮持有：任务之间串行，只有使用不同显示器（--displays）时才能并行
+        if self._shared_display_lock is None:
+            self._shared_display_lock = asyncio.Lock()
+        agent_config = {**self.config.get('agent', {}), 'name': f"agent-{index}"}
+        return HeadlessAgent(server_client, agent_config, display_lock=self._shared_display_lock)
+
+    async def start(self):
+        """建立服务端连接并启动Agent"""
+        if self._workers:
+            return
+        self._started_at = time.time()
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self.server_client.start()
+        self.agents = [self._agent_factory(i, self.server_client) for i in range(self.agent_count)]
+        self._workers = [asyncio.create_task(self._worker(agent)) for agent in self.agents]
+        logger.info(f"无界面运行时已启动: {len(self.agents)} 个Agent, 服务端 {self.server_url}")
+
+    async def _worker(self, agent: HeadlessAgent):
+        """Agent循环：从队列取出指令并执行"""
+        while True:
+            queued = await self._queue.get()
+            try:
+                if queued.future.cancelled():
+                    continue
+                result = await agent.run_task(queued.command, queued.task_id)
+                result.timings['queue_wait'] = result.started_at - queued.queued_at
+                self._finished += 1
+                self._succeeded += result.status in ('completed', 'replayed')
+                if not queued.future.done():
+                    queued.future.set_result(result)
+            except Exception as e:
+                if not queued.future.done():
+                    queued.future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    async def submit(self, command: str, task_id: Optional[str] = None) -> asyncio.Future:
+        """
+        提交指令（队列有上限且已满时等待）
+
+        Returns:
+            asyncio.Future: 结果为 AgentRunResult
+        """
+        if not self._workers:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(QueuedTask(command, future, task_id))
+        return future
+
+    async def run(self, commands: List[str]) -> List[AgentRunResult]:
+        """执行一批指令并按提交顺序返回结果"""
+        futures = [await self.submit(command) for command in commands]
+        return list(await asyncio.gather(*futures))
+
+    async def stop(self):
+        """停止Agent并断开服务端连接"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for agent in self.agents:
+            agent.close()
+        await self.server_client.disconnect()
+        logger.info("无界面运行时已停止")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取运行时统计信息"""
+        elapsed = time.time() - self._started_at if self._started_at else 0.0
+        return {
+            'agents': [agent.get_stats() for agent in self.agents],
+            'queued': self._queue.qsize() if self._queue else 0,
+            'finished': self._finished,
+            'succeeded': self._succeeded,
+            'throughput_per_min': self._finished / elapsed * 60 if elapsed > 0 else 0.0,
+            'connection': self.server_client.get_stats(),
+        }
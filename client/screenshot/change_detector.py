@@ -0,0 +1,126 @@
+"""
+帧变化检测 - 基于降采样亮度网格的哈希和逐格差异，判断屏幕是否变化并给出变化区域
+"""
+
+import hashlib
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+Rect = Tuple[int, int, int, int]  # (x1, y1, x2, y2)，原始分辨率像素坐标
+
+
+@dataclass
+class FrameChange:
+    """与上一帧相比的变化信息"""
+    changed: bool
+    frame_hash: str
+    changed_ratio: float = 0.0  # 变化网格占比
+    dirty_rects: List[Rect] = field(default_factory=list)
+
+
+class FrameChangeDetector:
+    """帧变化检测器，输入为 CapturedFrame.fingerprint() 生成的亮度网格"""
+
+    def __init__(self, grid_size: Tuple[int, int], config: Optional[Dict] = None):
+        """
+        初始化变化检测器
+
+        Args:
+            grid_size: 亮度网格尺寸 (列数, 行数)
+            config: 配置字典
+        """
+        self.config = config or {}
+        self.grid_w, self.grid_h = grid_size
+
+        self.cell_threshold = self.config.get('cell_threshold', 8)    # 单格亮度差超过该值视为变化
+        self.min_changed_cells = self.config.get('min_changed_cells', 1)
+        self.max_rects = self.config.get('max_rects', 8)              # 变化区域过多时合并为一个外接矩形
+        self.hash_quantization = self.config.get('hash_quantization', 4)  # 哈希前丢弃的低位数，吸收噪声
+
+        self._previous: Optional[bytes] = None
+        self._previous_hash: Optional[str] = None
+
+    def reset(self):
+        """清除参考帧，下一帧视为变化"""
+        self._previous = None
+        self._previous_hash = None
+
+    def frame_hash(self, fingerprint: bytes) -> str:
+        """量化亮度网格的哈希，相同哈希视为未变化"""
+        shift = self.hash_quantization
+        quantized = bytes(v >> shift for v in fingerprint)
+        return hashlib.blake2b(quantized, digest_size=8).hexdigest()
+
+    def detect(self, fingerprint: bytes, frame_size: Tuple[int, int]) -> FrameChange:
+        """
+        检测当前帧相对上一帧的变化，并将当前帧作为新的参考帧
+
+        Args:
+            fingerprint: 亮度网格字节
+            frame_size: 原始帧尺寸 (width, height)
+
+        Returns:
+            FrameChange: 变化信息
+        """
+        current_hash = self.frame_hash(fingerprint)
+        previous = self._previous
+        previous_hash = self._previous_hash
+        self._previous = fingerprint
+        self._previous_hash = current_hash
+
+        if previous is None or len(previous) != len(fingerprint):
+            return FrameChange(changed=True, frame_hash=current_hash, changed_ratio=1.0,
+                               dirty_rects=[(0, 0, frame_size[0], frame_size[1])])
+        if current_hash == previous_hash:
+            return FrameChange(changed=False, frame_hash=current_hash)
+
+        threshold = self.cell_threshold
+        dirty = [abs(a - b) > threshold for a, b in zip(fingerprint, previous)]
+        changed_cells = sum(dirty)
+        if changed_cells < self.min_changed_cells:
+            return FrameChange(changed=False, frame_hash=current_hash)
+
+        return FrameChange(
+            changed=True,
+            frame_hash=current_hash,
+            changed_ratio=changed_cells / len(dirty),
+            dirty_rects=self._dirty_rects(dirty, frame_size)
+        )
+
+    def _dirty_rects(self, dirty: List[bool], frame_size: Tuple[int, int]) -> List[Rect]:
+        """将变化网格按4邻域连通分组，输出每组的外接矩形（原始分辨率）"""
+        grid_w, grid_h = self.grid_w, self.grid_h
+        seen = [False] * len(dirty)
+        boxes = []
+
+        for start, is_dirty in enumerate(dirty):
+            if not is_dirty or seen[start]:
+                continue
+            seen[start] = True
+            queue = deque([start])
+            gx1 = gx2 = start % grid_w
+            gy1 = gy2 = start // grid_w
+            while queue:
+                index = queue.popleft()
+                x, y = index % grid_w, index // grid_w
+                gx1, gx2 = min(gx1, x), max(gx2, x)
+                gy1, gy2 = min(gy1, y), max(gy2, y)
+                for nx, ny in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+                    if 0 <= nx < grid_w and 0 <= ny < grid_h:
+                        neighbor = ny * grid_w + nx
+                        if dirty[neighbor] and not seen[neighbor]:
+                            seen[neighbor] = True
+                            queue.append(neighbor)
+            boxes.append((gx1, gy1, gx2 + 1, gy2 + 1))
+
+        if len(boxes) > self.max_rects:
+            boxes = [(min(b[0] for b in boxes), min(b[1] for b in boxes),
+                      max(b[2] for b in boxes), max(b[3] for b in boxes))]
+
+        width, height = frame_size
+        return [
+            (gx1 * width // grid_w, gy1 * height // grid_h,
+             min(width, -(-gx2 * width // grid_w)), min(height, -(-gy2 * height // grid_h)))
+            for gx1, gy1, gx2, gy2 in boxes
+        ]
@@ -0,0 +1,257 @@
+"""
+截图编码策略 - 根据实测上传吞吐量、屏幕像素密度和服务端识别精度需求，
+为每一帧选择传输分辨率、缩放滤波器以及编码格式和质量
+"""
+
+import base64
+import io
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, features
+
+# 重采样方式
+RESAMPLE_NONE = "none"        # 保持原始分辨率
+RESAMPLE_REDUCE = "reduce"    # 整数倍盒式降采样（最快）
+RESAMPLE_LANCZOS = "lanczos"  # 先整数倍降采样再LANCZOS（reducing_gap）
+
+# 候选编码，按画质从高到低排列；每字节像素比的先验值针对桌面界面截图
+_CANDIDATES: List[Tuple[str, int]] = [
+    ("PNG", 0),
+    ("WEBP", 90),
+    ("JPEG", 85),
+    ("WEBP", 75),
+    ("JPEG", 70),
+    ("WEBP", 60),
+]
+_BYTES_PER_PIXEL_PRIOR = {
+    ("PNG", 0): 0.60,
+    ("WEBP", 90): 0.16,
+    ("JPEG", 85): 0.22,
+    ("WEBP", 75): 0.10,
+    ("JPEG", 70): 0.15,
+    ("WEBP", 60): 0.08,
+}
+# 每百万像素编码耗时先验（秒）
+_ENCODE_SECONDS_PER_MP_PRIOR = {
+    "PNG": 0.045,
+    "WEBP": 0.100,
+    "JPEG": 0.030,
+}
+
+
+@dataclass
+class EncodingDecision:
+    """单帧编码决策"""
+    size: Tuple[int, int]
+    resample: str
+    codec: str        # JPEG / WEBP / PNG
+    quality: int      # PNG时为0
+    reason: str = ""
+
+    @property
+    def key(self) -> Tuple[str, int]:
+        return (self.codec, self.quality)
+
+
+class ThroughputEstimator:
+    """上传吞吐量的指数加权移动平均"""
+
+    def __init__(self, alpha: float = 0.3, min_bytes: int = 16 * 1024):
+        self.alpha = alpha
+        self.min_bytes = min_bytes  # 过小的消息主要反映延迟而非带宽，不计入
+        self._value: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record(self, num_bytes: int, seconds: float):
+        """记录一次上传（字节数，耗时秒）"""
+        if num_bytes < self.min_bytes or seconds <= 0:
+            return
+        sample = num_bytes / seconds
+        with self._lock:
+            self._value = sample if self._value is None else self.alpha * sample + (1 - self.alpha) * self._value
+
+    @property
+    def bytes_per_second(self) -> Optional[float]:
+        with self._lock:
+            return self._value
+
+
+class EncodingPolicy:
+    """截图编码策略引擎"""
+
+    def __init__(self, config: Optional[Dict] = None):
+        """
+        初始化编码策略
+
+        Args:
+            config: 配置字典
+        """
+        self.config = config or {}
+
+        # 识别精度需求：界面文字在原始屏幕上约 base_text_px * device_scale 像素高，
+        # 缩小后不能低于OCR/检测模型可靠识别的 min_text_px
+        self.base_text_px = self.config.get('base_text_px', 13)
+        self.min_text_px = self.config.get('min_text_px', 8)
+        self.device_scale = self.config.get('device_scale', 1.0)      # 屏幕像素密度（物理像素/逻辑像素）
+        self.target_short_edge = self.config.get('target_short_edge', 720)
+        self.max_short_edge = self.config.get('max_short_edge', 1080)  # 链路充裕时允许的最大短边
+        self.max_long_edge = self.config.get('max_long_edge', 2560)
+        self.target_upload_seconds = self.config.get('target_upload_seconds', 0.3)  # 单帧编码+上传的目标耗时
+        self.fast_link_bytes_per_second = self.config.get('fast_link_bytes_per_second', 8 * 1024 * 1024)
+        self.integer_snap_tolerance = self.config.get('integer_snap_tolerance', 0.12)  # 接近整数倍时改用reduce
+        self.allow_png = self.config.get('allow_png', True)
+        self.allow_webp = self.config.get('allow_webp', True) and features.check('webp')
+        self.default_codec = tuple(self.config.get('default_codec', ("JPEG", 85)))  # 吞吐量未知时使用
+
+        self.throughput = ThroughputEstimator(self.config.get('throughput_alpha', 0.3))
+        self._lock = threading.Lock()
+        self._bytes_per_pixel = dict(_BYTES_PER_PIXEL_PRIOR)
+        self._encode_seconds_per_mp = dict(_ENCODE_SECONDS_PER_MP_PRIOR)
+        self._stats = {'frames': 0, 'bytes': 0, 'encode_seconds': 0.0}
+
+    def set_device_scale(self, scale: float):
+        """设置屏幕像素密度"""
+        self.device_scale = max(1.0, scale)
+
+    def record_upload(self, num_bytes: int, seconds: float):
+        """记录一次上传，用于估计链路吞吐量"""
+        self.throughput.record(num_bytes, seconds)
+
+    def decide(self, source_size: Tuple[int, int]) -> EncodingDecision:
+        """
+        为一帧选择编码参数
+
+        Args:
+            source_size: 原始截图尺寸 (width, height)
+
+        Returns:
+            EncodingDecision: 编码决策
+        """
+        width, height = source_size
+        short_edge, long_edge = min(width, height), max(width, height)
+        throughput = self.throughput.bytes_per_second
+
+        # 1. 清晰度下限：文字缩小后仍需达到 min_text_px
+        min_scale = min(1.0, self.min_text_px / (self.base_text_px * self.device_scale))
+
+        # 2. 目标分辨率：吞吐量充裕时保留更多细节，保持原始宽高比
+        target_short = self.max_short_edge if throughput and throughput >= self.fast_link_bytes_per_second \
+            else self.target_short_edge
+        scale = min(1.0, target_short / short_edge, self.max_long_edge / long_edge)
+        scale = max(scale, min_scale)
+
+        # 3. 在链路预算内选择画质最高的编码，放不下时逐步缩小到清晰度下限
+        reason = "default" if throughput is None else f"throughput {throughput / 1024:.0f}KB/s"
+        while True:
+            scale, resample = self._snap_scale(scale, min_scale)
+            size = self._scaled_size(width, height, scale)
+            predictions = self._predict(size, throughput)
+            codec = self._pick_codec(predictions)
+            if codec is not None or scale <= min_scale:
+                break
+            scale = max(min_scale, scale * 0.8)
+
+        if codec is None:
+            # 清晰度下限处仍超出预算，选择预测耗时最短的编码
+            codec = min(predictions, key=lambda item: item[1])[0]
+            reason += ", link budget exceeded at detail floor"
+
+        return EncodingDecision(size=size, resample=resample, codec=codec[0], quality=codec[1], reason=reason)
+
+    def _snap_scale(self, scale: float, min_scale: float) -> Tuple[float, str]:
+        """缩放比例接近 1/k 且不低于清晰度下限时对齐到整数倍降采样（reduce 快速路径）"""
+        if scale >= 1.0:
+            return 1.0, RESAMPLE_NONE
+        factor = round(1 / scale)
+        if factor >= 2 and 1 / factor >= min_scale and abs(1 / scale - factor) <= self.integer_snap_tolerance * factor:
+            return 1 / factor, RESAMPLE_REDUCE
+        return scale, RESAMPLE_LANCZOS
+
+    @staticmethod
+    def _scaled_size(width: int, height: int, scale: float) -> Tuple[int, int]:
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    def _predict(self, size: Tuple[int, int], throughput: Optional[float]) -> List[Tuple[Tuple[str, int], float]]:
+        """预测各候选编码的编码+上传耗时（按画质从高到低），吞吐量未知时只包含默认编码"""
+        if throughput is None:
+            return [(self.default_codec, 0.0)]
+        megapixels = size[0] * size[1] / 1e6
+        predictions = []
+        with self._lock:
+            for codec in _CANDIDATES:
+                if codec[0] == "PNG" and not self.allow_png:
+                    continue
+                if codec[0] == "WEBP" and not self.allow_webp:
+                    continue
+                predicted_bytes = self._bytes_per_pixel[codec] * size[0] * size[1] * 4 / 3  # base64膨胀
+                predictions.append(
+                    (codec, predicted_bytes / throughput + self._encode_seconds_per_mp[codec[0]] * megapixels))
+        return predictions
+
+    def _pick_codec(self, predictions: List[Tuple[Tuple[str, int], float]]) -> Optional[Tuple[str, int]]:
+        """选择画质最高且不超出预算的编码"""
+        for codec, predicted in predictions:
+            if predicted <= self.target_upload_seconds:
+                return codec
+        return None
+
+    def resize(self, image: Image.Image, decision: EncodingDecision) -> Image.Image:
+        """按决策缩放图像"""
+        if decision.resample == RESAMPLE_NONE or image.size == decision.size:
+            return image
+        if decision.resample == RESAMPLE_REDUCE:
+            factor = round(image.width / decision.size[0])
+            reduced = image.reduce(factor)
+            if reduced.size == decision.size:
+                return reduced
+            return reduced.resize(decision.size, Image.Resampling.BILINEAR)
+        return image.resize(decision.size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+    def encode(self, image: Image.Image, decision: EncodingDecision) -> str:
+        """
+        按决策编码为base64，并用实际大小和耗时校准后续预测
+
+        Args:
+            image: 已缩放的RGB图像
+            decision: 编码决策
+
+        Returns:
+            str: base64编码
+        """
+        start_time = time.time()
+        buffer = io.BytesIO()
+        if decision.codec == "PNG":
+            image.save(buffer, format='PNG', compress_level=1)
+        elif decision.codec == "WEBP":
+            image.save(buffer, format='WEBP', quality=decision.quality, method=2)
+        else:
+            image.save(buffer, format='JPEG', quality=decision.quality, optimize=True)
+        data = buffer.getvalue()
+        elapsed = time.time() - start_time
+
+        pixels = image.width * image.height
+        with self._lock:
+            alpha = 0.3
+            self._bytes_per_pixel[decision.key] = (
+                alpha * len(data) / pixels + (1 - alpha) * self._bytes_per_pixel[decision.key])
+            self._encode_seconds_per_mp[decision.codec] = (
+                alpha * elapsed / (pixels / 1e6) + (1 - alpha) * self._encode_seconds_per_mp[decision.codec])
+            self._stats['frames'] += 1
+            self._stats['bytes'] += len(data)
+            self._stats['encode_seconds'] += elapsed
+
+        return base64.b64encode(data).decode()
+
+    def get_stats(self) -> Dict:
+        """获取编码统计信息"""
+        throughput = self.throughput.bytes_per_second
+        with self._lock:
+            return {
+                **self._stats,
+                'throughput_bytes_per_second': throughput,
+                'device_scale': self.device_scale,
+                'bytes_per_pixel': {f"{c}@{q}": round(v, 4) for (c, q), v in self._bytes_per_pixel.items()},
+            }
@@ -0,0 +1,217 @@
+"""
+增量帧编码 - 相对服务端已确认的参考帧只上传变化的图块（zlib压缩的原始像素），
+服务端在会话帧缓冲中重建完整截图；定期发送关键帧并用校验和发现漂移
+"""
+
+import base64
+import io
+import logging
+import threading
+import uuid
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image, ImageChops
+
+from shared.schemas.data_models import FrameDelta, FrameTile
+from shared.utils.tracing import get_tracer
+
+logger = logging.getLogger(__name__)
+
+Box = Tuple[int, int, int, int]  # (x1, y1, x2, y2)，传输分辨率像素坐标
+
+
+def payload_frame_id(payload: Dict[str, Any]) -> Optional[int]:
+    """获取上传数据（关键帧或增量帧）对应的帧ID"""
+    if payload.get('frame_delta'):
+        return payload['frame_delta']['frame_id']
+    return payload.get('frame_id')
+
+
+class DeltaFrameEncoder:
+    """
+    增量帧编码器，输入为 CapturedFrame
+
+    参考帧只在服务端成功响应后通过 acknowledge 确认，之后的增量帧都相对最近确认的帧计算。
+    每个参考帧保存两份图像：
+    - 重建帧：与服务端完全一致（关键帧为解码后的JPEG，增量帧为粘贴图块后的结果），用于crc32校验
+    - 源帧：未经JPEG压缩的对应图像，用于变化检测，避免把关键帧的压缩误差当作变化
+    """
+
+    def __init__(self, config: Optional[Dict] = None):
+        """
+        初始化增量帧编码器
+
+        Args:
+            config: 配置字典
+        """
+        self.config = config or {}
+
+        self.session_id = self.config.get('session_id') or uuid.uuid4().hex
+        self.enabled = self.config.get('enabled', True)
+        self.tile_size = self.config.get('tile_size', 64)
+        self.pixel_threshold = self.config.get('pixel_threshold', 8)       # 任一通道差异超过该值视为变化
+        self.keyframe_interval = self.config.get('keyframe_interval', 30)  # 连续增量帧上限，之后强制关键帧
+        self.max_delta_ratio = self.config.get('max_delta_ratio', 0.4)     # 变化图块占比超过该值时关键帧更小
+        self.compression_level = self.config.get('compression_level', 6)
+        self.max_consecutive_resyncs = self.config.get('max_consecutive_resyncs', 3)  # 反复失配时退回纯关键帧
+
+        self._lock = threading.Lock()
+        self._threshold_lut = [255 if v > self.pixel_threshold else 0 for v in range(256)]
+        self._acked_id: Optional[int] = None
+        self._acked_image: Optional[Image.Image] = None
+        self._acked_source: Optional[Image.Image] = None
+        # frame_id -> (重建帧, 源帧, 是否增量帧)
+        self._pending: "OrderedDict[int, Tuple[Image.Image, Image.Image, bool]]" = OrderedDict()
+        self._last_frame = None
+        self._deltas_since_keyframe = 0
+        self._force_keyframe = False
+        self._consecutive_resyncs = 0
+        self._stats = {'keyframes': 0, 'deltas': 0, 'tiles': 0, 'keyframe_bytes': 0, 'delta_bytes': 0, 'resyncs': 0}
+
+    def encode(self, frame) -> Dict[str, Any]:
+        """
+        编码一帧
+
+        Args:
+            frame: CapturedFrame
+
+        Returns:
+            Dict[str, Any]: 合并到请求data中的字段，关键帧为 screenshot_base64/session_id/frame_id，
+                            增量帧为 frame_delta
+        """
+        with get_tracer().span("frame_encode", frame_id=frame.frame_id) as span:
+            payload = self._encode(frame)
+            span.set(kind='delta' if payload.get('frame_delta') else 'keyframe')
+            return payload
+
+    def _encode(self, frame) -> Dict[str, Any]:
+        current = frame.wire_image()
+        with self._lock:
+            self._last_frame = frame
+            reference = self._acked_image
+            source = self._acked_source
+            if (not self.enabled or self._force_keyframe or reference is None
+                    or reference.size != current.size
+                    or self._deltas_since_keyframe >= self.keyframe_interval):
+                return self._keyframe(frame)
+
+            boxes = self._changed_tiles(source, current)
+            total_tiles = -(-current.width // self.tile_size) * -(-current.height // self.tile_size)
+            if len(boxes) / total_tiles > self.max_delta_ratio:
+                return self._keyframe(frame)
+
+            reconstructed = reference.copy()
+            # 源帧只更新变化图块，缓慢的亚阈值变化会累积到超过阈值后被发现
+            new_source = source.copy()
+            tiles: List[FrameTile] = []
+            delta_bytes = 0
+            for box in boxes:
+                patch = current.crop(box)
+                reconstructed.paste(patch, box[:2])
+                new_source.paste(patch, box[:2])
+                data = base64.b64encode(zlib.compress(patch.tobytes(), self.compression_level)).decode()
+                delta_bytes += len(data)
+                tiles.append(FrameTile(x=box[0], y=box[1], width=box[2] - box[0],
+                                       height=box[3] - box[1], data_base64=data))
+
+            delta = FrameDelta(
+                session_id=self.session_id,
+                frame_id=frame.frame_id,
+                base_frame_id=self._acked_id,
+                width=current.width,
+                height=current.height,
+                tiles=tiles,
+                checksum=zlib.crc32(reconstructed.tobytes())
+            )
+            self._remember(frame.frame_id, reconstructed, new_source, is_delta=True)
+            self._deltas_since_keyframe += 1
+            self._stats['deltas'] += 1
+            self._stats['tiles'] += len(tiles)
+            self._stats['delta_bytes'] += delta_bytes
+            logger.debug(f"Delta frame {frame.frame_id}: {len(tiles)}/{total_tiles} tiles, {delta_bytes} bytes")
+            return {'frame_delta': delta.model_dump()}
+
+    def acknowledge(self, payload: Dict[str, Any]):
+        """服务端成功处理上传数据后调用，将其重建帧确认为新的参考帧"""
+        frame_id = payload_frame_id(payload)
+        with self._lock:
+            entry = self._pending.get(frame_id)
+            if entry is None:
+                return
+            self._acked_id = frame_id
+            self._acked_image, self._acked_source, is_delta = entry
+            for pending_id in list(self._pending):
+                if pending_id <= frame_id:
+                    del self._pending[pending_id]
+            if is_delta:
+                self._consecutive_resyncs = 0
+
+    def resync(self) -> Optional[Dict[str, Any]]:
+        """
+        服务端要求重新同步时调用，丢弃参考帧并将最近一帧重新编码为关键帧
+
+        Returns:
+            Optional[Dict[str, Any]]: 关键帧上传数据，没有可用帧时返回None
+        """
+        with self._lock:
+            self._stats['resyncs'] += 1
+            self._consecutive_resyncs += 1
+            if self.enabled and self._consecutive_resyncs >= self.max_consecutive_resyncs:
+                # 双方解码的关键帧不一致时增量帧永远无法通过校验，退回每次发送完整截图
+                logger.warning("Delta frames keep failing checksum verification, falling back to keyframes only")
+                self.enabled = False
+            self._acked_id = None
+            self._acked_image = None
+            self._acked_source = None
+            self._pending.clear()
+            if self._last_frame is None:
+                self._force_keyframe = True
+                return None
+            return self._keyframe(self._last_frame)
+
+    def _keyframe(self, frame) -> Dict[str, Any]:
+        """编码关键帧（需持有锁），参考帧为解码后的JPEG，与服务端解码结果一致"""
+        screenshot_base64 = frame.to_base64()
+        reference = Image.open(io.BytesIO(base64.b64decode(screenshot_base64))).convert('RGB')
+        self._remember(frame.frame_id, reference, frame.wire_image(), is_delta=False)
+        self._deltas_since_keyframe = 0
+        self._force_keyframe = False
+        self._stats['keyframes'] += 1
+        self._stats['keyframe_bytes'] += len(screenshot_base64)
+        return {
+            'screenshot_base64': screenshot_base64,
+            'session_id': self.session_id,
+            'frame_id': frame.frame_id
+        }
+
+    def _remember(self, frame_id: int, image: Image.Image, source: Image.Image, is_delta: bool):
+        """保存待确认的重建帧和源帧（需持有锁），只保留最近几帧"""
+        self._pending[frame_id] = (image, source, is_delta)
+        while len(self._pending) > 4:
+            self._pending.popitem(last=False)
+
+    def _changed_tiles(self, source: Image.Image, current: Image.Image) -> List[Box]:
+        """按图块比较参考源帧和当前帧，返回变化图块"""
+        diff = ImageChops.difference(source, current)
+        red, green, blue = diff.split()
+        mask = ImageChops.lighter(ImageChops.lighter(red, green), blue).point(self._threshold_lut)
+        if mask.getbbox() is None:
+            return []
+
+        width, height = current.size
+        size = self.tile_size
+        boxes = []
+        for y in range(0, height, size):
+            for x in range(0, width, size):
+                box = (x, y, min(x + size, width), min(y + size, height))
+                if mask.crop(box).getbbox() is not None:
+                    boxes.append(box)
+        return boxes
+
+    def get_stats(self) -> Dict:
+        """获取编码统计信息"""
+        with self._lock:
+            return {**self._stats, 'session_id': self.session_id, 'enabled': self.enabled,
+                    'acked_frame_id': self._acked_id}
@@ -1,30 +1,149 @@
-import base64
-import io
+import itertools
+import threading
 from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from PIL import Image, ImageGrab
-from typing import Optional
+from typing import Callable, Dict, Optional, Tuple
 import time
 import os
+import sys
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(project_root)
+
+from client.screenshot.change_detector import FrameChangeDetector, FrameChange
+from client.screenshot.encoding_policy import EncodingPolicy, EncodingDecision
+from shared.utils.tracing import get_tracer
+
+DISPLAY_SIZE = (500, 300)      # 界面预览尺寸
+FINGERPRINT_SIZE = (64, 36)    # 变化检测用的亮度网格尺寸
+
+
+class CapturedFrame:
+    """
+    单次截图得到的一帧，显示缩略图、传输编码和变化检测指纹都从同一帧派生，
+    每个阶段按帧缓存，只计算一次
+    """
+    
+    def __init__(self, image: Image.Image, frame_id: int, preparer, encoder):
+        self.image = image
+        self.frame_id = frame_id
+        self.captured_at = time.time()
+        self._preparer = preparer
+        self._encoder = encoder
+        self._lock = threading.Lock()
+        self._wire_image: Optional[Image.Image] = None
+        self._base64: Optional[str] = None
+        self._thumbnails: Dict[Tuple[int, int], Image.Image] = {}
+        self._fingerprint: Optional[bytes] = None
+        self.change: Optional[FrameChange] = None  # 与上一帧相比的变化信息，由ScreenshotManager填充
+        self.encoding: Optional[EncodingDecision] = None  # 传输编码决策，由ScreenshotManager填充
+    
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.image.size
+    
+    @property
+    def changed(self) -> bool:
+        """相对上一帧是否有变化（未检测时视为变化）"""
+        return self.change is None or self.change.changed
+    
+    def wire_image(self) -> Image.Image:
+        """传输分辨率的RGB图像（缓存），关键帧编码和增量帧比较都基于它"""
+        with self._lock:
+            return self._get_wire_image()
+    
+    def _get_wire_image(self) -> Image.Image:
+        if self._wire_image is None:
+            self._wire_image = self._preparer(self.image)
+        return self._wire_image
+    
+    def to_base64(self) -> str:
+        """传输用的base64编码（缓存）"""
+        with self._lock:
+            if self._base64 is None:
+                self._base64 = self._encoder(self._get_wire_image())
+            return self._base64
+    
+    def thumbnail(self, size: Tuple[int, int] = DISPLAY_SIZE) -> Image.Image:
+        """界面显示用的缩略图（按尺寸缓存）"""
+        with self._lock:
+            thumb = self._thumbnails.get(size)
+            if thumb is None:
+                thumb = self.image.resize(size, Image.Resampling.LANCZOS)
+                self._thumbnails[size] = thumb
+            return thumb
+    
+    def fingerprint(self) -> bytes:
+        """变化检测用的降采样亮度网格（缓存）"""
+        with self._lock:
+            if self._fingerprint is None:
+                luma = self.image.convert('L')
+                self._fingerprint = luma.resize(FINGERPRINT_SIZE, Image.Resampling.BOX).tobytes()
+            return self._fingerprint
+
 
 class ScreenshotManager:
-    def __init__(self):
+    def __init__(self, encoding_policy: Optional[EncodingPolicy] = None,
+                 grab: Optional[Callable[[], Image.Image]] = None):
+        """
+        Args:
+            encoding_policy: 传输编码策略
+            grab: 整屏截图函数，默认使用 PIL.ImageGrab（主显示器）
+        """
+        self._grab = grab or ImageGrab.grab
         self.last_screenshot_time = 0
         self.screenshot_interval = 0.5  # 最小截图间隔0.5秒
         
         # 线程池用于异步截图操作
         self.thread_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="screenshot")
         
+        self._frame_ids = itertools.count(1)
+        self.last_frame: Optional[CapturedFrame] = None
+        
+        # 帧变化检测，未变化的帧可跳过编码、界面刷新和上传
+        self.change_detector = FrameChangeDetector(FINGERPRINT_SIZE)
+        
+        # 传输分辨率和编码格式由策略根据链路吞吐量和屏幕密度决定
+        self.encoding_policy = encoding_policy or EncodingPolicy()
     
     def _capture_screen_sync(self) -> Optional[Image.Image]:
         """同步捕获屏幕（内部方法）"""
         try:
-            screenshot = ImageGrab.grab()
+            screenshot = self._grab()
             self.last_screenshot_time = time.time()
             return screenshot
         except Exception as e:
             print(f"截图失败: {e}")
             return None
     
+    def capture_frame(self) -> Optional[CapturedFrame]:
+        """捕获一帧，后续的缩略图、编码等阶段都基于这一次截图"""
+        with get_tracer().span("capture") as span:
+            screenshot = self._capture_screen_sync()
+            if screenshot is None:
+                return None
+            decision = self.encoding_policy.decide(screenshot.size)
+            frame = CapturedFrame(screenshot, next(self._frame_ids),
+                                  partial(self._prepare_wire_image, decision=decision),
+                                  partial(self._encode_wire_image, decision=decision))
+            frame.encoding = decision
+            frame.change = self.change_detector.detect(frame.fingerprint(), frame.size)
+            span.set(frame_id=frame.frame_id, size=list(frame.size), changed=frame.changed)
+        self.last_frame = frame
+        return frame
+    
+    def capture_frame_async(self, callback=None):
+        """异步捕获一帧"""
+        def capture_and_callback():
+            frame = self.capture_frame()
+            if callback:
+                callback(frame)
+            return frame
+        
+        return self.thread_pool.submit(capture_and_callback)
+    
     def capture_screen(self) -> Optional[Image.Image]:
         """捕获整个屏幕（同步方法，保持向后兼容）"""
         return self._capture_screen_sync()
@@ -41,21 +160,24 @@ class ScreenshotManager:
     
     def capture_screen_to_base64(self) -> Optional[str]:
         """捕获屏幕并转换为base64字符串"""
-        screenshot = self._capture_screen_sync()
-        if screenshot is None:
+        frame = self.capture_frame()
+        if frame is None:
             return None
         
         try:
-            base64_str = self._process_image_to_base64(screenshot)
-            return base64_str
+            return frame.to_base64()
         except Exception as e:
             print(f"图片转换失败: {e}")
             return None
     
     def _process_image_to_base64(self, screenshot: Image.Image) -> str:
         """处理图像到base64（可在线程池中执行）"""
-        # 压缩图片以减少传输大小
-        compressed = screenshot.resize((1280, 720), Image.Resampling.LANCZOS)
+        decision = self.encoding_policy.decide(screenshot.size)
+        return self._encode_wire_image(self._prepare_wire_image(screenshot, decision), decision)
+    
+    def _prepare_wire_image(self, screenshot: Image.Image, decision: EncodingDecision) -> Image.Image:
+        """转换为RGB并按编码决策缩放到传输分辨率"""
+        compressed = screenshot
         
         # 如果图像有透明通道，转换为RGB模式
         if compressed.mode in ('RGBA', 'LA', 'P'):
@@ -66,17 +188,17 @@ class ScreenshotManager:
             # 将原图像粘贴到白色背景上
             rgb_image.paste(compressed, mask=compressed.split()[-1] if compressed.mode == 'RGBA' else None)
             compressed = rgb_image
+        elif compressed.mode != 'RGB':
+            compressed = compressed.convert('RGB')
         
-        # 转换为base64
-        buffer = io.BytesIO()
-        compressed.save(buffer, format='JPEG', quality=85, optimize=True)  # 使用JPEG减少大小
-        img_str = base64.b64encode(buffer.getvalue()).decode()
-        
-        # 释放临时图像
-        del compressed
-        buffer.close()
-        
-        return img_str
+        return self.encoding_policy.resize(compressed, decision)
+    
+    def _encode_wire_image(self, compressed: Image.Image, decision: EncodingDecision) -> str:
+        """按编码决策将传输分辨率图像编码为base64"""
+        with get_tracer().span("encode", size=list(compressed.size)) as span:
+            encoded = self.encoding_policy.encode(compressed, decision)
+            span.set(chars=len(encoded))
+            return encoded
     
     def capture_screen_to_base64_async(self, callback=None):
         """异步捕获屏幕并转换为base64"""
@@ -112,8 +234,10 @@ class ScreenshotManager:
     
     def get_screen_size(self) -> tuple:
         """获取屏幕分辨率"""
+        if self.last_frame is not None:
+            return self.last_frame.size
         try:
-            screenshot = ImageGrab.grab()
+            screenshot = self._grab()
             size = screenshot.size
             del screenshot  # 释放临时截图
             return size
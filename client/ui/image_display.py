@@ -0,0 +1,189 @@
+"""
+截图显示 - 直接用RGB像素缓冲构造QImage，在QThreadPool中由Qt完成缩放，
+界面线程只负责 QPixmap.fromImage 和 setPixmap，避免每次刷新都做PNG编码/解码
+"""
+
+import base64
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional, Union
+
+from PIL import Image
+from PyQt6.QtCore import QObject, QRunnable, QSize, QThreadPool, Qt, pyqtSignal
+from PyQt6.QtGui import QImage, QPixmap
+from PyQt6.QtWidgets import QLabel
+
+
+def qimage_from_pil(image: Image.Image) -> QImage:
+    """
+    将PIL图像包装为QImage
+
+    像素只在 tobytes() 导出RGB字节时复制一次，QImage直接引用该缓冲，不再额外复制；
+    调用方需在QImage使用期间保持返回值存活（本模块中缩放后即得到Qt自有的新图像）
+
+    Args:
+        image: PIL图像
+
+    Returns:
+        QImage: 引用像素缓冲的QImage（缓冲保存在 qimage._buffer）
+    """
+    rgb = image if image.mode == 'RGB' else image.convert('RGB')
+    buffer = rgb.tobytes()
+    qimage = QImage(buffer, rgb.width, rgb.height, rgb.width * 3, QImage.Format.Format_RGB888)
+    qimage._buffer = buffer
+    return qimage
+
+
+class DisplayLatencyStats:
+    """显示延迟统计：截图到上屏的延迟和界面线程耗时"""
+
+    def __init__(self, window: int = 100):
+        self._frame_to_screen = deque(maxlen=window)
+        self._gui_thread = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.dropped = 0  # 被更新的帧取代而未显示的帧数
+
+    def record(self, frame_to_screen: Optional[float], gui_thread: float):
+        with self._lock:
+            if frame_to_screen is not None:
+                self._frame_to_screen.append(frame_to_screen)
+            self._gui_thread.append(gui_thread)
+
+    @staticmethod
+    def _summary(samples) -> Dict:
+        if not samples:
+            return {'count': 0}
+        ordered = sorted(samples)
+        return {
+            'count': len(ordered),
+            'p50_ms': ordered[len(ordered) // 2] * 1000,
+            'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+            'max_ms': ordered[-1] * 1000,
+        }
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                'frame_to_screen': self._summary(self._frame_to_screen),
+                'gui_thread': self._summary(self._gui_thread),
+                'dropped': self.dropped,
+            }
+
+
+class _ScaleSignals(QObject):
+    """缩放任务完成信号（在界面线程中接收）"""
+    finished = pyqtSignal(int, object, object)  # generation, QImage, captured_at
+    failed = pyqtSignal(int, str)
+
+
+class _ScaleJob(QRunnable):
+    """在线程池中构造并缩放QImage"""
+
+    def __init__(self, signals: _ScaleSignals, generation: int, source: Union[Image.Image, bytes, str],
+                 target: QSize, captured_at: Optional[float]):
+        super().__init__()
+        self.signals = signals
+        self.generation = generation
+        self.source = source
+        self.target = target
+        self.captured_at = captured_at
+
+    def run(self):
+        try:
+            if isinstance(self.source, Image.Image):
+                qimage = qimage_from_pil(self.source)
+            else:
+                # 已编码的图像（如服务端返回的标注截图）由Qt在线程池中解码
+                data = self.source
+                if isinstance(data, str):
+                    if data.startswith('data:image'):
+                        data = data.split(',', 1)[1]
+                    data = base64.b64decode(data)
+                qimage = QImage.fromData(data)
+                if qimage.isNull():
+                    raise ValueError("无法解码图像数据")
+            scaled = qimage.scaled(self.target, Qt.AspectRatioMode.KeepAspectRatio,
+                                   Qt.TransformationMode.SmoothTransformation)
+            self.signals.finished.emit(self.generation, scaled, self.captured_at)
+        except Exception as e:
+            self.signals.failed.emit(self.generation, str(e))
+
+
+class AsyncImageDisplay(QObject):
+    """QLabel的异步图像显示，只显示最新提交的图像"""
+
+    displayed = pyqtSignal(float)  # 截图到上屏的延迟（秒），没有截图时间时为0
+    failed = pyqtSignal(str)
+
+    def __init__(self, label: QLabel, fallback_size: QSize = QSize(500, 300),
+                 thread_pool: Optional[QThreadPool] = None):
+        """
+        初始化异步显示
+
+        Args:
+            label: 显示图像的QLabel
+            fallback_size: 标签尚未布局时使用的显示尺寸
+            thread_pool: 缩放使用的线程池，默认使用全局线程池
+        """
+        super().__init__(label)
+        self.label = label
+        self.fallback_size = fallback_size
+        self.thread_pool = thread_pool or QThreadPool.globalInstance()
+        self.stats = DisplayLatencyStats()
+
+        self._generation = 0
+        self._pending = False  # 最新提交的图像是否尚未显示
+        self._signals = _ScaleSignals()
+        self._signals.finished.connect(self._on_scaled)
+        self._signals.failed.connect(self._on_failed)
+
+    def show_image(self, image: Image.Image, captured_at: Optional[float] = None):
+        """
+        显示PIL图像（在线程池中包装并缩放）
+
+        Args:
+            image: 要显示的图像，提交后不应再被修改
+            captured_at: 截图时间，用于统计截图到上屏的延迟
+        """
+        self._submit(image, captured_at)
+
+    def show_encoded(self, data: Union[bytes, str], captured_at: Optional[float] = None):
+        """
+        显示已编码的图像（base64字符串或PNG/JPEG字节，在线程池中解码并缩放）
+
+        Args:
+            data: 图像数据
+            captured_at: 截图时间
+        """
+        self._submit(data, captured_at)
+
+    def _target_size(self) -> QSize:
+        size = self.label.contentsRect().size()
+        if size.width() < 16 or size.height() < 16:
+            return self.fallback_size
+        return size
+
+    def _submit(self, source, captured_at: Optional[float]):
+        if self._pending:
+            self.stats.dropped += 1
+        self._generation += 1
+        self._pending = True
+        self.thread_pool.start(_ScaleJob(self._signals, self._generation, source, self._target_size(), captured_at))
+
+    def _on_scaled(self, generation: int, qimage: QImage, captured_at: Optional[float]):
+        if generation != self._generation:
+            return  # 已有更新的图像提交，丢弃过期结果
+        start_time = time.time()
+        self.label.setPixmap(QPixmap.fromImage(qimage))
+        self._pending = False
+        now = time.time()
+        frame_to_screen = now - captured_at if captured_at else None
+        self.stats.record(frame_to_screen, now - start_time)
+        self.displayed.emit(frame_to_screen or 0.0)
+
+    def _on_failed(self, generation: int, error: str):
+        if generation != self._generation:
+            return
+        self._pending = False
+        self.failed.emit(error)
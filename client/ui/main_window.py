@@ -1,26 +1,30 @@
 import sys
 import asyncio
 import os
-import platform
 import time
+import uuid
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, 
                             QWidget, QPushButton, QTextEdit, QLabel, QLineEdit, 
                             QTextBrowser, QSplitter, QFrame, QTabWidget, QTableWidget, 
-                            QTableWidgetItem, QHeaderView, QScrollArea, QComboBox, QMessageBox)
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QTimer, QMutex
-from PyQt6.QtGui import QFont, QPixmap
+                            QTableWidgetItem, QHeaderView, QScrollArea, QComboBox, QMessageBox,
+                            QSizePolicy)
+from PyQt6.QtCore import Qt, QThread, pyqtSignal, QTimer, QMutex, QSize, QEvent
+from PyQt6.QtGui import QFont
 
 # 添加项目根目录到Python路径
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.append(project_root)
 
-from client.screenshot.screenshot_manager import ScreenshotManager
-from client.communication.server_client import ServerClient
+from client.screenshot.screenshot_manager import ScreenshotManager, DISPLAY_SIZE
+from client.ui.image_display import AsyncImageDisplay
+from client.communication.server_client import ServerClient, ServerClientError
 from client.automation import ExecutionManager, ExecutionConfig, ExecutionMode
+from client.utils.environment_info import get_environment_info
+from shared.utils.tracing import get_tracer
 
 class ScreenshotWorker(QThread):
     """专用截图工作线程"""
-    screenshot_ready = pyqtSignal(object, str)  # PIL图像, base64数据
+    screenshot_ready = pyqtSignal(object)  # CapturedFrame（缩略图和base64已在截图线程中生成）
     screenshot_failed = pyqtSignal(str)  # 错误信息
     
     def __init__(self, screenshot_manager):
@@ -44,19 +48,17 @@ class ScreenshotWorker(QThread):
         """线程主循环"""
         while self.should_run:
             try:
-                # 异步获取截图
-                future = self.screenshot_manager.capture_screen_async()
-                screenshot = future.result(timeout=5.0)  # 5秒超时
+                # 只截图一次，显示和上传使用同一帧
+                future = self.screenshot_manager.capture_frame_async()
+                frame = future.result(timeout=5.0)  # 5秒超时
                 
-                if screenshot:
-                    # 异步获取base64
-                    base64_future = self.screenshot_manager.capture_screen_to_base64_async()
-                    base64_data = base64_future.result(timeout=5.0)
-                    
-                    if base64_data:
-                        self.screenshot_ready.emit(screenshot, base64_data)
-                    else:
-                        self.screenshot_failed.emit("Base64转换失败")
+                if frame and not frame.changed:
+                    # 屏幕没有变化，跳过编码和界面刷新
+                    pass
+                elif frame:
+                    # 在截图线程中完成编码（同时生成显示使用的传输分辨率图像），避免占用界面线程
+                    frame.to_base64()
+                    self.screenshot_ready.emit(frame)
                 else:
                     self.screenshot_failed.emit("截图失败")
                     
@@ -78,26 +80,19 @@ class ConnectWorker(QThread):
     def run(self):
         """在子线程中运行连接"""
         try:
-            # 创建新的事件循环
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            # 在工作线程中创建ServerClient
+            # ServerClient的连接运行在共享事件循环中，断开后自动重连
             server_client = ServerClient(self.server_url)
-            
-            # 运行连接
-            success = loop.run_until_complete(server_client.connect())
+            success = server_client.connect_sync()
             
             if success:
                 self.connection_result.emit(True, server_client)
             else:
+                server_client.disconnect_sync()
                 self.connection_result.emit(False, None)
                 
         except Exception as e:
             print(f"连接错误: {e}")
             self.connection_result.emit(False, None)
-        finally:
-            loop.close()
 
 class DisconnectWorker(QThread):
     """处理断开连接的工作线程"""
@@ -110,19 +105,12 @@ class DisconnectWorker(QThread):
     def run(self):
         """在子线程中运行断开连接"""
         try:
-            # 创建新的事件循环
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            # 运行断开连接
-            loop.run_until_complete(self.server_client.disconnect())
+            self.server_client.disconnect_sync()
             self.disconnection_result.emit(True)
                 
         except Exception as e:
             print(f"断开连接错误: {e}")
             self.disconnection_result.emit(False)
-        finally:
-            loop.close()
 
 class TaskWorker(QThread):
     """处理异步任务的工作线程（支持分阶段响应）"""
@@ -130,47 +118,61 @@ class TaskWorker(QThread):
     task_failed = pyqtSignal(str)        # 任务失败信号
     omniparser_result = pyqtSignal(object)  # OmniParser结果信号
     claude_result = pyqtSignal(object)      # Claude结果信号
+    action_partial = pyqtSignal(object)     # Claude流式操作信号
     
-    def __init__(self, server_url, text_command, screenshot_base64):
+    def __init__(self, server_url, text_command, screenshot_base64, upload_recorder=None, server_client=None,
+                 frame_ref=None, screenshot_preparsed=False, task_id=None):
         super().__init__()
         self.server_url = server_url
+        self.task_id = task_id  # 同时作为trace_id，服务端处理阶段的span归入同一trace
         self.text_command = text_command
         self.screenshot_base64 = screenshot_base64
-        self.os_info = self._get_os_info()
+        self.upload_recorder = upload_recorder  # 上传耗时回调，用于估计链路吞吐量
+        self.server_client = server_client  # 共享长连接，未提供时为本任务单独建立连接
+        # 截图对应的预解析帧 {"session_id", "frame_id"}，服务端命中缓存时跳过OmniParser阶段
+        self.frame_ref = frame_ref or {}
+        self.screenshot_preparsed = screenshot_preparsed  # 预解析已完成时省略截图上传
+        self.os_info = get_environment_info().os_info()
     
-    def _get_os_info(self):
-        """获取操作系统信息"""
-        try:
-            # 获取屏幕分辨率
-            import pyautogui
-            screen_width, screen_height = pyautogui.size()
-            
-            return {
-                "system": platform.system(),
-                "version": platform.version(),
-                "release": platform.release(),
-                "machine": platform.machine(),
-                "processor": platform.processor(),
-                "platform": platform.platform(),
-                "screen_width": screen_width,
-                "screen_height": screen_height
-            }
-        except Exception as e:
-            return {
-                "system": "Unknown",
-                "version": "Unknown",
-                "release": "Unknown", 
-                "machine": "Unknown",
-                "processor": "Unknown",
-                "platform": "Unknown",
-                "screen_width": None,
-                "screen_height": None,
-                "error": str(e)
-            }
+    def _build_request_data(self, include_screenshot=True):
+        """构建任务请求数据"""
+        return {
+            "text_command": self.text_command,
+            "screenshot_base64": self.screenshot_base64 if include_screenshot else None,
+            "user_id": "default",
+            "os_info": self.os_info,
+            **self.frame_ref
+        }
     
+    def _handle_message(self, response) -> bool:
+        """分发服务端消息，返回是否为最终响应"""
+        message_type = response.get("type")
+        
+        if message_type == "omniparser_result":
+            # OmniParser结果
+            self.omniparser_result.emit(response)
+        elif message_type == "action_partial":
+            # Claude流式生成的单个操作
+            self.action_partial.emit(response)
+        elif message_type == "claude_result":
+            # Claude分析结果
+            self.claude_result.emit(response)
+        elif message_type == "analysis_result":
+            # 最终结果
+            self.task_completed.emit(response)
+            return True
+        elif message_type == "error":
+            self.task_failed.emit(response.get("message", "服务端错误"))
+            return True
+        else:
+            print(f"未知消息类型: {message_type}")
+        return False
     
     def run(self):
         """在子线程中运行异步任务（支持分阶段响应）"""
+        if self.server_client:
+            self._run_shared_connection()
+            return
         try:
             # 创建新的事件循环
             loop = asyncio.new_event_loop()
@@ -184,6 +186,27 @@ class TaskWorker(QThread):
         finally:
             loop.close()
     
+    def _run_shared_connection(self):
+        """通过共享长连接提交任务，中间消息在共享事件循环线程中以信号转发"""
+        try:
+            response = self.server_client.request_sync(
+                "analyze_task", self._build_request_data(not self.screenshot_preparsed),
+                task_id=self.task_id, on_message=self._handle_message
+            )
+            if response.get("type") == "frame_resync":
+                # 预解析结果已被服务端淘汰，改为上传完整截图
+                print(f"预解析帧不可用，重新上传截图: {response.get('data', {}).get('reason')}")
+                response = self.server_client.request_sync(
+                    "analyze_task", self._build_request_data(), task_id=self.task_id,
+                    on_message=self._handle_message
+                )
+            if not self._handle_message(response):
+                self.task_failed.emit(f"未知响应类型: {response.get('type')}")
+        except ServerClientError as e:
+            self.task_failed.emit(f"服务端响应失败: {str(e)}")
+        except Exception as e:
+            self.task_failed.emit(f"任务执行失败: {str(e)}")
+    
     async def _run_async_task(self):
         """异步任务执行"""
         import sys
@@ -203,43 +226,25 @@ class TaskWorker(QThread):
             # 使用WebSocket管理器
             async with WebSocketManager(self.server_url) as ws_manager:
                 # 构建任务请求
-                task_id = str(uuid.uuid4())
+                task_id = self.task_id or str(uuid.uuid4())
                 request = {
                     "type": "analyze_task",
                     "task_id": task_id,
                     "timestamp": time.time(),
-                    "data": {
-                        "text_command": self.text_command,
-                        "screenshot_base64": self.screenshot_base64,
-                        "user_id": "default",
-                        "os_info": self.os_info
-                    }
+                    "data": self._build_request_data()
                 }
                 
                 # 发送请求
                 await ws_manager.send_message(request)
+                if self.upload_recorder:
+                    self.upload_recorder(ws_manager.last_send_bytes, ws_manager.last_send_seconds)
                 
                 # 接收分阶段响应
                 while True:
                     try:
                         response = await ws_manager.receive_message()
-                        message_type = response.get("type")
-                        
-                        if message_type == "omniparser_result":
-                            # OmniParser结果
-                            self.omniparser_result.emit(response)
-                        elif message_type == "claude_result":
-                            # Claude分析结果
-                            self.claude_result.emit(response)
-                        elif message_type == "analysis_result":
-                            # 最终结果
-                            self.task_completed.emit(response)
-                            break
-                        elif message_type == "error":
-                            self.task_failed.emit(response.get("message", "服务端错误"))
+                        if self._handle_message(response):
                             break
-                        else:
-                            print(f"未知消息类型: {message_type}")
                             
                     except Exception as e:
                         if "超时" in str(e):
@@ -256,7 +261,8 @@ class TaskCompletionVerificationWorker(QThread):
     verification_completed = pyqtSignal(object)  # 验证完成信号
     verification_failed = pyqtSignal(str)        # 验证失败信号
     
-    def __init__(self, server_url, task_id, original_command, previous_claude_output, screenshot_base64, verification_prompt):
+    def __init__(self, server_url, task_id, original_command, previous_claude_output, screenshot_base64, verification_prompt,
+                 frame_payload=None, frame_encoder=None, upload_recorder=None, server_client=None):
         super().__init__()
         self.server_url = server_url
         self.task_id = task_id
@@ -264,9 +270,50 @@ class TaskCompletionVerificationWorker(QThread):
         self.previous_claude_output = previous_claude_output
         self.screenshot_base64 = screenshot_base64
         self.verification_prompt = verification_prompt
+        # 增量帧协议：上传字段及其编码器（用于确认参考帧和重新同步）
+        self.frame_payload = frame_payload or {"screenshot_base64": screenshot_base64}
+        self.frame_encoder = frame_encoder
+        self.upload_recorder = upload_recorder
+        self.server_client = server_client  # 共享长连接，未提供时为本次验证单独建立连接
+    
+    def _build_request_data(self, frame_payload):
+        """构建验证请求数据"""
+        return {
+            "original_command": self.original_command,
+            "previous_claude_output": self.previous_claude_output,
+            "verification_prompt": self.verification_prompt,
+            **frame_payload
+        }
+    
+    def _resync_payload(self, response, attempt):
+        """服务端要求重新同步时返回关键帧上传数据，无法重试时发出失败信号并返回None"""
+        frame_payload = self.frame_encoder.resync() if self.frame_encoder and attempt == 0 else None
+        if not frame_payload:
+            self.verification_failed.emit(f"截图帧同步失败: {response.get('data', {}).get('reason')}")
+        return frame_payload
+    
+    def _handle_response(self, response, frame_payload):
+        """处理验证最终响应"""
+        try:
+            message_type = response.get("type")
+            
+            if message_type == "task_completion_result":
+                if self.frame_encoder:
+                    self.frame_encoder.acknowledge(frame_payload)
+                self.verification_completed.emit(response)
+            elif message_type == "error":
+                self.verification_failed.emit(response.get("message", "服务端验证错误"))
+            else:
+                self.verification_failed.emit(f"未知响应类型: {message_type}")
+                
+        except Exception as e:
+            self.verification_failed.emit(f"处理验证响应失败: {str(e)}")
     
     def run(self):
         """在子线程中运行任务完成度验证"""
+        if self.server_client:
+            self._run_shared_connection()
+            return
         try:
             # 创建新的事件循环
             loop = asyncio.new_event_loop()
@@ -280,6 +327,28 @@ class TaskCompletionVerificationWorker(QThread):
         finally:
             loop.close()
     
+    def _run_shared_connection(self):
+        """通过共享长连接提交验证请求"""
+        try:
+            frame_payload = self.frame_payload
+            
+            # 服务端帧缓冲缺少参考帧或校验失败时，改发关键帧重试一次
+            for attempt in range(2):
+                response = self.server_client.request_sync(
+                    "verify_task_completion", self._build_request_data(frame_payload), task_id=self.task_id
+                )
+                if response.get("type") != "frame_resync":
+                    break
+                frame_payload = self._resync_payload(response, attempt)
+                if not frame_payload:
+                    return
+            
+            self._handle_response(response, frame_payload)
+        except ServerClientError as e:
+            self.verification_failed.emit(f"验证请求失败: {str(e)}")
+        except Exception as e:
+            self.verification_failed.emit(f"验证执行失败: {str(e)}")
+    
     async def _run_async_verification(self):
         """异步任务完成度验证"""
         import sys
@@ -297,54 +366,76 @@ class TaskCompletionVerificationWorker(QThread):
             
             # 使用WebSocket管理器
             async with WebSocketManager(self.server_url) as ws_manager:
-                # 构建验证请求
-                request = {
-                    "type": "verify_task_completion",
-                    "task_id": self.task_id,
-                    "timestamp": time.time(),
-                    "data": {
-                        "original_command": self.original_command,
-                        "previous_claude_output": self.previous_claude_output,
-                        "screenshot_base64": self.screenshot_base64,
-                        "verification_prompt": self.verification_prompt
-                    }
-                }
+                frame_payload = self.frame_payload
                 
-                # 发送请求
-                await ws_manager.send_message(request)
-                
-                # 接收响应
-                try:
-                    response = await ws_manager.receive_message()
-                    message_type = response.get("type")
+                # 服务端帧缓冲缺少参考帧或校验失败时，改发关键帧重试一次
+                for attempt in range(2):
+                    # 构建验证请求
+                    request = {
+                        "type": "verify_task_completion",
+                        "task_id": self.task_id,
+                        "timestamp": time.time(),
+                        "data": self._build_request_data(frame_payload)
+                    }
                     
-                    if message_type == "task_completion_result":
-                        self.verification_completed.emit(response)
-                    elif message_type == "error":
-                        self.verification_failed.emit(response.get("message", "服务端验证错误"))
-                    else:
-                        self.verification_failed.emit(f"未知响应类型: {message_type}")
-                        
-                except Exception as e:
-                    if "超时" in str(e):
-                        self.verification_failed.emit(f"验证超时: {str(e)}")
-                    else:
-                        self.verification_failed.emit(f"接收验证响应失败: {str(e)}")
+                    # 发送请求
+                    await ws_manager.send_message(request)
+                    if self.upload_recorder:
+                        self.upload_recorder(ws_manager.last_send_bytes, ws_manager.last_send_seconds)
+                    
+                    try:
+                        response = await ws_manager.receive_message()
+                    except Exception as e:
+                        if "超时" in str(e):
+                            self.verification_failed.emit(f"验证超时: {str(e)}")
+                        else:
+                            self.verification_failed.emit(f"接收验证响应失败: {str(e)}")
+                        return
+                    
+                    if response.get("type") != "frame_resync":
+                        break
+                    
+                    frame_payload = self._resync_payload(response, attempt)
+                    if not frame_payload:
+                        return
+                
+                # 处理响应
+                self._handle_response(response, frame_payload)
                         
         except Exception as e:
             self.verification_failed.emit(f"连接验证服务失败: {str(e)}")
 
 class MainWindow(QMainWindow):
+    run_on_gui_thread = pyqtSignal(object)  # 在主线程中执行的回调（截图线程池完成后使用）
+    
     def __init__(self):
         super().__init__()
+        self.run_on_gui_thread.connect(lambda callback: callback())
         self.setWindowTitle("Computer Use Agent - 客户端 (优化版)")
         self.setGeometry(100, 100, 1200, 800)
         
         # 初始化组件
         self.screenshot_manager = ScreenshotManager()
+        # 高分屏上界面文字占用更多物理像素，可以缩得更小而不影响识别
+        screen = QApplication.primaryScreen()
+        if screen is not None:
+            self.screenshot_manager.encoding_policy.set_device_scale(screen.devicePixelRatio())
         self.server_client = None  # 在连接时创建
         self.current_screenshot_base64 = None
         self.current_screenshot_image = None
+        self.current_frame = None
+        
+        # 预解析：屏幕稳定或指令框获得焦点时提前上传当前帧，服务端在用户输入期间完成OmniParser解析
+        self.preparse_session_id = uuid.uuid4().hex
+        self.preparse_frame_id = None
+        self.preparse_future = None
+        # 操作系统信息只检测一次，显示器或输入法变化时失效
+        self.environment = get_environment_info()
+        self.environment.set_device_scale_provider(lambda: QApplication.primaryScreen().devicePixelRatio())
+        self._watch_environment_changes()
+        
+        # 当前任务的trace（继续执行的多轮分析属于同一trace，任务结束时导出）
+        self.trace_id = None
         
         # 初始化自动化执行管理器
         execution_config = ExecutionConfig(
@@ -360,6 +451,7 @@ class MainWindow(QMainWindow):
         self.current_action_plan = []
         self.current_ui_elements = []
         self.current_task_command = None  # 保存当前任务的原始指令
+        self.analysis_frame = None  # 发送给服务端分析的截图帧，执行时用于校正点击位置
         self.current_claude_output = None  # 保存当前Claude输出
         
         # 设置UI
@@ -377,6 +469,7 @@ class MainWindow(QMainWindow):
         
         # 用于缓存待更新的截图数据
         self.pending_screenshot_update = None
+        self.completion_checker = None  # 任务完成度检查器（首次验证时创建）
         
         # 初始截图（异步）
         self.manual_capture_screenshot()
@@ -444,8 +537,15 @@ class MainWindow(QMainWindow):
         self.command_input = QTextEdit()
         self.command_input.setMaximumHeight(100)
         self.command_input.setPlaceholderText("请输入要执行的指令，例如：帮我打开计算器")
+        self.command_input.installEventFilter(self)
         layout.addWidget(self.command_input)
         
+        # 截图稳定一段时间后再预解析，避免屏幕变化期间反复上传
+        self.preparse_timer = QTimer(self)
+        self.preparse_timer.setSingleShot(True)
+        self.preparse_timer.setInterval(800)
+        self.preparse_timer.timeout.connect(self._on_screen_settled)
+        
         # 按钮区域
         button_layout = QHBoxLayout()
         self.screenshot_btn = QPushButton("手动截图")
@@ -562,7 +662,11 @@ class MainWindow(QMainWindow):
         self.screenshot_label.setStyleSheet("border: 1px solid gray;")
         self.screenshot_label.setText("暂无截图")
         self.screenshot_label.setMinimumHeight(200)
+        # 图像按标签尺寸缩放，不让图像尺寸反过来撑大布局
+        self.screenshot_label.setSizePolicy(QSizePolicy.Policy.Ignored, QSizePolicy.Policy.Ignored)
         original_layout.addWidget(self.screenshot_label)
+        self.screenshot_display = AsyncImageDisplay(self.screenshot_label, QSize(*DISPLAY_SIZE))
+        self.screenshot_display.failed.connect(lambda error: self.screenshot_label.setText(f"显示截图失败: {error}"))
         
         # 截图信息
         self.screenshot_info = QLabel("截图信息: 暂无")
@@ -580,7 +684,11 @@ class MainWindow(QMainWindow):
         self.annotated_screenshot_label.setStyleSheet("border: 1px solid blue;")
         self.annotated_screenshot_label.setText("等待分析结果...")
         self.annotated_screenshot_label.setMinimumHeight(200)
+        self.annotated_screenshot_label.setSizePolicy(QSizePolicy.Policy.Ignored, QSizePolicy.Policy.Ignored)
         annotated_layout.addWidget(self.annotated_screenshot_label)
+        self.annotated_display = AsyncImageDisplay(self.annotated_screenshot_label, QSize(*DISPLAY_SIZE))
+        self.annotated_display.failed.connect(
+            lambda error: self.annotated_screenshot_label.setText(f"显示标注截图失败: {error}"))
         
         # 标注截图信息
         self.annotated_info = QLabel("OmniParser信息: 暂无")
@@ -595,8 +703,8 @@ class MainWindow(QMainWindow):
     
     def toggle_connection(self):
         """切换服务端连接状态"""
-        if self.server_client is None or not self.server_client.connected:
-            # 尝试连接
+        if self.server_client is None:
+            # 尝试连接（已有的共享连接断开后会自动重连）
             self.connect_to_server()
         else:
             # 断开连接
@@ -616,6 +724,7 @@ class MainWindow(QMainWindow):
         """连接结果回调"""
         if success:
             self.server_client = server_client
+            self.server_client.upload_recorder = self.screenshot_manager.encoding_policy.record_upload
             self.connect_btn.setText("断开连接")
             self.status_label.setText("已连接到服务端")
             self.result_display.append("✅ 成功连接到服务端")
@@ -643,15 +752,49 @@ class MainWindow(QMainWindow):
         self.result_display.append("🔌 已断开服务端连接")
         self.connect_btn.setEnabled(True)
     
-    def on_screenshot_ready(self, screenshot_image, base64_data):
-        """截图准备就绪的回调（在截图线程中调用）"""
-        self.current_screenshot_base64 = base64_data
-        self.current_screenshot_image = screenshot_image
+    def _watch_environment_changes(self):
+        """显示器增减、分辨率变化和输入法切换时使缓存的环境信息失效"""
+        app = QApplication.instance()
+        if app is None:
+            return
+        invalidate_display = lambda *_: self.environment.invalidate_display()
+        app.screenAdded.connect(invalidate_display)
+        app.screenRemoved.connect(invalidate_display)
+        app.primaryScreenChanged.connect(invalidate_display)
+        for screen in app.screens():
+            screen.geometryChanged.connect(invalidate_display)
+        app.screenAdded.connect(lambda screen: screen.geometryChanged.connect(invalidate_display))
+        input_method = QApplication.inputMethod()
+        if input_method is not None:
+            input_method.localeChanged.connect(lambda: self.environment.invalidate_input_method())
+    
+    def _get_server_client(self):
+        """
+        获取与当前服务端地址对应的共享长连接，没有时在后台建立
         
-        # 使用防抖机制更新UI
-        self.pending_screenshot_update = (screenshot_image, base64_data)
-        # 使用QTimer.singleShot在主线程中延迟执行UI更新
-        QTimer.singleShot(100, self.update_screenshot_display)
+        任务和验证请求都通过该连接按request_id并发复用，不再每次新建连接
+        """
+        server_url = self.server_url_input.text().strip()
+        if self.server_client is None or self.server_client.server_url != server_url:
+            if self.server_client is not None:
+                # 旧连接在共享事件循环中关闭，不阻塞界面
+                self.server_client.disconnect_nowait()
+            self.server_client = ServerClient(server_url)
+            self.server_client.upload_recorder = self.screenshot_manager.encoding_policy.record_upload
+            self.server_client.start()
+            self.connect_btn.setText("断开连接")
+        return self.server_client
+    
+    def on_screenshot_ready(self, frame):
+        """截图准备就绪的回调（在截图线程中调用）"""
+        self.current_screenshot_base64 = frame.to_base64()
+        self.current_screenshot_image = frame.image
+        self.current_frame = frame
+        
+        # 只显示最新一帧，缩放在线程池中完成，不需要额外延迟
+        self.pending_screenshot_update = frame
+        # 使用QTimer.singleShot在主线程中执行UI更新
+        QTimer.singleShot(0, self.update_screenshot_display)
     
     def on_screenshot_failed(self, error_msg):
         """截图失败的回调"""
@@ -663,52 +806,92 @@ class MainWindow(QMainWindow):
         if not self.pending_screenshot_update:
             return
             
-        screenshot_image, base64_data = self.pending_screenshot_update
+        frame = self.pending_screenshot_update
         self.pending_screenshot_update = None
         
         try:
-            # 缩放图像以适应显示
-            from PIL import Image
-            display_img = screenshot_image.resize((500, 300), Image.Resampling.LANCZOS)
+            # 直接使用帧的RGB像素（与上传的base64来自同一次截图），在线程池中由Qt缩放
+            self.screenshot_display.show_image(frame.wire_image(), frame.captured_at)
             
-            # 转换为QPixmap显示
-            import io
-            buffer = io.BytesIO()
-            display_img.save(buffer, format='PNG')
-            pixmap = QPixmap()
-            pixmap.loadFromData(buffer.getvalue())
-            
-            self.screenshot_label.setPixmap(pixmap)
-            self.screenshot_info.setText(f"截图尺寸: {screenshot_image.size}, Base64长度: {len(base64_data)}")
-            
-            # 清理临时对象
-            del display_img
-            buffer.close()
+            latency = self.screenshot_display.stats.get_stats()['frame_to_screen']
+            latency_text = f", 显示延迟p50: {latency['p50_ms']:.0f}ms" if latency['count'] else ""
+            self.screenshot_info.setText(f"截图尺寸: {frame.size}, Base64长度: {len(frame.to_base64())}{latency_text}")
             
             self.status_label.setText("截图已更新")
+            self.preparse_timer.start()
             
         except Exception as e:
             self.screenshot_label.setText(f"显示截图失败: {str(e)}")
             self.status_label.setText("截图显示错误")
     
+    def eventFilter(self, obj, event):
+        """指令框获得焦点时立即预解析当前帧"""
+        if obj is self.command_input and event.type() == QEvent.Type.FocusIn:
+            self._send_preparse()
+        return super().eventFilter(obj, event)
+    
+    def _on_screen_settled(self):
+        """截图稳定后，用户正在输入指令时预解析"""
+        if self.command_input.hasFocus() or self.command_input.toPlainText().strip():
+            self._send_preparse()
+    
+    def _send_preparse(self):
+        """将当前帧发送给服务端预解析（每帧只发送一次，不等待结果）"""
+        frame = self.current_frame
+        if frame is None or self.server_client is None or frame.frame_id == self.preparse_frame_id:
+            return  # 未连接服务端时不为预解析主动建立连接
+        try:
+            self.preparse_future = self.server_client.submit("preparse", {
+                "screenshot_base64": frame.to_base64(),
+                "session_id": self.preparse_session_id,
+                "frame_id": frame.frame_id,
+                "os_info": self.environment.os_info()
+            })
+            self.preparse_frame_id = frame.frame_id
+        except Exception as e:
+            print(f"预解析请求失败: {e}")
+    
+    def _preparsed_frame_ref(self):
+        """
+        当前帧的预解析状态
+        
+        Returns:
+            (frame_ref, 预解析是否已成功): 当前帧未预解析时frame_ref为None
+        """
+        frame = self.current_frame
+        if frame is None or self.preparse_future is None or frame.frame_id != self.preparse_frame_id:
+            return None, False
+        frame_ref = {"session_id": self.preparse_session_id, "frame_id": frame.frame_id}
+        future = self.preparse_future
+        if not future.done() or future.cancelled() or future.exception() is not None:
+            # 预解析仍在进行时服务端会等待同一次解析
+            return frame_ref, False
+        return frame_ref, bool(future.result().get("data", {}).get("success"))
+    
     def manual_capture_screenshot(self):
         """手动触发截图（立即执行）"""
         self.status_label.setText("正在截图...")
         
         # 在线程池中异步执行
-        future = self.screenshot_manager.capture_screen_to_base64_async(
-            callback=lambda result: self.on_manual_screenshot_ready(result)
+        future = self.screenshot_manager.capture_frame_async(
+            callback=lambda frame: self.on_manual_screenshot_ready(frame)
         )
     
-    def on_manual_screenshot_ready(self, base64_data):
-        """手动截图完成回调"""
-        if base64_data:
-            self.current_screenshot_base64 = base64_data
-            # 同时获取图像用于显示
-            screenshot_img = self.screenshot_manager.capture_screen()
-            if screenshot_img:
-                self.current_screenshot_image = screenshot_img
-                self.on_screenshot_ready(screenshot_img, base64_data)
+    def on_manual_screenshot_ready(self, frame):
+        """手动截图完成回调（显示和上传使用同一帧）"""
+        if frame:
+            frame.to_base64()
+            self.on_screenshot_ready(frame)
+    
+    def _capture_then(self, on_ready):
+        """截取新的一帧，成为当前截图后在主线程中调用 on_ready(frame)，截图失败时 frame 为None"""
+        self.status_label.setText("正在截图...")
+        
+        def callback(frame):
+            self.on_manual_screenshot_ready(frame)
+            self.run_on_gui_thread.emit(lambda: on_ready(frame))
+        
+        self.screenshot_manager.capture_frame_async(callback=callback)
     
     def send_task(self):
         """发送任务到服务端"""
@@ -718,18 +901,39 @@ class MainWindow(QMainWindow):
             self.result_display.append("❌ 请输入指令")
             return
         
+        # 新任务：结束上一任务的trace（停止、出错、屏幕无变化或未完成时不会自动结束），
+        # 分析、执行和验证都使用新的任务ID；只有自动继续的轮次沿用同一ID
+        self._finish_trace()
+        # 上一任务未保存的录制（停止、出错、结果不明或放弃继续）不再追加
+        self.execution_manager.discard_recorded_trace()
+        
+        # 同一指令之前执行成功过时在本地回放操作轨迹，不需要服务端分析
+        trace = self.execution_manager.find_trace(command)
+        if trace is not None and self.execution_manager.replay_trace(trace, f"replay_{int(time.time())}"):
+            self.current_task_command = command
+            self.result_display.append(f"♻️ 回放已录制的操作轨迹: {command} ({len(trace.steps)} 步)")
+            self.status_label.setText("回放中...")
+            self.send_task_btn.setEnabled(False)
+            return
+        
+        self._send_task_to_server(command)
+    
+    def _send_task_to_server(self, command):
+        """将任务发送给服务端分析"""
         if not self.current_screenshot_base64:
             self.result_display.append("❌ 请先截图")
+            self.send_task_btn.setEnabled(True)
             return
         
         # 保存当前任务指令
         self.current_task_command = command
+        self.analysis_frame = self.current_frame
         
-        # TaskWorker现在会自己建立连接，无需预先连接
-        # 但我们仍然需要有效的服务端地址
+        # 未预先连接时在共享长连接上自动建立连接，但仍然需要有效的服务端地址
         server_url = self.server_url_input.text().strip()
         if not server_url:
             self.result_display.append("❌ 请输入服务端地址")
+            self.send_task_btn.setEnabled(True)
             return
         
         # 显示发送状态
@@ -737,16 +941,32 @@ class MainWindow(QMainWindow):
         self.status_label.setText("发送中...")
         self.send_task_btn.setEnabled(False)
         
+        # 新任务开始trace，执行线程和共享连接上的span都归入该trace
+        if self.trace_id is None:
+            self.trace_id = str(uuid.uuid4())
+            get_tracer().activate(self.trace_id)
+        
+        # 当前帧已预解析时服务端直接进入Claude阶段
+        frame_ref, preparsed = self._preparsed_frame_ref()
+        if preparsed:
+            self.result_display.append("⚡ 使用预解析的屏幕元素")
+        
         # 创建工作线程处理任务
         self.task_worker = TaskWorker(
             self.server_url_input.text(),
             command, 
-            self.current_screenshot_base64
+            self.current_screenshot_base64,
+            upload_recorder=self.screenshot_manager.encoding_policy.record_upload,
+            server_client=self._get_server_client(),
+            frame_ref=frame_ref,
+            screenshot_preparsed=preparsed,
+            task_id=self.trace_id
         )
         self.task_worker.task_completed.connect(self.on_task_completed)
         self.task_worker.task_failed.connect(self.on_task_failed)
         self.task_worker.omniparser_result.connect(self.on_omniparser_result)
         self.task_worker.claude_result.connect(self.on_claude_result)
+        self.task_worker.action_partial.connect(self.on_action_partial)
         self.task_worker.start()
         
         # 清空之前的结果显示
@@ -814,6 +1034,9 @@ class MainWindow(QMainWindow):
             import traceback
             traceback.print_exc()
         finally:
+            # 服务端未返回Claude结果（例如降级为模拟分析）时结束流式计划
+            if self.execution_manager.is_streaming_plan():
+                self.execution_manager.finalize_streamed_plan(None)
             # 无论成功还是失败，都要重置UI状态
             self.status_label.setText("任务完成")
             self.send_task_btn.setEnabled(True)
@@ -857,18 +1080,8 @@ class MainWindow(QMainWindow):
                 self.annotated_info.setText(f"OmniParser: 检测到{element_count}个元素，处理时间{processing_time:.2f}秒")
             
             # 保存UI元素供执行使用
-            from shared.schemas.data_models import UIElement
-            self.current_ui_elements = []
-            for elem_data in ui_elements:
-                ui_element = UIElement(
-                    id=elem_data.get('id', 0),
-                    type=elem_data.get('type', ''),
-                    description=elem_data.get('description', ''),
-                    coordinates=elem_data.get('coordinates', []),
-                    text=elem_data.get('text', ''),
-                    confidence=elem_data.get('confidence', 0.0)
-                )
-                self.current_ui_elements.append(ui_element)
+            from shared.schemas.serialization import parse_ui_elements
+            self.current_ui_elements = parse_ui_elements(ui_elements)
             
             # 更新状态
             self.status_label.setText("OmniParser分析完成，等待Claude分析...")
@@ -947,8 +1160,11 @@ class MainWindow(QMainWindow):
             # 保存Claude输出用于后续任务完成度验证
             self.current_claude_output = f"推理过程: {reasoning}\n操作计划: {len(actions)}个步骤"
             
-            # 自动执行操作计划
-            if self.current_action_plan:
+            # 自动执行操作计划（流式执行中则补齐剩余操作）
+            if self.execution_manager.is_streaming_plan():
+                self.execution_manager.finalize_streamed_plan(self.current_action_plan, self.current_claude_output)
+                self.claude_display.append(f"\n🚀 <b>操作计划已完整接收，继续执行剩余操作...</b>")
+            elif self.current_action_plan:
                 self.claude_display.append(f"\n🚀 <b>操作计划已准备就绪，开始自动执行...</b>")
                 self._auto_execute_action_plan()
             else:
@@ -963,24 +1179,8 @@ class MainWindow(QMainWindow):
     def display_annotated_screenshot(self, annotated_base64):
         """显示标注后的截图"""
         try:
-            import base64
-            import io
-            from PIL import Image
-            
-            # 解码base64图像
-            image_data = base64.b64decode(annotated_base64)
-            image = Image.open(io.BytesIO(image_data))
-            
-            # 缩放图像以适应显示区域
-            display_img = image.resize((500, 300), Image.Resampling.LANCZOS)
-            
-            # 转换为QPixmap显示
-            buffer = io.BytesIO()
-            display_img.save(buffer, format='PNG')
-            pixmap = QPixmap()
-            pixmap.loadFromData(buffer.getvalue())
-            
-            self.annotated_screenshot_label.setPixmap(pixmap)
+            # 解码和缩放都在线程池中完成
+            self.annotated_display.show_encoded(annotated_base64)
             
         except Exception as e:
             self.annotated_screenshot_label.setText(f"显示标注截图失败: {str(e)}")
@@ -1050,11 +1250,51 @@ class MainWindow(QMainWindow):
             self.elements_stats.setText(f"更新UI元素表格失败: {str(e)}")
             print(f"更新UI元素表格错误: {e}")
     
+    def on_action_partial(self, response):
+        """处理Claude流式生成的单个操作，第一个操作到达时即开始执行"""
+        try:
+            from shared.schemas.data_models import ActionPlan
+            data = response.get('data', {})
+            index = data.get('index', 0)
+            action = ActionPlan(**data.get('action', {}))
+            
+            if index == 0 and not self.execution_manager.is_executing():
+                self.execution_manager.update_config(self._auto_execution_config())
+                self.execution_manager.start_streaming_plan(
+                    self.current_ui_elements,
+                    self._execution_task_id("auto_task"),
+                    self.current_task_command,
+                    analysis_frame=self._analysis_image()
+                )
+            
+            if self.execution_manager.append_streamed_action(action):
+                self.claude_display.append(f"⚡ 流式操作 {index + 1}: <b>{action.type}</b>: {action.description}")
+            
+        except Exception as e:
+            self.claude_display.append(f"❌ 处理流式操作失败: {str(e)}")
+    
     def on_task_failed(self, error_msg):
         """任务失败回调"""
+        # 结束流式计划，只执行已到达的操作
+        if self.execution_manager.is_streaming_plan():
+            self.execution_manager.finalize_streamed_plan(None)
         self.result_display.append(f"❌ 任务失败: {error_msg}")
         self.status_label.setText("任务失败")
         self.send_task_btn.setEnabled(True)
+        self._finish_trace()
+    
+    def _execution_task_id(self, prefix: str) -> str:
+        """
+        执行和完成度验证使用的任务ID：与分析请求的task_id（trace_id）一致，
+        服务端可以按它取回分析时保存的任务上下文做本地验证
+        """
+        return self.trace_id or f"{prefix}_{int(time.time())}"
+    
+    def _finish_trace(self):
+        """结束当前任务的trace并导出"""
+        if self.trace_id is not None:
+            get_tracer().finish(self.trace_id)
+            self.trace_id = None
     
     
     def _connect_execution_signals(self):
@@ -1068,6 +1308,21 @@ class MainWindow(QMainWindow):
         self.execution_manager.error_occurred.connect(self._on_execution_error)
         self.execution_manager.status_changed.connect(self._on_execution_status_changed)
         self.execution_manager.task_completion_check_requested.connect(self._on_task_completion_check_requested)
+        self.execution_manager.replay_finished.connect(self._on_replay_finished)
+    
+    def _auto_execution_config(self) -> ExecutionConfig:
+        """全自动执行配置，不需要用户确认"""
+        return ExecutionConfig(
+            mode=ExecutionMode.FULL_AUTO,
+            confirm_dangerous_actions=False,  # 关闭危险操作确认
+            screenshot_enabled=False,         # 关闭截图功能
+            strict_mode=False,
+            auto_retry=True
+        )
+    
+    def _analysis_image(self):
+        """服务端分析所用截图的原始图像（与上传的base64来自同一帧）"""
+        return self.analysis_frame.image if self.analysis_frame is not None else None
     
     def _auto_execute_action_plan(self):
         """自动执行操作计划（无用户干预）"""
@@ -1079,23 +1334,16 @@ class MainWindow(QMainWindow):
             self.result_display.append("❌ 已有任务在执行中")
             return
         
-        # 使用全自动模式，不需要用户确认
-        config = ExecutionConfig(
-            mode=ExecutionMode.FULL_AUTO,
-            confirm_dangerous_actions=False,  # 关闭危险操作确认
-            screenshot_enabled=False,         # 关闭截图功能
-            strict_mode=False,
-            auto_retry=True
-        )
-        self.execution_manager.update_config(config)
+        self.execution_manager.update_config(self._auto_execution_config())
         
         # 开始执行
         success = self.execution_manager.execute_action_plan(
             self.current_action_plan,
             self.current_ui_elements,
-            f"auto_task_{int(time.time())}",
+            self._execution_task_id("auto_task"),
             self.current_task_command,
-            self.current_claude_output
+            self.current_claude_output,
+            analysis_frame=self._analysis_image()
         )
         
         if not success:
@@ -1106,16 +1354,26 @@ class MainWindow(QMainWindow):
         try:
             # 使用任务完成度检查器进行验证
             from client.automation.task_completion_checker import TaskCompletionChecker
-            checker = TaskCompletionChecker()
+            # 复用检查器，使验证截图能与上一次验证截图比较
+            if self.completion_checker is None:
+                self.completion_checker = TaskCompletionChecker()
+                # 与预览截图共享编码策略（吞吐量估计和屏幕密度）
+                self.completion_checker.screenshot_manager.encoding_policy = self.screenshot_manager.encoding_policy
             
             # 检查任务完成度
-            check_result = checker.check_task_completion(
+            check_result = self.completion_checker.check_task_completion(
                 task_id, 
                 original_command, 
                 previous_claude_output
             )
             
-            if check_result.screenshot_base64 and check_result.verification_prompt:
+            if not check_result.frame_changed:
+                # 后续操作执行后屏幕没有变化，重新上传验证只会得到相同结论
+                self.claude_display.append(f"\n⚠️ <b>屏幕自上次验证以来没有变化，跳过验证上传并停止自动继续</b>")
+                self.status_label.setText("屏幕无变化")
+                self.execution_manager.discard_recorded_trace()
+                self._finish_trace()
+            elif check_result.frame_payload and check_result.verification_prompt:
                 # 启动任务完成度验证工作线程
                 self.verification_worker = TaskCompletionVerificationWorker(
                     self.server_url_input.text(),
@@ -1123,7 +1381,11 @@ class MainWindow(QMainWindow):
                     original_command,
                     previous_claude_output,
                     check_result.screenshot_base64,
-                    check_result.verification_prompt
+                    check_result.verification_prompt,
+                    frame_payload=check_result.frame_payload,
+                    frame_encoder=self.completion_checker.delta_encoder,
+                    upload_recorder=self.screenshot_manager.encoding_policy.record_upload,
+                    server_client=self._get_server_client()
                 )
                 
                 self.verification_worker.verification_completed.connect(self._on_verification_completed)
@@ -1153,6 +1415,9 @@ class MainWindow(QMainWindow):
             if status == "completed":
                 self.claude_display.append(f"\n🎉 <b>任务已完成！</b>")
                 self.status_label.setText("任务完成")
+                trace = self.execution_manager.save_recorded_trace()
+                if trace is not None:
+                    self.claude_display.append(f"💾 已录制操作轨迹（{len(trace.steps)} 步），再次执行该指令时将在本地回放")
             elif status == "incomplete":
                 next_steps = data.get('next_steps')
                 next_actions = data.get('next_actions')
@@ -1192,9 +1457,13 @@ class MainWindow(QMainWindow):
             elif status == "failed":
                 self.claude_display.append(f"\n❌ <b>任务执行失败</b>")
                 self.status_label.setText("任务失败")
+                self.execution_manager.discard_recorded_trace()
             else:
                 self.claude_display.append(f"\n❓ <b>无法确定任务状态</b>")
                 self.status_label.setText("状态不明")
+            
+            if status != "incomplete":
+                self._finish_trace()
         
         except Exception as e:
             self.claude_display.append(f"\n❌ <b>处理验证结果失败: {str(e)}</b>")
@@ -1203,6 +1472,7 @@ class MainWindow(QMainWindow):
         """任务完成度验证失败处理"""
         self.claude_display.append(f"\n❌ <b>任务完成度验证失败: {error_msg}</b>")
         self.status_label.setText("验证失败")
+        self._finish_trace()
     
     def _continue_task_execution(self, next_steps_description):
         """继续执行任务"""
@@ -1211,8 +1481,8 @@ class MainWindow(QMainWindow):
             self.command_input.setPlainText(next_steps_description)
             self.claude_display.append(f"\n🔄 <b>准备继续执行任务...</b>")
             
-            # 等待2秒后自动重新开始分析
-            QTimer.singleShot(2000, self.send_task)
+            # 等待2秒后自动重新开始分析（同一任务的后续轮次，继续录制同一条轨迹）
+            QTimer.singleShot(2000, lambda: self._send_task_to_server(next_steps_description))
             
         except Exception as e:
             self.claude_display.append(f"\n❌ <b>继续执行任务失败: {str(e)}</b>")
@@ -1243,7 +1513,7 @@ class MainWindow(QMainWindow):
             self.execution_manager.execute_action_plan(
                 action_plans, 
                 [], # UI元素列表（可以为空，因为操作指令已经包含必要信息）
-                f"continuation_{int(time.time())}", 
+                self._execution_task_id("continuation"), 
                 original_command,
                 "继续执行验证后的操作指令"
             )
@@ -1254,6 +1524,39 @@ class MainWindow(QMainWindow):
             print(f"Error in _continue_task_execution_with_actions: {traceback.format_exc()}")
     
     
+    def _on_replay_finished(self, trace, result):
+        """轨迹回放结束处理：成功时照常验证任务完成度，失败时截取新的屏幕交给服务端分析"""
+        if result.success:
+            self.result_display.append(f"✅ 轨迹回放完成: {result.completed_steps} 步，耗时 {result.elapsed:.2f}秒")
+            self.execution_status.setText("执行状态: 完成")
+            self.send_task_btn.setEnabled(True)
+            # 部分步骤只通过了PARTIAL校验，回放成功不代表任务完成
+            self._on_task_completion_check_requested(
+                f"replay_{int(time.time())}",
+                trace.command,
+                f"在本地回放了已录制的操作轨迹（{len(trace.steps)} 步）: "
+                + "; ".join(step.action.get('description', '') for step in trace.steps)
+            )
+            return
+        
+        if result.reason == "已停止":
+            self.result_display.append("⏹️ 轨迹回放已停止")
+            self.send_task_btn.setEnabled(True)
+            return
+        
+        self.result_display.append(
+            f"⚠️ 轨迹回放在第 {(result.failed_step or 0) + 1} 步中断: {result.reason}，改由服务端分析"
+        )
+        # 回放改变了屏幕，新截图成为当前截图后再发送
+        def send(frame):
+            if frame is None:
+                self.result_display.append("❌ 截图失败，无法交给服务端分析")
+                self.send_task_btn.setEnabled(True)
+                return
+            self._send_task_to_server(trace.command)
+        
+        self._capture_then(send)
+    
     def _on_execution_started(self, task_id):
         """执行开始处理"""
         self.execution_status.setText(f"执行状态: 正在执行 ({task_id})")
@@ -1329,9 +1632,11 @@ class MainWindow(QMainWindow):
                 self.screenshot_manager.shutdown()
             
             # 断开服务端连接
-            if self.server_client and self.server_client.connected:
+            if self.server_client:
                 self.server_client.disconnect_sync()
             
+            self._finish_trace()
+            
             # 停止执行管理器
             if hasattr(self, 'execution_manager') and self.execution_manager.is_executing():
                 self.execution_manager.stop_execution()
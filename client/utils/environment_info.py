@@ -0,0 +1,170 @@
+"""
+客户端环境信息 - 操作系统信息、屏幕分辨率和输入法状态只检测一次并缓存，
+显示器或键盘布局变化事件到来时失效，另有TTL兜底；每个请求直接使用缓存的 OSInfo 字典
+"""
+
+import logging
+import platform
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# 添加项目根目录到Python路径
+import sys
+import os
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(project_root)
+
+from shared.schemas.data_models import OSInfo
+
+logger = logging.getLogger(__name__)
+
+ScreenSizeProvider = Callable[[], Tuple[int, int]]
+DeviceScaleProvider = Callable[[], float]
+
+
+def primary_screen_size() -> Tuple[int, int]:
+    """主显示器分辨率：优先pyautogui（不截图），不可用时退回一次整屏截图"""
+    try:
+        import pyautogui
+        return tuple(pyautogui.size())
+    except ImportError:
+        from PIL import ImageGrab
+        return ImageGrab.grab().size
+
+
+class EnvironmentInfo:
+    """
+    客户端环境信息服务（线程安全）
+
+    - os_info(): 请求携带的操作系统信息，已按 OSInfo 校验并转为字典，多次调用返回同一对象（调用方不要修改）
+    - input_method(): 当前输入法状态（检测需要调用系统命令，单独按较短的TTL缓存）
+    - invalidate_display() / invalidate_input_method(): 由显示器变化、键盘布局变化等事件调用
+    """
+
+    def __init__(self, screen_size: Optional[ScreenSizeProvider] = None, config: Optional[Dict] = None,
+                 device_scale: Optional[DeviceScaleProvider] = None):
+        """
+        初始化环境信息服务
+
+        Args:
+            screen_size: 屏幕分辨率查询函数，默认查询主显示器
+            config: 配置字典
+            device_scale: 设备像素比查询函数（如GUI的 devicePixelRatio），未提供时不上报
+        """
+        self.config = config or {}
+        self.ttl = self.config.get('ttl', 300.0)                          # 无事件通知时OS信息的最长缓存时间
+        self.input_method_ttl = self.config.get('input_method_ttl', 30.0)  # 输入法状态的最长缓存时间
+
+        self._screen_size = screen_size or primary_screen_size
+        self._device_scale = device_scale
+        self._lock = threading.Lock()
+        self._platform: Optional[Dict[str, str]] = None  # 进程内不变的部分
+        self._os_info: Optional[Dict[str, Any]] = None
+        self._os_info_at = 0.0
+        self._input_method: Optional[Dict[str, Any]] = None
+        self._input_method_at = 0.0
+        self._detector = None
+        self.stats = {'os_info_refreshes': 0, 'input_method_refreshes': 0, 'invalidations': 0}
+
+    def os_info(self) -> Dict[str, Any]:
+        """
+        获取操作系统信息（缓存）
+
+        Returns:
+            Dict[str, Any]: OSInfo 字段字典，可直接放入请求data
+        """
+        info = self._os_info
+        if info is not None and time.monotonic() - self._os_info_at < self.ttl:
+            return info
+        with self._lock:
+            if self._os_info is None or time.monotonic() - self._os_info_at >= self.ttl:
+                self._os_info = self._detect_os_info()
+                self._os_info_at = time.monotonic()
+                self.stats['os_info_refreshes'] += 1
+            return self._os_info
+
+    def input_method(self) -> Dict[str, Any]:
+        """获取当前输入法信息（缓存，格式见 InputMethodDetector.get_input_method_dict）"""
+        info = self._input_method
+        if info is not None and time.monotonic() - self._input_method_at < self.input_method_ttl:
+            return info
+        with self._lock:
+            if self._input_method is None or time.monotonic() - self._input_method_at >= self.input_method_ttl:
+                if self._detector is None:
+                    from client.utils.input_method_detector import InputMethodDetector
+                    self._detector = InputMethodDetector()
+                self._input_method = self._detector.get_input_method_dict()
+                self._input_method_at = time.monotonic()
+                self.stats['input_method_refreshes'] += 1
+            return self._input_method
+
+    def set_device_scale_provider(self, device_scale: Optional[DeviceScaleProvider]):
+        """设置设备像素比查询函数（GUI创建后调用），下次请求重新检测"""
+        self._device_scale = device_scale
+        self.invalidate_display()
+
+    def invalidate_display(self):
+        """显示器增减或分辨率变化后调用，下次请求重新查询屏幕分辨率"""
+        with self._lock:
+            self._os_info = None
+            self.stats['invalidations'] += 1
+
+    def invalidate_input_method(self):
+        """输入法或键盘布局切换后调用"""
+        with self._lock:
+            self._input_method = None
+            self.stats['invalidations'] += 1
+
+    def invalidate(self):
+        """使全部缓存失效"""
+        self.invalidate_display()
+        self.invalidate_input_method()
+
+    def _detect_os_info(self) -> Dict[str, Any]:
+        try:
+            if self._platform is None:
+                self._platform = {
+                    "system": platform.system(),
+                    "version": platform.version(),
+                    "release": platform.release(),
+                    "machine": platform.machine(),
+                    "processor": platform.processor(),
+                    "platform": platform.platform(),
+                }
+            info = dict(self._platform)
+        except Exception as e:
+            return OSInfo(system="Unknown", version="Unknown", release="Unknown", machine="Unknown",
+                          processor="Unknown", platform="Unknown", error=str(e)).model_dump()
+
+        try:
+            screen_width, screen_height = self._screen_size()
+            info.update(screen_width=int(screen_width), screen_height=int(screen_height))
+        except Exception as e:
+            logger.warning(f"屏幕分辨率查询失败: {e}")
+            info['error'] = str(e)
+        if self._device_scale is not None:
+            try:
+                info['device_scale'] = float(self._device_scale())
+            except Exception as e:
+                logger.warning(f"设备像素比查询失败: {e}")
+        return OSInfo(**info).model_dump()
+
+    def get_stats(self) -> Dict[str, Any]:
+        info = self._os_info or {}
+        return {**self.stats, 'cached': bool(info),
+                'screen_size': (info.get('screen_width'), info.get('screen_height')) if info else None}
+
+
+_environment_info: Optional[EnvironmentInfo] = None
+_environment_lock = threading.Lock()
+
+
+def get_environment_info() -> EnvironmentInfo:
+    """获取主显示器的全局环境信息服务"""
+    global _environment_info
+    if _environment_info is None:
+        with _environment_lock:
+            if _environment_info is None:
+                _environment_info = EnvironmentInfo()
+    return _environment_info
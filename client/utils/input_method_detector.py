@@ -277,9 +277,10 @@ input_method_detector = InputMethodDetector()
 
 def get_current_input_method_info() -> Dict[str, Any]:
     """
-    便捷函数：获取当前输入法信息
+    便捷函数：获取当前输入法信息（经环境信息服务缓存，不会每次调用系统命令）
     
     Returns:
         Dict[str, Any]: 输入法信息字典
     """
-    return input_method_detector.get_input_method_dict()
\ No newline at end of file
+    from client.utils.environment_info import get_environment_info
+    return get_environment_info().input_method()
\ No newline at end of file
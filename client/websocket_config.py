@@ -6,6 +6,7 @@ import asyncio
 import websockets
 import json
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -15,7 +16,7 @@ WEBSOCKET_CONFIG = {
     'ping_interval': 60,            # 60秒ping间隔
     'ping_timeout': 30,             # 30秒ping超时
     'close_timeout': 30,            # 30秒关闭超时
-    'compression': None             # 禁用压缩
+    'compression': None             # 禁用permessage-deflate（ServerClient通过子协议协商选择性压缩，图像不压缩）
 }
 
 # 接收超时配置
@@ -61,11 +62,15 @@ async def send_websocket_message(websocket, message: dict, timeout: float = 10.0
         websocket: WebSocket连接
         message: 要发送的消息字典
         timeout: 发送超时时间
+    
+    Returns:
+        发送的字节数
     """
     try:
         message_json = json.dumps(message)
         await asyncio.wait_for(websocket.send(message_json), timeout=timeout)
         logger.debug(f"发送消息: {message.get('type', 'unknown')}")
+        return len(message_json)
     except asyncio.TimeoutError:
         raise Exception(f"发送消息超时 ({timeout}秒)")
     except Exception as e:
@@ -104,6 +109,9 @@ class WebSocketManager:
         self.uri = uri
         self.websocket = None
         self.connected = False
+        # 最近一次发送的大小和耗时，用于估计上传吞吐量
+        self.last_send_bytes = 0
+        self.last_send_seconds = 0.0
     
     async def connect(self, max_retries: int = 3):
         """连接WebSocket"""
@@ -133,7 +141,9 @@ class WebSocketManager:
         if not self.connected or not self.websocket:
             raise Exception("WebSocket未连接")
         
-        await send_websocket_message(self.websocket, message, timeout)
+        start_time = time.time()
+        self.last_send_bytes = await send_websocket_message(self.websocket, message, timeout)
+        self.last_send_seconds = time.time() - start_time
     
     async def receive_message(self, timeout: float = None):
         """接收消息"""
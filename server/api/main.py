@@ -1,5 +1,5 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-import json
+import asyncio
 import time
 import uvicorn
 import sys
@@ -10,10 +10,17 @@ project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(_
 sys.path.append(project_root)
 
 from shared.schemas.data_models import (
-    TaskAnalysisRequest, TaskAnalysisResponse, ActionPlan, UIElement,
-    OmniParserResult, ClaudeAnalysisResult, MessageType,
-    CompletionVerificationRequest, CompletionVerificationResponse
+    TaskAnalysisRequest, TaskAnalysisResponse, ActionPlan,
+    OmniParserResult, ClaudeAnalysisResult, ActionPartialResult, MessageType,
+    CompletionVerificationRequest, CompletionVerificationResponse, FrameResyncRequest,
+    PreparseRequest, PreparseResult
 )
+from server.utils.frame_buffer import SessionFrameBuffer, FrameResyncRequired
+from server.utils.parse_cache import ScreenParseCache, ParsedScreen
+from server.utils.server_metrics import ServerMetrics
+from shared.schemas.serialization import parse_ui_elements
+from shared.utils.tracing import TRACE_FIELD, SpanContext, configure_tracer, get_tracer
+from shared.utils.wire_codec import WireCodec, WireStats, codec_from_subprotocol, select_subprotocol
 
 app = FastAPI(title="Computer Use Agent Server", version="1.0.0")
 
@@ -21,10 +28,49 @@ app = FastAPI(title="Computer Use Agent Server", version="1.0.0")
 omniparser_service = None
 claude_service = None
 
+# 按会话重建增量上传的截图
+frame_buffer = SessionFrameBuffer()
+
+# 按 (会话, 帧) 缓存OmniParser解析结果，预解析和任务分析共享
+parse_cache = ScreenParseCache()
+
+# 连接数、排队深度、各阶段耗时和内存，由 /stats 输出
+metrics = ServerMetrics()
+
+# 客户端通过子协议协商的消息压缩（WIRE_CODECS 为空时只收发JSON文本），所有连接共用编码统计
+WIRE_CODECS = [name for name in os.environ.get("WIRE_CODECS", "zstd,zlib").split(",") if name]
+WIRE_COMPRESSION_LEVEL = int(os.environ["WIRE_COMPRESSION_LEVEL"]) if os.environ.get("WIRE_COMPRESSION_LEVEL") else None
+wire_stats = WireStats()
+
+# Claude CLI 请求对冲（CLAUDE_HEDGING=1 启用），其余参数未设置时使用 HedgingPolicy 的默认值
+CLAUDE_HEDGING_ENV = {
+    "CLAUDE_HEDGE_PERCENTILE": ("hedge_percentile", float),
+    "CLAUDE_HEDGE_MIN_SAMPLES": ("min_samples", int),
+    "CLAUDE_HEDGE_MIN_DELAY": ("min_delay", float),
+    "CLAUDE_HEDGE_MAX_RATE": ("max_hedge_rate", float),
+    "CLAUDE_MAX_CONCURRENCY": ("max_concurrency", int),
+}
+
+def hedging_config_from_env() -> dict:
+    """从环境变量读取对冲配置"""
+    config = {"enabled": os.environ.get("CLAUDE_HEDGING") == "1"}
+    for name, (key, convert) in CLAUDE_HEDGING_ENV.items():
+        if os.environ.get(name):
+            config[key] = convert(os.environ[name])
+    return config
+
+# 请求携带trace上下文时记录各阶段span并随最终响应返回；设置 TRACE_DIR 时服务端也导出到本地
+configure_tracer("server", enabled=False)
+
 def initialize_services():
     """初始化所有服务"""
     global omniparser_service, claude_service
     
+    # 压测等场景由调用方注入替身服务
+    if os.environ.get("SKIP_SERVICE_INITIALIZATION") == "1":
+        print("📝 跳过服务初始化")
+        return
+    
     # 初始化OmniParser服务
     try:
         from server.omniparser import OmniParserService
@@ -37,8 +83,14 @@ def initialize_services():
     # 初始化Claude服务
     try:
         from server.claude import ClaudeService
-        claude_service = ClaudeService()
+        claude_service = ClaudeService({'hedging': hedging_config_from_env()})
         print("✅ Claude服务初始化成功")
+        if claude_service.hedging_policy.enabled:
+            print("⚡ 已启用Claude请求对冲")
+        
+        # 本地快速验证使用OmniParser的OCR匹配预期文本
+        if omniparser_service and omniparser_service.is_available():
+            claude_service.local_verifier.set_text_extractor(omniparser_service.extract_text)
     except Exception as e:
         print(f"❌ Claude服务初始化失败: {e}")
         print("📝 将使用模拟分析模式")
@@ -50,18 +102,51 @@ class ConnectionManager:
     def __init__(self):
         self.active_connections: list[WebSocket] = []
     
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
+    async def connect(self, websocket: WebSocket) -> WireCodec:
+        """接受连接并按客户端提供的子协议选择消息编码"""
+        subprotocol = select_subprotocol(websocket.scope.get("subprotocols", []), WIRE_CODECS)
+        await websocket.accept(subprotocol=subprotocol)
         self.active_connections.append(websocket)
-        print(f"新客户端连接，当前连接数: {len(self.active_connections)}")
+        metrics.connections = len(self.active_connections)
+        codec = codec_from_subprotocol(subprotocol)
+        print(f"新客户端连接（消息编码: {codec or 'json'}），当前连接数: {len(self.active_connections)}")
+        return WireCodec(codec, WIRE_COMPRESSION_LEVEL, stats=wire_stats)
     
     def disconnect(self, websocket: WebSocket):
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
+        metrics.connections = len(self.active_connections)
         print(f"客户端断开连接，当前连接数: {len(self.active_connections)}")
 
 manager = ConnectionManager()
 
+# 单个连接上同时处理的请求数上限，超出的请求排队等待
+MAX_CONCURRENT_REQUESTS_PER_CONNECTION = int(os.environ.get("MAX_CONCURRENT_REQUESTS_PER_CONNECTION", "8"))
+
+class ResponseChannel:
+    """
+    单个请求的响应通道
+    
+    同一连接上的多个请求并发处理，共享发送锁保证消息不交错；
+    请求携带request_id时回传到该请求的每条消息中，客户端据此路由响应
+    """
+    def __init__(self, websocket: WebSocket, send_lock: asyncio.Lock, request_id: str = None,
+                 codec: WireCodec = None):
+        self.websocket = websocket
+        self.send_lock = send_lock
+        self.request_id = request_id
+        self.codec = codec or WireCodec(stats=wire_stats)
+    
+    async def send(self, payload: dict):
+        if self.request_id:
+            payload = {**payload, "request_id": self.request_id}
+        data = self.codec.encode(payload)
+        async with self.send_lock:
+            if isinstance(data, bytes):
+                await self.websocket.send_bytes(data)
+            else:
+                await self.websocket.send_text(data)
+
 @app.get("/")
 async def root():
     return {"message": "Computer Use Agent Server is running"}
@@ -69,53 +154,141 @@ async def root():
 @app.get("/health")
 async def health_check():
     omniparser_status = omniparser_service.get_status() if omniparser_service else {"available": False}
-    claude_status = {"available": claude_service is not None} if claude_service else {"available": False}
+    claude_status = {
+        "available": True,
+        "hedging": claude_service.hedging_policy.get_metrics()
+    } if claude_service else {"available": False}
     return {
         "status": "healthy", 
         "timestamp": time.time(),
         "omniparser": omniparser_status,
-        "claude": claude_status
+        "claude": claude_status,
+        "frame_buffer": frame_buffer.get_stats(),
+        "parse_cache": parse_cache.get_stats()
+    }
+
+@app.get("/stats")
+async def server_stats():
+    """运行指标：连接数、排队深度、各阶段耗时分位数和内存"""
+    return {
+        "timestamp": time.time(),
+        **metrics.get_stats(),
+        "frame_buffer": frame_buffer.get_stats(),
+        "parse_cache": parse_cache.get_stats(),
+        "wire": wire_stats.get_stats()
     }
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    codec = await manager.connect(websocket)
+    
+    # 每个请求在独立的协程中处理，长时间的Claude调用不会阻塞同一连接上的其他请求
+    send_lock = asyncio.Lock()
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS_PER_CONNECTION)
+    request_tasks = set()
     
     try:
         while True:
-            # 接收客户端消息
-            data = await websocket.receive_text()
-            message = json.loads(data)
+            # 接收客户端消息（JSON文本或协商编码后的二进制帧）
+            raw = await websocket.receive()
+            if raw["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(raw.get("code", 1000))
+            received_at = time.time()
+            message = codec.decode(raw["bytes"] if raw.get("bytes") is not None else raw["text"])
             
             print(f"收到消息类型: {message.get('type')}")
             
-            if message.get("type") == "analyze_task":
-                # 处理任务分析请求（支持分阶段响应）
-                response = await handle_task_analysis(message, websocket)
-                await websocket.send_text(json.dumps(response))
-            elif message.get("type") == "verify_task_completion":
-                # 处理任务完成度验证请求（旧版本兼容）
-                response = await handle_task_completion_verification(message, websocket)
-                await websocket.send_text(json.dumps(response))
-            elif message.get("type") == MessageType.VERIFY_COMPLETION:
-                # 处理简化的任务完成验证请求
-                response = await handle_simple_completion_verification(message, websocket)
-                await websocket.send_text(json.dumps(response))
-            else:
-                # 未知消息类型
-                error_response = {
-                    "type": "error",
-                    "message": f"未知消息类型: {message.get('type')}"
-                }
-                await websocket.send_text(json.dumps(error_response))
+            channel = ResponseChannel(websocket, send_lock, message.get("request_id"), codec)
+            task = asyncio.create_task(dispatch_message(message, channel, semaphore, received_at))
+            request_tasks.add(task)
+            task.add_done_callback(request_tasks.discard)
                 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
     except Exception as e:
         print(f"WebSocket错误: {e}")
         manager.disconnect(websocket)
+    finally:
+        # 连接已断开，未完成请求的响应无法送达
+        for task in request_tasks:
+            task.cancel()
+
+async def dispatch_message(message: dict, channel: ResponseChannel, semaphore: asyncio.Semaphore,
+                           received_at: float = None):
+    """处理单个请求并发送最终响应"""
+    tracer = get_tracer()
+    trace_context = tracer.extract(message)
+    with tracer.continue_trace(trace_context):
+        await process_message(message, channel, semaphore, received_at, trace_context)
+    if trace_context:
+        # 导出响应发送阶段等未随响应返回的span（配置了导出目标时）
+        tracer.finish(trace_context.trace_id)
+
+def attach_trace_spans(response: dict, trace_context: SpanContext) -> dict:
+    """在最终响应中带回本次请求在服务端记录的span，客户端汇总为完整的瀑布图（由客户端导出，服务端不重复导出）"""
+    spans = get_tracer().take(trace_context.trace_id)
+    return {**response, TRACE_FIELD: {
+        "trace_id": trace_context.trace_id,
+        "spans": [span.to_dict() for span in spans]
+    }}
 
-async def handle_task_analysis(message: dict, websocket: WebSocket) -> dict:
+async def process_message(message: dict, channel: ResponseChannel, semaphore: asyncio.Semaphore,
+                          received_at: float, trace_context: SpanContext):
+    """排队等待并发名额，处理请求并发送最终响应（记录指标和span）"""
+    tracer = get_tracer()
+    message_type = str(message.get("type"))
+    queued_at = time.time()
+    if received_at:
+        tracer.record("receive_decode", received_at, queued_at, type=message_type)
+    # 排队期间被取消（连接断开）的请求同样要离开队列
+    metrics.request_queued()
+    try:
+        await semaphore.acquire()
+    finally:
+        metrics.request_dequeued()
+    metrics.request_started()
+    started_at = time.time()
+    metrics.record("queue_wait", started_at - queued_at)
+    tracer.record("server_queue", queued_at, started_at)
+    success = False
+    try:
+        with tracer.span(f"handle.{message_type}"):
+            response = await handle_message(message, channel)
+        if trace_context:
+            response = attach_trace_spans(response, trace_context)
+        with tracer.span("response"):
+            await channel.send(response)
+        success = response.get("type") != "error"
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"处理请求失败: {e}")
+    finally:
+        semaphore.release()
+        metrics.request_finished(message_type, time.time() - started_at, success)
+
+async def handle_message(message: dict, channel: ResponseChannel) -> dict:
+    """按消息类型处理请求，返回最终响应"""
+    if message.get("type") == "analyze_task":
+        # 处理任务分析请求（支持分阶段响应）
+        return await handle_task_analysis(message, channel)
+    elif message.get("type") == "verify_task_completion":
+        # 处理任务完成度验证请求（旧版本兼容）
+        return await handle_task_completion_verification(message, channel)
+    elif message.get("type") == MessageType.PREPARSE:
+        # 用户输入指令期间预先解析当前帧
+        return await handle_preparse(message, channel)
+    elif message.get("type") == MessageType.VERIFY_COMPLETION:
+        # 处理简化的任务完成验证请求
+        return await handle_simple_completion_verification(message, channel)
+    # 未知消息类型
+    return {
+        "type": "error",
+        "task_id": message.get("task_id"),
+        "message": f"未知消息类型: {message.get('type')}"
+    }
+
+async def handle_task_analysis(message: dict, channel: ResponseChannel) -> dict:
     """处理任务分析请求（支持分阶段响应）"""
     try:
         # 解析请求数据
@@ -125,40 +298,51 @@ async def handle_task_analysis(message: dict, websocket: WebSocket) -> dict:
         
         print(f"处理任务: {task_id}")
         print(f"指令: {request.text_command}")
-        print(f"截图数据长度: {len(request.screenshot_base64)}")
         
-        # 第一阶段：使用OmniParser分析屏幕元素
+        # 获取屏幕分辨率
+        screen_resolution = get_screen_resolution(request.os_info)
+        device_scale = get_device_scale(request.os_info)
+        if screen_resolution:
+            print(f"📏 使用屏幕分辨率: {screen_resolution}")
+        else:
+            print("⚠️  未获取到屏幕分辨率，使用图片尺寸")
+        
+        # 引用已预解析的帧时客户端可以省略截图，从解析缓存中取回
+        preparsed = parse_cache.get(request.session_id, request.frame_id, screen_resolution, device_scale)
+        screenshot_base64 = request.screenshot_base64
+        if screenshot_base64 is None:
+            try:
+                if preparsed is None:
+                    raise LookupError("预解析结果不在缓存中")
+                screenshot_base64 = (await asyncio.shield(preparsed)).screenshot_base64
+            except Exception as e:
+                return build_frame_resync_response(task_id, FrameResyncRequired(request.session_id or "", str(e)))
+        print(f"截图数据长度: {len(screenshot_base64)}")
+        
+        # 第一阶段：使用OmniParser分析屏幕元素（命中预解析缓存时直接使用缓存结果）
         ui_elements = []
         annotated_screenshot = None
         omni_start_time = time.time()
         
         if omniparser_service and omniparser_service.is_available():
             try:
-                print("🔍 使用OmniParser分析屏幕元素...")
-                # 获取屏幕分辨率
-                screen_resolution = None
-                if request.os_info and request.os_info.screen_width and request.os_info.screen_height:
-                    screen_resolution = (request.os_info.screen_width, request.os_info.screen_height)
-                    print(f"📏 使用屏幕分辨率: {screen_resolution}")
+                if preparsed is not None:
+                    print(f"⚡ 使用预解析结果: 帧 {request.frame_id}")
                 else:
-                    print("⚠️  未获取到屏幕分辨率，使用图片尺寸")
+                    print("🔍 使用OmniParser分析屏幕元素...")
                 
-                annotated_img_base64, parsed_elements = omniparser_service.parse_screen(request.screenshot_base64, screen_resolution)
+                # shield: 请求被取消（客户端断开）时不中断其他请求共享的解析
+                parsed = await asyncio.shield(parse_screen_cached(
+                    request.session_id, request.frame_id, screenshot_base64, screen_resolution, device_scale
+                ))
+                annotated_img_base64, parsed_elements = parsed.annotated_screenshot_base64, parsed.parsed_elements
                 
-                # 转换为标准格式
-                ui_elements = [
-                    UIElement(
-                        id=elem.get('id', i),
-                        type=elem.get('type', 'unknown'),
-                        description=elem.get('description', ''),
-                        coordinates=elem.get('coordinates', []),
-                        text=elem.get('text', ''),
-                        confidence=elem.get('confidence', 0.0)
-                    ) for i, elem in enumerate(parsed_elements)
-                ]
+                # 转换为标准格式（整个列表一次校验）
+                ui_elements = parse_ui_elements(parsed_elements)
                 
                 annotated_screenshot = annotated_img_base64
                 omni_processing_time = time.time() - omni_start_time
+                metrics.record("omniparser", omni_processing_time)
                 
                 print(f"✅ 检测到 {len(ui_elements)} 个UI元素")
                 
@@ -179,7 +363,7 @@ async def handle_task_analysis(message: dict, websocket: WebSocket) -> dict:
                     "data": omni_result.model_dump()
                 }
                 
-                await websocket.send_text(json.dumps(omni_message))
+                await channel.send(omni_message)
                 print("📤 OmniParser结果已发送给客户端")
                 
             except Exception as e:
@@ -192,16 +376,53 @@ async def handle_task_analysis(message: dict, websocket: WebSocket) -> dict:
             try:
                 print("🧠 使用Claude进行智能任务分析...")
                 
-                actions, reasoning, confidence = claude_service.analyze_task_with_claude(
-                    request.text_command,
-                    request.screenshot_base64,
-                    ui_elements,
-                    annotated_screenshot,
-                    request.os_info,
-                    task_id  # 传递task_id给记忆模块
-                )
+                # Claude在线程池中执行，流式生成的操作经队列转发给客户端，客户端可提前开始执行
+                loop = asyncio.get_running_loop()
+                partial_queue: asyncio.Queue = asyncio.Queue()
+                
+                def on_action(index: int, action: ActionPlan):
+                    loop.call_soon_threadsafe(partial_queue.put_nowait, (index, action))
+                
+                async def forward_partial_actions():
+                    while True:
+                        item = await partial_queue.get()
+                        if item is None:
+                            break
+                        index, action = item
+                        if index == 0:
+                            metrics.record("claude_first_action", time.time() - claude_start_time)
+                        partial_message = {
+                            "type": MessageType.ACTION_PARTIAL.value,
+                            "task_id": task_id,
+                            "timestamp": time.time(),
+                            "data": ActionPartialResult(task_id=task_id, index=index, action=action).model_dump()
+                        }
+                        await channel.send(partial_message)
+                        print(f"📤 流式操作 #{index} 已发送: {action.type}")
+                
+                forwarder = asyncio.create_task(forward_partial_actions())
+                try:
+                    actions, reasoning, confidence = await loop.run_in_executor(
+                        None,
+                        get_tracer().bind(lambda: claude_service.analyze_task_with_claude(
+                            request.text_command,
+                            screenshot_base64,
+                            ui_elements,
+                            annotated_screenshot,
+                            request.os_info,
+                            task_id,  # 传递task_id给记忆模块
+                            on_action
+                        ))
+                    )
+                finally:
+                    # 回调经call_soon_threadsafe入队，哨兵排在所有已产出操作之后
+                    loop.call_soon_threadsafe(partial_queue.put_nowait, None)
+                    await forwarder
                 
                 claude_processing_time = time.time() - claude_start_time
+                metrics.record("claude", claude_processing_time)
+                task_context = claude_service.memory.get_task_context(task_id) or {}
+                expected_outcome = task_context.get('expected_outcome') or "根据Claude分析生成的操作计划"
                 
                 # 发送Claude分析结果
                 claude_result = ClaudeAnalysisResult(
@@ -209,7 +430,7 @@ async def handle_task_analysis(message: dict, websocket: WebSocket) -> dict:
                     success=True,
                     reasoning=reasoning,
                     actions=actions,
-                    expected_outcome="根据Claude分析生成的操作计划",
+                    expected_outcome=expected_outcome,
                     confidence=confidence,
                     processing_time=claude_processing_time
                 )
@@ -221,7 +442,7 @@ async def handle_task_analysis(message: dict, websocket: WebSocket) -> dict:
                     "data": claude_result.model_dump()
                 }
                 
-                await websocket.send_text(json.dumps(claude_message))
+                await channel.send(claude_message)
                 print(f"✅ Claude分析完成，生成 {len(actions)} 个操作步骤")
                 
                 # 创建最终响应（兼容性）
@@ -230,7 +451,7 @@ async def handle_task_analysis(message: dict, websocket: WebSocket) -> dict:
                     success=True,
                     reasoning=reasoning,
                     actions=actions,
-                    expected_outcome="根据Claude分析生成的操作计划",
+                    expected_outcome=expected_outcome,
                     confidence=confidence,
                     ui_elements=ui_elements,
                     annotated_screenshot_base64=annotated_screenshot
@@ -264,7 +485,72 @@ async def handle_task_analysis(message: dict, websocket: WebSocket) -> dict:
             "message": f"任务分析失败: {str(e)}"
         }
 
-async def handle_task_completion_verification(message: dict, websocket: WebSocket) -> dict:
+def get_screen_resolution(os_info) -> tuple:
+    """从客户端系统信息中获取屏幕分辨率，缺失时返回None（使用图片尺寸）"""
+    if os_info and os_info.screen_width and os_info.screen_height:
+        return (os_info.screen_width, os_info.screen_height)
+    return None
+
+def get_device_scale(os_info) -> float:
+    """从客户端系统信息中获取设备像素比，缺失时返回None（截图像素即屏幕坐标）"""
+    if os_info and os_info.device_scale:
+        return os_info.device_scale
+    return None
+
+def parse_screen_cached(session_id: str, frame_id: int, screenshot_base64: str, screen_resolution: tuple,
+                        device_scale: float = None) -> asyncio.Future:
+    """在线程池中用OmniParser解析截图，结果按 (会话, 帧) 缓存，同一帧的并发请求共享一次解析"""
+    async def run_parser() -> ParsedScreen:
+        start_time = time.time()
+        with get_tracer().span("omniparser.parse"):
+            annotated_img_base64, parsed_elements = await asyncio.get_running_loop().run_in_executor(
+                None, get_tracer().bind(omniparser_service.parse_screen), screenshot_base64, screen_resolution,
+                device_scale
+            )
+        return ParsedScreen(
+            screenshot_base64=screenshot_base64,
+            annotated_screenshot_base64=annotated_img_base64,
+            parsed_elements=parsed_elements,
+            processing_time=time.time() - start_time
+        )
+    return parse_cache.parse(session_id, frame_id, screen_resolution, run_parser, device_scale)
+
+async def handle_preparse(message: dict, channel: ResponseChannel) -> dict:
+    """处理预解析请求：解析当前帧并缓存，之后引用该帧的任务请求跳过OmniParser阶段"""
+    data = message.get("data", {})
+    try:
+        request = PreparseRequest(**data)
+        
+        if not (omniparser_service and omniparser_service.is_available()):
+            result = PreparseResult(session_id=request.session_id, frame_id=request.frame_id,
+                                    success=False, error="OmniParser不可用")
+        else:
+            print(f"🔍 预解析帧 {request.frame_id} (会话 {request.session_id[:8]})")
+            parsed = await asyncio.shield(parse_screen_cached(
+                request.session_id, request.frame_id, request.screenshot_base64,
+                get_screen_resolution(request.os_info), get_device_scale(request.os_info)
+            ))
+            result = PreparseResult(
+                session_id=request.session_id,
+                frame_id=request.frame_id,
+                success=True,
+                element_count=len(parsed.parsed_elements),
+                processing_time=parsed.processing_time
+            )
+            print(f"✅ 预解析完成: {result.element_count} 个UI元素")
+    except Exception as e:
+        print(f"预解析失败: {e}")
+        result = PreparseResult(session_id=str(data.get("session_id", "")), frame_id=int(data.get("frame_id") or 0),
+                                success=False, error=str(e))
+    
+    return {
+        "type": MessageType.PREPARSE_RESULT.value,
+        "task_id": message.get("task_id"),
+        "timestamp": time.time(),
+        "data": result.model_dump()
+    }
+
+async def handle_task_completion_verification(message: dict, channel: ResponseChannel) -> dict:
     """处理任务完成度验证请求"""
     try:
         # 解析请求数据
@@ -272,9 +558,20 @@ async def handle_task_completion_verification(message: dict, websocket: WebSocke
         task_id = message["task_id"]
         original_command = verification_data["original_command"]
         previous_claude_output = verification_data["previous_claude_output"]
-        screenshot_base64 = verification_data.get("screenshot_base64")
         verification_prompt = verification_data.get("verification_prompt")
         
+        try:
+            screenshot_base64 = await asyncio.get_running_loop().run_in_executor(
+                None,
+                get_tracer().bind(frame_buffer.resolve),
+                verification_data.get("screenshot_base64"),
+                verification_data.get("session_id"),
+                verification_data.get("frame_id"),
+                verification_data.get("frame_delta")
+            )
+        except FrameResyncRequired as e:
+            return build_frame_resync_response(task_id, e)
+        
         print(f"处理任务完成度验证: {task_id}")
         print(f"原始指令: {original_command}")
         print(f"使用内存截图数据进行验证")
@@ -283,12 +580,17 @@ async def handle_task_completion_verification(message: dict, websocket: WebSocke
         if claude_service:
             try:
                 print("🔍 使用Claude验证任务完成度...")
-                status, reasoning, confidence, next_steps, next_actions = claude_service.verify_task_completion_with_base64(
+                verify_start_time = time.time()
+                status, reasoning, confidence, next_steps, next_actions = await asyncio.get_running_loop().run_in_executor(
+                    None,
+                    get_tracer().bind(claude_service.verify_task_completion_with_base64),
                     original_command,
                     previous_claude_output,
                     screenshot_base64,
-                    verification_prompt
+                    verification_prompt,
+                    task_id
                 )
+                metrics.record("verification", time.time() - verify_start_time)
                 
                 print(f"✅ 任务完成度验证结果: {status} (置信度: {confidence:.2f})")
                 if next_steps:
@@ -352,7 +654,7 @@ async def handle_task_completion_verification(message: dict, websocket: WebSocke
             "message": f"任务完成度验证失败: {str(e)}"
         }
 
-async def handle_simple_completion_verification(message: dict, websocket: WebSocket) -> dict:
+async def handle_simple_completion_verification(message: dict, channel: ResponseChannel) -> dict:
     """处理简化的任务完成验证请求"""
     try:
         # 解析请求数据
@@ -362,14 +664,26 @@ async def handle_simple_completion_verification(message: dict, websocket: WebSoc
         
         print(f"处理简化任务完成度验证: {task_id}")
         
+        try:
+            screenshot_base64 = await asyncio.get_running_loop().run_in_executor(
+                None, get_tracer().bind(frame_buffer.resolve),
+                request.screenshot_base64, request.session_id, request.frame_id, request.frame_delta
+            )
+        except FrameResyncRequired as e:
+            return build_frame_resync_response(task_id, e)
+        
         # 使用Claude服务的简化验证接口
         if claude_service:
             try:
                 print("🔍 使用简化接口验证任务完成度...")
-                verification_result = claude_service.verify_completion_simple(
-                    task_id, 
-                    request.screenshot_base64
+                verify_start_time = time.time()
+                verification_result = await asyncio.get_running_loop().run_in_executor(
+                    None,
+                    get_tracer().bind(claude_service.verify_completion_simple),
+                    task_id,
+                    screenshot_base64
                 )
+                metrics.record("verification", time.time() - verify_start_time)
                 
                 print(f"✅ 简化验证结果: {verification_result.status} (置信度: {verification_result.confidence:.2f})")
                 
@@ -426,6 +740,16 @@ async def handle_simple_completion_verification(message: dict, websocket: WebSoc
             "message": f"简化任务完成度验证失败: {str(e)}"
         }
 
+def build_frame_resync_response(task_id: str, error: FrameResyncRequired) -> dict:
+    """构建要求客户端重新发送关键帧的响应"""
+    print(f"🔄 帧缓冲需要重新同步: {error.reason}")
+    return {
+        "type": MessageType.FRAME_RESYNC.value,
+        "task_id": task_id,
+        "timestamp": time.time(),
+        "data": FrameResyncRequest(session_id=error.session_id, reason=error.reason).model_dump()
+    }
+
 def simulate_ai_analysis(task_id: str, request: TaskAnalysisRequest, ui_elements: list = None) -> TaskAnalysisResponse:
     """模拟AI分析过程（临时实现）"""
     
@@ -3,34 +3,54 @@ Claude服务 - 集成Claude模型进行智能任务分析和操作指令生成
 """
 
 import subprocess
+import selectors
+import threading
+import queue
+import codecs
 import tempfile
 import os
-import base64
 import json
 import logging
 import time
 import re
-from typing import Dict, List, Optional, Tuple
-from PIL import Image
-import io
+from typing import Callable, Dict, List, Optional, Tuple
 
 from shared.schemas.data_models import ActionPlan, UIElement, OSInfo, CompletionVerificationRequest, CompletionVerificationResponse, CompletionStatus
+from shared.utils.coordinate_converter import element_centers
+from shared.utils.tracing import get_tracer
+from .prompt_compactor import PromptCompactor
+from .streaming_parser import StreamingActionParser
+from .local_verifier import LocalCompletionVerifier
+from .image_store import EphemeralImageStore
+from .hedging import HedgingPolicy
 
 logger = logging.getLogger(__name__)
 
+
+class _CommandCancelled(RuntimeError):
+    """命令被取消（对冲请求中的失败方）"""
+
+    def __init__(self):
+        super().__init__("Claude command cancelled")
+
+
 class TaskMemory:
     """任务记忆模块 - 存储任务上下文信息"""
     
     def __init__(self):
         self.task_contexts: Dict[str, Dict] = {}
     
-    def save_task_context(self, task_id: str, original_command: str, actions: List[ActionPlan], reasoning: str, ui_elements: Optional[List[UIElement]] = None):
-        """保存任务上下文"""
+    def save_task_context(self, task_id: str, original_command: str, actions: List[ActionPlan], reasoning: str, ui_elements: Optional[List[UIElement]] = None,
+                          expected_outcome: Optional[str] = None, expected_texts: Optional[List[str]] = None, baseline_fingerprint=None):
+        """保存任务上下文（预期结果和执行前截图指纹用于本地快速验证）"""
         self.task_contexts[task_id] = {
             'original_command': original_command,
             'actions': actions,
             'reasoning': reasoning,
             'ui_elements': ui_elements or [],
+            'expected_outcome': expected_outcome,
+            'expected_texts': expected_texts or [],
+            'baseline_fingerprint': baseline_fingerprint,
             'created_at': time.time()
         }
         logger.info(f"Saved context for task {task_id} with {len(ui_elements) if ui_elements else 0} UI elements")
@@ -67,9 +87,8 @@ class ClaudeService:
             config: 配置字典
         """
         self.config = config or {}
-        # 使用固定的img目录而不是临时目录
-        self.img_dir = "/root/autodl-tmp/computer-use-agent/server/claude/img"
-        os.makedirs(self.img_dir, exist_ok=True)
+        # 按内容寻址的临时图像存储（tmpfs），每个请求持有独立引用，避免并发请求互相覆盖
+        self.image_store = EphemeralImageStore(self.config.get('image_store', {}))
         
         # 初始化记忆模块
         self.memory = TaskMemory()
@@ -77,8 +96,22 @@ class ClaudeService:
         # 重试配置
         self.max_retries = self.config.get('max_retries', 3)
         self.retry_delay = self.config.get('retry_delay', 2.0)
+        self.command_timeout = self.config.get('command_timeout', 300)  # 5分钟超时
+        
+        # 对冲请求（默认关闭）：主请求超过p90延迟仍无输出时发起第二个相同请求
+        self.hedging_policy = HedgingPolicy(self.config.get('hedging', {}), backend="claude-cli")
         
-        logger.info(f"Claude service initialized with img dir: {self.img_dir}, max_retries: {self.max_retries}")
+        # Prompt压缩配置
+        self.prompt_compaction_enabled = self.config.get('prompt_compaction_enabled', True)
+        self.prompt_compactor = PromptCompactor(self.config.get('prompt_compaction', {}))
+        
+        # 本地快速验证（文本提取函数由服务端在OmniParser可用时注入）
+        self.local_verifier = LocalCompletionVerifier(self.config.get('local_verification', {}))
+        
+        # 最近一个元素列表的中心点 (元素列表, 元素数, ID -> 中心点)
+        self._element_centers_cache = None
+        
+        logger.info(f"Claude service initialized with image store: {self.image_store.root_dir}, max_retries: {self.max_retries}")
     
     def analyze_task_with_claude(
         self, 
@@ -87,7 +120,8 @@ class ClaudeService:
         ui_elements: List[UIElement],
         annotated_screenshot_base64: Optional[str] = None,
         os_info: Optional[OSInfo] = None,
-        task_id: Optional[str] = None
+        task_id: Optional[str] = None,
+        on_action: Optional[Callable[[int, ActionPlan], None]] = None
     ) -> Tuple[List[ActionPlan], str, float]:
         """
         使用Claude分析任务并生成pyautogui操作指令
@@ -99,29 +133,44 @@ class ClaudeService:
             annotated_screenshot_base64: 标注后的截图base64编码（可选）
             os_info: 操作系统信息
             task_id: 任务ID，用于记忆管理
+            on_action: 流式回调 (index, action)，Claude每输出一个完整操作即调用一次，
+                       早于最终结果返回；最终结果仍包含全部操作
             
         Returns:
             Tuple[List[ActionPlan], str, float]: (操作计划列表, 推理过程, 置信度)
         """
+        tracer = get_tracer()
         try:
-            # 保存图像文件
-            image_path = self._save_image_from_base64(
-                annotated_screenshot_base64 or screenshot_base64, 
-                "analysis_image.png"
-            )
-            
             # 构建Claude分析提示
-            prompt = self._build_analysis_prompt(text_command, ui_elements, os_info)
+            with tracer.span("prompt_build", elements=len(ui_elements)):
+                prompt = self._build_analysis_prompt(text_command, ui_elements, os_info)
+            
+            # 流式解析：actions数组中每个操作闭合后立即转换并回调
+            stream_parser = None
+            if on_action:
+                stream_parser = StreamingActionParser(
+                    lambda index, action_data: on_action(index, self._build_action_plan(action_data, ui_elements))
+                )
             
-            # 执行Claude命令（带重试机制）
-            claude_response = self._execute_claude_command_with_retry(prompt, image_path)
+            # 执行Claude命令（带重试机制），图像在调用期间由存储持有
+            with self.image_store.acquire(annotated_screenshot_base64 or screenshot_base64) as image_path:
+                claude_response = self._execute_claude_command_with_retry(prompt, image_path, stream_parser)
             
             # 解析Claude响应
-            actions, reasoning, confidence = self._parse_claude_response(claude_response, ui_elements)
+            with tracer.span("parse"):
+                actions, reasoning, confidence = self._parse_claude_response(claude_response, ui_elements)
+            if stream_parser and stream_parser.emitted_count:
+                logger.info(f"Streamed {stream_parser.emitted_count}/{len(actions)} actions before response completed")
             
             # 保存到记忆模块
             if task_id:
-                self.memory.save_task_context(task_id, text_command, actions, reasoning, ui_elements)
+                expected_outcome, expected_texts = self._extract_expected_outcome(claude_response)
+                self.memory.save_task_context(
+                    task_id, text_command, actions, reasoning, ui_elements,
+                    expected_outcome=expected_outcome,
+                    expected_texts=expected_texts,
+                    baseline_fingerprint=self.local_verifier.fingerprint(screenshot_base64)
+                )
             
             return actions, reasoning, confidence
             
@@ -170,7 +219,8 @@ class ClaudeService:
         original_command: str, 
         previous_claude_output: str,
         screenshot_base64: str,
-        verification_prompt: str = None
+        verification_prompt: str = None,
+        task_id: Optional[str] = None
     ) -> Tuple[str, str, float, Optional[str], Optional[List[Dict]]]:
         """
         使用Claude验证任务完成度（使用base64截图数据）
@@ -180,40 +230,38 @@ class ClaudeService:
             previous_claude_output: 上一轮Claude输出
             screenshot_base64: 截图的base64数据
             verification_prompt: 可选的自定义验证提示词
+            task_id: 任务ID，记忆模块中有该任务的上下文时先做本地快速验证
             
         Returns:
             Tuple[str, str, float, Optional[str], Optional[List[Dict]]]: (状态, 推理过程, 置信度, 下一步建议, 下一步操作)
         """
+        tracer = get_tracer()
         try:
+            # 本地快速验证，结果确定时无需调用Claude
+            task_context = self.memory.get_task_context(task_id) if task_id else None
+            if task_context:
+                local_result = self.local_verifier.verify(task_context, screenshot_base64)
+                if local_result:
+                    return (local_result.status.value, local_result.reasoning, local_result.confidence,
+                            local_result.next_steps, None)
+            
             # 如果没有提供自定义提示词，使用默认的构建方法
             if not verification_prompt:
-                verification_prompt = self._build_completion_verification_prompt(
-                    original_command, 
-                    previous_claude_output
-                )
+                with tracer.span("prompt_build"):
+                    verification_prompt = self._build_completion_verification_prompt(
+                        original_command, 
+                        previous_claude_output
+                    )
             
-            # 将base64数据保存为临时文件用于Claude分析
-            timestamp = int(time.time())
-            temp_filename = f"verification_temp_{timestamp}.png"
-            temp_filepath = self._save_image_from_base64(screenshot_base64, temp_filename)
+            # 执行Claude命令（带重试机制），截图在调用期间由临时图像存储持有
+            with self.image_store.acquire(screenshot_base64) as image_path:
+                claude_response = self._execute_claude_command_with_retry(verification_prompt, image_path)
             
-            try:
-                # 执行Claude命令（带重试机制）
-                claude_response = self._execute_claude_command_with_retry(verification_prompt, temp_filepath)
-                
-                # 解析Claude响应（增强版，支持next_steps和next_actions）
+            # 解析Claude响应（增强版，支持next_steps和next_actions）
+            with tracer.span("parse"):
                 status, reasoning, confidence, next_steps, next_actions = self._parse_completion_response_enhanced(claude_response)
-                
-                return status, reasoning, confidence, next_steps, next_actions
-                
-            finally:
-                # 清理临时文件
-                try:
-                    if os.path.exists(temp_filepath):
-                        os.remove(temp_filepath)
-                        logger.debug(f"Cleaned up temp file: {temp_filepath}")
-                except Exception as cleanup_error:
-                    logger.warning(f"Failed to cleanup temp file {temp_filepath}: {cleanup_error}")
+            
+            return status, reasoning, confidence, next_steps, next_actions
             
         except Exception as e:
             logger.error(f"Claude task completion verification with base64 failed: {str(e)}")
@@ -246,6 +294,18 @@ class ClaudeService:
                     verification_time=time.time() - start_time
                 )
             
+            # 本地快速验证，结果确定时无需调用Claude
+            local_result = self.local_verifier.verify(task_context, screenshot_base64)
+            if local_result:
+                return CompletionVerificationResponse(
+                    task_id=task_id,
+                    status=local_result.status,
+                    reasoning=local_result.reasoning,
+                    confidence=local_result.confidence,
+                    next_steps=local_result.next_steps,
+                    verification_time=time.time() - start_time
+                )
+            
             original_command = task_context['original_command']
             previous_reasoning = task_context['reasoning']
             
@@ -256,39 +316,25 @@ class ClaudeService:
                 task_context
             )
             
-            # 保存截图用于分析
-            timestamp = int(time.time())
-            temp_filename = f"verification_{task_id}_{timestamp}.png"
-            temp_filepath = self._save_image_from_base64(screenshot_base64, temp_filename)
+            # 执行Claude命令，截图在调用期间由临时图像存储持有
+            with self.image_store.acquire(screenshot_base64) as image_path:
+                claude_response = self._execute_claude_command_with_retry(prompt, image_path)
             
-            try:
-                # 执行Claude命令
-                claude_response = self._execute_claude_command_with_retry(prompt, temp_filepath)
-                
-                # 解析响应（使用增强版解析器，支持坐标提取）
-                ui_elements = task_context.get('ui_elements', [])
-                status, reasoning, confidence, next_steps, next_actions = self._parse_completion_response_enhanced(claude_response, ui_elements)
-                
-                verification_time = time.time() - start_time
-                
-                return CompletionVerificationResponse(
-                    task_id=task_id,
-                    status=CompletionStatus(status),
-                    reasoning=reasoning,
-                    confidence=confidence,
-                    next_steps=next_steps,
-                    next_actions=next_actions,
-                    verification_time=verification_time
-                )
-                
-            finally:
-                # 清理临时文件
-                try:
-                    if os.path.exists(temp_filepath):
-                        os.remove(temp_filepath)
-                        logger.debug(f"Cleaned up temp file: {temp_filepath}")
-                except Exception as cleanup_error:
-                    logger.warning(f"Failed to cleanup temp file {temp_filepath}: {cleanup_error}")
+            # 解析响应（使用增强版解析器，支持坐标提取）
+            ui_elements = task_context.get('ui_elements', [])
+            status, reasoning, confidence, next_steps, next_actions = self._parse_completion_response_enhanced(claude_response, ui_elements)
+            
+            verification_time = time.time() - start_time
+            
+            return CompletionVerificationResponse(
+                task_id=task_id,
+                status=CompletionStatus(status),
+                reasoning=reasoning,
+                confidence=confidence,
+                next_steps=next_steps,
+                next_actions=next_actions,
+                verification_time=verification_time
+            )
                     
         except Exception as e:
             logger.error(f"Simple completion verification failed for task {task_id}: {str(e)}")
@@ -301,37 +347,6 @@ class ClaudeService:
                 verification_time=time.time() - start_time
             )
     
-    def _save_image_from_base64(self, image_base64: str, filename: str) -> str:
-        """
-        将base64图像保存为文件
-        
-        Args:
-            image_base64: base64编码的图像
-            filename: 文件名
-            
-        Returns:
-            str: 保存的文件路径
-        """
-        try:
-            # 移除data URL前缀（如果存在）
-            if image_base64.startswith('data:image'):
-                image_base64 = image_base64.split(',')[1]
-            
-            # 解码图像数据
-            image_data = base64.b64decode(image_base64)
-            image = Image.open(io.BytesIO(image_data))
-            
-            # 保存图像到img目录
-            image_path = os.path.join(self.img_dir, filename)
-            image.save(image_path)
-            
-            logger.info(f"Image saved to: {image_path}")
-            return image_path
-            
-        except Exception as e:
-            logger.error(f"Failed to save image: {str(e)}")
-            raise
-    
     def _build_analysis_prompt(self, text_command: str, ui_elements: List[UIElement], os_info: Optional[OSInfo] = None) -> str:
         """
         构建Claude分析提示
@@ -345,16 +360,22 @@ class ClaudeService:
             str: 分析提示
         """
         # 构建UI元素描述
-        elements_description = []
-        for elem in ui_elements:
-            elem_desc = f"ID:{elem.id} 类型:{elem.type} 描述:{elem.description}"
-            if elem.coordinates and len(elem.coordinates) >= 4:
-                elem_desc += f" 坐标:[{elem.coordinates[0]},{elem.coordinates[1]},{elem.coordinates[2]},{elem.coordinates[3]}]"
-            if elem.text:
-                elem_desc += f" 文本:'{elem.text}'"
-            elements_description.append(elem_desc)
-        
-        elements_text = "\n".join(elements_description) if elements_description else "无UI元素检测到"
+        if not ui_elements:
+            elements_text = "无UI元素检测到"
+        elif self.prompt_compaction_enabled:
+            # 按相关性排序、去重并在token预算内编码为紧凑表格
+            screen_size = None
+            if os_info and os_info.screen_width and os_info.screen_height:
+                screen_size = (os_info.screen_width, os_info.screen_height)
+            table_text, stats = self.prompt_compactor.compact(text_command, ui_elements, screen_size)
+            elements_text = f"(按与指令的相关性排序，列格式: {PromptCompactor.HEADER})\n{table_text}"
+            logger.info(
+                f"Prompt compaction: {stats.kept_elements}/{stats.total_elements} elements kept, "
+                f"{stats.deduplicated} deduplicated, {stats.original_chars} -> {stats.compact_chars} chars, "
+                f"~{stats.estimated_tokens}/{stats.token_budget} tokens"
+            )
+        else:
+            elements_text = "\n".join(PromptCompactor._verbose_line(elem) for elem in ui_elements)
         
         # 构建操作系统信息
         os_text = "未知"
@@ -377,6 +398,8 @@ class ClaudeService:
 {{
     "reasoning": "简短的分析推理过程，不要使用双引号",
     "confidence": 0.8,
+    "expected_outcome": "任务完成后屏幕应呈现的状态，不要使用双引号",
+    "expected_texts": ["任务完成后屏幕上一定能看到的短文本，如窗口标题或结果值"],
     "actions": [
         {{
             "type": "click",
@@ -413,6 +436,7 @@ JSON格式要求:
 3. 确保JSON格式完全有效
 4. 对于点击操作，必须使用element_id引用上面列出的UI元素
 5. 如果没有合适的UI元素可以点击，在reasoning中说明并提供替代方案
+6. expected_texts只列出能确定出现在屏幕上的文本，无法确定时留空数组
 
 操作系统特定要求:
 - Windows系统: 使用Windows特定的快捷键(如Win+R, Alt+Tab等)
@@ -617,13 +641,19 @@ JSON格式要求:
 
         return prompt
     
-    def _execute_claude_command_with_retry(self, prompt: str, image_path: str) -> str:
+    def _execute_claude_command_with_retry(
+        self,
+        prompt: str,
+        image_path: str,
+        stream_parser: Optional[StreamingActionParser] = None
+    ) -> str:
         """
         执行Claude命令（带重试机制）
         
         Args:
             prompt: 分析提示
             image_path: 图像文件路径
+            stream_parser: 流式解析器（可选），增量消费命令输出；重试时已产出的操作不会重复产出
             
         Returns:
             str: Claude响应
@@ -636,46 +666,17 @@ JSON格式要求:
                     logger.info(f"Claude命令重试 {attempt}/{self.max_retries}")
                     time.sleep(self.retry_delay * attempt)  # 指数退避
                 
-                response = self._execute_claude_command(prompt, image_path)
-                
-                # 验证响应是否为空或无效
-                if not response or response.strip() == "":
-                    raise RuntimeError("Claude returned empty response")
-                
-                # 简单验证响应是否包含有效内容
-                if len(response.strip()) < 10:
-                    raise RuntimeError(f"Claude response too short: {len(response)} chars")
-                
-                # 检测Claude CLI界面消息，但尝试提取JSON内容
-                cli_messages = [
-                    "Welcome to Claude Code",
-                    "🌟",
-                    "You are using the canonical relay", 
-                    "If the relay doesn't work",
-                    "Execution error",
-                    "claude --pick-relay"
-                ]
-                
-                contains_cli_message = any(msg in response for msg in cli_messages)
-                if contains_cli_message:
-                    logger.warning(f"Claude CLI interface detected, attempting to extract JSON content")
-                    # 尝试提取JSON部分
-                    if '{' in response and '}' in response:
-                        # 找到第一个'{'和最后一个'}'之间的内容
-                        start_idx = response.find('{')
-                        end_idx = response.rfind('}')
-                        if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-                            json_content = response[start_idx:end_idx+1]
-                            logger.info(f"Extracted JSON content from CLI response: {len(json_content)} chars")
-                            response = json_content
-                        else:
-                            raise RuntimeError(f"Could not extract JSON from CLI response: {response[:100]}")
-                    else:
-                        raise RuntimeError(f"Claude returned CLI interface message without JSON: {response[:100]}")
-                
-                # 验证响应是否包含JSON格式（基本检查）
-                if not ('{' in response and '}' in response):
-                    raise RuntimeError(f"Claude response doesn't contain JSON structure: {response[:100]}")
+                if stream_parser:
+                    stream_parser.begin_attempt()
+                with get_tracer().span("llm", attempt=attempt + 1, prompt_chars=len(prompt)) as span:
+                    response, hedge_won = self._execute_claude_command_hedged(
+                        prompt, image_path, on_output=stream_parser.feed if stream_parser else None
+                    )
+                    span.set(hedge_won=hedge_won)
+                if hedge_won and stream_parser:
+                    # 对冲请求的输出没有流式送入解析器，补充解析（已产出的操作不会重复产出）
+                    stream_parser.begin_attempt()
+                    stream_parser.feed(response)
                 
                 logger.info(f"Claude命令成功 (尝试 {attempt + 1})")
                 return response
@@ -690,13 +691,190 @@ JSON格式要求:
         logger.error(f"Claude命令最终失败，已重试 {self.max_retries} 次")
         raise last_error or RuntimeError("Claude command failed after all retries")
     
-    def _execute_claude_command(self, prompt: str, image_path: str) -> str:
+    def _validate_claude_response(self, response: str) -> str:
+        """
+        校验Claude响应，必要时从CLI界面消息中提取JSON
+        
+        Args:
+            response: Claude原始响应
+            
+        Returns:
+            str: 校验后的响应
+            
+        Raises:
+            RuntimeError: 响应无效
+        """
+        # 验证响应是否为空或无效
+        if not response or response.strip() == "":
+            raise RuntimeError("Claude returned empty response")
+        
+        # 简单验证响应是否包含有效内容
+        if len(response.strip()) < 10:
+            raise RuntimeError(f"Claude response too short: {len(response)} chars")
+        
+        # 检测Claude CLI界面消息，但尝试提取JSON内容
+        cli_messages = [
+            "Welcome to Claude Code",
+            "🌟",
+            "You are using the canonical relay", 
+            "If the relay doesn't work",
+            "Execution error",
+            "claude --pick-relay"
+        ]
+        
+        contains_cli_message = any(msg in response for msg in cli_messages)
+        if contains_cli_message:
+            logger.warning(f"Claude CLI interface detected, attempting to extract JSON content")
+            # 尝试提取JSON部分
+            if '{' in response and '}' in response:
+                # 找到第一个'{'和最后一个'}'之间的内容
+                start_idx = response.find('{')
+                end_idx = response.rfind('}')
+                if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
+                    json_content = response[start_idx:end_idx+1]
+                    logger.info(f"Extracted JSON content from CLI response: {len(json_content)} chars")
+                    response = json_content
+                else:
+                    raise RuntimeError(f"Could not extract JSON from CLI response: {response[:100]}")
+            else:
+                raise RuntimeError(f"Claude returned CLI interface message without JSON: {response[:100]}")
+        
+        # 验证响应是否包含JSON格式（基本检查）
+        if not ('{' in response and '}' in response):
+            raise RuntimeError(f"Claude response doesn't contain JSON structure: {response[:100]}")
+        
+        return response
+    
+    def _execute_claude_command_hedged(
+        self,
+        prompt: str,
+        image_path: str,
+        on_output: Optional[Callable[[str], object]] = None
+    ) -> Tuple[str, bool]:
+        """
+        执行Claude命令，按对冲策略在主请求迟迟没有输出时发起第二个相同请求
+        
+        主请求一旦开始输出（已经流式送入解析器），立即取消对冲请求并丢弃其结果，
+        返回的操作不会混合两个请求的输出
+        
+        Args:
+            prompt: 分析提示
+            image_path: 图像文件路径
+            on_output: 输出回调（仅主请求的输出会实时回调）
+            
+        Returns:
+            Tuple[str, bool]: (校验后的响应, 是否由对冲请求返回)
+        """
+        policy = self.hedging_policy
+        hedge_delay = policy.hedge_delay()
+        start_time = time.time()
+        
+        if hedge_delay is None:
+            if policy.enabled:
+                policy.acquire()
+            try:
+                response = self._validate_claude_response(self._execute_claude_command(prompt, image_path, on_output))
+            finally:
+                if policy.enabled:
+                    policy.release()
+            elapsed = time.time() - start_time
+            policy.record(elapsed, hedged=False, hedge_won=False, primary_elapsed=elapsed)
+            return response, False
+        
+        results: queue.Queue = queue.Queue()
+        cancel_events = {'primary': threading.Event(), 'hedge': threading.Event()}
+        primary_output = threading.Event()
+        hedge_chosen = threading.Event()
+        decision_lock = threading.Lock()  # 主请求的首次输出与选定对冲结果互斥
+        
+        def primary_on_output(text: str):
+            with decision_lock:
+                if hedge_chosen.is_set():
+                    return  # 对冲请求已胜出，主请求即将被取消
+                if not primary_output.is_set():
+                    primary_output.set()
+                    cancel_events['hedge'].set()
+            if on_output:
+                on_output(text)
+        
+        def run(role: str, output_callback: Callable[[str], object]):
+            try:
+                response = self._execute_claude_command(
+                    prompt, image_path, on_output=output_callback, cancel_event=cancel_events[role]
+                )
+                results.put((role, self._validate_claude_response(response), None, time.time()))
+            except Exception as e:
+                results.put((role, None, e, time.time()))
+            finally:
+                policy.release()
+        
+        policy.acquire()
+        threading.Thread(target=run, args=('primary', primary_on_output), daemon=True).start()
+        running = {'primary'}
+        hedged = False
+        
+        try:
+            role, response, error, finished_at = results.get(timeout=hedge_delay)
+        except queue.Empty:
+            role = None
+            # 主请求已有输出说明没有卡住，不需要对冲
+            if not primary_output.is_set() and policy.allow_hedge() and policy.acquire(blocking=False):
+                logger.info(f"Claude主请求 {hedge_delay:.1f}s 内无输出，发起对冲请求")
+                threading.Thread(target=run, args=('hedge', lambda text: None), daemon=True).start()
+                running.add('hedge')
+                hedged = True
+        
+        first_error = None
+        primary_finished_at = None
+        hedge_cancelled = 0
+        while True:
+            if role is None:
+                role, response, error, finished_at = results.get()
+            running.discard(role)
+            if role == 'primary':
+                primary_finished_at = finished_at
+            # 主请求已开始流式输出时对冲结果一律丢弃（通常是被取消导致的错误），只等待主请求
+            with decision_lock:
+                discarded = role == 'hedge' and primary_output.is_set()
+                if role == 'hedge' and not discarded and error is None:
+                    hedge_chosen.set()
+            if discarded:
+                hedge_cancelled = int(error is not None)
+            elif error is None:
+                break
+            else:
+                first_error = first_error or error
+            if not running:
+                policy.record(time.time() - start_time, hedged, hedge_won=False,
+                              primary_elapsed=(primary_finished_at or time.time()) - start_time)
+                raise first_error
+            role = None
+        
+        # 取消仍在运行的请求
+        for loser in running:
+            cancel_events[loser].set()
+        cancelled = len(running) + hedge_cancelled
+        
+        latency = finished_at - start_time
+        primary_elapsed = (primary_finished_at or time.time()) - start_time
+        policy.record(latency, hedged, hedge_won=(role == 'hedge'), primary_elapsed=primary_elapsed, cancelled=cancelled)
+        return response, role == 'hedge'
+    
+    def _execute_claude_command(
+        self,
+        prompt: str,
+        image_path: str,
+        on_output: Optional[Callable[[str], object]] = None,
+        cancel_event: Optional[threading.Event] = None
+    ) -> str:
         """
         执行Claude命令行工具
         
         Args:
             prompt: 分析提示
             image_path: 图像文件路径
+            on_output: 输出回调（可选），提供时逐块读取stdout并实时回调
+            cancel_event: 取消事件（可选），被设置时终止子进程
             
         Returns:
             str: Claude响应
@@ -714,13 +892,16 @@ JSON格式要求:
             
             logger.debug(f"Executing Claude command: {' '.join(cmd[:2])} [prompt with image path]")
             
-            # 执行命令（5分钟超时）
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=300  # 5分钟超时
-            )
+            # 执行命令（默认5分钟超时）
+            if on_output or cancel_event:
+                result = self._run_command_streaming(cmd, on_output or (lambda text: None), cancel_event)
+            else:
+                result = subprocess.run(
+                    cmd,
+                    capture_output=True,
+                    text=True,
+                    timeout=self.command_timeout
+                )
             
             if result.returncode == 0:
                 response = result.stdout.strip()
@@ -755,6 +936,69 @@ JSON格式要求:
             logger.error(f"Error executing Claude command: {str(e)}")
             raise
     
+    def _run_command_streaming(
+        self,
+        cmd: List[str],
+        on_output: Callable[[str], object],
+        cancel_event: Optional[threading.Event] = None
+    ) -> subprocess.CompletedProcess:
+        """
+        执行命令并逐块读取stdout，每读到一块文本即回调
+        
+        Args:
+            cmd: 命令参数列表
+            on_output: 输出回调
+            cancel_event: 取消事件（可选），被设置时终止子进程
+            
+        Returns:
+            subprocess.CompletedProcess: 与subprocess.run一致的结果
+        """
+        deadline = time.time() + self.command_timeout
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        
+        # stderr在后台线程读取，避免管道写满阻塞子进程
+        stderr_chunks: List[bytes] = []
+        stderr_thread = threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)
+        stderr_thread.start()
+        
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        stdout_chunks: List[str] = []
+        try:
+            with selectors.DefaultSelector() as selector:
+                selector.register(process.stdout, selectors.EVENT_READ)
+                while True:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise subprocess.TimeoutExpired(cmd, self.command_timeout)
+                    if cancel_event and cancel_event.is_set():
+                        raise _CommandCancelled()
+                    if not selector.select(timeout=min(remaining, 0.2)):
+                        continue
+                    data = os.read(process.stdout.fileno(), 4096)
+                    if not data:
+                        break
+                    text = decoder.decode(data)
+                    if text:
+                        stdout_chunks.append(text)
+                        on_output(text)
+            
+            tail = decoder.decode(b'', final=True)
+            if tail:
+                stdout_chunks.append(tail)
+                on_output(tail)
+            
+            returncode = process.wait(timeout=max(0.1, deadline - time.time()))
+        except (subprocess.TimeoutExpired, _CommandCancelled):
+            process.kill()
+            process.wait()
+            raise
+        finally:
+            process.stdout.close()
+        
+        stderr_thread.join(timeout=1.0)
+        stderr = b''.join(stderr_chunks).decode('utf-8', errors='replace')
+        return subprocess.CompletedProcess(cmd, returncode, ''.join(stdout_chunks), stderr)
+    
     def _extract_coordinates_from_element_id(self, element_id: str, ui_elements: List[UIElement]) -> Optional[List[int]]:
         """
         根据元素ID从UI元素列表中提取边界框中心点坐标
@@ -772,28 +1016,62 @@ JSON格式要求:
         try:
             # 元素ID可能是字符串，需要转换为整数
             element_id_int = int(element_id)
-            
-            # 在UI元素列表中查找对应的元素
-            for element in ui_elements:
-                if element.id == element_id_int:
-                    coordinates = element.coordinates
-                    if coordinates and len(coordinates) >= 4:
-                        # 计算边界框中心点
-                        x1, y1, x2, y2 = coordinates[:4]
-                        center_x = int((x1 + x2) / 2)
-                        center_y = int((y1 + y2) / 2)
-                        logger.debug(f"Element {element_id} center coordinates: ({center_x}, {center_y})")
-                        return [center_x, center_y]
-                    else:
-                        logger.warning(f"Element {element_id} has invalid coordinates: {coordinates}")
-                        return None
-            
-            logger.warning(f"Element with ID {element_id} not found in UI elements list")
-            return None
-            
         except (ValueError, TypeError) as e:
             logger.warning(f"Invalid element_id format: {element_id}, error: {e}")
             return None
+        
+        centers = self._element_centers(ui_elements)
+        key = str(element_id_int)
+        if key not in centers:
+            logger.warning(f"Element with ID {element_id} not found in UI elements list")
+            return None
+        center = centers[key]
+        if center is None:
+            logger.warning(f"Element {element_id} has invalid coordinates")
+            return None
+        logger.debug(f"Element {element_id} center coordinates: {center}")
+        return list(center)
+    
+    def _element_centers(self, ui_elements: List[UIElement]) -> Dict[str, Optional[Tuple[int, int]]]:
+        """
+        元素ID -> 中心点（同一元素列表只计算一次，一个响应中的多个操作共用）
+        """
+        cached = self._element_centers_cache
+        if cached is not None and cached[0] is ui_elements and cached[1] == len(ui_elements):
+            return cached[2]
+        centers = element_centers(ui_elements)
+        self._element_centers_cache = (ui_elements, len(ui_elements), centers)
+        return centers
+    
+    def _build_action_plan(self, action_data: Dict, ui_elements: List[UIElement]) -> ActionPlan:
+        """
+        将Claude输出的单个操作字典转换为ActionPlan
+        
+        Args:
+            action_data: 操作字典
+            ui_elements: UI元素列表（用于坐标提取）
+            
+        Returns:
+            ActionPlan: 操作计划
+        """
+        element_id = action_data.get("element_id")
+        coordinates = action_data.get("coordinates")
+        
+        # 如果有element_id但没有coordinates，尝试从UI元素中提取坐标
+        if element_id and not coordinates:
+            extracted_coords = self._extract_coordinates_from_element_id(element_id, ui_elements)
+            if extracted_coords:
+                coordinates = extracted_coords
+                logger.debug(f"Extracted coordinates {coordinates} for element_id {element_id}")
+        
+        return ActionPlan(
+            type=action_data.get("type", ""),
+            description=action_data.get("description", ""),
+            element_id=element_id,
+            coordinates=coordinates,
+            text=action_data.get("text"),
+            duration=action_data.get("duration")
+        )
     
     def _parse_claude_response(self, response: str, ui_elements: List[UIElement]) -> Tuple[List[ActionPlan], str, float]:
         """
@@ -824,27 +1102,7 @@ JSON格式要求:
                 actions_data = response_data.get("actions", [])
                 
                 # 转换为ActionPlan对象
-                actions = []
-                for action_data in actions_data:
-                    element_id = action_data.get("element_id")
-                    coordinates = action_data.get("coordinates")
-                    
-                    # 如果有element_id但没有coordinates，尝试从UI元素中提取坐标
-                    if element_id and not coordinates:
-                        extracted_coords = self._extract_coordinates_from_element_id(element_id, ui_elements)
-                        if extracted_coords:
-                            coordinates = extracted_coords
-                            logger.debug(f"Extracted coordinates {coordinates} for element_id {element_id}")
-                    
-                    action = ActionPlan(
-                        type=action_data.get("type", ""),
-                        description=action_data.get("description", ""),
-                        element_id=element_id,
-                        coordinates=coordinates,
-                        text=action_data.get("text"),
-                        duration=action_data.get("duration")
-                    )
-                    actions.append(action)
+                actions = [self._build_action_plan(action_data, ui_elements) for action_data in actions_data]
                 
                 logger.info(f"Parsed {len(actions)} actions from Claude response")
                 return actions, reasoning, confidence
@@ -856,27 +1114,7 @@ JSON格式要求:
                 confidence = float(response_data.get("confidence", 0.5))
                 actions_data = response_data.get("actions", [])
                 
-                actions = []
-                for action_data in actions_data:
-                    element_id = action_data.get("element_id")
-                    coordinates = action_data.get("coordinates")
-                    
-                    # 如果有element_id但没有coordinates，尝试从UI元素中提取坐标
-                    if element_id and not coordinates:
-                        extracted_coords = self._extract_coordinates_from_element_id(element_id, ui_elements)
-                        if extracted_coords:
-                            coordinates = extracted_coords
-                            logger.debug(f"Extracted coordinates {coordinates} for element_id {element_id}")
-                    
-                    action = ActionPlan(
-                        type=action_data.get("type", ""),
-                        description=action_data.get("description", ""),
-                        element_id=element_id,
-                        coordinates=coordinates,
-                        text=action_data.get("text"),
-                        duration=action_data.get("duration")
-                    )
-                    actions.append(action)
+                actions = [self._build_action_plan(action_data, ui_elements) for action_data in actions_data]
                 
                 logger.info(f"Parsed {len(actions)} actions from Claude response")
                 return actions, reasoning, confidence
@@ -901,6 +1139,28 @@ JSON格式要求:
             logger.error(f"Error parsing Claude response: {str(e)}")
             return self._create_fallback_actions(response), f"Parsing error: {str(e)}", 0.2
     
+    def _extract_expected_outcome(self, response: str) -> Tuple[Optional[str], List[str]]:
+        """
+        从Claude分析响应中提取预期结果，用于后续本地验证
+        
+        Args:
+            response: Claude响应文本
+            
+        Returns:
+            Tuple[Optional[str], List[str]]: (预期结果描述, 预期出现的文本列表)
+        """
+        try:
+            json_start = response.find('{')
+            json_end = response.rfind('}') + 1
+            response_data = json.loads(response[json_start:json_end])
+        except (ValueError, TypeError):
+            return None, []
+        
+        expected_texts = response_data.get("expected_texts") or []
+        if not isinstance(expected_texts, list):
+            expected_texts = [expected_texts]
+        return response_data.get("expected_outcome"), [str(t) for t in expected_texts if t]
+    
     def _parse_completion_response(self, response: str) -> Tuple[str, str, float]:
         """
         解析Claude任务完成度验证响应
@@ -1365,17 +1625,12 @@ JSON格式要求:
         return "继续执行原始任务指令"
     
     def cleanup(self):
-        """清理临时文件（保留img目录）"""
+        """清理临时图像存储"""
         try:
-            # 只清理分析生成的临时图片，保留img目录
-            analysis_files = [f for f in os.listdir(self.img_dir) if f.startswith('analysis_')]
-            for file in analysis_files:
-                file_path = os.path.join(self.img_dir, file)
-                if os.path.isfile(file_path):
-                    os.remove(file_path)
-                    logger.debug(f"Cleaned up analysis file: {file_path}")
+            if hasattr(self, 'image_store'):
+                self.image_store.close()
         except Exception as e:
-            logger.warning(f"Failed to cleanup analysis files: {e}")
+            logger.warning(f"Failed to cleanup image store: {e}")
     
     def __del__(self):
         """析构函数，自动清理"""
@@ -0,0 +1,163 @@
+"""
+对冲请求策略 - 主请求超过历史p90延迟仍无输出时发起第二个相同请求，先返回有效结果者胜出
+"""
+
+import logging
+import math
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """滑动窗口延迟统计"""
+
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """
+        获取百分位延迟
+
+        Args:
+            p: 百分位 (0-100)
+
+        Returns:
+            Optional[float]: 延迟秒数，没有样本时返回None
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        return _percentile(samples, p)
+
+
+def _percentile(sorted_samples: List[float], p: float) -> Optional[float]:
+    if not sorted_samples:
+        return None
+    index = min(len(sorted_samples) - 1, max(0, math.ceil(p / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+class HedgingPolicy:
+    """单个后端的对冲策略：触发时机、并发上限、对冲比例预算和效果统计"""
+
+    def __init__(self, config: Optional[Dict] = None, backend: str = "claude-cli"):
+        """
+        初始化对冲策略
+
+        Args:
+            config: 配置字典
+            backend: 后端名称
+        """
+        self.config = config or {}
+        self.backend = backend
+
+        self.enabled = self.config.get('enabled', False)
+        self.hedge_percentile = self.config.get('hedge_percentile', 90)
+        self.min_samples = self.config.get('min_samples', 20)        # 样本不足时不对冲
+        self.min_delay = self.config.get('min_delay', 1.0)           # 对冲触发延迟下限（秒）
+        self.max_hedge_rate = self.config.get('max_hedge_rate', 0.1) # 最近窗口内对冲请求占比上限
+        self.budget_window = self.config.get('budget_window', 100)
+        self.max_concurrency = self.config.get('max_concurrency', 4) # 该后端同时运行的命令数上限
+
+        self.latency = LatencyTracker(self.config.get('latency_window', 200))
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        self._recent_hedges: Deque[bool] = deque(maxlen=self.budget_window)
+
+        # 实际延迟与不对冲时延迟的下界（对冲胜出时主请求被取消，只知道其已耗时）
+        self._observed: Deque[float] = deque(maxlen=self.config.get('latency_window', 200))
+        self._unhedged_lower_bound: Deque[float] = deque(maxlen=self.config.get('latency_window', 200))
+        self._counters = {
+            'requests': 0,
+            'hedges_launched': 0,
+            'hedge_wins': 0,
+            'cancelled': 0,
+            'skipped_budget': 0,
+            'skipped_concurrency': 0,
+        }
+
+    def hedge_delay(self) -> Optional[float]:
+        """
+        获取对冲触发延迟
+
+        Returns:
+            Optional[float]: 主请求运行多久后发起对冲，未启用或样本不足时返回None
+        """
+        if not self.enabled or self.latency.count() < self.min_samples:
+            return None
+        return max(self.min_delay, self.latency.percentile(self.hedge_percentile))
+
+    def allow_hedge(self) -> bool:
+        """检查对冲比例预算"""
+        with self._lock:
+            hedged = sum(self._recent_hedges)
+            allowed = hedged < max(1.0, self.max_hedge_rate * len(self._recent_hedges))
+            if not allowed:
+                self._counters['skipped_budget'] += 1
+            return allowed
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """获取后端并发槽位，对冲请求使用非阻塞获取，槽位不足时放弃对冲"""
+        acquired = self._semaphore.acquire(blocking=blocking)
+        if not acquired:
+            with self._lock:
+                self._counters['skipped_concurrency'] += 1
+        return acquired
+
+    def release(self):
+        """释放后端并发槽位"""
+        self._semaphore.release()
+
+    def record(self, latency: float, hedged: bool, hedge_won: bool, primary_elapsed: float, cancelled: int = 0):
+        """
+        记录一次请求结果
+
+        Args:
+            latency: 实际返回延迟（从主请求开始计时）
+            hedged: 是否发起了对冲
+            hedge_won: 是否对冲请求胜出
+            primary_elapsed: 主请求的耗时（被取消时为取消前的耗时）
+            cancelled: 被取消的请求数
+        """
+        self.latency.record(latency)
+        with self._lock:
+            self._recent_hedges.append(hedged)
+            self._observed.append(latency)
+            self._unhedged_lower_bound.append(max(latency, primary_elapsed))
+            self._counters['requests'] += 1
+            self._counters['hedges_launched'] += int(hedged)
+            self._counters['hedge_wins'] += int(hedge_won)
+            self._counters['cancelled'] += cancelled
+
+    def get_metrics(self) -> Dict:
+        """获取对冲效果统计"""
+        with self._lock:
+            counters = dict(self._counters)
+            observed = sorted(self._observed)
+            unhedged = sorted(self._unhedged_lower_bound)
+
+        p99_observed = _percentile(observed, 99)
+        p99_unhedged = _percentile(unhedged, 99)
+        return {
+            'backend': self.backend,
+            'enabled': self.enabled,
+            **counters,
+            'hedge_rate': counters['hedges_launched'] / counters['requests'] if counters['requests'] else 0.0,
+            'hedge_delay': self.hedge_delay(),
+            'p50_observed': _percentile(observed, 50),
+            'p90_observed': _percentile(observed, 90),
+            'p99_observed': p99_observed,
+            'p99_unhedged_lower_bound': p99_unhedged,
+            'p99_improvement_lower_bound': (p99_unhedged - p99_observed) if observed else None,
+        }
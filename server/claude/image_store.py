@@ -0,0 +1,243 @@
+"""
+临时图像存储 - 按内容寻址的内存文件系统图像存储，替代固定路径的PNG写盘
+
+- 相同内容的图像只写一次，每个请求通过引用计数持有图像
+- 优先使用 /dev/shm（tmpfs），可选 memfd 匿名内存文件
+- 后台线程回收引用计数归零且空闲超时的图像
+"""
+
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# 文件头 -> 扩展名，CLI根据扩展名识别图片类型
+_IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF8', 'gif'),
+    (b'RIFF', 'webp'),
+)
+
+
+@dataclass
+class ImageEntry:
+    """存储中的单个图像"""
+    digest: str
+    path: str
+    data: bytes
+    refcount: int = 0
+    last_used: float = field(default_factory=time.time)
+    fd: Optional[int] = None  # memfd模式下的文件描述符
+
+
+def decode_image_bytes(image: Union[bytes, str]) -> bytes:
+    """
+    将base64字符串（兼容data URL前缀）或原始字节统一为图像字节
+
+    Args:
+        image: base64字符串或图像字节
+
+    Returns:
+        bytes: 图像字节
+    """
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return bytes(image)
+    if image.startswith('data:image'):
+        image = image.split(',', 1)[1]
+    try:
+        return base64.b64decode(image, validate=True)
+    except binascii.Error:
+        return base64.b64decode(image)
+
+
+def guess_extension(data: bytes) -> str:
+    """根据文件头推断图像扩展名"""
+    for signature, ext in _IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return ext
+    return 'png'
+
+
+class EphemeralImageStore:
+    """按内容寻址、带引用计数和后台回收的临时图像存储"""
+
+    def __init__(self, config: Optional[Dict] = None):
+        """
+        初始化图像存储
+
+        Args:
+            config: 配置字典
+        """
+        self.config = config or {}
+
+        self.idle_ttl = self.config.get('idle_ttl', 60.0)        # 引用归零后保留的秒数，便于相同帧复用
+        self.gc_interval = self.config.get('gc_interval', 10.0)
+        self.max_entries = self.config.get('max_entries', 64)    # 超出时立即回收最久未用的空闲图像
+        self.use_memfd = self.config.get('use_memfd', False) and hasattr(os, 'memfd_create')
+
+        # memfd路径没有扩展名，依赖扩展名识别图片的CLI需要使用tmpfs文件，因此默认关闭
+        if self.use_memfd:
+            self.root_dir = 'memfd'
+        else:
+            base_dir = self.config.get('root_dir') or self._default_root_dir()
+            self.root_dir = tempfile.mkdtemp(prefix=f"cua-images-{os.getpid()}-", dir=base_dir)
+
+        self._entries: Dict[str, ImageEntry] = {}
+        self._lock = threading.Lock()
+        self._stats = {'puts': 0, 'dedup_hits': 0, 'writes': 0, 'evictions': 0}
+
+        self._stop_event = threading.Event()
+        self._gc_thread = threading.Thread(target=self._gc_loop, name="image-store-gc", daemon=True)
+        self._gc_thread.start()
+
+        logger.info(f"Ephemeral image store at {self.root_dir}")
+
+    @staticmethod
+    def _default_root_dir() -> str:
+        """优先使用tmpfs，不可用时退回系统临时目录"""
+        shm = '/dev/shm'
+        if os.path.isdir(shm) and os.access(shm, os.W_OK):
+            return shm
+        return tempfile.gettempdir()
+
+    def put(self, image: Union[bytes, str]) -> str:
+        """
+        存入图像并持有一个引用，调用方用完后需调用 release
+
+        Args:
+            image: base64字符串或图像字节
+
+        Returns:
+            str: 图像摘要（sha256）
+        """
+        data = decode_image_bytes(image)
+        digest = hashlib.sha256(data).hexdigest()
+
+        with self._lock:
+            self._stats['puts'] += 1
+            entry = self._entries.get(digest)
+            if entry is None:
+                entry = self._write(digest, data)
+                self._entries[digest] = entry
+                self._stats['writes'] += 1
+            else:
+                self._stats['dedup_hits'] += 1
+            entry.refcount += 1
+            entry.last_used = time.time()
+
+            if len(self._entries) > self.max_entries:
+                self._evict_idle(force=True)
+
+        return digest
+
+    def release(self, digest: str):
+        """释放一个引用，引用归零的图像由后台回收"""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return
+            entry.refcount = max(0, entry.refcount - 1)
+            entry.last_used = time.time()
+
+    def path(self, digest: str) -> str:
+        """获取图像文件路径（供需要文件路径的CLI使用）"""
+        with self._lock:
+            return self._entries[digest].path
+
+    def get_bytes(self, digest: str) -> bytes:
+        """获取图像字节（供可直接接收图像数据的后端使用，不经过文件系统）"""
+        with self._lock:
+            return self._entries[digest].data
+
+    @contextmanager
+    def acquire(self, image: Union[bytes, str]) -> Iterator[str]:
+        """
+        持有图像期间返回其文件路径，退出时自动释放引用
+
+        Args:
+            image: base64字符串或图像字节
+
+        Yields:
+            str: 图像文件路径
+        """
+        digest = self.put(image)
+        try:
+            yield self.path(digest)
+        finally:
+            self.release(digest)
+
+    def _write(self, digest: str, data: bytes) -> ImageEntry:
+        ext = guess_extension(data)
+        if self.use_memfd:
+            fd = os.memfd_create(f"cua-{digest[:16]}.{ext}")
+            os.write(fd, data)
+            # 子进程通过本进程的fd路径读取匿名内存文件
+            return ImageEntry(digest=digest, path=f"/proc/{os.getpid()}/fd/{fd}", data=data, fd=fd)
+
+        path = os.path.join(self.root_dir, f"{digest[:32]}.{ext}")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return ImageEntry(digest=digest, path=path, data=data)
+
+    def _remove(self, entry: ImageEntry):
+        try:
+            if entry.fd is not None:
+                os.close(entry.fd)
+            elif os.path.exists(entry.path):
+                os.remove(entry.path)
+        except OSError as e:
+            logger.warning(f"Failed to remove ephemeral image {entry.path}: {e}")
+
+    def _evict_idle(self, force: bool = False):
+        """回收空闲图像（需持有锁）；force时不等待空闲超时，按最久未用顺序回收到容量以内"""
+        now = time.time()
+        idle = sorted((e for e in self._entries.values() if e.refcount == 0), key=lambda e: e.last_used)
+        for entry in idle:
+            if force:
+                if len(self._entries) <= self.max_entries:
+                    break
+            elif now - entry.last_used < self.idle_ttl:
+                break
+            del self._entries[entry.digest]
+            self._remove(entry)
+            self._stats['evictions'] += 1
+
+    def _gc_loop(self):
+        while not self._stop_event.wait(self.gc_interval):
+            with self._lock:
+                self._evict_idle()
+
+    def get_stats(self) -> Dict:
+        """获取存储统计信息"""
+        with self._lock:
+            return {
+                **self._stats,
+                'entries': len(self._entries),
+                'bytes': sum(len(e.data) for e in self._entries.values()),
+                'in_use': sum(1 for e in self._entries.values() if e.refcount > 0),
+            }
+
+    def close(self):
+        """停止后台回收并删除全部图像"""
+        self._stop_event.set()
+        with self._lock:
+            for entry in self._entries.values():
+                self._remove(entry)
+            self._entries.clear()
+        if not self.use_memfd:
+            try:
+                os.rmdir(self.root_dir)
+            except OSError:
+                pass
@@ -0,0 +1,200 @@
+"""
+本地快速完成度验证 - 在调用Claude之前先用像素差异和OCR文本匹配做低成本判定，
+只有本地结果不确定时才升级到Claude验证
+
+- 屏幕与分析时相同且计划中有应改变界面的操作：判定未完成，提示重新执行
+- 屏幕上出现全部预期文本（需要OmniParser的OCR）：判定完成
+"""
+
+import base64
+import io
+import logging
+import re
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from PIL import Image, ImageChops, ImageStat
+
+from shared.schemas.data_models import CompletionStatus
+
+logger = logging.getLogger(__name__)
+
+# 文本提取函数：输入截图base64，返回屏幕上识别出的文本列表
+TextExtractor = Callable[[str], List[str]]
+
+_NORMALIZE_RE = re.compile(r"[\s'\"“”‘’`]+")
+
+# 执行后应引起界面变化的操作类型（wait、move 不一定改变屏幕）
+CHANGING_ACTIONS = ("click", "double_click", "right_click", "type", "key", "hotkey", "scroll", "drag")
+
+
+@dataclass
+class LocalVerificationResult:
+    """本地验证结果"""
+    status: CompletionStatus
+    confidence: float
+    reasoning: str
+    tier: str  # unchanged, text_match
+    next_steps: Optional[str] = None
+    elapsed: float = 0.0
+
+
+def decode_image(image_base64: str) -> Image.Image:
+    """解码base64图像（兼容data URL前缀）"""
+    if image_base64.startswith('data:image'):
+        image_base64 = image_base64.split(',')[1]
+    return Image.open(io.BytesIO(base64.b64decode(image_base64)))
+
+
+class LocalCompletionVerifier:
+    """分层本地验证器"""
+
+    def __init__(self, config: Optional[Dict] = None, text_extractor: Optional[TextExtractor] = None):
+        """
+        初始化本地验证器
+
+        Args:
+            config: 配置字典
+            text_extractor: 文本提取函数（可选），通常为OmniParser的OCR
+        """
+        self.config = config or {}
+        self.text_extractor = text_extractor
+
+        self.enabled = self.config.get('enabled', True)
+        self.fingerprint_size = tuple(self.config.get('fingerprint_size', (64, 36)))
+        # 灰度缩略图平均差异低于该值（0-255）视为屏幕没有变化
+        self.unchanged_threshold = self.config.get('unchanged_threshold', 1.5)
+        self.unchanged_confidence = self.config.get('unchanged_confidence', 0.8)
+        self.text_match_confidence = self.config.get('text_match_confidence', 0.9)
+
+    def set_text_extractor(self, text_extractor: Optional[TextExtractor]):
+        """设置文本提取函数"""
+        self.text_extractor = text_extractor
+
+    def fingerprint(self, image_base64: str) -> Optional[Image.Image]:
+        """
+        生成用于像素比较的灰度缩略图
+
+        Args:
+            image_base64: 截图base64
+
+        Returns:
+            Optional[Image.Image]: 缩略图，解码失败时返回None
+        """
+        try:
+            image = decode_image(image_base64).convert('L')
+            image.draft('L', self.fingerprint_size)
+            return image.resize(self.fingerprint_size, Image.Resampling.BILINEAR)
+        except Exception as e:
+            logger.warning(f"Failed to build screenshot fingerprint: {e}")
+            return None
+
+    def verify(self, task_context: Dict, screenshot_base64: str) -> Optional[LocalVerificationResult]:
+        """
+        本地验证任务完成度
+
+        Args:
+            task_context: 记忆模块中的任务上下文
+            screenshot_base64: 当前截图base64
+
+        Returns:
+            Optional[LocalVerificationResult]: 确定的验证结果，不确定时返回None（需升级到Claude）
+        """
+        if not self.enabled:
+            return None
+
+        start_time = time.time()
+        # 屏幕与分析时相同：预期文本可能本来就在屏幕上，文本匹配不能说明任务完成
+        if self._is_unchanged(task_context, screenshot_base64):
+            result = self._unchanged_verdict(task_context)
+        else:
+            result = self._check_expected_texts(task_context, screenshot_base64)
+
+        if result is not None:
+            result.elapsed = time.time() - start_time
+            logger.info(f"Local verification decided {result.status.value} via {result.tier} in {result.elapsed:.3f}s")
+        return result
+
+    def _is_unchanged(self, task_context: Dict, screenshot_base64: str) -> bool:
+        """第一层：与分析时的截图对比，判断屏幕是否几乎没有变化"""
+        baseline = task_context.get('baseline_fingerprint')
+        if baseline is None:
+            return False
+
+        current = self.fingerprint(screenshot_base64)
+        if current is None or current.size != baseline.size:
+            return False
+
+        mean_diff = ImageStat.Stat(ImageChops.difference(baseline, current)).mean[0]
+        logger.debug(f"Pixel diff against baseline: {mean_diff:.2f}")
+        return mean_diff < self.unchanged_threshold
+
+    def _unchanged_verdict(self, task_context: Dict) -> Optional[LocalVerificationResult]:
+        """
+        屏幕没有变化时的判定：计划中有应改变界面的操作说明操作没有生效，判定未完成并提示重新执行；
+        只有等待、移动等操作时屏幕不变是正常的（目标状态可能本来就已满足），交给Claude判断
+        """
+        changing = [action for action in task_context.get('actions') or []
+                    if str(getattr(action, 'type', '')).lower() in CHANGING_ACTIONS]
+        if not changing:
+            logger.info("Screen unchanged since analysis and no action expected a change, local verification inconclusive")
+            return None
+
+        original_command = task_context.get('original_command') or ''
+        return LocalVerificationResult(
+            status=CompletionStatus.INCOMPLETE,
+            confidence=self.unchanged_confidence,
+            reasoning=f"执行 {len(changing)} 个应改变界面的操作后屏幕与执行前相同，操作没有生效",
+            tier='unchanged',
+            next_steps=f"操作后屏幕没有变化，请重新执行: {original_command}" if original_command else None
+        )
+
+    @staticmethod
+    def _element_index(task_context: Dict) -> str:
+        """分析帧解析元素的文本和描述（归一化后拼接），缓存在任务上下文中"""
+        index = task_context.get('element_index')
+        if index is None:
+            parts = []
+            for element in task_context.get('ui_elements') or []:
+                parts.append(getattr(element, 'text', '') or '')
+                parts.append(getattr(element, 'description', '') or '')
+            index = task_context['element_index'] = _NORMALIZE_RE.sub('', ' '.join(parts)).lower()
+        return index
+
+    def _check_expected_texts(self, task_context: Dict, screenshot_base64: str) -> Optional[LocalVerificationResult]:
+        """
+        第二层：屏幕上出现全部预期文本（且不是分析时就已存在）即判定完成；
+        未找到时OCR可能漏检，交给Claude判断
+        """
+        expected_texts = [t for t in task_context.get('expected_texts') or [] if t and t.strip()]
+        if not expected_texts or not self.text_extractor:
+            return None
+
+        try:
+            screen_texts = self.text_extractor(screenshot_base64)
+        except Exception as e:
+            logger.warning(f"Text extraction for local verification failed: {e}")
+            return None
+        if not screen_texts:
+            return None
+
+        screen_blob = _NORMALIZE_RE.sub('', ' '.join(screen_texts)).lower()
+        missing = [t for t in expected_texts if _NORMALIZE_RE.sub('', t).lower() not in screen_blob]
+        if missing:
+            logger.debug(f"Expected texts not found on screen: {missing}")
+            return None
+
+        # 分析时解析出的元素中已经包含全部预期文本（例如标题本来就在屏幕上），出现不能说明任务完成
+        analysis_blob = self._element_index(task_context)
+        if analysis_blob and all(_NORMALIZE_RE.sub('', t).lower() in analysis_blob for t in expected_texts):
+            logger.debug(f"Expected texts were already on screen at analysis time: {expected_texts}")
+            return None
+
+        expected_outcome = task_context.get('expected_outcome') or ''
+        return LocalVerificationResult(
+            status=CompletionStatus.COMPLETED,
+            confidence=self.text_match_confidence,
+            reasoning=f"屏幕上已出现预期文本 {expected_texts}。{expected_outcome}".strip(),
+            tier='text_match'
+        )
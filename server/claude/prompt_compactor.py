@@ -0,0 +1,307 @@
+"""
+Prompt压缩模块 - 按与指令的相关性对UI元素排序、去重，并在token预算内生成紧凑的表格编码
+"""
+
+import math
+import re
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+from shared.schemas.data_models import UIElement
+
+logger = logging.getLogger(__name__)
+
+# 英文单词/数字按词切分，中文按单字切分
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[一-鿿]")
+_CJK_RE = re.compile(r"[一-鿿　-〿＀-￯]")
+
+# 常见的中英文同义词，用于弥补纯词法匹配在跨语言指令上的不足
+SYNONYM_GROUPS = [
+    ("计算器", "calculator", "calc"),
+    ("浏览器", "browser", "chrome", "safari", "firefox", "edge"),
+    ("搜索", "search", "查找", "find"),
+    ("设置", "settings", "preferences", "偏好设置", "setting"),
+    ("文件", "file", "files", "finder", "文件夹", "folder"),
+    ("终端", "terminal", "命令行", "console"),
+    ("记事本", "notepad", "textedit", "文本编辑"),
+    ("关闭", "close", "退出", "quit", "exit"),
+    ("打开", "open", "启动", "launch", "start"),
+    ("保存", "save"),
+    ("新建", "new", "create", "创建"),
+    ("删除", "delete", "remove"),
+    ("发送", "send", "submit", "提交"),
+    ("确定", "ok", "confirm", "确认"),
+    ("取消", "cancel"),
+    ("邮件", "mail", "email", "outlook"),
+    ("音乐", "music", "spotify"),
+    ("地址栏", "address", "url"),
+]
+
+# 指令中提到的屏幕区域关键词
+REGION_KEYWORDS = {
+    'top': ('顶部', '上方', '顶端', '菜单栏', '标题栏', 'top', 'menu bar', 'title bar', 'toolbar'),
+    'bottom': ('底部', '下方', '任务栏', '程序坞', 'bottom', 'taskbar', 'dock'),
+    'left': ('左侧', '左边', '左上', '左下', '侧边栏', 'left', 'sidebar'),
+    'right': ('右侧', '右边', '右上', '右下', 'right'),
+    'center': ('中间', '中央', '正中', 'center', 'middle'),
+}
+
+
+@dataclass
+class CompactionStats:
+    """压缩统计信息"""
+    total_elements: int
+    kept_elements: int
+    deduplicated: int
+    estimated_tokens: int
+    token_budget: int
+    original_chars: int
+    compact_chars: int
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的token数量：中文字符约1个token/字，其他字符约4字符/token
+
+    Args:
+        text: 待估算文本
+
+    Returns:
+        int: 估算的token数
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+class PromptCompactor:
+    """UI元素压缩器，生成相关性排序且受token预算约束的元素表"""
+
+    HEADER = "id|type|x1,y1,x2,y2|text"
+
+    def __init__(self, config: Optional[Dict] = None):
+        """
+        初始化压缩器
+
+        Args:
+            config: 配置字典
+        """
+        self.config = config or {}
+
+        self.token_budget = self.config.get('token_budget', 1500)
+        self.min_elements = self.config.get('min_elements', 10)  # 预算内至少保留的元素数
+        self.max_text_length = self.config.get('max_text_length', 40)
+        self.dedupe_iou = self.config.get('dedupe_iou', 0.5)
+        self.dedupe_center_distance = self.config.get('dedupe_center_distance', 12)
+
+        # 相关性权重
+        self.lexical_weight = self.config.get('lexical_weight', 0.6)
+        self.semantic_weight = self.config.get('semantic_weight', 0.3)
+        self.region_weight = self.config.get('region_weight', 0.1)
+
+        self._synonyms = self._build_synonym_index()
+
+    def _build_synonym_index(self) -> Dict[str, Set[str]]:
+        """构建同义词索引"""
+        index: Dict[str, Set[str]] = {}
+        for group in SYNONYM_GROUPS:
+            for word in group:
+                index.setdefault(word, set()).update(group)
+        return index
+
+    def compact(
+        self,
+        text_command: str,
+        ui_elements: List[UIElement],
+        screen_size: Optional[Tuple[int, int]] = None
+    ) -> Tuple[str, CompactionStats]:
+        """
+        对UI元素排序、去重并编码为紧凑表格
+
+        Args:
+            text_command: 用户指令
+            ui_elements: UI元素列表
+            screen_size: 屏幕尺寸 (width, height)，未提供时根据元素坐标推断
+
+        Returns:
+            Tuple[str, CompactionStats]: (元素表文本, 压缩统计)
+        """
+        original_chars = sum(len(self._verbose_line(elem)) + 1 for elem in ui_elements)
+
+        unique_elements = self._deduplicate(ui_elements)
+        deduplicated = len(ui_elements) - len(unique_elements)
+
+        screen_size = screen_size or self._infer_screen_size(unique_elements)
+        ranked = self._rank(text_command, unique_elements, screen_size)
+
+        lines = [self.HEADER]
+        used_tokens = estimate_tokens(self.HEADER)
+        kept = 0
+        for elem in ranked:
+            row = self._encode_row(elem)
+            row_tokens = estimate_tokens(row) + 1
+            if used_tokens + row_tokens > self.token_budget and kept >= self.min_elements:
+                break
+            lines.append(row)
+            used_tokens += row_tokens
+            kept += 1
+
+        omitted = len(ranked) - kept
+        if omitted > 0:
+            lines.append(f"(另有{omitted}个低相关元素已省略)")
+
+        text = "\n".join(lines)
+        stats = CompactionStats(
+            total_elements=len(ui_elements),
+            kept_elements=kept,
+            deduplicated=deduplicated,
+            estimated_tokens=estimate_tokens(text),
+            token_budget=self.token_budget,
+            original_chars=original_chars,
+            compact_chars=len(text)
+        )
+        return text, stats
+
+    def _rank(self, text_command: str, ui_elements: List[UIElement], screen_size: Tuple[int, int]) -> List[UIElement]:
+        """按相关性得分排序，得分相同的保持原始ID顺序"""
+        command = (text_command or "").lower()
+        command_tokens = set(_TOKEN_RE.findall(command))
+        expanded_tokens = self._expand_synonyms(command, command_tokens)
+        command_bigrams = self._char_bigrams(command)
+        regions = [region for region, words in REGION_KEYWORDS.items() if any(w in command for w in words)]
+
+        scored = []
+        for index, elem in enumerate(ui_elements):
+            content = f"{elem.description} {elem.text}".lower()
+            elem_tokens = set(_TOKEN_RE.findall(content))
+
+            lexical = len(command_tokens & elem_tokens) / len(elem_tokens) if elem_tokens and command_tokens else 0.0
+            synonym_hits = len((expanded_tokens - command_tokens) & elem_tokens)
+            semantic = max(
+                self._jaccard(command_bigrams, self._char_bigrams(content)),
+                min(1.0, synonym_hits / 2)
+            )
+            region = self._region_score(elem, regions, screen_size) if regions else 0.0
+
+            score = (self.lexical_weight * min(1.0, lexical) +
+                     self.semantic_weight * semantic +
+                     self.region_weight * region)
+            scored.append((-score, index, elem))
+
+        scored.sort(key=lambda item: (item[0], item[1]))
+        return [elem for _, _, elem in scored]
+
+    def _expand_synonyms(self, command: str, command_tokens: Set[str]) -> Set[str]:
+        """展开指令中的同义词（同时匹配多字中文词）"""
+        expanded = set(command_tokens)
+        for word, group in self._synonyms.items():
+            if word in command_tokens or (len(word) > 1 and word in command):
+                for synonym in group:
+                    expanded.update(_TOKEN_RE.findall(synonym))
+        return expanded
+
+    @staticmethod
+    def _char_bigrams(text: str) -> Set[str]:
+        """字符二元组，对中文和拼写变体较鲁棒"""
+        compact = re.sub(r"\s+", "", text)
+        return {compact[i:i + 2] for i in range(len(compact) - 1)}
+
+    @staticmethod
+    def _jaccard(a: Set[str], b: Set[str]) -> float:
+        if not a or not b:
+            return 0.0
+        return len(a & b) / len(a | b)
+
+    @staticmethod
+    def _region_score(elem: UIElement, regions: List[str], screen_size: Tuple[int, int]) -> float:
+        """根据元素中心点与指令提及区域的接近程度打分"""
+        if not elem.coordinates or len(elem.coordinates) < 4:
+            return 0.0
+        width, height = screen_size
+        if width <= 0 or height <= 0:
+            return 0.0
+
+        x1, y1, x2, y2 = elem.coordinates[:4]
+        cx = min(1.0, max(0.0, (x1 + x2) / 2 / width))
+        cy = min(1.0, max(0.0, (y1 + y2) / 2 / height))
+
+        scores = {
+            'top': 1.0 - cy,
+            'bottom': cy,
+            'left': 1.0 - cx,
+            'right': cx,
+            'center': 1.0 - min(1.0, 2 * math.hypot(cx - 0.5, cy - 0.5)),
+        }
+        return max(scores[region] for region in regions)
+
+    def _deduplicate(self, ui_elements: List[UIElement]) -> List[UIElement]:
+        """移除文本相同且位置几乎重叠的元素，保留置信度更高的一个"""
+        groups: Dict[str, List[UIElement]] = {}
+        for elem in ui_elements:
+            key = re.sub(r"\s+", " ", f"{elem.type}|{elem.description}|{elem.text}".lower()).strip()
+            groups.setdefault(key, []).append(elem)
+
+        dropped = set()
+        for members in groups.values():
+            if len(members) < 2:
+                continue
+            members = sorted(members, key=lambda e: -e.confidence)
+            kept: List[UIElement] = []
+            for elem in members:
+                if any(self._is_near_duplicate(elem, other) for other in kept):
+                    dropped.add(id(elem))
+                else:
+                    kept.append(elem)
+
+        return [elem for elem in ui_elements if id(elem) not in dropped]
+
+    def _is_near_duplicate(self, a: UIElement, b: UIElement) -> bool:
+        if len(a.coordinates) < 4 or len(b.coordinates) < 4:
+            return not a.coordinates and not b.coordinates
+        ax1, ay1, ax2, ay2 = a.coordinates[:4]
+        bx1, by1, bx2, by2 = b.coordinates[:4]
+
+        center_distance = math.hypot((ax1 + ax2 - bx1 - bx2) / 2, (ay1 + ay2 - by1 - by2) / 2)
+        if center_distance <= self.dedupe_center_distance:
+            return True
+
+        inter_w = max(0.0, min(ax2, bx2) - max(ax1, bx1))
+        inter_h = max(0.0, min(ay2, by2) - max(ay1, by1))
+        inter = inter_w * inter_h
+        union = (ax2 - ax1) * (ay2 - ay1) + (bx2 - bx1) * (by2 - by1) - inter
+        return union > 0 and inter / union >= self.dedupe_iou
+
+    @staticmethod
+    def _infer_screen_size(ui_elements: List[UIElement]) -> Tuple[int, int]:
+        """根据元素坐标的最大值推断屏幕尺寸"""
+        max_x = max((e.coordinates[2] for e in ui_elements if len(e.coordinates) >= 4), default=0)
+        max_y = max((e.coordinates[3] for e in ui_elements if len(e.coordinates) >= 4), default=0)
+        return (int(max_x) or 1, int(max_y) or 1)
+
+    def _encode_row(self, elem: UIElement) -> str:
+        """将元素编码为一行紧凑表格记录"""
+        if elem.coordinates and len(elem.coordinates) >= 4:
+            coords = ",".join(str(int(round(c))) for c in elem.coordinates[:4])
+        else:
+            coords = "-"
+
+        label = elem.description or ""
+        if elem.text and elem.text != elem.description:
+            label = f"{label}/{elem.text}" if label else elem.text
+        label = re.sub(r"[|\r\n]+", " ", label).strip()
+        if len(label) > self.max_text_length:
+            label = label[:self.max_text_length] + "…"
+
+        return f"{elem.id}|{elem.type}|{coords}|{label}"
+
+    @staticmethod
+    def _verbose_line(elem: UIElement) -> str:
+        """原始的逐行详细格式，用于统计压缩前的大小"""
+        line = f"ID:{elem.id} 类型:{elem.type} 描述:{elem.description}"
+        if elem.coordinates and len(elem.coordinates) >= 4:
+            line += f" 坐标:[{elem.coordinates[0]},{elem.coordinates[1]},{elem.coordinates[2]},{elem.coordinates[3]}]"
+        if elem.text:
+            line += f" 文本:'{elem.text}'"
+        return line
@@ -0,0 +1,182 @@
+"""
+流式JSON解析器 - 增量消费Claude输出，在actions数组中的每个操作对象闭合时立即产出
+"""
+
+import json
+import re
+import logging
+from typing import Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# 字符串结束引号之后允许出现的字符；其他字符说明这是字符串内部未转义的引号
+_STRING_TERMINATORS = {',', ':', '}', ']'}
+_TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+
+
+class StreamingActionParser:
+    """
+    容错的增量JSON解析器
+
+    只跟踪到根对象中指定数组（默认 actions）的单个元素级别：
+    - 根对象 '{' 之前的说明文字和markdown标记会被忽略
+    - 字符串中未转义的双引号通过向后看一个非空白字符来判定并自动转义
+    - 每个操作对象闭合后立即解析并通过 on_action 回调产出
+    """
+
+    def __init__(self, on_action: Optional[Callable[[int, Dict], None]] = None,
+                 array_keys: Sequence[str] = ("actions",)):
+        """
+        初始化解析器
+
+        Args:
+            on_action: 每解析出一个完整操作时的回调 (index, action_dict)
+            array_keys: 需要流式产出元素的数组字段名
+        """
+        self.on_action = on_action
+        self.array_keys = set(array_keys)
+        self.emitted_count = 0  # 跨重试保留，避免重复产出
+        self.halted = False     # 出现无法解析的操作后停止流式产出，剩余操作以完整解析结果为准
+        self.begin_attempt()
+
+    def begin_attempt(self):
+        """开始新一轮输出（例如命令重试），重置文本状态但保留已产出的数量"""
+        self._started = False
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._pending_quote: Optional[int] = None  # 字符串中待判定的引号在缓冲区中的位置
+        self._string_start = 0
+        self._last_string: Optional[str] = None
+        self._pending_key: Optional[str] = None
+        self._array_depth: Optional[int] = None
+        self._item_start: Optional[int] = None
+        self._buffer: List[str] = []
+        self._attempt_index = 0
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """
+        输入一段新的输出文本
+
+        Args:
+            chunk: 新到达的文本
+
+        Returns:
+            List[Dict]: 本次新完成的操作列表
+        """
+        completed = []
+        for char in chunk:
+            action = self._feed_char(char)
+            if action is not None:
+                completed.append(action)
+        return completed
+
+    def _feed_char(self, char: str) -> Optional[Dict]:
+        if not self._started:
+            if char != '{':
+                return None
+            self._started = True
+
+        if self._in_string:
+            return self._feed_string_char(char)
+
+        self._buffer.append(char)
+
+        if char.isspace():
+            return None
+        if char == '"':
+            self._in_string = True
+            self._string_start = len(self._buffer)
+            return None
+
+        if char == ':' and len(self._stack) == 1:
+            self._pending_key = self._last_string
+        elif char in '{[':
+            self._stack.append(char)
+            if (char == '[' and len(self._stack) == 2 and self._pending_key in self.array_keys):
+                self._array_depth = len(self._stack)
+            elif (char == '{' and self._array_depth is not None and
+                  len(self._stack) == self._array_depth + 1):
+                self._item_start = len(self._buffer) - 1
+        elif char in '}]':
+            if not self._stack:
+                return None
+            self._stack.pop()
+            if char == ']' and self._array_depth is not None and len(self._stack) < self._array_depth:
+                self._array_depth = None
+                self._pending_key = None
+            elif (char == '}' and self._item_start is not None and
+                  self._array_depth is not None and len(self._stack) == self._array_depth):
+                item_text = ''.join(self._buffer[self._item_start:])
+                self._item_start = None
+                return self._emit(item_text)
+        elif char == ',' and len(self._stack) == 1:
+            self._pending_key = None
+        return None
+
+    def _feed_string_char(self, char: str) -> Optional[Dict]:
+        if self._pending_quote is not None:
+            if char.isspace():
+                self._buffer.append(char)
+                return None
+            quote_pos = self._pending_quote
+            self._pending_quote = None
+            if char in _STRING_TERMINATORS:
+                # 引号确实是字符串结束
+                self._in_string = False
+                self._last_string = ''.join(self._buffer[self._string_start:quote_pos])
+                return self._feed_char(char)
+            # 字符串内部未转义的引号，补上转义符
+            self._buffer.insert(quote_pos, '\\')
+
+        if self._escape:
+            self._escape = False
+            self._buffer.append(char)
+            return None
+        if char == '\\':
+            self._escape = True
+            self._buffer.append(char)
+            return None
+        if char == '"':
+            self._pending_quote = len(self._buffer)
+            self._buffer.append(char)
+            return None
+        if char == '\n':
+            self._buffer.append('\\n')
+            return None
+        self._buffer.append(char)
+        return None
+
+    def _emit(self, item_text: str) -> Optional[Dict]:
+        index = self._attempt_index
+        self._attempt_index += 1
+
+        if self.halted:
+            return None
+        action = self._loads_tolerant(item_text)
+        if action is None or not isinstance(action, dict):
+            logger.warning(f"Streaming parser halted at unparsable action #{index}: {item_text[:100]}")
+            self.halted = True
+            return None
+        if index < self.emitted_count:
+            # 重试时重复输出的操作，已经产出过
+            return None
+
+        self.emitted_count = index + 1
+        if self.on_action:
+            try:
+                self.on_action(index, action)
+            except Exception as e:
+                logger.warning(f"Streaming action callback failed for #{index}: {e}")
+        return action
+
+    @staticmethod
+    def _loads_tolerant(text: str) -> Optional[Dict]:
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            pass
+        try:
+            return json.loads(_TRAILING_COMMA_RE.sub(r'\1', text))
+        except json.JSONDecodeError:
+            return None
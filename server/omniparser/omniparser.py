@@ -13,6 +13,7 @@ from PIL import Image
 import io
 import base64
 from typing import Dict
+from shared.utils.tracing import get_tracer
 class Omniparser(object):
     def __init__(self, config: Dict):
         self.config = config
@@ -23,8 +24,12 @@ class Omniparser(object):
         print('Omniparser initialized!!!')
 
     def parse(self, image_base64: str):
-        image_bytes = base64.b64decode(image_base64)
-        image = Image.open(io.BytesIO(image_bytes))
+        tracer = get_tracer()
+        with tracer.span("decode") as span:
+            image_bytes = base64.b64decode(image_base64)
+            image = Image.open(io.BytesIO(image_bytes))
+            image.load()
+            span.set(bytes=len(image_bytes), size=list(image.size))
         print('image size:', image.size)
         
         box_overlay_ratio = max(image.size) / 3200
@@ -35,7 +40,15 @@ class Omniparser(object):
             'thickness': max(int(3 * box_overlay_ratio), 1),
         }
 
-        (text, ocr_bbox), _ = check_ocr_box(image, display_img=False, output_bb_format='xyxy', easyocr_args={'text_threshold': 0.8}, use_paddleocr=False)
+        with tracer.span("ocr"):
+            (text, ocr_bbox), _ = check_ocr_box(image, display_img=False, output_bb_format='xyxy', easyocr_args={'text_threshold': 0.8}, use_paddleocr=False)
         dino_labled_img, label_coordinates, parsed_content_list = get_som_labeled_img(image, self.som_model, BOX_TRESHOLD = self.config['BOX_TRESHOLD'], output_coord_in_ratio=True, ocr_bbox=ocr_bbox,draw_bbox_config=draw_bbox_config, caption_model_processor=self.caption_model_processor, ocr_text=text,use_local_semantics=True, iou_threshold=0.7, scale_img=False, batch_size=128)
 
-        return dino_labled_img, parsed_content_list
\ No newline at end of file
+        return dino_labled_img, parsed_content_list
+
+    def ocr(self, image_base64: str):
+        """只运行OCR，返回识别出的文本列表（不做图标检测和描述生成）"""
+        image_bytes = base64.b64decode(image_base64)
+        image = Image.open(io.BytesIO(image_bytes))
+        (text, _), _ = check_ocr_box(image, display_img=False, output_bb_format='xyxy', easyocr_args={'text_threshold': 0.8}, use_paddleocr=False)
+        return text
@@ -16,6 +16,8 @@ except ImportError as e:
     FULL_OMNIPARSER_AVAILABLE = False
 import logging
 
+from shared.utils.coordinate_converter import CoordinateConverter
+
 logger = logging.getLogger(__name__)
 
 class OmniParserService:
@@ -57,13 +59,15 @@ class OmniParserService:
             logger.error(f"Failed to initialize OmniParser: {str(e)}")
             raise
     
-    def parse_screen(self, image_base64: str, screen_resolution: Optional[Tuple[int, int]] = None) -> Tuple[str, List[Dict]]:
+    def parse_screen(self, image_base64: str, screen_resolution: Optional[Tuple[int, int]] = None,
+                     device_scale: Optional[float] = None) -> Tuple[str, List[Dict]]:
         """
         解析屏幕截图，检测UI元素
         
         Args:
             image_base64: Base64编码的图像数据
             screen_resolution: 实际屏幕分辨率 (width, height), 如果提供则用于坐标转换
+            device_scale: 客户端设备像素比，没有屏幕分辨率时按它把物理像素截图换算为屏幕坐标
             
         Returns:
             Tuple[str, List[Dict]]: (标注后的图像base64, 检测到的元素列表)
@@ -86,9 +90,9 @@ class OmniParserService:
             # 打印调试信息，查看原始数据结构
             logger.info(f"Raw parsed_content_list sample: {parsed_content_list[:3] if parsed_content_list else 'Empty'}")
             
-            # 格式化输出，如果提供了屏幕分辨率则使用，否则使用图片尺寸
-            target_resolution = screen_resolution if screen_resolution else image_size
-            formatted_elements = self._format_parsed_content(parsed_content_list, image_size, target_resolution)
+            # 格式化输出，如果提供了屏幕分辨率则使用，否则按设备像素比从图片尺寸推算
+            formatted_elements = self._format_parsed_content(parsed_content_list, image_size, screen_resolution,
+                                                             device_scale or 1.0)
             
             logger.debug(f"Parsed {len(formatted_elements)} elements from screen")
             
@@ -98,7 +102,8 @@ class OmniParserService:
             logger.error(f"Failed to parse screen: {str(e)}")
             raise
     
-    def _format_parsed_content(self, parsed_content_list: List, image_size: Tuple[int, int] = (1280, 720), target_resolution: Optional[Tuple[int, int]] = None) -> List[Dict]:
+    def _format_parsed_content(self, parsed_content_list: List, image_size: Tuple[int, int] = (1280, 720), target_resolution: Optional[Tuple[int, int]] = None,
+                               device_scale: float = 1.0) -> List[Dict]:
         """
         格式化解析后的内容
         
@@ -106,47 +111,38 @@ class OmniParserService:
             parsed_content_list: OmniParser输出的原始内容列表
             image_size: 图片尺寸 (width, height)
             target_resolution: 目标分辨率 (width, height), 如果提供则进行坐标转换
+            device_scale: 设备像素比，未提供目标分辨率时目标分辨率为 image_size / device_scale
             
         Returns:
             List[Dict]: 格式化后的元素列表
         """
-        formatted_elements = []
         image_width, image_height = image_size
+        converter = CoordinateConverter(image_size, target_resolution, device_scale=device_scale)
+        if converter.is_conversion_needed():
+            logger.info(f"Coordinate scaling: image({image_width}x{image_height}) -> "
+                        f"screen({converter.screen_width}x{converter.screen_height}), "
+                        f"scale({converter.scale_x:.3f}, {converter.scale_y:.3f})")
         
-        # 如果提供了目标分辨率，计算缩放比例
-        if target_resolution:
-            target_width, target_height = target_resolution
-            scale_x = target_width / image_width
-            scale_y = target_height / image_height
-            logger.info(f"Coordinate scaling: image({image_width}x{image_height}) -> screen({target_width}x{target_height}), scale({scale_x:.3f}, {scale_y:.3f})")
-        else:
-            scale_x = scale_y = 1.0
-            target_width, target_height = image_width, image_height
+        # 所有元素的相对坐标（通常是[x1, y1, x2, y2]）在一次数组运算中转换为目标分辨率坐标
+        box_indices = [i for i, content in enumerate(parsed_content_list)
+                       if isinstance(content, dict) and content.get('bbox') is not None and len(content['bbox']) >= 4]
+        boxes = converter.relative_to_absolute(
+            [parsed_content_list[i]['bbox'][:4] for i in box_indices]
+        ).tolist()
+        coordinates_by_index = dict(zip(box_indices, boxes))
         
+        formatted_elements = []
         for i, content in enumerate(parsed_content_list):
             if isinstance(content, dict):
                 # 从OmniParser的输出格式提取信息
-                bbox = content.get('bbox', [])
                 content_text = content.get('content', '')
                 element_type = content.get('type', 'unknown')
                 
-                # 转换bbox格式 (通常是[x1, y1, x2, y2]的相对坐标)
-                if bbox and len(bbox) >= 4:
-                    # 首先转换为图片像素坐标，然后缩放到目标分辨率
-                    coordinates = [
-                        int(bbox[0] * image_width * scale_x),   # x1
-                        int(bbox[1] * image_height * scale_y),  # y1  
-                        int(bbox[2] * image_width * scale_x),   # x2
-                        int(bbox[3] * image_height * scale_y)   # y2
-                    ]
-                else:
-                    coordinates = []
-                
                 element = {
                     'id': i,
                     'type': element_type,
                     'description': content_text or f'{element_type.title()} element {i}',
-                    'coordinates': coordinates,
+                    'coordinates': coordinates_by_index.get(i, []),
                     'text': content_text if element_type == 'text' else '',
                     'confidence': content.get('confidence', 0.0)
                 }
@@ -165,6 +161,25 @@ class OmniParserService:
         
         return formatted_elements
     
+    def extract_text(self, image_base64: str) -> List[str]:
+        """
+        提取屏幕上的文本（仅OCR），用于本地快速完成度验证
+        
+        Args:
+            image_base64: Base64编码的图像数据
+            
+        Returns:
+            List[str]: 识别出的文本列表，不支持OCR时返回空列表
+        """
+        if not self.omniparser or not hasattr(self.omniparser, 'ocr'):
+            return []
+        
+        if image_base64.startswith('data:image'):
+            image_base64 = image_base64.split(',')[1]
+        texts = self.omniparser.ocr(image_base64)
+        logger.debug(f"Extracted {len(texts)} text items from screen")
+        return texts
+    
     def is_available(self) -> bool:
         """检查OmniParser是否可用"""
         return self.omniparser is not None
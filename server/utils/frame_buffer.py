@@ -0,0 +1,204 @@
+"""
+会话帧缓冲 - 按会话保存客户端发送过的参考帧，应用增量帧（变化图块）重建完整截图
+"""
+
+import base64
+import io
+import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Union
+
+from PIL import Image
+
+from shared.schemas.data_models import FrameDelta
+from shared.utils.tracing import get_tracer
+
+logger = logging.getLogger(__name__)
+
+
+class FrameResyncRequired(Exception):
+    """帧缓冲无法重建增量帧（缺少参考帧或校验和不一致），需要客户端重新发送关键帧"""
+
+    def __init__(self, session_id: str, reason: str):
+        super().__init__(reason)
+        self.session_id = session_id
+        self.reason = reason
+
+
+@dataclass
+class _SessionFrames:
+    """单个会话的参考帧（frame_id -> RGB图像，按插入顺序淘汰）"""
+    frames: "OrderedDict[int, Image.Image]" = field(default_factory=OrderedDict)
+    last_used: float = field(default_factory=time.time)
+
+
+class SessionFrameBuffer:
+    """按会话保存最近若干参考帧的帧缓冲"""
+
+    def __init__(self, config: Optional[Dict] = None):
+        """
+        初始化帧缓冲
+
+        Args:
+            config: 配置字典
+        """
+        self.config = config or {}
+
+        # 客户端只在收到响应后才确认参考帧，保留多帧以容忍响应丢失
+        self.max_frames_per_session = self.config.get('max_frames_per_session', 3)
+        self.max_sessions = self.config.get('max_sessions', 16)
+        self.session_ttl = self.config.get('session_ttl', 1800.0)
+        self.output_quality = self.config.get('output_quality', 90)  # 重建帧交给下游时的JPEG质量
+
+        self._sessions: "OrderedDict[str, _SessionFrames]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'keyframes': 0, 'deltas': 0, 'tiles': 0, 'delta_bytes': 0, 'keyframe_bytes': 0, 'resyncs': 0}
+
+    def put_keyframe(self, session_id: str, frame_id: int, screenshot_base64: str) -> Image.Image:
+        """
+        登记关键帧作为后续增量帧的参考帧
+
+        Args:
+            session_id: 会话ID
+            frame_id: 帧ID
+            screenshot_base64: 关键帧截图base64
+
+        Returns:
+            Image.Image: 解码后的RGB参考帧
+        """
+        if screenshot_base64.startswith('data:image'):
+            screenshot_base64 = screenshot_base64.split(',', 1)[1]
+        data = base64.b64decode(screenshot_base64)
+        image = Image.open(io.BytesIO(data)).convert('RGB')
+
+        with self._lock:
+            self._store(session_id, frame_id, image)
+            self._stats['keyframes'] += 1
+            self._stats['keyframe_bytes'] += len(data)
+        return image
+
+    def apply_delta(self, delta: FrameDelta) -> Image.Image:
+        """
+        在参考帧上应用增量帧
+
+        Args:
+            delta: 增量帧
+
+        Returns:
+            Image.Image: 重建后的完整RGB帧
+
+        Raises:
+            FrameResyncRequired: 缺少参考帧、尺寸不符、图块损坏或校验和不一致
+        """
+        with self._lock:
+            session = self._sessions.get(delta.session_id)
+            base = session.frames.get(delta.base_frame_id) if session else None
+
+        if base is None:
+            self._resync(delta.session_id, f"参考帧 {delta.base_frame_id} 不在帧缓冲中")
+        if base.size != (delta.width, delta.height):
+            self._resync(delta.session_id, f"参考帧尺寸 {base.size} 与增量帧 {(delta.width, delta.height)} 不一致")
+
+        image = base.copy()
+        delta_bytes = 0
+        for tile in delta.tiles:
+            try:
+                raw = zlib.decompress(base64.b64decode(tile.data_base64))
+                patch = Image.frombytes('RGB', (tile.width, tile.height), raw)
+            except (ValueError, zlib.error) as e:
+                self._resync(delta.session_id, f"图块 ({tile.x}, {tile.y}) 解码失败: {e}")
+            image.paste(patch, (tile.x, tile.y))
+            delta_bytes += len(tile.data_base64)
+
+        checksum = zlib.crc32(image.tobytes())
+        if checksum != delta.checksum:
+            # 参考帧已经漂移，丢弃该会话的全部参考帧
+            with self._lock:
+                self._sessions.pop(delta.session_id, None)
+            self._resync(delta.session_id, f"重建帧校验和不一致 ({checksum:#010x} != {delta.checksum:#010x})")
+
+        with self._lock:
+            self._store(delta.session_id, delta.frame_id, image)
+            self._stats['deltas'] += 1
+            self._stats['tiles'] += len(delta.tiles)
+            self._stats['delta_bytes'] += delta_bytes
+        return image
+
+    def resolve(self, screenshot_base64: Optional[str] = None, session_id: Optional[str] = None,
+                frame_id: Optional[int] = None,
+                frame_delta: Optional[Union[FrameDelta, Dict]] = None) -> Optional[str]:
+        """
+        根据请求中的关键帧/增量帧字段得到完整截图base64
+
+        Args:
+            screenshot_base64: 完整截图（关键帧或旧客户端的普通截图）
+            session_id: 关键帧所属会话
+            frame_id: 关键帧ID
+            frame_delta: 增量帧
+
+        Returns:
+            Optional[str]: 完整截图base64
+
+        Raises:
+            FrameResyncRequired: 增量帧无法重建
+        """
+        if frame_delta is not None:
+            if isinstance(frame_delta, dict):
+                frame_delta = FrameDelta(**frame_delta)
+            with get_tracer().span("decode", delta=True):
+                return self.encode_base64(self.apply_delta(frame_delta))
+
+        if screenshot_base64 and session_id and frame_id is not None:
+            try:
+                with get_tracer().span("decode", keyframe=True):
+                    self.put_keyframe(session_id, frame_id, screenshot_base64)
+            except Exception as e:
+                # 关键帧登记失败只影响后续增量帧（届时会要求重新同步），不影响本次请求
+                logger.warning(f"Failed to register keyframe {frame_id} for session {session_id}: {e}")
+        return screenshot_base64
+
+    def encode_base64(self, image: Image.Image) -> str:
+        """将重建帧编码为下游使用的JPEG base64"""
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=self.output_quality)
+        return base64.b64encode(buffer.getvalue()).decode()
+
+    def drop_session(self, session_id: str):
+        """丢弃会话的全部参考帧"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _resync(self, session_id: str, reason: str):
+        with self._lock:
+            self._stats['resyncs'] += 1
+        logger.info(f"Frame resync required for session {session_id}: {reason}")
+        raise FrameResyncRequired(session_id, reason)
+
+    def _store(self, session_id: str, frame_id: int, image: Image.Image):
+        """保存参考帧并淘汰过期帧和会话（需持有锁）"""
+        now = time.time()
+        session = self._sessions.pop(session_id, None) or _SessionFrames()
+        session.frames.pop(frame_id, None)
+        session.frames[frame_id] = image
+        session.last_used = now
+        while len(session.frames) > self.max_frames_per_session:
+            session.frames.popitem(last=False)
+        self._sessions[session_id] = session
+
+        for stale_id in [sid for sid, s in self._sessions.items() if now - s.last_used > self.session_ttl]:
+            del self._sessions[stale_id]
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def get_stats(self) -> Dict:
+        """获取帧缓冲统计信息"""
+        with self._lock:
+            return {
+                **self._stats,
+                'sessions': len(self._sessions),
+                'frames': sum(len(s.frames) for s in self._sessions.values()),
+            }
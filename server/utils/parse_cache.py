@@ -0,0 +1,120 @@
+"""
+屏幕解析缓存 - 按 (会话ID, 帧ID) 缓存OmniParser解析结果，
+客户端在用户输入指令期间预先上传当前帧，之后的任务请求直接复用解析结果
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, int, Optional[Tuple[int, int]], Optional[float]]  # (会话ID, 帧ID, 屏幕分辨率, 设备像素比)
+
+
+@dataclass
+class ParsedScreen:
+    """一帧截图的解析结果"""
+    screenshot_base64: str
+    annotated_screenshot_base64: Optional[str]
+    parsed_elements: List[Dict]
+    processing_time: float
+    created_at: float = field(default_factory=time.time)
+
+
+class ScreenParseCache:
+    """
+    解析结果缓存，进行中的解析也登记在缓存中，同一帧的后续请求等待同一次解析
+
+    只能在服务端事件循环中使用；等待返回的Future时应使用 asyncio.shield，
+    避免某个请求被取消时连带取消其他请求共享的解析
+    """
+
+    def __init__(self, config: Optional[Dict] = None):
+        """
+        初始化解析缓存
+
+        Args:
+            config: 配置字典
+        """
+        self.config = config or {}
+
+        self.max_entries = self.config.get('max_entries', 32)
+        self.ttl = self.config.get('ttl', 600.0)  # 预解析后用户可能输入较长时间
+
+        self._entries: "OrderedDict[CacheKey, asyncio.Future]" = OrderedDict()
+        # misses: 可缓存但未命中的解析，parses: 不带帧ID的解析
+        self._stats = {'parses': 0, 'hits': 0, 'joined': 0, 'misses': 0, 'failures': 0}
+
+    def get(self, session_id: Optional[str], frame_id: Optional[int],
+            screen_resolution: Optional[Tuple[int, int]] = None,
+            device_scale: Optional[float] = None) -> Optional[asyncio.Future]:
+        """
+        查找缓存的解析结果
+
+        Returns:
+            Optional[asyncio.Future]: 结果为 ParsedScreen 的Future（可能仍在解析中），未命中时为None
+        """
+        if session_id is None or frame_id is None:
+            return None
+        self._evict_expired()
+        key = (session_id, frame_id, screen_resolution, device_scale)
+        future = self._entries.get(key)
+        if future is not None:
+            self._entries.move_to_end(key)
+        return future
+
+    def parse(self, session_id: Optional[str], frame_id: Optional[int],
+              screen_resolution: Optional[Tuple[int, int]],
+              parser: Callable[[], Awaitable[ParsedScreen]],
+              device_scale: Optional[float] = None) -> asyncio.Future:
+        """
+        获取解析结果，未缓存时启动解析并登记
+
+        Args:
+            session_id: 会话ID，为空时不缓存
+            frame_id: 帧ID，为空时不缓存
+            screen_resolution: 坐标换算使用的屏幕分辨率
+            parser: 执行解析的协程函数
+            device_scale: 坐标换算使用的设备像素比
+
+        Returns:
+            asyncio.Future: 结果为 ParsedScreen 的Future
+        """
+        cached = self.get(session_id, frame_id, screen_resolution, device_scale)
+        if cached is not None:
+            self._stats['hits' if cached.done() else 'joined'] += 1
+            return cached
+
+        self._stats['misses' if session_id is not None and frame_id is not None else 'parses'] += 1
+        future = asyncio.ensure_future(parser())
+        if session_id is None or frame_id is None:
+            return future
+
+        key = (session_id, frame_id, screen_resolution, device_scale)
+        self._entries[key] = future
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+        def on_done(done: asyncio.Future):
+            if done.cancelled() or done.exception() is not None:
+                # 解析失败不缓存，后续请求重新解析
+                self._stats['failures'] += 1
+                if self._entries.get(key) is done:
+                    del self._entries[key]
+        future.add_done_callback(on_done)
+        return future
+
+    def _evict_expired(self):
+        now = time.time()
+        for key in [k for k, f in self._entries.items()
+                    if f.done() and not f.cancelled() and f.exception() is None
+                    and now - f.result().created_at > self.ttl]:
+            del self._entries[key]
+
+    def get_stats(self) -> Dict:
+        """获取缓存统计信息"""
+        return {**self._stats, 'entries': len(self._entries)}
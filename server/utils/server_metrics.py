@@ -0,0 +1,129 @@
+"""
+服务端运行指标 - 记录连接数、排队和处理中的请求数、各处理阶段耗时以及进程内存，
+由 /stats 接口输出，供压测工具按时间采样
+"""
+
+import os
+import sys
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, Iterable, Optional
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:  # Windows
+    RESOURCE_AVAILABLE = False
+
+
+def summarize_latencies(values: Iterable[float]) -> Dict[str, float]:
+    """
+    耗时样本的分位数汇总（单位与输入一致）
+
+    Returns:
+        Dict[str, float]: count / mean / p50 / p95 / p99 / max，没有样本时只有 count
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return {'count': 0}
+
+    def percentile(q: float) -> float:
+        # 线性插值，与 numpy.percentile 默认方法一致
+        position = (len(ordered) - 1) * q
+        lower = int(position)
+        upper = min(lower + 1, len(ordered) - 1)
+        return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+    return {
+        'count': len(ordered),
+        'mean': sum(ordered) / len(ordered),
+        'p50': percentile(0.50),
+        'p95': percentile(0.95),
+        'p99': percentile(0.99),
+        'max': ordered[-1],
+    }
+
+
+def memory_usage() -> Dict[str, Optional[float]]:
+    """当前进程的常驻内存和峰值内存（MB），无法获取时为None"""
+    rss_mb = None
+    peak_mb = None
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            rss_mb = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if RESOURCE_AVAILABLE:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux以KB为单位，macOS以字节为单位
+        peak_mb = peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    return {'rss_mb': rss_mb, 'peak_rss_mb': peak_mb}
+
+
+class ServerMetrics:
+    """服务端运行指标（只在服务端事件循环中更新，不需要加锁）"""
+
+    def __init__(self, window: int = 4096):
+        """
+        初始化指标
+
+        Args:
+            window: 每个阶段保留的最近耗时样本数
+        """
+        self.window = window
+        self.started_at = time.time()
+
+        self.connections = 0  # 当前WebSocket连接数
+        self.waiting = 0      # 等待连接并发名额的请求数（排队深度）
+        self.in_flight = 0    # 正在处理的请求数
+        self.peak_waiting = 0
+        self.peak_in_flight = 0
+
+        self.requests: Counter = Counter()  # 消息类型 -> 已完成请求数
+        self.errors: Counter = Counter()    # 消息类型 -> 处理失败数
+        self._stages: Dict[str, Deque[float]] = {}
+        self._stage_counts: Counter = Counter()
+
+    def record(self, stage: str, seconds: float):
+        """记录一个阶段的耗时（秒）"""
+        samples = self._stages.get(stage)
+        if samples is None:
+            samples = self._stages[stage] = deque(maxlen=self.window)
+        samples.append(seconds)
+        self._stage_counts[stage] += 1
+
+    def request_queued(self):
+        self.waiting += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+
+    def request_dequeued(self):
+        self.waiting -= 1
+
+    def request_started(self):
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def request_finished(self, message_type: str, seconds: float, success: bool = True):
+        self.in_flight -= 1
+        self.requests[message_type] += 1
+        if not success:
+            self.errors[message_type] += 1
+        self.record(f"request.{message_type}", seconds)
+
+    def get_stats(self) -> Dict:
+        """获取指标快照，阶段耗时单位为毫秒"""
+        return {
+            'uptime': time.time() - self.started_at,
+            'connections': self.connections,
+            'waiting': self.waiting,
+            'in_flight': self.in_flight,
+            'peak_waiting': self.peak_waiting,
+            'peak_in_flight': self.peak_in_flight,
+            'requests': dict(self.requests),
+            'errors': dict(self.errors),
+            'stages_ms': {
+                stage: {**summarize_latencies(v * 1000 for v in samples), 'total': self._stage_counts[stage]}
+                for stage, samples in self._stages.items()
+            },
+            'memory': memory_usage(),
+        }
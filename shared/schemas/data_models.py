@@ -7,8 +7,12 @@ class MessageType(str, Enum):
     ANALYSIS_RESULT = "analysis_result"
     OMNIPARSER_RESULT = "omniparser_result"  # OmniParser中间结果
     CLAUDE_RESULT = "claude_result"  # Claude分析结果
+    ACTION_PARTIAL = "action_partial"  # Claude流式输出的单个操作
     VERIFY_COMPLETION = "verify_completion"  # 简化的任务完成验证
     COMPLETION_RESULT = "completion_result"  # 验证结果
+    FRAME_RESYNC = "frame_resync"  # 服务端帧缓冲与客户端不一致，需要重新发送关键帧
+    PREPARSE = "preparse"  # 用户输入指令期间预先解析当前帧
+    PREPARSE_RESULT = "preparse_result"  # 预解析结果
     ERROR = "error"
 
 class OSInfo(BaseModel):
@@ -21,15 +25,34 @@ class OSInfo(BaseModel):
     platform: str
     screen_width: Optional[int] = None  # 屏幕宽度
     screen_height: Optional[int] = None  # 屏幕高度
+    device_scale: Optional[float] = None  # 设备像素比（截图像素 / 屏幕坐标），高分屏为2.0等
     error: Optional[str] = None
 
 
 class TaskAnalysisRequest(BaseModel):
     """客户端发送给服务端的任务分析请求"""
     text_command: str
-    screenshot_base64: str
+    screenshot_base64: Optional[str] = None  # 引用已预解析的帧时可以省略
     user_id: str = "default"
     os_info: Optional[OSInfo] = None
+    session_id: Optional[str] = None  # 预解析会话
+    frame_id: Optional[int] = None  # 预解析帧ID，命中时跳过OmniParser阶段
+
+class PreparseRequest(BaseModel):
+    """预解析请求：用户输入指令期间上传当前帧，服务端解析后缓存"""
+    screenshot_base64: str
+    session_id: str
+    frame_id: int
+    os_info: Optional[OSInfo] = None
+
+class PreparseResult(BaseModel):
+    """预解析结果"""
+    session_id: str
+    frame_id: int
+    success: bool
+    element_count: int = 0
+    processing_time: Optional[float] = None
+    error: Optional[str] = None
 
 class ActionType(str, Enum):
     """pyautogui操作类型枚举"""
@@ -90,6 +113,7 @@ class UIElement(BaseModel):
     coordinates: List[float]  # [x1, y1, x2, y2] 或 [x, y, width, height]
     text: str
     confidence: float
+    template_base64: Optional[str] = None  # 分析帧中元素中心的灰度小模板（PNG），客户端点击前用于重新定位
 
 class OmniParserResult(BaseModel):
     """OmniParser分析结果（中间结果）"""
@@ -111,6 +135,12 @@ class ClaudeAnalysisResult(BaseModel):
     processing_time: Optional[float] = None
     error_message: Optional[str] = None
 
+class ActionPartialResult(BaseModel):
+    """Claude流式输出中已完整生成的单个操作，最终的claude_result仍包含全部操作"""
+    task_id: str
+    index: int  # 操作在计划中的序号，从0开始连续递增
+    action: ActionPlan
+
 class TaskAnalysisResponse(BaseModel):
     """服务端返回给客户端的最终分析结果（保持兼容性）"""
     task_id: str
@@ -124,10 +154,37 @@ class TaskAnalysisResponse(BaseModel):
     ui_elements: Optional[List[UIElement]] = None
     annotated_screenshot_base64: Optional[str] = None
 
+class FrameTile(BaseModel):
+    """增量帧中的一个变化图块（传输分辨率下的像素坐标）"""
+    x: int
+    y: int
+    width: int
+    height: int
+    data_base64: str  # zlib压缩的RGB原始像素
+
+class FrameDelta(BaseModel):
+    """相对已确认关键帧的增量帧，服务端在会话帧缓冲中重建完整画面"""
+    session_id: str
+    frame_id: int
+    base_frame_id: int  # 服务端已确认的参考帧ID
+    width: int
+    height: int
+    tiles: List[FrameTile] = []
+    checksum: int  # 重建后完整RGB像素的crc32，用于发现漂移
+
+class FrameResyncRequest(BaseModel):
+    """服务端要求客户端重新发送关键帧"""
+    session_id: str
+    reason: str
+
 class CompletionVerificationRequest(BaseModel):
     """简化的任务完成验证请求 - 只需要截图"""
     task_id: str
-    screenshot_base64: str
+    screenshot_base64: Optional[str] = None  # 关键帧（完整截图）
+    # 增量帧协议：关键帧携带session_id/frame_id登记到服务端帧缓冲，之后只发送frame_delta
+    session_id: Optional[str] = None
+    frame_id: Optional[int] = None
+    frame_delta: Optional[FrameDelta] = None
 
 class CompletionStatus(str, Enum):
     """任务完成状态"""
@@ -0,0 +1,163 @@
+"""
+消息序列化 - 协议消息的快速JSON编解码与pydantic模型的快速构造
+
+- dumps / dumps_text / loads: 优先使用 orjson，其次 msgspec，都未安装时退回标准库json；
+  pydantic模型、枚举和NumPy标量可直接编码
+- parse_ui_elements: 元素列表整体交给 TypeAdapter 一次校验（pydantic 2 的 model_construct 在Python中
+  逐字段赋值，实测比校验还慢，因此不用它跳过校验）
+- pack_records / unpack_records: 字段相同的字典列表（UIElement列表）按表格形式编码为
+  {"fields": [...], "rows": [[...], ...]}，不再为每个元素重复键名
+"""
+
+import enum
+import json
+from typing import Any, Dict, List, Optional, Union
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgspec
+    MSGSPEC_AVAILABLE = True
+except ImportError:
+    MSGSPEC_AVAILABLE = False
+
+from shared.schemas.data_models import UIElement
+
+TABLE_FIELDS = "fields"
+TABLE_ROWS = "rows"
+
+
+def _default(value: Any) -> Any:
+    """标准库json/msgspec不能直接编码的类型"""
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, enum.Enum):
+        return value.value
+    if hasattr(value, 'tolist'):  # NumPy数组和标量
+        return value.tolist()
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+
+if ORJSON_AVAILABLE:
+    BACKEND = "orjson"
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    # orjson.JSONDecodeError 是 json.JSONDecodeError 的子类，调用方的异常处理不变
+
+    def dumps(obj: Any) -> bytes:
+        """编码为紧凑的UTF-8 JSON字节串"""
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+
+    def loads(data: Union[str, bytes]) -> Any:
+        """解码JSON文本或字节串，格式错误时抛出 json.JSONDecodeError"""
+        return orjson.loads(data)
+
+elif MSGSPEC_AVAILABLE:
+    BACKEND = "msgspec"
+    _encoder = msgspec.json.Encoder(enc_hook=_default)
+    _decoder = msgspec.json.Decoder()
+
+    def dumps(obj: Any) -> bytes:
+        """编码为紧凑的UTF-8 JSON字节串"""
+        return _encoder.encode(obj)
+
+    def loads(data: Union[str, bytes]) -> Any:
+        """解码JSON文本或字节串，格式错误时抛出 json.JSONDecodeError"""
+        try:
+            return _decoder.decode(data)
+        except msgspec.DecodeError as e:
+            raise json.JSONDecodeError(str(e), data if isinstance(data, str) else "", 0)
+
+else:
+    BACKEND = "json"
+
+    def dumps(obj: Any) -> bytes:
+        """编码为紧凑的UTF-8 JSON字节串"""
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False, default=_default).encode('utf-8')
+
+    def loads(data: Union[str, bytes]) -> Any:
+        """解码JSON文本或字节串，格式错误时抛出 json.JSONDecodeError"""
+        return json.loads(data)
+
+
+def dumps_text(obj: Any) -> str:
+    """编码为紧凑的JSON文本（WebSocket文本帧）"""
+    return dumps(obj).decode('utf-8')
+
+
+# ---- UIElement列表的批量构造 ----
+
+_UI_ELEMENT_LIST = TypeAdapter(List[UIElement])
+
+
+def _with_defaults(data: Dict[str, Any], index: int) -> Dict[str, Any]:
+    """补齐缺失字段（与原先逐个构造UIElement时的默认值一致）"""
+    return {
+        'id': data.get('id', index),
+        'type': data.get('type', 'unknown'),
+        'description': data.get('description', ''),
+        'coordinates': data.get('coordinates', []),
+        'text': data.get('text', ''),
+        'confidence': data.get('confidence', 0.0),
+        'template_base64': data.get('template_base64'),
+    }
+
+
+def parse_ui_elements(items: Optional[Union[List[Dict[str, Any]], Dict[str, Any]]]) -> List[UIElement]:
+    """
+    批量构造UIElement列表
+
+    整个列表交给一个 TypeAdapter 在pydantic-core中一次校验，比逐个 UIElement(**elem) 快约一倍；
+    有元素缺少字段时补齐默认值后重试。items 可以是元素字典列表或 pack_records 的表格形式
+
+    Raises:
+        ValidationError: 补齐默认值后仍有字段类型错误
+    """
+    if not items:
+        return []
+    if is_packed(items):
+        items = unpack_records(items)
+    try:
+        return _UI_ELEMENT_LIST.validate_python(items)
+    except ValidationError:
+        return _UI_ELEMENT_LIST.validate_python([_with_defaults(item, i) for i, item in enumerate(items)])
+
+
+# ---- 表格形式（array-of-structs 去掉重复键名） ----
+
+def pack_records(records: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    将字段相同的字典列表编码为表格形式
+
+    Returns:
+        Optional[Dict]: {"fields": [...], "rows": [[...], ...]}；列表为空、含非字典项或字段不一致时返回None
+    """
+    if not records or not isinstance(records[0], dict):
+        return None
+    fields = list(records[0])
+    rows = []
+    for record in records:
+        if not isinstance(record, dict) or len(record) != len(fields):
+            return None
+        try:
+            rows.append([record[field] for field in fields])
+        except KeyError:
+            return None
+    return {TABLE_FIELDS: fields, TABLE_ROWS: rows}
+
+
+def unpack_records(table: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """pack_records 的逆操作"""
+    fields = table[TABLE_FIELDS]
+    return [dict(zip(fields, row)) for row in table[TABLE_ROWS]]
+
+
+def is_packed(value: Any) -> bool:
+    return isinstance(value, dict) and TABLE_FIELDS in value and TABLE_ROWS in value and len(value) == 2
@@ -0,0 +1,257 @@
+"""
+坐标转换工具 - 处理不同分辨率之间的坐标转换
+
+除单点/单框接口外提供数组接口，整个元素集合的边界框、中心点和相对坐标在一次NumPy调用中完成转换；
+支持高分屏缩放（截图为物理像素、输入坐标为逻辑点），设备像素比由客户端随 os_info 上报
+"""
+
+from typing import Iterable, List, Optional, Sequence, Tuple, Union
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ArrayLike = Union[np.ndarray, Sequence[Sequence[float]]]
+
+
+def _as_rows(values: ArrayLike, width: int, name: str) -> np.ndarray:
+    """转换为 (N, width) 的浮点数组，每行取前 width 个值"""
+    array = np.asarray(values, dtype=np.float64)
+    if array.size == 0:
+        return np.empty((0, width), dtype=np.float64)
+    if array.ndim != 2 or array.shape[1] < width:
+        raise ValueError(f"{name}必须为 (N, {width}) 的数组")
+    return array[:, :width]
+
+
+def _truncate(values: np.ndarray) -> np.ndarray:
+    """向零取整，与逐个 int() 的结果一致"""
+    return np.trunc(values).astype(np.int64)
+
+
+class CoordinateConverter:
+    """坐标转换器，处理图片坐标到屏幕坐标的转换"""
+
+    def __init__(self, image_size: Tuple[int, int], screen_size: Optional[Tuple[int, int]] = None,
+                 device_scale: float = 1.0):
+        """
+        初始化坐标转换器
+
+        Args:
+            image_size: 图片尺寸 (width, height)
+            screen_size: 屏幕尺寸 (width, height)，即输入坐标空间的大小；
+                         未提供时按 image_size / device_scale 计算（截图为物理像素的高分屏）
+            device_scale: 设备像素比（Retina/高DPI为2.0等）
+        """
+        self.image_width, self.image_height = image_size
+        if screen_size is None:
+            screen_size = (round(self.image_width / device_scale), round(self.image_height / device_scale))
+        self.screen_width, self.screen_height = screen_size
+        self.device_scale = device_scale
+
+        self.scale_x = self.screen_width / self.image_width
+        self.scale_y = self.screen_height / self.image_height
+
+        # 按 [x1, y1, x2, y2] 排列的系数，供数组接口广播
+        self._image_dims = np.array([self.image_width, self.image_height] * 2, dtype=np.float64)
+        self._scales = np.array([self.scale_x, self.scale_y] * 2, dtype=np.float64)
+
+        logger.debug(f"坐标转换器: 图片({self.image_width}x{self.image_height}) -> "
+                     f"屏幕({self.screen_width}x{self.screen_height}), 缩放({self.scale_x:.3f}, {self.scale_y:.3f})")
+
+    # ---- 单点/单框接口 ----
+
+    def convert_point(self, x: float, y: float) -> Tuple[int, int]:
+        """
+        转换单个点坐标
+
+        Args:
+            x: 图片坐标X
+            y: 图片坐标Y
+
+        Returns:
+            Tuple[int, int]: 屏幕坐标 (x, y)
+        """
+        screen_x = int(x * self.scale_x)
+        screen_y = int(y * self.scale_y)
+        return screen_x, screen_y
+
+    def convert_bbox(self, bbox: List[float]) -> List[int]:
+        """
+        转换边界框坐标
+
+        Args:
+            bbox: 边界框 [x1, y1, x2, y2]
+
+        Returns:
+            List[int]: 转换后的边界框坐标
+        """
+        if len(bbox) != 4:
+            raise ValueError("边界框必须包含4个坐标值")
+
+        x1, y1, x2, y2 = bbox
+        screen_x1, screen_y1 = self.convert_point(x1, y1)
+        screen_x2, screen_y2 = self.convert_point(x2, y2)
+
+        return [screen_x1, screen_y1, screen_x2, screen_y2]
+
+    def convert_center_point(self, bbox: List[float]) -> Tuple[int, int]:
+        """
+        从边界框计算中心点并转换坐标
+
+        Args:
+            bbox: 边界框 [x1, y1, x2, y2]
+
+        Returns:
+            Tuple[int, int]: 屏幕坐标中心点 (x, y)
+        """
+        if len(bbox) != 4:
+            raise ValueError("边界框必须包含4个坐标值")
+
+        x1, y1, x2, y2 = bbox
+        center_x = (x1 + x2) / 2
+        center_y = (y1 + y2) / 2
+
+        return self.convert_point(center_x, center_y)
+
+    def convert_relative_to_absolute(self, relative_bbox: List[float]) -> List[int]:
+        """
+        将相对坐标转换为绝对屏幕坐标
+
+        Args:
+            relative_bbox: 相对坐标 [x1, y1, x2, y2] (0-1范围)
+
+        Returns:
+            List[int]: 绝对屏幕坐标
+        """
+        if len(relative_bbox) != 4:
+            raise ValueError("相对坐标必须包含4个值")
+
+        x1, y1, x2, y2 = relative_bbox
+
+        # 转换为图片像素坐标，然后缩放到屏幕坐标
+        screen_coords = [
+            int(x1 * self.image_width * self.scale_x),
+            int(y1 * self.image_height * self.scale_y),
+            int(x2 * self.image_width * self.scale_x),
+            int(y2 * self.image_height * self.scale_y)
+        ]
+
+        return screen_coords
+
+    # ---- 数组接口 ----
+
+    def convert_points(self, points: ArrayLike) -> np.ndarray:
+        """
+        批量转换点坐标
+
+        Args:
+            points: (N, 2) 图片坐标
+
+        Returns:
+            np.ndarray: (N, 2) int64 屏幕坐标
+        """
+        points = _as_rows(points, 2, "点坐标")
+        return _truncate(points * self._scales[:2])
+
+    def convert_bboxes(self, bboxes: ArrayLike) -> np.ndarray:
+        """
+        批量转换边界框
+
+        Args:
+            bboxes: (N, 4) 图片坐标边界框 [x1, y1, x2, y2]
+
+        Returns:
+            np.ndarray: (N, 4) int64 屏幕坐标边界框
+        """
+        bboxes = _as_rows(bboxes, 4, "边界框")
+        return _truncate(bboxes * self._scales)
+
+    def convert_centers(self, bboxes: ArrayLike) -> np.ndarray:
+        """
+        批量计算图片坐标边界框的中心点并转换为屏幕坐标
+
+        Returns:
+            np.ndarray: (N, 2) int64 屏幕坐标中心点
+        """
+        bboxes = _as_rows(bboxes, 4, "边界框")
+        return self.convert_points((bboxes[:, :2] + bboxes[:, 2:]) / 2)
+
+    def relative_to_absolute(self, relative_bboxes: ArrayLike) -> np.ndarray:
+        """
+        批量将相对坐标（0-1范围）转换为绝对屏幕坐标
+
+        Args:
+            relative_bboxes: (N, 4) 相对坐标 [x1, y1, x2, y2]
+
+        Returns:
+            np.ndarray: (N, 4) int64 屏幕坐标
+        """
+        relative_bboxes = _as_rows(relative_bboxes, 4, "相对坐标")
+        return _truncate(relative_bboxes * self._image_dims * self._scales)
+
+    @staticmethod
+    def centers(bboxes: ArrayLike) -> np.ndarray:
+        """
+        批量计算边界框中心点（不做坐标转换，用于已经是屏幕坐标的元素）
+
+        Returns:
+            np.ndarray: (N, 2) int64 中心点，与逐个 int((x1 + x2) / 2) 的结果一致
+        """
+        bboxes = _as_rows(bboxes, 4, "边界框")
+        return _truncate((bboxes[:, :2] + bboxes[:, 2:]) / 2)
+
+    # ---- 信息 ----
+
+    def is_conversion_needed(self) -> bool:
+        """
+        检查是否需要进行坐标转换
+
+        Returns:
+            bool: 如果图片尺寸和屏幕尺寸不同则返回True
+        """
+        return (self.image_width != self.screen_width or
+                self.image_height != self.screen_height)
+
+    def get_scaling_info(self) -> dict:
+        """
+        获取缩放信息
+
+        Returns:
+            dict: 包含缩放比例和尺寸信息的字典
+        """
+        return {
+            'image_size': (self.image_width, self.image_height),
+            'screen_size': (self.screen_width, self.screen_height),
+            'scale_x': self.scale_x,
+            'scale_y': self.scale_y,
+            'device_scale': self.device_scale,
+            'conversion_needed': self.is_conversion_needed()
+        }
+
+
+def element_centers(elements: Iterable) -> dict:
+    """
+    一次计算元素集合的中心点
+
+    Args:
+        elements: 带 id 和 coordinates（屏幕坐标 [x1, y1, x2, y2]）属性的元素（UIElement）
+
+    Returns:
+        dict: 元素ID字符串 -> (x, y)；坐标无效的元素映射为 None
+    """
+    result = {}
+    valid_ids = []
+    boxes = []
+    for element in elements:
+        coordinates = element.coordinates
+        if coordinates and len(coordinates) >= 4:
+            valid_ids.append(str(element.id))
+            boxes.append(coordinates[:4])
+        else:
+            result[str(element.id)] = None
+    if boxes:
+        for element_id, (x, y) in zip(valid_ids, CoordinateConverter.centers(boxes).tolist()):
+            result[element_id] = (x, y)
+    return result
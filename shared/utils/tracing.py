@@ -0,0 +1,391 @@
+"""
+端到端延迟追踪 - 以task_id作为trace_id，客户端和服务端各自记录阶段span，
+trace上下文随WebSocket消息传递，服务端在最终响应中带回本次请求的span，
+客户端汇总后导出为Chrome trace JSON（chrome://tracing 或 Perfetto 中以瀑布图查看）
+
+用法:
+    tracer = get_tracer()
+    with tracer.trace(task_id):
+        with tracer.span("capture"):
+            ...
+    tracer.finish(task_id)  # 导出该任务的全部span
+
+只有处于trace上下文中的span会被记录，未启用追踪时 span() 只有一次上下文变量读取的开销
+"""
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# WebSocket消息中携带trace上下文的字段: {"trace_id": ..., "span_id": ..., "spans": [...]}
+TRACE_FIELD = "trace"
+
+
+@dataclass(frozen=True)
+class SpanContext:
+    """trace上下文：所属trace和父span"""
+    trace_id: str
+    span_id: Optional[str] = None
+
+
+@dataclass
+class Span:
+    """一个阶段的耗时记录"""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start: float                   # 开始时间（epoch秒）
+    end: Optional[float] = None
+    process: str = ""              # client / server
+    thread: str = ""
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.time()) - self.start
+
+    def set(self, **attributes):
+        """添加属性（导出为Chrome trace事件的args）"""
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name, 'trace_id': self.trace_id, 'span_id': self.span_id, 'parent_id': self.parent_id,
+            'start': self.start, 'end': self.end, 'process': self.process, 'thread': self.thread,
+            'attributes': self.attributes,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Span':
+        return cls(**{key: data.get(key) for key in ('name', 'trace_id', 'span_id', 'parent_id', 'start', 'end',
+                                                     'process', 'thread')},
+                   attributes=data.get('attributes') or {})
+
+
+class _NoopSpan:
+    """不在trace上下文中时返回的空span"""
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+_current: contextvars.ContextVar[Optional[SpanContext]] = contextvars.ContextVar('trace_context', default=None)
+
+
+def new_span_id() -> str:
+    """生成span ID"""
+    return uuid.uuid4().hex[:16]
+
+
+def to_chrome_events(spans: List[Span]) -> List[Dict[str, Any]]:
+    """
+    span转换为Chrome trace事件（完整事件 ph=X，时间单位微秒）
+
+    每个进程（client/server）一行进程轨道，每个线程一条子轨道
+    """
+    pids: Dict[str, int] = {}
+    tids: Dict[tuple, int] = {}
+    events = []
+    for span in sorted(spans, key=lambda s: s.start):
+        pid = pids.setdefault(span.process or 'process', len(pids) + 1)
+        tid = tids.setdefault((pid, span.thread), len(tids) + 1)
+        events.append({
+            'name': span.name,
+            'cat': span.process or 'span',
+            'ph': 'X',
+            'ts': span.start * 1_000_000,
+            'dur': max(0.0, span.duration) * 1_000_000,
+            'pid': pid,
+            'tid': tid,
+            'args': {'trace_id': span.trace_id, 'span_id': span.span_id, 'parent_id': span.parent_id,
+                     **span.attributes},
+        })
+    for process, pid in pids.items():
+        events.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': process}})
+    for (pid, thread), tid in tids.items():
+        events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': thread}})
+    return events
+
+
+class ChromeTraceExporter:
+    """每个trace写为一个Chrome trace JSON文件（同一trace多次导出时按span_id合并）"""
+
+    def __init__(self, directory: str):
+        self.directory = os.path.expanduser(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def path_for(self, trace_id: str) -> str:
+        safe_id = ''.join(c for c in trace_id if c.isalnum() or c in '-_') or 'trace'
+        return os.path.join(self.directory, f"{safe_id}.json")
+
+    def export(self, trace_id: str, spans: List[Span]):
+        path = self.path_for(trace_id)
+        with self._lock:
+            existing = []
+            if os.path.exists(path):
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        existing = [Span.from_dict(s) for s in json.load(f).get('spans', [])]
+                except (OSError, ValueError):
+                    existing = []
+            # 客户端和服务端共用目录时同一span可能被两个进程导出，按span_id去重
+            merged = list({span.span_id: span for span in existing + spans}.values())
+            temp_path = f"{path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'traceEvents': to_chrome_events(merged),
+                    'displayTimeUnit': 'ms',
+                    'spans': [span.to_dict() for span in merged],
+                }, f, ensure_ascii=False)
+            os.replace(temp_path, path)
+        logger.debug(f"Trace {trace_id} exported to {path} ({len(spans)} spans)")
+
+
+class CollectorExporter:
+    """以HTTP POST把Chrome trace JSON发送到收集服务（后台线程，不阻塞调用方）"""
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def export(self, trace_id: str, spans: List[Span]):
+        body = json.dumps({'trace_id': trace_id, 'traceEvents': to_chrome_events(spans)}).encode('utf-8')
+        threading.Thread(target=self._post, args=(body,), daemon=True, name="trace-export").start()
+
+    def _post(self, body: bytes):
+        request = urllib.request.Request(self.url, data=body, headers={'Content-Type': 'application/json'})
+        try:
+            urllib.request.urlopen(request, timeout=self.timeout).close()
+        except Exception as e:
+            logger.warning(f"Trace export to {self.url} failed: {e}")
+
+
+class Tracer:
+    """span记录器，按trace_id缓存未导出的span"""
+
+    def __init__(self, process: str = "client", exporters: Optional[List] = None,
+                 enabled: bool = True, max_traces: int = 256, max_spans_per_trace: int = 4096):
+        """
+        初始化记录器
+
+        Args:
+            process: 进程名（client/server），导出后对应瀑布图中的进程轨道
+            exporters: 导出器列表（ChromeTraceExporter / CollectorExporter）
+            enabled: 是否开启新的trace（只影响 trace()，已传入的上下文照常记录）
+            max_traces: 最多缓存的未导出trace数，超出时丢弃最早的
+            max_spans_per_trace: 单个trace最多缓存的span数
+        """
+        self.process = process
+        self.exporters = list(exporters or [])
+        self.enabled = enabled
+        self.max_traces = max_traces
+        self.max_spans_per_trace = max_spans_per_trace
+
+        self._spans: 'OrderedDict[str, List[Span]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._active: Optional[SpanContext] = None  # 跨线程的当前trace（界面客户端一次只执行一个任务）
+
+    # ---- 上下文 ----
+
+    def current(self) -> Optional[SpanContext]:
+        """当前trace上下文：优先使用上下文变量，其次为 activate() 设置的全局trace"""
+        return _current.get() or self._active
+
+    @contextmanager
+    def trace(self, trace_id: Optional[str], parent_span_id: Optional[str] = None) -> Iterator[Optional[SpanContext]]:
+        """在 trace_id 的上下文中执行（trace_id为空或未启用时不记录）"""
+        if not trace_id or not self.enabled:
+            yield None
+            return
+        context = SpanContext(trace_id, parent_span_id)
+        token = _current.set(context)
+        try:
+            yield context
+        finally:
+            _current.reset(token)
+
+    @contextmanager
+    def continue_trace(self, context: Optional[SpanContext]) -> Iterator[Optional[SpanContext]]:
+        """在传入的上下文中执行（服务端处理带trace字段的消息时使用，不受 enabled 影响）"""
+        if context is None:
+            yield None
+            return
+        token = _current.set(context)
+        try:
+            yield context
+        finally:
+            _current.reset(token)
+
+    def activate(self, trace_id: Optional[str]):
+        """设置跨线程的当前trace，之后各线程中未处于其他上下文的span都归入该trace"""
+        self._active = SpanContext(trace_id) if trace_id and self.enabled else None
+
+    def bind(self, func: Callable) -> Callable:
+        """
+        绑定当前上下文，供线程池执行（run_in_executor 不会复制上下文变量）
+        """
+        context = contextvars.copy_context()
+        return lambda *args, **kwargs: context.run(func, *args, **kwargs)
+
+    # ---- 记录 ----
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Any]:
+        """记录代码块的耗时，块内的span以它为父span"""
+        context = self.current()
+        if context is None:
+            yield _NOOP_SPAN
+            return
+        span = Span(name=name, trace_id=context.trace_id, span_id=new_span_id(),
+                    parent_id=context.span_id, start=time.time(), process=self.process,
+                    thread=threading.current_thread().name, attributes=attributes)
+        token = _current.set(SpanContext(context.trace_id, span.span_id))
+        try:
+            yield span
+        except BaseException as e:
+            span.set(error=f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            _current.reset(token)
+            span.end = time.time()
+            self._add(span)
+
+    def record(self, name: str, start: float, end: Optional[float] = None, context: Optional[SpanContext] = None,
+               span_id: Optional[str] = None, **attributes) -> Optional[Span]:
+        """
+        记录已知起止时间的span（如排队等待），不在trace上下文中时忽略
+
+        Args:
+            context: 父上下文，默认为当前上下文（在其他线程中记录时显式传入）
+            span_id: 预先分配的span ID（子span先于父span结束时使用）
+        """
+        context = context or self.current()
+        if context is None:
+            return None
+        span = Span(name=name, trace_id=context.trace_id, span_id=span_id or new_span_id(),
+                    parent_id=context.span_id, start=start, end=end or time.time(), process=self.process,
+                    thread=threading.current_thread().name, attributes=attributes)
+        self._add(span)
+        return span
+
+    def _add(self, span: Span):
+        with self._lock:
+            spans = self._spans.get(span.trace_id)
+            if spans is None:
+                spans = self._spans[span.trace_id] = []
+                while len(self._spans) > self.max_traces:
+                    self._spans.popitem(last=False)
+            if len(spans) < self.max_spans_per_trace:
+                spans.append(span)
+
+    def ingest(self, spans: List[Dict[str, Any]]):
+        """加入其他进程记录的span（服务端随响应返回的span）"""
+        for data in spans or []:
+            try:
+                self._add(Span.from_dict(data))
+            except (TypeError, KeyError) as e:
+                logger.debug(f"Ignoring malformed span: {e}")
+
+    def spans(self, trace_id: str) -> List[Span]:
+        with self._lock:
+            return list(self._spans.get(trace_id, []))
+
+    def take(self, trace_id: Optional[str]) -> List[Span]:
+        """
+        取出trace缓存的span但不导出（span随响应交给其他进程导出时使用）
+
+        Returns:
+            List[Span]: 该trace的span
+        """
+        if not trace_id:
+            return []
+        with self._lock:
+            spans = self._spans.pop(trace_id, [])
+        if self._active and self._active.trace_id == trace_id:
+            self._active = None
+        return spans
+
+    def finish(self, trace_id: Optional[str]) -> List[Span]:
+        """
+        结束trace：取出缓存的span并交给导出器
+
+        Returns:
+            List[Span]: 该trace的span
+        """
+        spans = self.take(trace_id)
+        if spans:
+            for exporter in self.exporters:
+                try:
+                    exporter.export(trace_id, spans)
+                except Exception as e:
+                    logger.warning(f"Trace export failed: {e}")
+        return spans
+
+    # ---- 消息传递 ----
+
+    def inject(self, message: Dict[str, Any], context: Optional[SpanContext] = None) -> Dict[str, Any]:
+        """在消息中写入trace上下文（不在trace中时不修改消息）"""
+        context = context or self.current()
+        if context is not None:
+            message[TRACE_FIELD] = {'trace_id': context.trace_id, 'span_id': context.span_id}
+        return message
+
+    @staticmethod
+    def extract(message: Dict[str, Any]) -> Optional[SpanContext]:
+        """读取消息中的trace上下文"""
+        data = message.get(TRACE_FIELD)
+        if not isinstance(data, dict) or not data.get('trace_id'):
+            return None
+        return SpanContext(str(data['trace_id']), data.get('span_id'))
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def configure_tracer(process: str = "client", directory: Optional[str] = None, collector_url: Optional[str] = None,
+                     enabled: Optional[bool] = None) -> Tracer:
+    """
+    配置全局记录器
+
+    Args:
+        process: 进程名
+        directory: Chrome trace文件目录，默认读取环境变量 TRACE_DIR
+        collector_url: 收集服务地址，默认读取环境变量 TRACE_COLLECTOR_URL
+        enabled: 是否开启新trace，默认在配置了任一导出目标时开启
+
+    Returns:
+        Tracer: 全局记录器
+    """
+    global _tracer
+    directory = directory or os.environ.get('TRACE_DIR')
+    collector_url = collector_url or os.environ.get('TRACE_COLLECTOR_URL')
+    exporters = []
+    if directory:
+        exporters.append(ChromeTraceExporter(directory))
+    if collector_url:
+        exporters.append(CollectorExporter(collector_url))
+    with _tracer_lock:
+        _tracer = Tracer(process, exporters, enabled=bool(exporters) if enabled is None else enabled)
+    return _tracer
+
+
+def get_tracer() -> Tracer:
+    """获取全局记录器，未配置时按环境变量配置"""
+    if _tracer is None:
+        return configure_tracer()
+    return _tracer
@@ -0,0 +1,317 @@
+"""
+WebSocket消息编码 - 选择性压缩
+
+JSON中的元素列表、推理文本和操作计划压缩率高（5-10倍），而截图、模板、图块等base64数据
+本身已经是JPEG/PNG/zlib压缩过的，再压缩只消耗CPU。permessage-deflate 只能对整条消息生效，
+因此在应用层分帧：图像字段原样放在未压缩的数据块中，其余JSON用 zstd（可用时）或 zlib 压缩。
+
+二进制帧中字段相同的字典列表（UIElement列表等）按表格形式 {"fields": [...], "rows": [...]} 编码，
+不再为每个元素重复键名；JSON编解码使用 shared/schemas/serialization.py（orjson可用时）。
+
+双方通过WebSocket子协议协商编码（"cua-wire.zstd" / "cua-wire.zlib"），未协商时仍然收发JSON文本，
+与旧版本客户端、服务端兼容。
+
+二进制帧格式（整数均为大端）:
+    magic b"CUAW" | version u8 | codec u8 | blob_count u16 | header_len u32 | blob_len u32 * blob_count
+    | header（压缩后的JSON: {"m": 去掉图像字段的消息, "b": 各图像字段的路径, "t": 表格形式列表的路径}）
+    | 图像数据块...
+版本1的帧没有 "t"，仍可解码。
+"""
+
+import logging
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+from shared.schemas.serialization import dumps, dumps_text, loads, pack_records, unpack_records
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"CUAW"
+VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+SUBPROTOCOL_PREFIX = "cua-wire."
+
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+CODEC_NAMES = {CODEC_NONE: "none", CODEC_ZLIB: "zlib", CODEC_ZSTD: "zstd"}
+CODEC_IDS = {name: codec_id for codec_id, name in CODEC_NAMES.items()}
+DEFAULT_LEVELS = {"zlib": 6, "zstd": 3}
+
+_PREFIX = struct.Struct(">4sBBHI")
+_BLOB_LEN = struct.Struct(">I")
+
+Path = List[Union[str, int]]
+
+
+class WireFormatError(ValueError):
+    """二进制帧无法解析"""
+    pass
+
+
+def available_codecs() -> List[str]:
+    """本机支持的压缩编码（按优先顺序）"""
+    return (["zstd"] if ZSTD_AVAILABLE else []) + ["zlib"]
+
+
+def subprotocols(codecs: Optional[List[str]] = None) -> List[str]:
+    """客户端握手时提供的子协议列表"""
+    return [SUBPROTOCOL_PREFIX + name for name in (codecs or available_codecs()) if name in available_codecs()]
+
+
+def select_subprotocol(offered: List[str], codecs: Optional[List[str]] = None) -> Optional[str]:
+    """服务端按客户端的优先顺序选择第一个双方都支持的子协议，没有时返回None（使用JSON文本）"""
+    supported = set(subprotocols(codecs))
+    for protocol in offered or []:
+        if protocol in supported:
+            return protocol
+    return None
+
+
+def codec_from_subprotocol(subprotocol: Optional[str]) -> Optional[str]:
+    if subprotocol and subprotocol.startswith(SUBPROTOCOL_PREFIX):
+        name = subprotocol[len(SUBPROTOCOL_PREFIX):]
+        if name in available_codecs():
+            return name
+    return None
+
+
+class WireStats:
+    """编码统计：压缩前后字节数与压缩/解压耗时，用于权衡压缩级别（线程安全，可由多个连接共用）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sent_messages = 0
+        self.sent_json_bytes = 0       # 未压缩的JSON部分
+        self.sent_blob_bytes = 0       # 不压缩的图像数据
+        self.sent_wire_bytes = 0       # 实际发送
+        self.compress_seconds = 0.0    # 编码总耗时（序列化+压缩）
+        self.received_messages = 0
+        self.received_wire_bytes = 0
+        self.decompress_seconds = 0.0  # 解码总耗时（解压+反序列化）
+
+    def record_send(self, json_bytes: int, blob_bytes: int, wire_bytes: int, seconds: float):
+        with self._lock:
+            self.sent_messages += 1
+            self.sent_json_bytes += json_bytes
+            self.sent_blob_bytes += blob_bytes
+            self.sent_wire_bytes += wire_bytes
+            self.compress_seconds += seconds
+
+    def record_receive(self, wire_bytes: int, seconds: float):
+        with self._lock:
+            self.received_messages += 1
+            self.received_wire_bytes += wire_bytes
+            self.decompress_seconds += seconds
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            raw = self.sent_json_bytes + self.sent_blob_bytes
+            saved = raw - self.sent_wire_bytes
+            return {
+                'sent_messages': self.sent_messages,
+                'sent_raw_bytes': raw,
+                'sent_wire_bytes': self.sent_wire_bytes,
+                'sent_blob_bytes': self.sent_blob_bytes,
+                'bytes_saved': saved,
+                'compression_ratio': raw / self.sent_wire_bytes if self.sent_wire_bytes else None,
+                'encode_ms': self.compress_seconds * 1000,
+                # 每节省1MB消耗的编码CPU时间，用于选择压缩级别
+                'encode_ms_per_mb_saved': (self.compress_seconds * 1000 / (saved / (1024 * 1024))
+                                           if saved > 0 else None),
+                'received_messages': self.received_messages,
+                'received_wire_bytes': self.received_wire_bytes,
+                'decode_ms': self.decompress_seconds * 1000,
+            }
+
+
+class WireCodec:
+    """
+    单个连接的消息编解码器
+
+    codec为None时只收发JSON文本；否则较大的 *_base64 字段作为图像数据块原样发送，
+    JSON部分超过 min_compress_size 时压缩
+    """
+
+    def __init__(self, codec: Optional[str] = None, level: Optional[int] = None,
+                 blob_min_size: int = 256, min_compress_size: int = 1024, pack_min_rows: int = 4,
+                 stats: Optional[WireStats] = None):
+        """
+        Args:
+            codec: "zstd" / "zlib" / None（JSON文本）
+            level: 压缩级别，默认 zstd 3、zlib 6
+            blob_min_size: *_base64 字段达到该长度时作为图像数据块单独发送
+            min_compress_size: JSON部分小于该字节数时不压缩
+            pack_min_rows: 字段相同的字典列表达到该长度时按表格形式编码，0表示不使用表格形式
+            stats: 编码统计（可多个连接共用）
+        """
+        if codec is not None and codec not in available_codecs():
+            raise ValueError(f"不支持的压缩编码: {codec}")
+        self.codec = codec
+        self.level = level if level is not None else DEFAULT_LEVELS.get(codec, 0)
+        self.blob_min_size = blob_min_size
+        self.min_compress_size = min_compress_size
+        self.pack_min_rows = pack_min_rows
+        self.stats = stats or WireStats()
+
+        self._zstd_compressor = None
+        self._zstd_decompressor = None
+        if ZSTD_AVAILABLE:
+            self._zstd_decompressor = zstandard.ZstdDecompressor()
+            if codec == "zstd":
+                self._zstd_compressor = zstandard.ZstdCompressor(level=self.level)
+
+    # ---- 编码 ----
+
+    def encode(self, message: Dict[str, Any]) -> Union[str, bytes]:
+        """
+        编码消息
+
+        Returns:
+            Union[str, bytes]: 未协商压缩时为JSON文本，否则为二进制帧
+        """
+        start_time = time.perf_counter()
+        if self.codec is None:
+            text = dumps_text(message)
+            self.stats.record_send(len(text), 0, len(text), time.perf_counter() - start_time)
+            return text
+
+        blobs: List[bytes] = []
+        paths: List[Path] = []
+        tables: List[Path] = []
+        stripped = self._extract_blobs(message, [], blobs, paths, tables)
+        header = dumps({'m': stripped, 'b': paths, 't': tables})
+
+        codec_id = CODEC_NONE
+        payload = header
+        if len(header) >= self.min_compress_size:
+            compressed = self._compress(header)
+            if len(compressed) < len(header):
+                codec_id, payload = CODEC_IDS[self.codec], compressed
+
+        parts = [_PREFIX.pack(MAGIC, VERSION, codec_id, len(blobs), len(payload))]
+        parts.extend(_BLOB_LEN.pack(len(blob)) for blob in blobs)
+        parts.append(payload)
+        parts.extend(blobs)
+        frame = b''.join(parts)
+
+        blob_bytes = sum(len(blob) for blob in blobs)
+        self.stats.record_send(len(header), blob_bytes, len(frame), time.perf_counter() - start_time)
+        return frame
+
+    def _extract_blobs(self, value: Any, path: Path, blobs: List[bytes], paths: List[Path],
+                       tables: List[Path]) -> Any:
+        """
+        复制消息结构，把较大的 *_base64 字段取出为数据块，字段相同的字典列表转为表格形式（原消息不修改）
+
+        数据块和表格的路径都按展开后的结构记录，解码时先由外向内还原表格再放回数据块；
+        不含容器的列表（坐标等）不会被修改，直接引用原列表
+        """
+        if isinstance(value, dict):
+            result = {}
+            for key, item in value.items():
+                if isinstance(item, (dict, list)):
+                    result[key] = self._extract_blobs(item, path + [key], blobs, paths, tables)
+                elif (isinstance(item, str) and len(item) >= self.blob_min_size
+                        and isinstance(key, str) and key.endswith('_base64')):
+                    paths.append(path + [key])
+                    blobs.append(item.encode('utf-8'))
+                    result[key] = None
+                else:
+                    result[key] = item
+            return result
+        if isinstance(value, list):
+            if not any(isinstance(item, (dict, list)) for item in value):
+                return value
+            items = [self._extract_blobs(item, path + [i], blobs, paths, tables) for i, item in enumerate(value)]
+            if self.pack_min_rows and len(items) >= self.pack_min_rows:
+                table = pack_records(items)
+                if table is not None:
+                    tables.append(path)
+                    return table
+            return items
+        return value
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.codec == "zstd":
+            return self._zstd_compressor.compress(data)
+        return zlib.compress(data, self.level)
+
+    # ---- 解码 ----
+
+    def decode(self, raw: Union[str, bytes]) -> Dict[str, Any]:
+        """
+        解码一条WebSocket消息（JSON文本或二进制帧）
+
+        Raises:
+            json.JSONDecodeError / WireFormatError: 消息格式错误（均为ValueError）
+        """
+        start_time = time.perf_counter()
+        if isinstance(raw, str):
+            message = loads(raw)
+        else:
+            message = self._decode_frame(bytes(raw))
+        self.stats.record_receive(len(raw), time.perf_counter() - start_time)
+        return message
+
+    def _decode_frame(self, frame: bytes) -> Dict[str, Any]:
+        if len(frame) < _PREFIX.size:
+            raise WireFormatError("帧长度不足")
+        magic, version, codec_id, blob_count, header_len = _PREFIX.unpack_from(frame)
+        if magic != MAGIC or version not in SUPPORTED_VERSIONS:
+            raise WireFormatError(f"未知的帧格式 (magic={magic!r}, version={version})")
+
+        offset = _PREFIX.size
+        blob_lens = []
+        for _ in range(blob_count):
+            blob_lens.append(_BLOB_LEN.unpack_from(frame, offset)[0])
+            offset += _BLOB_LEN.size
+        if offset + header_len + sum(blob_lens) != len(frame):
+            raise WireFormatError("帧长度与头部描述不一致")
+
+        header = self._decompress(codec_id, frame[offset:offset + header_len])
+        offset += header_len
+        try:
+            envelope = loads(header)
+        except ValueError as e:
+            raise WireFormatError(f"帧头部JSON无效: {e}")
+
+        message = envelope['m']
+        # 表格可以嵌套（行中的字段本身是表格），路径均按展开后的结构记录；
+        # 编码时内层先于外层记录，逆序还原即先展开外层，内层路径才能沿展开后的行找到
+        for path in reversed(envelope.get('t', ())):
+            target = message
+            for key in path[:-1]:
+                target = target[key]
+            target[path[-1]] = unpack_records(target[path[-1]])
+        for path, length in zip(envelope['b'], blob_lens):
+            target = message
+            for key in path[:-1]:
+                target = target[key]
+            target[path[-1]] = frame[offset:offset + length].decode('utf-8')
+            offset += length
+        return message
+
+    def _decompress(self, codec_id: int, data: bytes) -> bytes:
+        if codec_id == CODEC_NONE:
+            return data
+        if codec_id == CODEC_ZLIB:
+            return zlib.decompress(data)
+        if codec_id == CODEC_ZSTD:
+            if self._zstd_decompressor is None:
+                raise WireFormatError("收到zstd压缩的帧，但未安装zstandard")
+            return self._zstd_decompressor.decompress(data)
+        raise WireFormatError(f"未知的压缩编码: {codec_id}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'codec': self.codec or 'json', 'level': self.level if self.codec else None,
+                **self.stats.get_stats()}
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+启动无界面客户端的便捷脚本（参数原样传给 client/headless/main.py）
+"""
+
+import subprocess
+import sys
+import os
+
+def main():
+    print("🚀 启动Computer Use Agent无界面客户端...", file=sys.stderr)
+    
+    # 切换到项目目录
+    project_dir = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(project_dir)
+    
+    try:
+        # 启动无界面客户端
+        result = subprocess.run([
+            sys.executable, "client/headless/main.py", *sys.argv[1:]
+        ])
+        sys.exit(result.returncode)
+    except KeyboardInterrupt:
+        print("\n👋 无界面客户端已关闭", file=sys.stderr)
+    except Exception as e:
+        print(f"❌ 启动失败: {e}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""
+WebSocket消息编码的往返测试
+"""
+
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+
+from shared.utils.wire_codec import WireCodec
+
+
+@pytest.mark.parametrize("codec", [None, "zlib"])
+def test_nested_tables_round_trip(codec):
+    wire = WireCodec(codec)
+    message = {"type": "t", "data": {"items": [{"a": i, "sub": [{"k": j} for j in range(5)]} for i in range(5)]}}
+    assert wire.decode(wire.encode(message)) == message
+
+
+def test_nested_tables_with_blobs_round_trip():
+    wire = WireCodec("zlib", blob_min_size=8)
+    message = {"data": {"ui_elements": [
+        {"id": i, "template_base64": "QUJD" * (i + 3), "parts": [{"k": j, "image_base64": "WFla" * 4} for j in range(4)]}
+        for i in range(6)
+    ]}}
+    assert wire.decode(wire.encode(message)) == message